@@ -0,0 +1,269 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Micro-benchmarks
+
+Timings of the pure-Python paths which see the most data, over
+synthetic builds. The suites follow the conventions of asv: each
+class may have a ``params`` sequence and a ``setup`` method, and each
+``time_*`` method is timed once per param.
+
+Run them via ``python -m benchmarks`` or ``make benchmark``.
+"""
+
+
+from io import StringIO
+from random import Random
+
+from kojismokydingo.builds import build_nvr_sort
+from kojismokydingo.cli import tabulate
+from kojismokydingo.common import (
+    _rpm_str_compare, fnmatches, globfilter, rpm_evr_compare, )
+from kojismokydingo.sift import DEFAULT_SIEVES, Sifter
+from kojismokydingo.sift.parse import ItemPath, parse_exprs
+
+
+# count of builds for each timing. Only the first is used unless all
+# params are requested
+SIZES = (10000, 100000, 1000000)
+
+
+_builds_cache = {}
+
+
+def synthetic_builds(count, seed=0):
+    """
+    A list of build info dicts in a random order, with names, versions
+    and releases varied enough to exercise the RPM comparison rules.
+    Shared between suites, so do not modify them.
+
+    :param count: count of builds
+
+    :type count: int
+
+    :param seed: seed for the random order and values
+
+    :type seed: int, optional
+
+    :rtype: list[dict]
+    """
+
+    found = _builds_cache.get((count, seed))
+    if found is not None:
+        return found
+
+    rand = Random(seed)
+    packages = max(1, count // 10)
+
+    found = []
+    for bid in range(1, count + 1):
+        pkg = rand.randrange(packages)
+        name = "pkg%05i" % pkg
+        version = "%i.%i.%i%s" % (rand.randrange(4), rand.randrange(20),
+                                  rand.randrange(100),
+                                  rand.choice(("", "a", "rc1", "~beta")))
+        release = "%i.el%i" % (rand.randrange(1, 30), rand.randrange(6, 10))
+        epoch = rand.choice((None, None, None, 1))
+
+        found.append({
+            "id": bid, "build_id": bid,
+            "name": name, "version": version, "release": release,
+            "epoch": epoch,
+            "nvr": "%s-%s-%s" % (name, version, release),
+            "state": rand.choice((1, 1, 1, 2, 3)),
+            "owner_name": "user%i" % rand.randrange(20),
+            "extra": {"typeinfo": {"maven": {
+                "group_id": "com.example%i" % (pkg % 7),
+                "artifact_id": name}}} if bid % 10 == 0 else None,
+        })
+
+    _builds_cache[(count, seed)] = found
+    return found
+
+
+def _evr(binfo):
+    epoch = binfo["epoch"]
+    return ("0" if epoch is None else str(epoch),
+            binfo["version"], binfo["release"])
+
+
+class RPMCompare():
+
+    params = SIZES
+    param_names = ("builds", )
+
+
+    def setup(self, count):
+        builds = synthetic_builds(count)
+        evrs = [_evr(b) for b in builds]
+        self.pairs = list(zip(evrs, evrs[1:] + evrs[:1]))
+        self.versions = [(left[1], right[1]) for left, right in self.pairs]
+
+
+    def time_rpm_evr_compare(self, count):
+        for left, right in self.pairs:
+            rpm_evr_compare(left, right)
+
+
+    def time_rpm_str_compare(self, count):
+        for left, right in self.versions:
+            _rpm_str_compare(left, right)
+
+
+class BuildSort():
+
+    params = SIZES
+    param_names = ("builds", )
+
+
+    def setup(self, count):
+        self.builds = synthetic_builds(count)
+
+
+    def time_build_nvr_sort(self, count):
+        build_nvr_sort(self.builds)
+
+
+    def time_build_nvr_sort_dups(self, count):
+        build_nvr_sort(self.builds, dedup=False)
+
+
+class ParseExprs():
+
+    params = (1000, 10000, 100000)
+    param_names = ("exprs", )
+
+
+    def setup(self, count):
+        exprs = []
+        for index in range(count):
+            exprs.append("(flag f%i (or (name pkg%05i* |foo\\|bar|)"
+                         " (not (state 2 3)) (item extra.typeinfo"
+                         " /com\\.example[0-9]/ {1..3})))"
+                         % (index, index))
+        self.source = "\n".join(exprs)
+
+
+    def time_parse_exprs(self, count):
+        for _expr in parse_exprs(self.source):
+            pass
+
+
+class ItemPathGet():
+
+    params = SIZES
+    param_names = ("builds", )
+
+
+    def setup(self, count):
+        self.builds = synthetic_builds(count)
+        self.path = ItemPath("extra", "typeinfo", "maven", "group_id")
+        self.shallow = ItemPath("owner_name")
+
+
+    def time_item_path_get(self, count):
+        get = self.path.get
+        for binfo in self.builds:
+            for _found in get(binfo):
+                pass
+
+
+    def time_item_path_get_shallow(self, count):
+        get = self.shallow.get
+        for binfo in self.builds:
+            for _found in get(binfo):
+                pass
+
+
+class GlobMatch():
+
+    params = SIZES
+    param_names = ("builds", )
+
+
+    def setup(self, count):
+        self.nvrs = [b["nvr"] for b in synthetic_builds(count)]
+        self.patterns = ["pkg0001*", "*-1.1*", "pkg?2*.el7", "*rc1*"]
+
+
+    def time_globfilter(self, count):
+        for _nvr in globfilter(self.nvrs, self.patterns):
+            pass
+
+
+    def time_globfilter_ignore_case(self, count):
+        for _nvr in globfilter(self.nvrs, self.patterns, ignore_case=True):
+            pass
+
+
+    def time_fnmatches(self, count):
+        patterns = self.patterns
+        for nvr in self.nvrs:
+            fnmatches(nvr, patterns)
+
+
+class SifterLogic():
+
+    params = SIZES
+    param_names = ("builds", )
+
+
+    def setup(self, count):
+        self.builds = synthetic_builds(count)
+
+        self.logic_or = Sifter(DEFAULT_SIEVES, """
+        (or (item name pkg000*) (item owner_name user1 user2)
+            (item extra.typeinfo.maven.group_id com.example1)
+            (item state 3))
+        """)
+
+        self.logic_not = Sifter(DEFAULT_SIEVES, """
+        (not (item name pkg000*) (item owner_name user1 user2)
+             (item state 3))
+        """)
+
+
+    def time_logic_or(self, count):
+        self.logic_or.run(None, self.builds)
+
+
+    def time_logic_not(self, count):
+        self.logic_not.run(None, self.builds)
+
+
+class Tabulate():
+
+    params = SIZES
+    param_names = ("rows", )
+
+
+    def setup(self, count):
+        self.rows = [(b["id"], b["nvr"], b["owner_name"], b["state"])
+                     for b in synthetic_builds(count)]
+
+
+    def time_tabulate(self, count):
+        tabulate(("ID", "NVR", "Owner", "State"), self.rows,
+                 quiet=False, out=StringIO())
+
+
+    def time_tabulate_sorted(self, count):
+        tabulate(("ID", "NVR", "Owner", "State"), self.rows,
+                 key=lambda r: (r[1], r[0], r[2], r[3]), sorting=1,
+                 quiet=True, out=StringIO())
+
+
+#
+# The end.
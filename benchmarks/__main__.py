@@ -0,0 +1,210 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Micro-benchmark runner
+
+Times each benchmark in the `benchmarks` package, optionally saving
+the timings as a baseline, or comparing them against a previously
+saved baseline and exiting with an error if any have regressed beyond
+a threshold.
+"""
+
+
+import sys
+
+from argparse import ArgumentParser
+from fnmatch import fnmatchcase
+from gc import collect
+from inspect import getmembers, isclass
+from json import dump, load
+from time import perf_counter
+
+import benchmarks
+
+from kojismokydingo.cli import printerr, tabulate
+
+
+def iter_benchmarks(module, all_params=False):
+    """
+    Yields (name, suite class, method name, param) for each timing
+    in the module
+    """
+
+    for cname, cls in getmembers(module, isclass):
+        if cls.__module__ != module.__name__:
+            continue
+
+        params = getattr(cls, "params", (None, ))
+        if not all_params:
+            params = params[:1]
+
+        for mname, _meth in getmembers(cls):
+            if not mname.startswith("time_"):
+                continue
+
+            for param in params:
+                name = "%s.%s" % (cname, mname)
+                if param is not None:
+                    name = "%s(%s)" % (name, param)
+                yield name, cls, mname, param
+
+
+def time_benchmark(cls, mname, param, repeat, min_time=0.1):
+    """
+    The best time in seconds of a single run of a benchmark. Each
+    sample loops over the benchmark enough times to take at least
+    min_time seconds, to keep quick benchmarks from being all noise.
+    """
+
+    suite = cls()
+    args = () if param is None else (param, )
+
+    setup = getattr(suite, "setup", None)
+    if setup:
+        setup(*args)
+
+    meth = getattr(suite, mname)
+
+    # the first run warms up and calibrates the loop count
+    start = perf_counter()
+    meth(*args)
+    loops = max(1, int(min_time / max(perf_counter() - start, 1e-6)))
+
+    best = None
+    for _index in range(repeat):
+        collect()
+        start = perf_counter()
+        for _loop in range(loops):
+            meth(*args)
+        elapsed = (perf_counter() - start) / loops
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def compare_timings(baseline, timings, threshold):
+    """
+    Rows of (name, baseline, current, ratio, status), along with the
+    count of regressions beyond the threshold
+    """
+
+    rows = []
+    regressed = 0
+
+    for name, current in timings.items():
+        before = baseline.get(name)
+        if before is None:
+            rows.append((name, "-", "%0.4f" % current, "-", "new"))
+            continue
+
+        ratio = current / before if before else 1.0
+        if ratio > 1.0 + threshold:
+            status = "REGRESSED"
+            regressed += 1
+        elif ratio < 1.0 - threshold:
+            status = "improved"
+        else:
+            status = "ok"
+
+        rows.append((name, "%0.4f" % before, "%0.4f" % current,
+                     "%0.2f" % ratio, status))
+
+    return rows, regressed
+
+
+def cli(options):
+    baseline = None
+    if options.compare:
+        try:
+            with open(options.compare, "rt") as fin:
+                baseline = load(fin)["timings"]
+        except OSError as ose:
+            printerr("Could not read baseline:", ose)
+            printerr("Create one via --save or make benchmark-baseline")
+            return 1
+
+    timings = {}
+    for name, cls, mname, param in iter_benchmarks(benchmarks,
+                                                   options.all_params):
+        if options.filter and not fnmatchcase(name, options.filter):
+            continue
+
+        elapsed = time_benchmark(cls, mname, param, options.repeat,
+                                 options.min_time)
+        timings[name] = elapsed
+
+        if baseline is None:
+            print("%-50s %0.4f" % (name, elapsed), flush=True)
+
+    if options.save:
+        with open(options.save, "wt") as fout:
+            dump({"version": 1, "python": sys.version,
+                  "timings": timings}, fout, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        rows, regressed = compare_timings(baseline, timings,
+                                          options.threshold)
+        tabulate(("Benchmark", "Baseline", "Current", "Ratio", "Status"),
+                 rows, quiet=False)
+
+        if regressed:
+            printerr("%i benchmarks regressed by more than %i%%" %
+                     (regressed, options.threshold * 100))
+            return 1
+
+    return 0
+
+
+def main(args=None):
+    parser = ArgumentParser(prog="python -m benchmarks",
+                            description="Run the ksd micro-benchmarks")
+    addarg = parser.add_argument
+
+    addarg("--save", metavar="FILENAME", default=None,
+           help="Write the timings to a baseline file")
+
+    addarg("--compare", metavar="FILENAME", default=None,
+           help="Compare the timings against a baseline file, and exit"
+           " with an error if any have regressed")
+
+    addarg("--threshold", type=float, default=0.25,
+           help="Fraction by which a timing may be slower than its"
+           " baseline before it counts as a regression. Default: 0.25")
+
+    addarg("--repeat", type=int, default=5,
+           help="Runs of each benchmark, of which the best is kept."
+           " Default: 5")
+
+    addarg("--min-time", type=float, default=0.1,
+           help="Minimum seconds for each run, repeating quick"
+           " benchmarks as needed. Default: 0.1")
+
+    addarg("--all-params", action="store_true", default=False,
+           help="Time every param of each suite, up to a million"
+           " builds, rather than only the first")
+
+    addarg("--filter", metavar="GLOB", default=None,
+           help="Only run benchmarks whose names match")
+
+    return cli(parser.parse_args(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+
+#
+# The end.
@@ -0,0 +1,1297 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+A local stand-in for a koji hub, serving a seeded synthetic data set
+over XML-RPC, for exercising ksd against realistic volumes of data.
+
+Only the subset of hub methods which ksd itself uses is implemented.
+Builds, archives, RPMs, and buildroots are computed from their IDs
+on demand, so very large data sets cost little memory until they are
+requested. Latency may be injected per request and per call.
+
+To run a hub for load testing::
+
+  python -m benchmarks.fakehub --builds 200000 --tags 5000 --depth 25 \\
+      --tagged 50000 --latency 0.05
+
+which prints the URL to use as the server of a koji profile.
+"""
+
+
+import koji
+
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from hashlib import md5
+from random import Random
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from time import sleep
+from xmlrpc.client import Fault
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+
+BASE_TS = 1500000000
+
+COMPLETE = koji.BUILD_STATES["COMPLETE"]
+DELETED = koji.BUILD_STATES["DELETED"]
+FAILED = koji.BUILD_STATES["FAILED"]
+EXPIRED = koji.BR_STATES["EXPIRED"]
+
+BTYPES = ("rpm", "maven", "win", "image")
+
+ARCHIVE_TYPES = {
+    "maven": ((1, "jar"), (2, "pom")),
+    "image": ((3, "qcow2"), (4, "tar")),
+    "win": ((5, "dll"), (6, "exe")),
+}
+
+RPM_ARCHES = ("src", "x86_64", "noarch", "aarch64", "ppc64le", "s390x")
+
+SIGKEYS = ("", "fd431d51", "2f86d6a1")
+
+CHANNELS = ("default", "createrepo", "image")
+
+# archive and RPM IDs are derived from their build's ID
+PER_BUILD = 16
+
+
+class SyntheticData():
+    """
+    A deterministic, scalable data set, generated from a seed.
+
+    Tags are arranged in inheritance chains of the given depth, with
+    some tags also inheriting from the head of the previous chain.
+    Each tag directly contains a contiguous window of `tagged` builds.
+    One in twenty builds is imported by a content generator, and one
+    in fifty has failed.
+
+    :param seed: seed for the varying values such as sizes, owners,
+      and signatures
+
+    :param builds: count of builds
+
+    :param packages: count of packages. Default, one per ten builds
+
+    :param tags: count of tags
+
+    :param depth: length of the tag inheritance chains
+
+    :param tagged: count of builds directly tagged into each tag.
+      Default, enough to tag each build into two tags
+
+    :param users: count of users
+
+    :param archives: count of archives for each non-rpm build
+
+    :param rpms: count of RPMs for each rpm build
+    """
+
+    def __init__(self, seed=0, builds=1000, packages=None, tags=50,
+                 depth=5, tagged=None, users=20, archives=2, rpms=3):
+
+        self.seed = seed
+        self.builds = builds
+        self.packages = packages or max(1, builds // 10)
+        self.tags = tags
+        self.depth = max(1, depth)
+        self.tagged = tagged or max(1, (builds * 2) // tags)
+        self.users = users
+        self.archives = min(archives, PER_BUILD)
+        self.rpms = min(rpms, PER_BUILD)
+
+        # tag inheritance is small enough to compute up front
+        self._parents = {}
+        self._children = {}
+        for tid in range(1, tags + 1):
+            parents = []
+            if (tid - 1) % self.depth:
+                parents.append(tid - 1)
+            if tid > self.depth and tid % 3 == 0:
+                head = tid - ((tid - 1) % self.depth) - self.depth
+                if head not in parents:
+                    parents.append(head)
+            self._parents[tid] = parents
+            for pid in parents:
+                self._children.setdefault(pid, []).append(tid)
+
+        # changes made via tagBuildBypass and untagBuildBypass
+        self._added = {}
+        self._removed = {}
+        self._lock = Lock()
+
+
+    def _rand(self, kind, ident):
+        return Random("%i:%s:%i" % (self.seed, kind, ident))
+
+
+    def user(self, key):
+        if isinstance(key, str):
+            if not key.startswith("user"):
+                return None
+            key = key[4:]
+            if not key.isdigit():
+                return None
+            key = int(key)
+
+        if not 1 <= key <= self.users:
+            return None
+
+        name = "user%i" % key
+        return {"id": key, "name": name, "status": 0,
+                "usertype": 0,
+                "krb_principals": ["%s@EXAMPLE.COM" % name]}
+
+
+    def build_type(self, bid):
+        if bid % 15 == 0:
+            return "image"
+        elif bid % 10 == 0:
+            return "maven"
+        elif bid % 97 == 0:
+            return "win"
+        else:
+            return "rpm"
+
+
+    def build(self, key):
+        if isinstance(key, str):
+            bid = self.nvr_to_id(key)
+        elif isinstance(key, dict):
+            bid = key.get("id")
+        else:
+            bid = key
+
+        if bid is None or not 1 <= bid <= self.builds:
+            return None
+
+        rand = self._rand("build", bid)
+        pkg = (bid - 1) % self.packages + 1
+        serial = (bid - 1) // self.packages
+
+        name = "pkg%05i" % pkg
+        version = "1.%i" % serial
+        release = "%i.fake" % (bid % 3 + 1)
+        owner = rand.randint(1, self.users)
+        created = BASE_TS + bid * 60
+
+        if bid % 50 == 0:
+            state = FAILED
+        elif bid % 73 == 0:
+            state = DELETED
+        else:
+            state = COMPLETE
+
+        cg = (bid % 20 == 0)
+        btype = self.build_type(bid)
+
+        extra = None
+        if btype == "maven":
+            extra = {"typeinfo": {"maven": {
+                "group_id": "com.example", "artifact_id": name,
+                "version": version}}}
+
+        return {
+            "id": bid, "build_id": bid,
+            "package_id": pkg, "package_name": name,
+            "name": name, "version": version, "release": release,
+            "epoch": None,
+            "nvr": "%s-%s-%s" % (name, version, release),
+            "state": state,
+            "owner_id": owner, "owner_name": "user%i" % owner,
+            "task_id": None if cg else 100000 + bid,
+            "cg_id": 1 if cg else None,
+            "cg_name": "fake-cg" if cg else None,
+            "volume_id": 0, "volume_name": "DEFAULT",
+            "creation_event_id": bid * 10,
+            "creation_ts": float(created),
+            "creation_time": str(created),
+            "start_ts": float(created - 600),
+            "completion_ts": float(created),
+            "completion_time": str(created),
+            "source": None,
+            "extra": extra,
+        }
+
+
+    def nvr_to_id(self, nvr):
+        try:
+            name, version, release = nvr.rsplit("-", 2)
+            pkg = int(name[3:])
+            serial = int(version.split(".")[1])
+        except (ValueError, IndexError):
+            return None
+
+        bid = serial * self.packages + pkg
+        info = self.build(bid)
+        return bid if (info and info["nvr"] == nvr) else None
+
+
+    def archives_of(self, bid):
+        btype = self.build_type(bid)
+        if btype == "rpm" or not 1 <= bid <= self.builds:
+            return []
+
+        found = []
+        for index in range(self.archives):
+            found.append(self.archive(bid * PER_BUILD + index))
+        return found
+
+
+    def archive(self, aid):
+        bid, index = divmod(aid, PER_BUILD)
+        btype = self.build_type(bid)
+        if (btype == "rpm" or index >= self.archives or
+                not 1 <= bid <= self.builds):
+            return None
+
+        rand = self._rand("archive", aid)
+        type_id, type_name = ARCHIVE_TYPES[btype][index % 2]
+        name = "pkg%05i" % ((bid - 1) % self.packages + 1)
+
+        info = {
+            "id": aid, "build_id": bid,
+            "btype": btype, "btype_id": BTYPES.index(btype) + 1,
+            "type_id": type_id, "type_name": type_name,
+            "filename": "%s-%i-%i.%s" % (name, bid, index, type_name),
+            "size": rand.randint(1000, 10000000),
+            "checksum": md5(b"%i" % aid).hexdigest(),
+            "checksum_type": 0,
+            "buildroot_id": bid,
+            "metadata_only": False,
+            "extra": None,
+        }
+
+        if btype == "maven":
+            info.update({"group_id": "com.example", "artifact_id": name,
+                         "version": "1.%i" % bid})
+        elif btype == "win":
+            info.update({"relpath": "", "platforms": "x86_64",
+                         "flags": ""})
+        return info
+
+
+    def archive_types(self):
+        found = []
+        for btype in BTYPES[1:]:
+            for type_id, type_name in ARCHIVE_TYPES[btype]:
+                found.append({"id": type_id, "name": type_name,
+                              "description": "%s file" % type_name,
+                              "extensions": type_name,
+                              "compression_type": None})
+        return sorted(found, key=lambda t: t["id"])
+
+
+    def rpms_of(self, bid):
+        if self.build_type(bid) != "rpm" or not 1 <= bid <= self.builds:
+            return []
+
+        return [self.rpm(bid * PER_BUILD + index)
+                for index in range(self.rpms)]
+
+
+    def rpm(self, rid):
+        bid, index = divmod(rid, PER_BUILD)
+        if (self.build_type(bid) != "rpm" or index >= self.rpms or
+                not 1 <= bid <= self.builds):
+            return None
+
+        build = self.build(bid)
+        rand = self._rand("rpm", rid)
+        arch = RPM_ARCHES[index % len(RPM_ARCHES)]
+
+        return {
+            "id": rid, "build_id": bid,
+            "buildroot_id": bid,
+            "name": build["name"], "version": build["version"],
+            "release": build["release"], "epoch": None,
+            "arch": arch,
+            "nvr": build["nvr"],
+            "payloadhash": md5(b"%i" % rid).hexdigest(),
+            "size": rand.randint(1000, 1000000),
+            "buildtime": int(build["creation_ts"]),
+            "external_repo_id": 0, "external_repo_name": "INTERNAL",
+            "metadata_only": False,
+            "extra": None,
+        }
+
+
+    def rpm_sigs(self, rid):
+        if self.rpm(rid) is None:
+            return []
+
+        sigkey = self._rand("sig", rid).choice(SIGKEYS)
+        sighash = md5(b"%i:%s" % (rid, sigkey.encode())).hexdigest()
+        return [{"rpm_id": rid, "sigkey": sigkey, "sighash": sighash}]
+
+
+    def buildroot(self, brid):
+        if not 1 <= brid <= self.builds:
+            return None
+
+        cg = (brid % 20 == 0)
+        tag_id = (brid - 1) % self.tags + 1
+
+        return {
+            "id": brid, "state": EXPIRED,
+            "arch": "x86_64", "br_type": 0,
+            "host_id": brid % 5 + 1, "host_name": "host%i" % (brid % 5 + 1),
+            "task_id": None if cg else 200000 + brid,
+            "repo_id": brid, "repo_state": 1,
+            "tag_id": tag_id, "tag_name": "tag%04i" % tag_id,
+            "create_event_id": brid * 10 - 5,
+            "cg_id": 1 if cg else None,
+            "cg_name": "fake-cg" if cg else None,
+            "cg_version": "1.0" if cg else None,
+            "container_type": None, "container_arch": None,
+            "host_os": None, "host_arch": None,
+            "extra": None,
+        }
+
+
+    def buildroot_components(self, brid):
+        # the builds whose RPMs were installed into a buildroot
+        return [bid for bid in range(brid - 5, brid) if bid >= 1]
+
+
+    def tag_id(self, key):
+        if isinstance(key, dict):
+            key = key.get("id")
+
+        if isinstance(key, str):
+            if not key.startswith("tag") or not key[3:].isdigit():
+                return None
+            key = int(key[3:])
+
+        if key is None or not 1 <= key <= self.tags:
+            return None
+        return key
+
+
+    def tag(self, key):
+        tid = self.tag_id(key)
+        if tid is None:
+            return None
+
+        return {"id": tid, "name": "tag%04i" % tid,
+                "arches": "x86_64 aarch64" if tid % self.depth else None,
+                "locked": False, "maven_support": False,
+                "maven_include_all": False,
+                "perm": None, "perm_id": None,
+                "extra": {"tid": str(tid)}}
+
+
+    def tag_parents(self, tid):
+        return self._parents.get(tid, [])
+
+
+    def tag_children(self, tid):
+        return self._children.get(tid, [])
+
+
+    def inheritance(self, tid):
+        # depth-first walk of the tag's parents, as (link, depth)
+        # pairs where link is (child_id, parent_id, priority)
+
+        found = []
+        seen = set([tid])
+
+        def walk(child, depth):
+            for priority, pid in enumerate(self.tag_parents(child)):
+                if pid in seen:
+                    continue
+                seen.add(pid)
+                found.append(((child, pid, priority * 10), depth))
+                walk(pid, depth + 1)
+
+        walk(tid, 1)
+        return found
+
+
+    def reverse_inheritance(self, tid):
+        found = []
+        seen = set([tid])
+
+        def walk(parent, depth):
+            for cid in self.tag_children(parent):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                priority = self.tag_parents(cid).index(parent) * 10
+                found.append(((cid, parent, priority), depth))
+                walk(cid, depth + 1)
+
+        walk(tid, 1)
+        return found
+
+
+    def _window(self, tid):
+        # the first offset and length of the wrapping range of build
+        # IDs which were originally tagged into the tag
+
+        start = ((tid - 1) * max(1, self.builds // self.tags)) % self.builds
+        return start, min(self.tagged, self.builds)
+
+
+    def _in_window(self, tid, bid):
+        start, count = self._window(tid)
+        return ((bid - 1 - start) % self.builds < count and
+                bid % 50 and bid % 73)
+
+
+    def tagged_ids(self, tid):
+        # the build IDs directly tagged into the tag, newest first
+
+        start, count = self._window(tid)
+
+        with self._lock:
+            removed = set(self._removed.get(tid, ()))
+            added = set(self._added.get(tid, ()))
+
+        found = set()
+        for offset in range(count):
+            bid = (start + offset) % self.builds + 1
+            if bid % 50 and bid % 73:
+                found.add(bid)
+
+        found.update(added)
+        found.difference_update(removed)
+        return sorted(found, reverse=True)
+
+
+    def build_tags(self, bid):
+        with self._lock:
+            found = []
+            for tid in range(1, self.tags + 1):
+                if bid in self._removed.get(tid, ()):
+                    continue
+                if (self._in_window(tid, bid) or
+                        bid in self._added.get(tid, ())):
+                    found.append(tid)
+        return found
+
+
+    def tag_build(self, tid, bid):
+        with self._lock:
+            self._removed.get(tid, set()).discard(bid)
+            self._added.setdefault(tid, set()).add(bid)
+
+
+    def untag_build(self, tid, bid):
+        with self._lock:
+            self._added.get(tid, set()).discard(bid)
+            self._removed.setdefault(tid, set()).add(bid)
+
+
+    def target(self, key):
+        heads = range(1, self.tags + 1, self.depth)
+        count = len(heads)
+
+        if isinstance(key, str):
+            if not key.startswith("target") or not key[6:].isdigit():
+                return None
+            key = int(key[6:])
+
+        if not 1 <= key <= count:
+            return None
+
+        dest = heads[key - 1]
+        build = min(dest + self.depth - 1, self.tags)
+        return {"id": key, "name": "target%i" % key,
+                "build_tag": build, "build_tag_name": "tag%04i" % build,
+                "dest_tag": dest, "dest_tag_name": "tag%04i" % dest}
+
+
+    def host(self, key):
+        if isinstance(key, str):
+            if not key.startswith("host") or not key[4:].isdigit():
+                return None
+            key = int(key[4:])
+
+        if not 1 <= key <= 5:
+            return None
+
+        return {"id": key, "name": "host%i" % key, "user_id": key,
+                "arches": "x86_64", "capacity": 2.0, "enabled": True,
+                "ready": True, "task_load": 0.0, "comment": None,
+                "description": None}
+
+
+    def channel(self, key):
+        if isinstance(key, str):
+            key = CHANNELS.index(key) + 1 if key in CHANNELS else 0
+
+        if not 1 <= key <= len(CHANNELS):
+            return None
+
+        return {"id": key, "name": CHANNELS[key - 1], "enabled": True,
+                "comment": None, "description": None}
+
+
+    def package(self, key):
+        if isinstance(key, str):
+            if not key.startswith("pkg") or not key[3:].isdigit():
+                return None
+            key = int(key[3:])
+
+        if not 1 <= key <= self.packages:
+            return None
+
+        return {"id": key, "name": "pkg%05i" % key}
+
+
+def _apply_query_opts(found, queryOpts):
+    # the order, offset, and limit of queryOpts, as the hub applies them
+
+    if not queryOpts:
+        return found
+
+    order = queryOpts.get("order")
+    if order:
+        key = order.lstrip("-")
+        found = sorted(found, key=lambda info: info[key],
+                       reverse=order.startswith("-"))
+
+    offset = queryOpts.get("offset") or 0
+    limit = queryOpts.get("limit")
+    if limit is None:
+        return found[offset:]
+    return found[offset:offset + limit]
+
+
+class FakeHub():
+    """
+    Implements the subset of the koji hub API used by ksd over a
+    `SyntheticData` set. Methods named in camelCase are the exported
+    hub methods.
+
+    :param data: the data set to serve
+
+    :param latency: seconds to sleep for each request
+
+    :param call_latency: seconds to sleep for each call, including
+      each call within a multicall
+    """
+
+    def __init__(self, data, latency=0.0, call_latency=0.0):
+        self.data = data
+        self.latency = latency
+        self.call_latency = call_latency
+
+        # count of requests and of calls, by method name
+        self.requests = 0
+        self.calls = {}
+        self._lock = Lock()
+
+        # IDs of packages which listPackages omits, as if they had
+        # been removed from the package lists while still tagged
+        self.unlisted = set()
+
+
+    def _dispatch(self, method, params):
+        with self._lock:
+            self.requests += 1
+
+        if self.latency:
+            sleep(self.latency)
+
+        return self._call(method, params)
+
+
+    def _call(self, method, params):
+        if method.startswith("_") or not method[:1].islower():
+            raise Fault(1000, "Invalid method: %s" % method)
+
+        func = getattr(self, method, None)
+        if func is None or method in ("data", "latency", "call_latency",
+                                      "requests", "calls", "unlisted"):
+            raise Fault(1000, "Invalid method: %s" % method)
+
+        args = list(params)
+        kwargs = {}
+        if args and isinstance(args[-1], dict) and args[-1].get("__starstar"):
+            kwargs = dict(args.pop())
+            del kwargs["__starstar"]
+
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if self.call_latency:
+            sleep(self.call_latency)
+
+        try:
+            return func(*args, **kwargs)
+        except TypeError as te:
+            raise Fault(koji.ParameterError.faultCode, str(te))
+
+
+    def _tagged(self, tid, inherit):
+        tag_ids = [tid]
+        if inherit:
+            tag_ids.extend(link[1] for link, _depth in
+                           self.data.inheritance(tid))
+
+        seen = set()
+        for each in tag_ids:
+            taginfo = self.data.tag(each)
+            for bid in self.data.tagged_ids(each):
+                if bid not in seen:
+                    seen.add(bid)
+                    yield bid, taginfo
+
+
+    def multiCall(self, calls):
+        results = []
+        for call in calls:
+            try:
+                result = self._call(call["methodName"], call["params"])
+            except Fault as fault:
+                results.append({"faultCode": fault.faultCode,
+                                "faultString": fault.faultString})
+            else:
+                results.append([result])
+        return results
+
+
+    def count(self, methodName, *args, **kw):
+        func = getattr(self, methodName, None)
+        if methodName.startswith("_") or func is None:
+            raise Fault(1000, "Invalid method: %s" % methodName)
+        return len(func(*args, **kw))
+
+
+    def getAPIVersion(self):
+        return koji.API_VERSION
+
+
+    def getKojiVersion(self):
+        return "1.30.0"
+
+
+    def getLastEvent(self, before=None):
+        return {"id": self.data.builds * 10 + 1,
+                "ts": float(BASE_TS + self.data.builds * 60)}
+
+
+    def getLoggedInUser(self):
+        return self.data.user(1)
+
+
+    def getUserPerms(self, userID=None):
+        return ["admin"] if userID in (1, "user1", None) else []
+
+
+    def getAllPerms(self):
+        return [{"id": 1, "name": "admin", "description": "admin"}]
+
+
+    def getUser(self, userInfo=None, strict=False, krb_princs=True,
+                groups=False):
+        info = self.data.user(userInfo)
+        if info is None and strict:
+            raise Fault(1000, "No such user: %r" % (userInfo,))
+        return info
+
+
+    def getBuild(self, buildInfo, strict=False):
+        info = self.data.build(buildInfo)
+        if info is None and strict:
+            raise Fault(1000, "No such build: %r" % (buildInfo,))
+        return info
+
+
+    def getBuildType(self, buildInfo, strict=False):
+        info = self.data.build(buildInfo)
+        if info is None:
+            if strict:
+                raise Fault(1000, "No such build: %r" % (buildInfo,))
+            return {}
+
+        btype = self.data.build_type(info["id"])
+        found = {btype: None}
+        if btype == "maven":
+            found[btype] = dict(info["extra"]["typeinfo"]["maven"],
+                                build_id=info["id"])
+        elif btype == "win":
+            found[btype] = {"platform": "w10", "build_id": info["id"]}
+        elif btype == "image":
+            found[btype] = {"build_id": info["id"]}
+        return found
+
+
+    def listBTypes(self, query=None, queryOpts=None):
+        return [{"id": index + 1, "name": name}
+                for index, name in enumerate(BTYPES)]
+
+
+    def listCGs(self):
+        return {"fake-cg": {"id": 1, "users": ["user1"]}}
+
+
+    def getTaskInfo(self, task_id, request=False, strict=False):
+        if not 100000 < task_id <= 100000 + self.data.builds:
+            if strict:
+                raise Fault(1000, "No such task: %r" % task_id)
+            return None
+
+        info = {"id": task_id, "method": "build", "state": 2,
+                "owner": (task_id % self.data.users) + 1,
+                "arch": "noarch", "channel_id": 1, "parent": None,
+                "priority": 20, "weight": 0.2,
+                "create_ts": float(BASE_TS + task_id),
+                "completion_ts": float(BASE_TS + task_id + 600)}
+        if request:
+            info["request"] = ["git+https://example.com/pkg#abc",
+                               "target1", {}]
+        return info
+
+
+    def listArchives(self, buildID=None, buildrootID=None,
+                     componentBuildrootID=None, hostID=None, type=None,
+                     filename=None, size=None, checksum=None,
+                     typeInfo=None, queryOpts=None, imageID=None,
+                     archiveID=None, strict=False):
+
+        data = self.data
+
+        if buildID is not None:
+            found = data.archives_of(buildID)
+        elif type is not None:
+            found = []
+            for bid in range(1, data.builds + 1):
+                found.extend(data.archives_of(bid))
+        elif buildrootID is not None:
+            found = data.archives_of(buildrootID)
+        elif componentBuildrootID is not None:
+            found = []
+            for bid in data.buildroot_components(componentBuildrootID):
+                found.extend(data.archives_of(bid))
+        elif archiveID is not None:
+            found = [data.archive(archiveID)]
+        elif filename is not None:
+            try:
+                _name, bid, index = filename.rsplit(".", 1)[0].split("-")
+                aid = int(bid) * PER_BUILD + int(index)
+            except ValueError:
+                aid = 0
+            found = [data.archive(aid)]
+        else:
+            raise Fault(koji.ParameterError.faultCode,
+                        "listArchives requires a filter")
+
+        found = [a for a in found if a]
+        if type is not None:
+            found = [a for a in found if a["btype"] == type]
+        if filename is not None:
+            found = [a for a in found if a["filename"] == filename]
+        return _apply_query_opts(found, queryOpts)
+
+
+    def getArchive(self, archive_id, strict=False):
+        info = self.data.archive(archive_id)
+        if info is None and strict:
+            raise Fault(1000, "No such archive: %r" % archive_id)
+        return info
+
+
+    def getArchiveTypes(self):
+        return self.data.archive_types()
+
+
+    def getArchiveType(self, filename=None, type_name=None, type_id=None,
+                       strict=False):
+
+        types = self.data.archive_types()
+
+        if type_id is not None:
+            found = [t for t in types if t["id"] == type_id]
+        elif type_name is not None:
+            found = [t for t in types if t["name"] == type_name]
+        elif filename is not None:
+            ext = filename.rsplit(".", 1)[-1].lower()
+            found = [t for t in types if ext in t["extensions"].split()]
+        else:
+            raise Fault(koji.ParameterError.faultCode,
+                        "one of filename, type_name, or type_id is"
+                        " required")
+
+        if found:
+            return found[0]
+        elif strict:
+            raise Fault(1000, "Invalid archive type")
+        return None
+
+
+    def listTaggedArchives(self, tag, event=None, inherit=False,
+                           latest=False, package=None, type=None):
+
+        if type not in (None, "maven", "win"):
+            raise Fault(1000, "unsupported archive type: %s" % type)
+
+        builds = self.listTagged(tag, event, inherit=inherit, latest=latest,
+                                 package=package, type=type)
+
+        archives = []
+        for bld in builds:
+            found = self.data.archives_of(bld["id"])
+            archives.extend(a for a in found
+                            if type is None or a["btype"] == type)
+
+        return [archives, builds]
+
+
+    def getLatestMavenArchives(self, tag, event=None, inherit=True):
+        archives, builds = self.listTaggedArchives(tag, event, inherit,
+                                                   latest=True,
+                                                   type="maven")
+
+        # unlike listTaggedArchives, the archives carry some fields of
+        # their builds
+        builds = {bld["id"]: bld for bld in builds}
+        for archive in archives:
+            bld = builds[archive["build_id"]]
+            archive.update({"build_name": bld["name"],
+                            "build_version": bld["version"],
+                            "build_release": bld["release"],
+                            "build_epoch": bld["epoch"],
+                            "volume_id": bld["volume_id"],
+                            "volume_name": bld["volume_name"],
+                            "pkg_id": bld["package_id"]})
+        return archives
+
+
+    def getLatestRPMS(self, tag, package=None, arch=None, event=None,
+                      rpmsigs=False, type=None):
+
+        builds = self.listTagged(tag, event, inherit=True, latest=True,
+                                 package=package, type=type)
+
+        rpms = []
+        for bld in builds:
+            found = self.data.rpms_of(bld["id"])
+            rpms.extend(r for r in found if arch is None or r["arch"] == arch)
+
+        return [rpms, builds]
+
+
+    def listRPMs(self, buildID=None, buildrootID=None, imageID=None,
+                 componentBuildrootID=None, hostID=None, arches=None,
+                 queryOpts=None):
+
+        data = self.data
+
+        if buildID is not None:
+            found = data.rpms_of(buildID)
+        elif buildrootID is not None:
+            found = data.rpms_of(buildrootID)
+        elif componentBuildrootID is not None:
+            found = []
+            for bid in data.buildroot_components(componentBuildrootID):
+                found.extend(data.rpms_of(bid))
+        else:
+            raise Fault(koji.ParameterError.faultCode,
+                        "listRPMs requires a filter")
+
+        if arches:
+            if isinstance(arches, str):
+                arches = [arches]
+            found = [r for r in found if r["arch"] in arches]
+        return found
+
+
+    def getRPM(self, rpminfo, strict=False, multi=False):
+        info = None
+        if isinstance(rpminfo, int):
+            info = self.data.rpm(rpminfo)
+
+        elif isinstance(rpminfo, str):
+            nvr, _, arch = rpminfo.rpartition(".")
+            bid = self.data.nvr_to_id(nvr)
+            for found in self.data.rpms_of(bid or 0):
+                if found["arch"] == arch:
+                    info = found
+                    break
+        if info is None and strict:
+            raise Fault(1000, "No such rpm: %r" % (rpminfo,))
+        return info
+
+
+    def queryRPMSigs(self, rpm_id=None, sigkey=None, queryOpts=None):
+        found = self.data.rpm_sigs(rpm_id)
+        if sigkey is not None:
+            found = [s for s in found if s["sigkey"] == sigkey]
+        return found
+
+
+    def getBuildroot(self, buildrootID, strict=False):
+        info = self.data.buildroot(buildrootID)
+        if info is None and strict:
+            raise Fault(1000, "No such buildroot: %r" % buildrootID)
+        return info
+
+
+    def getTag(self, tagInfo, strict=False, event=None, blocked=False):
+        info = self.data.tag(tagInfo)
+        if info is None and strict:
+            raise Fault(1000, "No such tag: %r" % (tagInfo,))
+        return info
+
+
+    def listTags(self, build=None, package=None, perms=True,
+                 queryOpts=None, pattern=None):
+        data = self.data
+
+        if build is not None:
+            info = data.build(build)
+            if info is None:
+                raise Fault(1000, "No such build: %r" % (build,))
+            return [data.tag(tid) for tid in data.build_tags(info["id"])]
+
+        return [data.tag(tid) for tid in range(1, data.tags + 1)]
+
+
+    def _links(self, pairs, reverse):
+        data = self.data
+        found = []
+        for (child, parent, priority), depth in pairs:
+            named = child if reverse else parent
+            found.append({"child_id": child, "parent_id": parent,
+                          "tag_id": named,
+                          "name": data.tag(named)["name"],
+                          "priority": priority, "depth": depth,
+                          "currdepth": depth, "nextdepth": None,
+                          "maxdepth": None, "intransitive": False,
+                          "noconfig": False, "pkg_filter": "",
+                          "filter": []})
+        return found
+
+
+    def getInheritanceData(self, tag, event=None):
+        tid = self.data.tag_id(tag)
+        if tid is None:
+            raise Fault(1000, "No such tagInfo: %r" % (tag,))
+
+        links = [((tid, pid, index * 10), 1) for index, pid
+                 in enumerate(self.data.tag_parents(tid))]
+        return self._links(links, False)
+
+
+    def getFullInheritance(self, tag, event=None, reverse=False,
+                           stops=None, jumps=None):
+        tid = self.data.tag_id(tag)
+        if tid is None:
+            raise Fault(1000, "No such tagInfo: %r" % (tag,))
+
+        if reverse:
+            return self._links(self.data.reverse_inheritance(tid), True)
+        else:
+            return self._links(self.data.inheritance(tid), False)
+
+
+    def queryHistory(self, tables=None, **kwargs):
+        # only the package listings of a tag, including those of
+        # packages which have since been removed from the list
+        tid = self.data.tag_id(kwargs["tag"])
+        if tid is None:
+            raise Fault(1000, "No such tagInfo: %r" % (kwargs["tag"],))
+
+        found = []
+        seen = set()
+        for bid, taginfo in self._tagged(tid, False):
+            pkg = (bid - 1) % self.data.packages + 1
+            if pkg not in seen:
+                seen.add(pkg)
+                found.append({"tag_id": tid, "package_id": pkg,
+                              "tag.name": taginfo["name"],
+                              "package.name": "pkg%05i" % pkg,
+                              "blocked": False,
+                              "active": pkg not in self.unlisted})
+
+        return {"tag_packages": found}
+
+
+    def listTagged(self, tag, event=None, inherit=False, prefix=None,
+                   latest=False, package=None, owner=None, type=None,
+                   strict=True, extra=False):
+
+        data = self.data
+        tid = data.tag_id(tag)
+        if tid is None:
+            if strict:
+                raise Fault(1000, "No such tagInfo: %r" % (tag,))
+            return []
+
+        if isinstance(owner, int):
+            owner = "user%i" % owner
+
+        found = []
+        seen_pkgs = set()
+
+        for bid, taginfo in self._tagged(tid, inherit):
+            info = data.build(bid)
+            name = info["name"]
+
+            if package is not None and name != package:
+                continue
+            if prefix is not None and not name.startswith(prefix):
+                continue
+            if owner is not None and info["owner_name"] != owner:
+                continue
+            if type is not None and data.build_type(bid) != type:
+                continue
+            if latest:
+                if name in seen_pkgs:
+                    continue
+                seen_pkgs.add(name)
+
+            info["tag_id"] = taginfo["id"]
+            info["tag_name"] = taginfo["name"]
+            found.append(info)
+
+        return found
+
+
+    def getLatestBuilds(self, tag, event=None, package=None, type=None):
+        return self.listTagged(tag, event, inherit=True, latest=True,
+                               package=package, type=type)
+
+
+    def listPackages(self, tagID=None, userID=None, pkgID=None,
+                     prefix=None, inherited=False, with_dups=False,
+                     event=None, queryOpts=None, with_owners=True,
+                     with_blocked=True):
+
+        data = self.data
+
+        if tagID is None:
+            found = [{"package_id": pkg, "package_name": "pkg%05i" % pkg}
+                     for pkg in range(1, data.packages + 1)]
+        else:
+            tid = data.tag_id(tagID)
+            if tid is None:
+                raise Fault(1000, "No such tagInfo: %r" % (tagID,))
+
+            found = []
+            seen = set()
+            for bid, taginfo in self._tagged(tid, inherited):
+                pkg = (bid - 1) % data.packages + 1
+                if pkg in seen or pkg in self.unlisted:
+                    continue
+                seen.add(pkg)
+                found.append({"package_id": pkg,
+                              "package_name": "pkg%05i" % pkg,
+                              "tag_id": taginfo["id"],
+                              "tag_name": taginfo["name"],
+                              "owner_id": 1, "owner_name": "user1",
+                              "blocked": False, "extra_arches": ""})
+
+        if prefix:
+            found = [p for p in found if p["package_name"].startswith(prefix)]
+        return _apply_query_opts(found, queryOpts)
+
+
+    def listBuilds(self, packageID=None, userID=None, taskID=None,
+                   prefix=None, state=None, volumeID=None, source=None,
+                   createdBefore=None, createdAfter=None,
+                   completeBefore=None, completeAfter=None, type=None,
+                   typeInfo=None, queryOpts=None, pattern=None, cgID=None,
+                   draft=None):
+
+        data = self.data
+
+        found = []
+        for bid in range(1, data.builds + 1):
+            info = data.build(bid)
+            if packageID is not None and info["package_id"] != packageID:
+                continue
+            if userID is not None and info["owner_id"] != userID:
+                continue
+            if prefix is not None and not info["name"].startswith(prefix):
+                continue
+            if state is not None and info["state"] != state:
+                continue
+            if type is not None and data.build_type(bid) != type:
+                continue
+            found.append(info)
+
+        return _apply_query_opts(found, queryOpts)
+
+
+    def tagBuildBypass(self, tag, build, force=False, notify=False):
+        tid = self.data.tag_id(tag)
+        info = self.data.build(build)
+        if tid is None or info is None:
+            raise Fault(1000, "No such tag or build")
+        self.data.tag_build(tid, info["id"])
+
+
+    def untagBuildBypass(self, tag, build, strict=True, force=False,
+                         notify=False):
+        tid = self.data.tag_id(tag)
+        info = self.data.build(build)
+        if tid is None or info is None:
+            raise Fault(1000, "No such tag or build")
+        self.data.untag_build(tid, info["id"])
+
+
+    def getBuildTarget(self, info, event=None, strict=False):
+        found = self.data.target(info)
+        if found is None and strict:
+            raise Fault(1000, "No such build target: %r" % (info,))
+        return found
+
+
+    def getBuildTargets(self, info=None, event=None, buildTagID=None,
+                        destTagID=None, queryOpts=None):
+        data = self.data
+        count = len(range(1, data.tags + 1, data.depth))
+        found = [data.target(index) for index in range(1, count + 1)]
+
+        if info is not None:
+            found = [t for t in found if info in (t["id"], t["name"])]
+        if buildTagID is not None:
+            found = [t for t in found if t["build_tag"] == buildTagID]
+        if destTagID is not None:
+            found = [t for t in found if t["dest_tag"] == destTagID]
+        return found
+
+
+    def getHost(self, hostInfo, strict=False, event=None):
+        info = self.data.host(hostInfo)
+        if info is None and strict:
+            raise Fault(1000, "No such host: %r" % (hostInfo,))
+        return info
+
+
+    def listHosts(self, arches=None, channelID=None, ready=None,
+                  enabled=None, userID=None, queryOpts=None):
+        return [self.data.host(hid) for hid in range(1, 6)]
+
+
+    def getChannel(self, channelInfo, strict=False):
+        info = self.data.channel(channelInfo)
+        if info is None and strict:
+            raise Fault(1000, "No such channel: %r" % (channelInfo,))
+        return info
+
+
+    def getPackage(self, info, strict=False, create=False):
+        found = self.data.package(info)
+        if found is None and strict:
+            raise Fault(1000, "No such package: %r" % (info,))
+        return found
+
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    # accept any path, and keep connections alive like the real hub
+    rpc_paths = ()
+    protocol_version = "HTTP/1.1"
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeHubServer(ThreadingMixIn, SimpleXMLRPCServer):
+    """
+    A threaded XML-RPC server for a `FakeHub`
+    """
+
+    daemon_threads = True
+
+
+    def __init__(self, hub, host="127.0.0.1", port=0):
+        super().__init__((host, port), requestHandler=_RequestHandler,
+                         logRequests=False, allow_none=True)
+        self.register_instance(hub)
+        self.hub = hub
+
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://%s:%i/kojihub" % (host, port)
+
+
+@contextmanager
+def fake_hub(data=None, latency=0.0, call_latency=0.0):
+    """
+    Context manager which serves a `FakeHub` from a background thread,
+    and provides the server.
+    """
+
+    if data is None:
+        data = SyntheticData()
+
+    hub = FakeHub(data, latency, call_latency)
+    server = FakeHubServer(hub)
+
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def main(args=None):
+    parser = ArgumentParser(prog="python -m benchmarks.fakehub",
+                            description="Serve a fake koji hub with"
+                            " synthetic data")
+    addarg = parser.add_argument
+
+    addarg("--host", default="127.0.0.1")
+    addarg("--port", type=int, default=8080)
+    addarg("--seed", type=int, default=0)
+    addarg("--builds", type=int, default=10000)
+    addarg("--packages", type=int, default=None)
+    addarg("--tags", type=int, default=100)
+    addarg("--depth", type=int, default=5)
+    addarg("--tagged", type=int, default=None,
+           help="Builds directly tagged into each tag")
+    addarg("--users", type=int, default=20)
+    addarg("--latency", type=float, default=0.0,
+           help="Seconds of latency for each request")
+    addarg("--call-latency", type=float, default=0.0,
+           help="Seconds of latency for each call, including those"
+           " within a multicall")
+
+    options = parser.parse_args(args)
+
+    data = SyntheticData(seed=options.seed, builds=options.builds,
+                         packages=options.packages, tags=options.tags,
+                         depth=options.depth, tagged=options.tagged,
+                         users=options.users)
+
+    hub = FakeHub(data, options.latency, options.call_latency)
+    server = FakeHubServer(hub, options.host, options.port)
+
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
+
+
+#
+# The end.
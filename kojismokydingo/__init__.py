@@ -22,24 +22,48 @@ build system
 
 
 from collections import OrderedDict
+from collections.abc import Mapping
 from functools import partial
 from koji import (
-    ClientSession, Fault, GenericError, ParameterError,
-    convertFault, read_config)
-from koji_cli.lib import activate_session, ensure_connection
-
-from .common import chunkseq
+    BR_STATES, BUILD_STATES,
+    ClientSession, GenericError, ParameterError, read_config)
+
+from .batch import MulticallBatch, gather_batched
+from .cache import (
+    cached_metadata, close_bulk_cache, close_metadata_cache,
+    set_bulk_cache, set_metadata_cache, )
+from .chunker import AdaptiveChunker, session_chunker, set_bulk_chunking
+from .common import chunkseq, unique
+from .identity import (
+    IdentityMap, _identity_load, _iter_identity_load, set_identity_map, )
+from .multicall import (
+    _completed_build_ids, _iter_cached_bulk_load, iter_bulk_load,
+    set_bulk_retries, set_bulk_streaming, )
+from .paging import iter_paged
+from .pool import (
+    SessionPool, clone_session, close_session_pool, session_pool,
+    set_bulk_jobs, )
+from .stats import (
+    CallStats, _replaying, call_stats, set_call_stats, set_cassette,
+    stats_phase, )
+from .throttle import Throttle, set_throttle
+from .transport import set_transport
 
 
 __all__ = (
+    "AdaptiveChunker",
     "AnonClientSession",
     "BadDingo",
+    "CallStats",
     "FeatureUnavailable",
+    "IdentityMap",
     "ManagedClientSession",
+    "MulticallBatch",
     "NoSuchArchive",
     "NoSuchBuild",
     "NoSuchChannel",
     "NoSuchContentGenerator",
+    "NoSuchPackage",
     "NoSuchPermission",
     "NoSuchRPM",
     "NoSuchTag",
@@ -48,6 +72,8 @@ __all__ = (
     "NoSuchUser",
     "NotPermitted",
     "ProfileClientSession",
+    "SessionPool",
+    "Throttle",
 
     "as_archiveinfo",
     "as_buildinfo",
@@ -57,19 +83,54 @@ __all__ = (
     "as_targetinfo",
     "as_taskinfo",
     "as_userinfo",
+    "bulk_as_archiveinfo",
+    "bulk_as_buildinfo",
+    "bulk_as_hostinfo",
+    "bulk_as_rpminfo",
+    "bulk_as_taginfo",
+    "bulk_as_targetinfo",
+    "bulk_as_taskinfo",
+    "bulk_as_userinfo",
     "bulk_load",
+    "bulk_load_archives",
     "bulk_load_build_archives",
     "bulk_load_build_rpms",
     "bulk_load_builds",
     "bulk_load_buildroot_archives",
     "bulk_load_buildroot_rpms",
     "bulk_load_buildroots",
+    "bulk_load_channels",
+    "bulk_load_hosts",
+    "bulk_load_packages",
     "bulk_load_rpm_sigs",
+    "bulk_load_rpms",
     "bulk_load_tags",
+    "bulk_load_targets",
     "bulk_load_tasks",
     "bulk_load_users",
+    "cached_metadata",
+    "call_stats",
+    "clone_session",
+    "close_bulk_cache",
+    "close_metadata_cache",
+    "close_session_pool",
+    "gather_batched",
     "hub_version",
     "iter_bulk_load",
+    "iter_paged",
+    "session_chunker",
+    "session_pool",
+    "set_bulk_cache",
+    "set_bulk_chunking",
+    "set_bulk_jobs",
+    "set_bulk_retries",
+    "set_bulk_streaming",
+    "set_call_stats",
+    "set_cassette",
+    "set_identity_map",
+    "set_metadata_cache",
+    "set_throttle",
+    "stats_phase",
     "version_check",
     "version_require",
 )
@@ -80,13 +141,38 @@ class ManagedClientSession(ClientSession):
     A `koji.ClientSession` that can be used as via the ``with``
     keyword to provide a managed session that will handle
     authenticated login and logout.
+
+    Accepts the same arguments as `koji.ClientSession`, along with an
+    optional transport.
+
+    :param transport: a transport to send the session's calls over.
+      See `kojismokydingo.transport.set_transport`
+
+    :type transport: `kojismokydingo.transport.HubTransport`, optional
     """
 
+    def __init__(self, *args, transport=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        set_bulk_streaming(self, True)
+
+        if transport is not None:
+            set_transport(self, transport)
+
+
     def __enter__(self):
-        activate_session(self, self.opts)
+        # a replaying session never contacts the hub, so there's
+        # nothing to log in to
+        if not _replaying(self):
+            # koji_cli is only imported once a session is activated,
+            # so that the data API may be used without it
+            from koji_cli.lib import activate_session
+            activate_session(self, self.opts)
         return self
 
     def __exit__(self, exc_type, _exc_val, _exc_tb):
+        close_session_pool(self)
+        close_bulk_cache(self)
+        close_metadata_cache(self)
         self.logout()
         if self.rsession:
             self.rsession.close()
@@ -98,12 +184,29 @@ class ProfileClientSession(ManagedClientSession):
     """
     A `koji.ClientSession` which loads profile config information and
     which can be used via tha ``with`` keyword.
+
+    :param profile: name of the koji profile. Default, koji
+
+    :type profile: str, optional
+
+    :param cassette: a cassette to record or replay the session's
+      calls. See `set_cassette`
+
+    :type cassette: `kojismokydingo.cassette.Cassette`, optional
+
+    :param transport: a transport to send the session's calls over.
+      See `kojismokydingo.transport.set_transport`
+
+    :type transport: `kojismokydingo.transport.HubTransport`, optional
     """
 
-    def __init__(self, profile="koji"):
+    def __init__(self, profile="koji", cassette=None, transport=None):
         conf = read_config(profile)
         server = conf["server"]
-        super().__init__(server, opts=conf)
+        super().__init__(server, opts=conf, transport=transport)
+
+        if cassette is not None:
+            set_cassette(self, cassette)
 
 
 class AnonClientSession(ProfileClientSession):
@@ -231,6 +334,14 @@ class NoSuchRPM(BadDingo):
     complaint = "No such RPM"
 
 
+class NoSuchPackage(BadDingo):
+    """
+    A package was not found
+    """
+
+    complaint = "No such package"
+
+
 class NotPermitted(BadDingo):
     """
     A required permission was not associated with the currently logged
@@ -248,67 +359,8 @@ class FeatureUnavailable(BadDingo):
     complaint = "The koji hub version doesn't support this feature"
 
 
-def iter_bulk_load(session, loadfn, keys, err=True, size=100):
-    """
-    Generic bulk loading generator. Invokes the given loadfn on each
-    key in keys using chunking multicalls limited to the specified
-    size.
-
-    Yields (key, result) pairs in order.
-
-    If err is True (default) then any faults will raise an exception.
-    If err is False, then a None will be substituted as the result for
-    the failing key.
-
-    :param session: The koji session
-
-    :type session: `koji.ClientSession`
-
-    :param loadfn: The loading function, to be invoked in a multicall
-      arrangement. Will be called once with each given key from keys
-
-    :type loadfn: Callable[[object], object]
-
-    :param keys: The sequence of keys to be used to invoke loadfn.
-
-    :type keys: list[object]
-
-    :param err: Whether to raise any underlying fault returns as
-      exceptions. Default, True
-
-    :type err: bool, optional
-
-    :param size: How many calls to loadfn to chunk up for each
-      multicall. Default, 100
-
-    :type size: int, optional
-
-    :raises koji.GenericError: if err is True and an issue
-      occurrs while invoking the loadfn
-
-    :rtype: Generator[tuple[object, object]]
-    """
-
-    for key_chunk in chunkseq(keys, size):
-        session.multicall = True
-
-        for key in key_chunk:
-            loadfn(key)
-
-        for key, info in zip(key_chunk, session.multiCall(strict=err)):
-            if info:
-                if "faultCode" in info:
-                    if err:
-                        raise convertFault(Fault(**info))
-                    else:
-                        yield key, None
-                else:
-                    yield key, info[0]
-            else:
-                yield key, None
-
-
-def bulk_load(session, loadfn, keys, err=True, size=100, results=None):
+def bulk_load(session, loadfn, keys, err=True, size=None, results=None,
+              jobs=None):
     """
     Generic bulk loading function. Invokes the given `loadfn` on each
     key in `keys` using chunking multicalls limited to the specified
@@ -342,7 +394,7 @@ def bulk_load(session, loadfn, keys, err=True, size=100, results=None):
     :type err: bool, optional
 
     :param size: How many calls to `loadfn` to chunk up for each
-      multicall. Default, 100
+      multicall. Default, adaptive
 
     :type size: int, optional
 
@@ -353,6 +405,11 @@ def bulk_load(session, loadfn, keys, err=True, size=100, results=None):
 
     :type results: dict, optional
 
+    :param jobs: How many multicalls may be in flight at once. Default,
+      as set via `set_bulk_jobs` for this session, or 1
+
+    :type jobs: int, optional
+
     :raises koji.GenericError: if `err` is `True` and an issue
       occurrs while invoking the `loadfn`
 
@@ -360,11 +417,12 @@ def bulk_load(session, loadfn, keys, err=True, size=100, results=None):
     """
 
     results = OrderedDict() if results is None else results
-    results.update(iter_bulk_load(session, loadfn, keys, err, size))
+    results.update(iter_bulk_load(session, loadfn, keys, err, size, jobs))
     return results
 
 
-def bulk_load_builds(session, nvrs, err=True, size=100, results=None):
+def bulk_load_builds(session, nvrs, err=True, size=None, results=None,
+                     jobs=None, store=None):
     """
     Load many buildinfo dicts from a koji client session and a
     sequence of NVRs.
@@ -390,7 +448,7 @@ def bulk_load_builds(session, nvrs, err=True, size=100, results=None):
     :type err: bool, optional
 
     :param size: Count of NVRs to load in a single multicall. Default,
-      100
+      adaptive
 
     :type size: int, optional
 
@@ -399,13 +457,36 @@ def bulk_load_builds(session, nvrs, err=True, size=100, results=None):
 
     :type results: Mapping, optional
 
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :param store: keep the loaded build infos in this store, and
+      provide views of them in place of dicts. The same store may be
+      given to any number of loads. Default, provide dicts
+
+    :type store: `kojismokydingo.records.BuildStore`, optional
+
     :rtype: Mapping
     """
 
     results = OrderedDict() if results is None else results
 
-    for key, info in iter_bulk_load(session, session.getBuild, nvrs,
-                                    False, size):
+    complete = BUILD_STATES["COMPLETE"]
+    immutable = lambda key, info: info["state"] == complete
+    aliases = lambda info: (info["id"], info["nvr"])
+
+    loader = partial(_iter_cached_bulk_load, session, "getBuild",
+                     session.getBuild, immutable=immutable, err=False,
+                     size=size, jobs=jobs, aliases=aliases)
+
+    # compact each info as it arrives, so that an identity map also
+    # records the view rather than the dict
+    record = None if store is None else store.record
+
+    for key, info in _iter_identity_load(session, "build", nvrs, loader,
+                                         record):
         if err and not info:
             raise NoSuchBuild(key)
         else:
@@ -415,7 +496,7 @@ def bulk_load_builds(session, nvrs, err=True, size=100, results=None):
 
 
 def bulk_load_tasks(session, task_ids, request=False,
-                    err=True, size=100, results=None):
+                    err=True, size=None, results=None, jobs=None):
     """
     Load many taskinfo dicts from a koji client session and a sequence
     of task IDs.
@@ -428,7 +509,8 @@ def bulk_load_tasks(session, task_ids, request=False,
 
     fn = partial(session.getTaskInfo, request=request)
 
-    for key, info in iter_bulk_load(session, fn, task_ids, False, size):
+    for key, info in iter_bulk_load(session, fn, task_ids,
+                                    False, size, jobs):
         if err and not info:
             raise NoSuchTask(key)
         else:
@@ -437,7 +519,8 @@ def bulk_load_tasks(session, task_ids, request=False,
     return results
 
 
-def bulk_load_tags(session, tags, err=True, size=100, results=None):
+def bulk_load_tags(session, tags, err=True, size=None, results=None,
+                   jobs=None):
     """
     :param err: Raise an exception if a tag fails to load. Default,
       True.
@@ -445,9 +528,14 @@ def bulk_load_tags(session, tags, err=True, size=100, results=None):
     :type err: bool, optional
 
     :param size: Count of tags to load in a single multicall. Default,
-      100
+      adaptive
 
     :type size: int, optional
+
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
     """
 
     results = OrderedDict() if results is None else results
@@ -457,7 +545,9 @@ def bulk_load_tags(session, tags, err=True, size=100, results=None):
     else:
         fn = session.getTag
 
-    for key, info in iter_bulk_load(session, fn, tags, False, size):
+    loader = lambda keys: iter_bulk_load(session, fn, keys, False, size, jobs)
+
+    for key, info in _iter_identity_load(session, "tag", tags, loader):
         if err and not info:
             raise NoSuchTag(key)
         else:
@@ -466,7 +556,8 @@ def bulk_load_tags(session, tags, err=True, size=100, results=None):
     return results
 
 
-def bulk_load_rpm_sigs(session, rpm_ids, size=100, results=None):
+def bulk_load_rpm_sigs(session, rpm_ids, size=None, results=None,
+                       jobs=None):
     """
     Set up a chunking multicall to fetch the signatures for a list of
     RPM via `session.queryRPMSigs` for each ID in rpm_ids.
@@ -481,12 +572,12 @@ def bulk_load_rpm_sigs(session, rpm_ids, size=100, results=None):
 
     results = OrderedDict() if results is None else results
     results.update(iter_bulk_load(session, session.queryRPMSigs,
-                                  rpm_ids, True, size))
+                                  rpm_ids, True, size, jobs))
     return results
 
 
 def bulk_load_buildroot_archives(session, buildroot_ids, btype=None,
-                                 size=100, results=None):
+                                 size=None, results=None, jobs=None):
     """
     Set up a chunking multicall to fetch the archives of buildroots
     via `session.listArchives` for each buildroot ID in buildrood_ids.
@@ -501,12 +592,13 @@ def bulk_load_buildroot_archives(session, buildroot_ids, btype=None,
 
     results = OrderedDict() if results is None else results
     fn = lambda i: session.listArchives(componentBuildrootID=i, type=btype)
-    results.update(iter_bulk_load(session, fn, buildroot_ids, True, size))
+    results.update(iter_bulk_load(session, fn, buildroot_ids,
+                                  True, size, jobs))
     return results
 
 
 def bulk_load_buildroot_rpms(session, buildroot_ids,
-                             size=100, results=None):
+                             size=None, results=None, jobs=None):
     """
     Set up a chunking multicall to fetch the RPMs of buildroots via
     `session.listRPMs` for each buildroot ID in buildrood_ids.
@@ -521,12 +613,13 @@ def bulk_load_buildroot_rpms(session, buildroot_ids,
 
     results = OrderedDict() if results is None else results
     fn = lambda i: session.listRPMs(componentBuildrootID=i)
-    results.update(iter_bulk_load(session, fn, buildroot_ids, True, size))
+    results.update(iter_bulk_load(session, fn, buildroot_ids,
+                                  True, size, jobs))
     return results
 
 
 def bulk_load_build_archives(session, build_ids, btype=None,
-                             size=100, results=None):
+                             size=None, results=None, jobs=None):
     """
     Set up a chunking multicall to fetch the archives of builds
     via `session.listArchives` for each build ID in build_ids.
@@ -541,11 +634,21 @@ def bulk_load_build_archives(session, build_ids, btype=None,
 
     results = OrderedDict() if results is None else results
     fn = lambda i: session.listArchives(buildID=i, type=btype)
-    results.update(iter_bulk_load(session, fn, build_ids, True, size))
+
+    # the archives of a completed build cannot change
+    build_ids = tuple(build_ids)
+    complete = _completed_build_ids(session, build_ids)
+    immutable = lambda key, info: key in complete
+    argsfn = lambda key: {"buildID": key, "type": btype}
+
+    results.update(_iter_cached_bulk_load(session, "listArchives", fn,
+                                          build_ids, immutable, True,
+                                          size, jobs, argsfn=argsfn))
     return results
 
 
-def bulk_load_build_rpms(session, build_ids, size=100, results=None):
+def bulk_load_build_rpms(session, build_ids, size=None, results=None,
+                         jobs=None):
     """
     Set up a chunking multicall to fetch the RPMs of builds via
     `session.listRPMS` for each build ID in build_ids.
@@ -559,12 +662,20 @@ def bulk_load_build_rpms(session, build_ids, size=100, results=None):
     """
 
     results = OrderedDict() if results is None else results
-    results.update(iter_bulk_load(session, session.listRPMs,
-                                  build_ids, True, size))
+
+    # the RPMs of a completed build cannot change
+    build_ids = tuple(build_ids)
+    complete = _completed_build_ids(session, build_ids)
+    immutable = lambda key, info: key in complete
+
+    results.update(_iter_cached_bulk_load(session, "listRPMs",
+                                          session.listRPMs, build_ids,
+                                          immutable, True, size, jobs))
     return results
 
 
-def bulk_load_buildroots(session, broot_ids, size=100, results=None):
+def bulk_load_buildroots(session, broot_ids, size=None, results=None,
+                         jobs=None):
     """
     Set up a chunking multicall to fetch the buildroot data via
     `session.getBuildroot` for each ID in broot_ids.
@@ -578,12 +689,18 @@ def bulk_load_buildroots(session, broot_ids, size=100, results=None):
     """
 
     results = OrderedDict() if results is None else results
-    results.update(iter_bulk_load(session, session.getBuildroot,
-                                  broot_ids, True, size))
+
+    expired = BR_STATES["EXPIRED"]
+    immutable = lambda key, info: info["state"] == expired
+
+    results.update(_iter_cached_bulk_load(session, "getBuildroot",
+                                          session.getBuildroot, broot_ids,
+                                          immutable, True, size, jobs))
     return results
 
 
-def bulk_load_users(session, users, err=True, size=100, results=None):
+def bulk_load_users(session, users, err=True, size=None, results=None,
+                    jobs=None):
     """
     Load many userinfo dicts from a koji client session and a sequence of
     user identifiers.
@@ -612,7 +729,7 @@ def bulk_load_users(session, users, err=True, size=100, results=None):
     :type err: bool, optional
 
     :param size: number of users to load in a single
-      multicall. Default, 100
+      multicall. Default, adaptive
 
     :type size: int, optional
 
@@ -620,13 +737,34 @@ def bulk_load_users(session, users, err=True, size=100, results=None):
       OrderedDict
 
     :type results: dict, optional
+
+    :param jobs: number of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
     """
 
-    users = tuple(users)
     results = OrderedDict() if results is None else results
 
+    loader = partial(_iter_bulk_load_users, session, size=size, jobs=jobs)
+
+    for key, info in _iter_identity_load(session, "user", users, loader):
+        if err and not info:
+            raise NoSuchUser(key)
+        else:
+            results[key] = info
+
+    return results
+
+
+def _iter_bulk_load_users(session, users, size=None, jobs=None):
+    # yields (key, userinfo) pairs, with None for any users which
+    # could not be found
+
+    users = tuple(users)
+
     if not users:
-        return results
+        return
 
     # we need to identify which signature the getUser API will
     # support.  Unfortunately the change in signatures happened before
@@ -640,7 +778,7 @@ def bulk_load_users(session, users, err=True, size=100, results=None):
         # there wasn't already an answer, so we'll have to find out
         # ourselves. In this case we'll load the first user in the
         # list of users separately, outside of a multicall, and using
-        # the as_userinfo function. This function will first try the
+        # the _get_user function. This function will first try the
         # newer signature. If successful, it will record
         # __new_get_user as True, and we'll know to use the newer
         # signature. If not, the function will retry with the older
@@ -649,15 +787,9 @@ def bulk_load_users(session, users, err=True, size=100, results=None):
         key = users[0]
         users = users[1:]
 
-        try:
-            results[key] = as_userinfo(session, key)
-        except NoSuchUser:
-            if err:
-                raise
-            else:
-                results[key] = None
-
-        # the use of as_userinfo will have updated the __new_get_user
+        yield key, _get_user(session, key)
+
+        # the use of _get_user will have updated the __new_get_user
         # sentinel attribute to either True or False
         new_get_user = session_vars.get("__new_get_user")
 
@@ -666,15 +798,658 @@ def bulk_load_users(session, users, err=True, size=100, results=None):
     else:
         fn = session.getUser
 
-    for key, info in iter_bulk_load(session, fn, users, False, size):
+    yield from iter_bulk_load(session, fn, users, False, size, jobs)
+
+
+def _bulk_load_identity(session, kind, loadfn, keys, exc, err, size,
+                        results, jobs):
+
+    # the common form of the bulk loaders for the kinds of info which
+    # are recorded in an identity map
+
+    results = OrderedDict() if results is None else results
+
+    loader = lambda keys: iter_bulk_load(session, loadfn, keys,
+                                         False, size, jobs)
+
+    for key, info in _iter_identity_load(session, kind, keys, loader):
         if err and not info:
-            raise NoSuchUser(key)
+            raise exc(key)
+        else:
+            results[key] = info
+
+    return results
+
+
+def bulk_load_targets(session, targets, err=True, size=None,
+                      results=None, jobs=None):
+    """
+    Load many target info dicts from a koji client session and a
+    sequence of target names or IDs.
+
+    Returns an OrderedDict associating the individual keys with their
+    resulting target info.
+
+    :param session: active koji session
+
+    :type session: koji.ClientSession
+
+    :param targets: target names or IDs to load
+
+    :type targets: Iterator[str] or Iterator[int]
+
+    :param err: Raise an exception if a target fails to load. Default,
+      True.
+
+    :type err: bool, optional
+
+    :param size: Count of targets to load in a single
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param results: mapping to store the results in. Default, produce
+      a new OrderedDict
+
+    :type results: Mapping, optional
+
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchTarget: if err is True and a target could not be
+      found
+
+    :rtype: Mapping
+    """
+
+    return _bulk_load_identity(session, "target", session.getBuildTarget,
+                               targets, NoSuchTarget, err, size,
+                               results, jobs)
+
+
+def bulk_load_hosts(session, hosts, err=True, size=None, results=None,
+                    jobs=None):
+    """
+    Load many host info dicts from a koji client session and a
+    sequence of host names or IDs.
+
+    Returns an OrderedDict associating the individual keys with their
+    resulting host info.
+
+    :param session: active koji session
+
+    :type session: koji.ClientSession
+
+    :param hosts: host names or IDs to load
+
+    :type hosts: Iterator[str] or Iterator[int]
+
+    :param err: Raise an exception if a host fails to load. Default,
+      True.
+
+    :type err: bool, optional
+
+    :param size: Count of hosts to load in a single multicall. Default,
+      adaptive
+
+    :type size: int, optional
+
+    :param results: mapping to store the results in. Default, produce
+      a new OrderedDict
+
+    :type results: Mapping, optional
+
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchHost: if err is True and a host could not be found
+
+    :rtype: Mapping
+    """
+
+    return _bulk_load_identity(session, "host", session.getHost,
+                               hosts, NoSuchHost, err, size,
+                               results, jobs)
+
+
+def bulk_load_channels(session, channels, err=True, size=None,
+                       results=None, jobs=None):
+    """
+    Load many channel info dicts from a koji client session and a
+    sequence of channel names or IDs.
+
+    Returns an OrderedDict associating the individual keys with their
+    resulting channel info.
+
+    :param session: active koji session
+
+    :type session: koji.ClientSession
+
+    :param channels: channel names or IDs to load
+
+    :type channels: Iterator[str] or Iterator[int]
+
+    :param err: Raise an exception if a channel fails to load. Default,
+      True.
+
+    :type err: bool, optional
+
+    :param size: Count of channels to load in a single
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param results: mapping to store the results in. Default, produce
+      a new OrderedDict
+
+    :type results: Mapping, optional
+
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchChannel: if err is True and a channel could not be
+      found
+
+    :rtype: Mapping
+    """
+
+    return _bulk_load_identity(session, "channel", session.getChannel,
+                               channels, NoSuchChannel, err, size,
+                               results, jobs)
+
+
+def bulk_load_packages(session, packages, err=True, size=None,
+                       results=None, jobs=None):
+    """
+    Load many package info dicts from a koji client session and a
+    sequence of package names or IDs.
+
+    Returns an OrderedDict associating the individual keys with their
+    resulting package info.
+
+    :param session: active koji session
+
+    :type session: koji.ClientSession
+
+    :param packages: package names or IDs to load
+
+    :type packages: Iterator[str] or Iterator[int]
+
+    :param err: Raise an exception if a package fails to load. Default,
+      True.
+
+    :type err: bool, optional
+
+    :param size: Count of packages to load in a single
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param results: mapping to store the results in. Default, produce
+      a new OrderedDict
+
+    :type results: Mapping, optional
+
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchPackage: if err is True and a package could not be
+      found
+
+    :rtype: Mapping
+    """
+
+    return _bulk_load_identity(session, "package", session.getPackage,
+                               packages, NoSuchPackage, err, size,
+                               results, jobs)
+
+
+def bulk_load_archives(session, archives, err=True, size=None,
+                       results=None, jobs=None):
+    """
+    Load many archive info dicts from a koji client session and a
+    sequence of archive IDs or filenames, in the same manner as
+    `as_archiveinfo`.
+
+    Returns an OrderedDict associating the individual keys with their
+    resulting archive info.
+
+    :param session: active koji session
+
+    :type session: koji.ClientSession
+
+    :param archives: archive IDs or filenames to load
+
+    :type archives: Iterator[int] or Iterator[str]
+
+    :param err: Raise an exception if an archive fails to
+      load. Default, True.
+
+    :type err: bool, optional
+
+    :param size: Count of archives to load in a single
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param results: mapping to store the results in. Default, produce
+      a new OrderedDict
+
+    :type results: Mapping, optional
+
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchArchive: if err is True and an archive could not be
+      found
+
+    :rtype: Mapping
+    """
+
+    results = OrderedDict() if results is None else results
+
+    def load_archive(key):
+        if isinstance(key, str):
+            return session.listArchives(filename=key)
+        else:
+            return session.getArchive(key)
+
+    for key, info in iter_bulk_load(session, load_archive, archives,
+                                    False, size, jobs):
+
+        if isinstance(info, list):
+            # filenames are found via listArchives
+            info = info[0] if info else None
+
+        if err and not info:
+            raise NoSuchArchive(key)
+        else:
+            results[key] = info
+
+    return results
+
+
+def bulk_load_rpms(session, rpms, err=True, size=None, results=None,
+                   jobs=None):
+    """
+    Load many RPM info dicts from a koji client session and a sequence
+    of RPM IDs or NVRAs.
+
+    Returns an OrderedDict associating the individual keys with their
+    resulting RPM info.
+
+    :param session: active koji session
+
+    :type session: koji.ClientSession
+
+    :param rpms: RPM IDs or NVRAs to load
+
+    :type rpms: Iterator[int] or Iterator[str]
+
+    :param err: Raise an exception if an RPM fails to load. Default,
+      True.
+
+    :type err: bool, optional
+
+    :param size: Count of RPMs to load in a single multicall. Default,
+      adaptive
+
+    :type size: int, optional
+
+    :param results: mapping to store the results in. Default, produce
+      a new OrderedDict
+
+    :type results: Mapping, optional
+
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchRPM: if err is True and an RPM could not be found
+
+    :rtype: Mapping
+    """
+
+    results = OrderedDict() if results is None else results
+
+    for key, info in iter_bulk_load(session, session.getRPM, rpms,
+                                    False, size, jobs):
+        if err and not info:
+            raise NoSuchRPM(key)
         else:
             results[key] = info
 
     return results
 
 
+def _bulk_as_info(values, loader, exc, err, keytypes=(str, int)):
+
+    # the common form of the bulk_as_*info functions. Values which
+    # are dicts are passed through, and the unique values of keytypes
+    # are handed to loader, which must return a mapping of those keys
+    # to their info or None
+
+    values = tuple(values)
+    keys = unique(val for val in values if isinstance(val, keytypes))
+    loaded = loader(keys) if keys else {}
+
+    found = []
+    for val in values:
+        if isinstance(val, Mapping):
+            info = val
+        elif isinstance(val, keytypes):
+            info = loaded.get(val)
+        else:
+            info = None
+
+        if err and not info:
+            raise exc(val)
+
+        found.append(info)
+
+    return found
+
+
+def bulk_as_buildinfo(session, builds, err=True, size=None, jobs=None):
+    """
+    Coerces many build values into koji build info dicts, as
+    `as_buildinfo` would, loading all of the IDs and NVRs which need
+    it together via `bulk_load_builds`.
+
+    :param builds: values to lookup
+
+    :type builds: Iterable[int or str or dict]
+
+    :param err: raise an exception if a value cannot be resolved. If
+      False, None is given in its place. Default, True
+
+    :type err: bool, optional
+
+    :param size: count of builds to load in a single
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param jobs: count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchBuild: if err is True and a build value could not be
+      resolved into a build info dict
+
+    :rtype: list[dict]
+    """
+
+    loader = partial(bulk_load_builds, session, err=False,
+                     size=size, jobs=jobs)
+    return _bulk_as_info(builds, loader, NoSuchBuild, err)
+
+
+def bulk_as_taginfo(session, tags, err=True, size=None, jobs=None):
+    """
+    Coerces many tag values into koji tag info dicts, as `as_taginfo`
+    would, loading all of the IDs and names which need it together via
+    `bulk_load_tags`.
+
+    :param tags: values to lookup
+
+    :type tags: Iterable[int or str or dict]
+
+    :param err: raise an exception if a value cannot be resolved. If
+      False, None is given in its place. Default, True
+
+    :type err: bool, optional
+
+    :param size: count of tags to load in a single multicall. Default,
+      adaptive
+
+    :type size: int, optional
+
+    :param jobs: count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchTag: if err is True and a tag value could not be
+      resolved into a tag info dict
+
+    :rtype: list[dict]
+    """
+
+    loader = partial(bulk_load_tags, session, err=False,
+                     size=size, jobs=jobs)
+    return _bulk_as_info(tags, loader, NoSuchTag, err)
+
+
+def bulk_as_taskinfo(session, tasks, err=True, size=None, jobs=None):
+    """
+    Coerces many task values into koji task info dicts, as
+    `as_taskinfo` would, loading all of the IDs which need it together
+    via `bulk_load_tasks`.
+
+    :param tasks: values to lookup
+
+    :type tasks: Iterable[int or dict]
+
+    :param err: raise an exception if a value cannot be resolved. If
+      False, None is given in its place. Default, True
+
+    :type err: bool, optional
+
+    :param size: count of tasks to load in a single multicall. Default,
+      adaptive
+
+    :type size: int, optional
+
+    :param jobs: count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchTask: if err is True and a task value could not be
+      resolved into a task info dict
+
+    :rtype: list[dict]
+    """
+
+    loader = partial(bulk_load_tasks, session, request=True, err=False,
+                     size=size, jobs=jobs)
+    return _bulk_as_info(tasks, loader, NoSuchTask, err, (int, ))
+
+
+def bulk_as_targetinfo(session, targets, err=True, size=None, jobs=None):
+    """
+    Coerces many target values into koji target info dicts, as
+    `as_targetinfo` would, loading all of the IDs and names which need
+    it together via `bulk_load_targets`.
+
+    :param targets: values to lookup
+
+    :type targets: Iterable[int or str or dict]
+
+    :param err: raise an exception if a value cannot be resolved. If
+      False, None is given in its place. Default, True
+
+    :type err: bool, optional
+
+    :param size: count of targets to load in a single
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param jobs: count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchTarget: if err is True and a target value could not
+      be resolved into a target info dict
+
+    :rtype: list[dict]
+    """
+
+    loader = partial(bulk_load_targets, session, err=False,
+                     size=size, jobs=jobs)
+    return _bulk_as_info(targets, loader, NoSuchTarget, err)
+
+
+def bulk_as_hostinfo(session, hosts, err=True, size=None, jobs=None):
+    """
+    Coerces many host values into koji host info dicts, as
+    `as_hostinfo` would, loading all of the IDs and names which need
+    it together via `bulk_load_hosts`.
+
+    :param hosts: values to lookup
+
+    :type hosts: Iterable[int or str or dict]
+
+    :param err: raise an exception if a value cannot be resolved. If
+      False, None is given in its place. Default, True
+
+    :type err: bool, optional
+
+    :param size: count of hosts to load in a single multicall. Default,
+      adaptive
+
+    :type size: int, optional
+
+    :param jobs: count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchHost: if err is True and a host value could not be
+      resolved into a host info dict
+
+    :rtype: list[dict]
+    """
+
+    loader = partial(bulk_load_hosts, session, err=False,
+                     size=size, jobs=jobs)
+    return _bulk_as_info(hosts, loader, NoSuchHost, err)
+
+
+def bulk_as_archiveinfo(session, archives, err=True, size=None,
+                        jobs=None):
+    """
+    Coerces many archive values into koji archive info dicts, as
+    `as_archiveinfo` would, loading all of the IDs and filenames which
+    need it together via `bulk_load_archives`.
+
+    :param archives: values to lookup
+
+    :type archives: Iterable[int or str or dict]
+
+    :param err: raise an exception if a value cannot be resolved. If
+      False, None is given in its place. Default, True
+
+    :type err: bool, optional
+
+    :param size: count of archives to load in a single
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param jobs: count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchArchive: if err is True and an archive value could
+      not be resolved into an archive info dict
+
+    :rtype: list[dict]
+    """
+
+    loader = partial(bulk_load_archives, session, err=False,
+                     size=size, jobs=jobs)
+    return _bulk_as_info(archives, loader, NoSuchArchive, err)
+
+
+def bulk_as_rpminfo(session, rpms, err=True, size=None, jobs=None):
+    """
+    Coerces many RPM values into koji RPM info dicts, as `as_rpminfo`
+    would, loading all of the IDs and NVRAs which need it together via
+    `bulk_load_rpms`.
+
+    :param rpms: values to lookup
+
+    :type rpms: Iterable[int or str or dict]
+
+    :param err: raise an exception if a value cannot be resolved. If
+      False, None is given in its place. Default, True
+
+    :type err: bool, optional
+
+    :param size: count of RPMs to load in a single multicall. Default,
+      adaptive
+
+    :type size: int, optional
+
+    :param jobs: count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchRPM: if err is True and an RPM value could not be
+      resolved into an RPM info dict
+
+    :rtype: list[dict]
+    """
+
+    loader = partial(bulk_load_rpms, session, err=False,
+                     size=size, jobs=jobs)
+    return _bulk_as_info(rpms, loader, NoSuchRPM, err)
+
+
+def bulk_as_userinfo(session, users, err=True, size=None, jobs=None):
+    """
+    Coerces many user values into koji user info dicts, as
+    `as_userinfo` would, loading all of the IDs and names which need
+    it together via `bulk_load_users`.
+
+    :param users: values to lookup
+
+    :type users: Iterable[int or str or dict]
+
+    :param err: raise an exception if a value cannot be resolved. If
+      False, None is given in its place. Default, True
+
+    :type err: bool, optional
+
+    :param size: count of users to load in a single multicall. Default,
+      adaptive
+
+    :type size: int, optional
+
+    :param jobs: count of multicalls to have in flight at
+      once. Default, as set via `set_bulk_jobs`, or 1
+
+    :type jobs: int, optional
+
+    :raises NoSuchUser: if err is True and a user value could not be
+      resolved into a user info dict
+
+    :rtype: list[dict]
+    """
+
+    loader = partial(bulk_load_users, session, err=False,
+                     size=size, jobs=jobs)
+    return _bulk_as_info(users, loader, NoSuchUser, err)
+
+
 def as_buildinfo(session, build):
     """
     Coerces a build value into a koji build info dict.
@@ -695,8 +1470,8 @@ def as_buildinfo(session, build):
     """
 
     if isinstance(build, (str, int)):
-        info = session.getBuild(build)
-    elif isinstance(build, dict):
+        info = _identity_load(session, "build", build, session.getBuild)
+    elif isinstance(build, Mapping):
         info = build
     else:
         info = None
@@ -733,9 +1508,11 @@ def as_taginfo(session, tag):
 
     if isinstance(tag, (str, int)):
         if version_check(session, (1, 23)):
-            info = session.getTag(tag, blocked=True)
+            fn = partial(session.getTag, blocked=True)
         else:
-            info = session.getTag(tag)
+            fn = session.getTag
+
+        info = _identity_load(session, "tag", tag, fn)
 
     elif isinstance(tag, dict):
         info = tag
@@ -800,7 +1577,8 @@ def as_targetinfo(session, target):
     """
 
     if isinstance(target, (str, int)):
-        info = session.getBuildTarget(target)
+        info = _identity_load(session, "target", target,
+                              session.getBuildTarget)
     elif isinstance(target, dict):
         info = target
     else:
@@ -832,7 +1610,7 @@ def as_hostinfo(session, host):
     """
 
     if isinstance(host, (str, int)):
-        info = session.getHost(host)
+        info = _identity_load(session, "host", host, session.getHost)
     elif isinstance(host, dict):
         info = host
     else:
@@ -932,30 +1710,8 @@ def as_userinfo(session, user):
     """
 
     if isinstance(user, (str, int)):
-        session_vars = vars(session)
-        new_get_user = session_vars.get("__new_get_user")
-
-        if new_get_user:
-            # we've tried the new way and it worked, so keep doing it.
-            info = session.getUser(user, False, True)
-
-        elif new_get_user is None:
-            # an API incompatibility emerged at some point in Koji's
-            # past, so we need to try the new way first and fall back
-            # to the older signature if that fails. This happened
-            # before Koji hub started reporting its version, so we
-            # cannot use the version_check function to gate this.
-            try:
-                info = session.getUser(user, False, True)
-                session_vars["__new_get_user"] = True
-
-            except ParameterError:
-                info = session.getUser(user)
-                session_vars["__new_get_user"] = False
-
-        else:
-            # we've already tried the new way once and it didn't work.
-            info = session.getUser(user)
+        info = _identity_load(session, "user", user,
+                              partial(_get_user, session))
 
     elif isinstance(user, dict):
         info = user
@@ -969,6 +1725,37 @@ def as_userinfo(session, user):
     return info
 
 
+def _get_user(session, user):
+    # invokes getUser with whichever signature the hub supports
+
+    session_vars = vars(session)
+    new_get_user = session_vars.get("__new_get_user")
+
+    if new_get_user:
+        # we've tried the new way and it worked, so keep doing it.
+        info = session.getUser(user, False, True)
+
+    elif new_get_user is None:
+        # an API incompatibility emerged at some point in Koji's
+        # past, so we need to try the new way first and fall back
+        # to the older signature if that fails. This happened
+        # before Koji hub started reporting its version, so we
+        # cannot use the version_check function to gate this.
+        try:
+            info = session.getUser(user, False, True)
+            session_vars["__new_get_user"] = True
+
+        except ParameterError:
+            info = session.getUser(user)
+            session_vars["__new_get_user"] = False
+
+    else:
+        # we've already tried the new way once and it didn't work.
+        info = session.getUser(user)
+
+    return info
+
+
 def _int(val):
     if isinstance(val, str) and val.isdigit():
         val = int(val)
@@ -979,7 +1766,8 @@ def hub_version(session):
     """
     Wrapper for ``session.getKojiVersion`` which caches the results on
     the session and splits the value into a tuple of ints for easy
-    comparison.
+    comparison. The result is also stored in the session's metadata
+    cache, if any.
 
     If the getKojiVersion method isn't implemented on the hub, we
     presume that we're version 1.22 ``(1, 22)`` which is the last
@@ -995,18 +1783,28 @@ def hub_version(session):
 
     hub_ver = session_vars.get("__hub_version", None)
     if hub_ver is None:
-        try:
-            hub_ver = session.getKojiVersion()
-        except GenericError:
-            pass
+        def load_version():
+            try:
+                found = session.getKojiVersion()
+            except GenericError:
+                found = None
+            return list(_hub_version_tuple(found))
 
-        if hub_ver is None:
-            hub_ver = (1, 22)
+        hub_ver = tuple(cached_metadata(session, "getKojiVersion",
+                                        load_version))
+        session_vars["__hub_version"] = hub_ver
+
+    return hub_ver
 
-        elif isinstance(hub_ver, str):
-            hub_ver = tuple(map(_int, hub_ver.split(".")))
 
-        session_vars["__hub_version"] = hub_ver
+def _hub_version_tuple(hub_ver):
+    # converts the result of getKojiVersion into a tuple of ints
+
+    if hub_ver is None:
+        hub_ver = (1, 22)
+
+    elif isinstance(hub_ver, str):
+        hub_ver = tuple(map(_int, hub_ver.split(".")))
 
     return hub_ver
 
@@ -0,0 +1,695 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - asyncio bulk loading
+
+Coroutine counterparts to the bulk loading functions, which send
+their multicalls over asyncio connections rather than blocking on
+each response. These allow bulk loads to be interleaved with other
+asyncio work.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+import asyncio
+import ssl
+
+from collections import OrderedDict, deque
+from functools import partial
+from gzip import decompress
+from itertools import chain
+from koji import Fault, GenericError, convertFault
+from koji.xmlrpcplus import getparser
+from requests.exceptions import (
+    HTTPError, Timeout, ConnectionError as RequestsConnectionError, )
+from time import monotonic
+from urllib.parse import urlsplit
+
+from . import (
+    NoSuchBuild, NoSuchTag, NoSuchTask,
+    _hub_version_tuple, call_stats, clone_session, version_check, )
+from .multicall import (
+    _RECOVERABLE, _capture_calls, _fault_info, _iter_multicall_results,
+    _iter_queued_chunks, _queue_calls, )
+from .stats import _record_call
+from .throttle import _is_transient
+
+
+__all__ = (
+    "AsyncSession",
+    "async_bulk_load_builds",
+    "async_bulk_load_tags",
+    "async_bulk_load_tasks",
+    "async_hub_version",
+    "async_iter_bulk_load",
+)
+
+
+def _ssl_context(opts):
+    # an SSL context honoring the koji session options
+
+    ctx = ssl.create_default_context(cafile=opts.get("serverca"))
+
+    if opts.get("no_ssl_verify"):
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+
+    cert = opts.get("cert")
+    if cert:
+        ctx.load_cert_chain(cert)
+
+    return ctx
+
+
+class _Connection():
+    # a single keep-alive HTTP/1.1 connection to a hub
+
+    def __init__(self, url, opts):
+        parts = urlsplit(url)
+
+        self.netloc = parts.netloc
+        self.host = parts.hostname
+        self.secure = (parts.scheme == "https")
+        self.port = parts.port or (443 if self.secure else 80)
+        self.ssl = _ssl_context(opts) if self.secure else None
+        self.timeout = opts.get("timeout")
+
+        self._reader = None
+        self._writer = None
+
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
+
+    async def post(self, handler, headers, body):
+        parts = urlsplit(handler)
+        path = parts.path or "/"
+        if parts.query:
+            path = "%s?%s" % (path, parts.query)
+
+        lines = ["POST %s HTTP/1.1" % path,
+                 "Host: %s" % self.netloc,
+                 "Accept-Encoding: gzip",
+                 "Connection: keep-alive"]
+        lines.extend("%s: %s" % header for header in headers)
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+        try:
+            status, reason, headers, body = await asyncio.wait_for(
+                self._exchange(head + body), self.timeout)
+
+        except asyncio.TimeoutError:
+            self.close()
+            raise Timeout("Timed out waiting for %s" % self.netloc)
+
+        except BaseException:
+            # the exchange didn't finish, as when the call was
+            # cancelled, and the response may still be on its way. The
+            # connection can't be re-used, as the next request would
+            # read it.
+            self.close()
+            raise
+
+        if status >= 500:
+            raise HTTPError("%i %s" % (status, reason))
+        elif status >= 400:
+            raise GenericError("%i %s" % (status, reason))
+
+        if headers.get("content-encoding", "").lower() == "gzip":
+            body = decompress(body)
+
+        return body
+
+
+    async def _exchange(self, request):
+        # a connection which has been idle may have been dropped by
+        # the hub, in which case we reconnect once
+        for attempt in (0, 1):
+            fresh = self._writer is None
+            if fresh:
+                try:
+                    self._reader, self._writer = await asyncio.open_connection(
+                        self.host, self.port, ssl=self.ssl)
+                except OSError as exc:
+                    raise RequestsConnectionError(str(exc))
+
+            try:
+                self._writer.write(request)
+                await self._writer.drain()
+                return await self._read_response()
+
+            except (OSError, asyncio.IncompleteReadError) as exc:
+                self.close()
+                if fresh or attempt:
+                    raise RequestsConnectionError(str(exc))
+
+
+    async def _read_response(self):
+        reader = self._reader
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b"", None)
+
+        version, status, reason = \
+            status_line.decode("latin-1").rstrip().split(" ", 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = (version != "HTTP/1.0")
+        conn = headers.get("connection", "").lower()
+        if conn:
+            keep_alive = (conn == "keep-alive")
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if not size:
+                    while (await reader.readline()) not in (b"\r\n", b""):
+                        pass
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+            body = bytes(body)
+
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        if not keep_alive:
+            self.close()
+
+        return int(status), reason, headers, body
+
+
+def _parse_response(body):
+    # decodes an XML-RPC response body, raising any fault
+
+    parser, unmarshaller = getparser()
+    parser.feed(body)
+    parser.close()
+
+    try:
+        result = unmarshaller.close()
+    except Fault as fault:
+        raise convertFault(fault)
+
+    if len(result) == 1:
+        result = result[0]
+    return result
+
+
+class AsyncSession():
+    """
+    Sends calls on behalf of a koji session over a bounded set of
+    asyncio connections to its hub.
+
+    Each connection is paired with a clone of the session from
+    `kojismokydingo.clone_session`, so that a logged in session's
+    subsessions keep their calls in sequence. Clones are created as
+    they are needed, from a worker thread of the event loop's default
+    executor, as creating a subsession is a blocking call to the hub.
+
+    The wrapped session is still used to build the calls for the bulk
+    loading coroutines, and so should not be used by other threads
+    while they are running.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param connections: maximum number of concurrent calls. Default, 8
+
+    :type connections: int, optional
+    """
+
+    def __init__(self, session, connections=8):
+        self.session = session
+        self.connections = connections
+
+        self._slots = []
+        self._idle = None
+        self._opening = 0
+
+        # clones whose creation completed after the coroutine which
+        # asked for them was cancelled
+        self._orphans = []
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+    async def _acquire(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+
+        while True:
+            if self._idle.empty() and \
+               len(self._slots) + self._opening < self.connections:
+                clone = await self._clone()
+                slot = (clone, _Connection(clone.baseurl, clone.opts))
+                self._slots.append(slot)
+                return slot
+
+            # a None is queued when a clone couldn't be created, so
+            # that anything waiting for it may try again
+            slot = await self._idle.get()
+            if slot is not None:
+                return slot
+
+
+    async def _clone(self):
+        # creates a clone of the session in a worker thread, so that
+        # the event loop isn't blocked while the hub is creating a
+        # subsession
+
+        loop = asyncio.get_running_loop()
+        made = loop.run_in_executor(None, clone_session, self.session)
+
+        self._opening += 1
+        try:
+            return await asyncio.shield(made)
+
+        except BaseException:
+            made.add_done_callback(self._orphaned)
+            self._idle.put_nowait(None)
+            raise
+
+        finally:
+            self._opening -= 1
+
+
+    def _orphaned(self, made):
+        if not (made.cancelled() or made.exception()):
+            self._orphans.append(made.result())
+
+
+    async def _call(self, name, args, kwargs):
+        # returns the result of the call, and the size of the response
+        # body in bytes
+
+        stats = call_stats(self.session)
+        body = b""
+
+        slot = await self._acquire()
+        start = monotonic()
+        clone, conn = slot
+        try:
+            handler, headers, request = clone._prepCall(name, args, kwargs)
+            body = await conn.post(handler, headers, request)
+
+        except BaseException:
+            # the connection is only returned to use with no exchange
+            # left unfinished upon it, so that the next call doesn't
+            # read the response to this one
+            conn.close()
+            raise
+
+        finally:
+            self._idle.put_nowait(slot)
+            if stats is not None:
+                _record_call(stats, name, args, monotonic() - start,
+                             len(body))
+
+        return _parse_response(body), len(body)
+
+
+    async def call(self, name, *args, **kwargs):
+        """
+        Invokes the named hub method with the given arguments.
+
+        :param name: the hub method name
+
+        :type name: str
+
+        :raises koji.GenericError: if the hub returns a fault
+        """
+
+        result, _nbytes = await self._call(name, args, kwargs)
+        return result
+
+
+    async def multicall(self, calls):
+        """
+        Invokes a list of call dicts (as accumulated by a session in
+        multicall mode) as a single multicall.
+
+        Returns a tuple of the multicall results, the round-trip time
+        in seconds, and the size of the response in bytes.
+
+        :param calls: list of call dicts with methodName and params
+          keys
+
+        :type calls: list[dict]
+
+        :rtype: tuple[list, float, int]
+        """
+
+        start = monotonic()
+        results, nbytes = await self._call("multiCall", (calls,), {})
+        return results, monotonic() - start, nbytes
+
+
+    def close(self):
+        """
+        Closes the connections, and logs out any cloned sessions.
+        Subsessions are ended via the parent session.
+        """
+
+        for clone, conn in self._slots:
+            conn.close()
+
+        for clone in chain((c for c, _conn in self._slots), self._orphans):
+            if clone.logged_in:
+                try:
+                    clone.logout()
+                except Exception:
+                    pass
+
+        self._slots = []
+        self._orphans = []
+        self._idle = None
+
+
+async def _async_recover_multicall(session, send, key_chunk, exc):
+    # coroutine counterpart to kojismokydingo._recover_multicall
+
+    retries, backoff = vars(session).get("__bulk_retries", (2, 1.0))
+
+    attempt = 0
+    while _is_transient(exc):
+        if attempt >= retries:
+            raise exc
+
+        await asyncio.sleep(backoff * (2 ** attempt))
+        attempt += 1
+
+        try:
+            return await send(key_chunk)
+        except _RECOVERABLE as retry_exc:
+            exc = retry_exc
+
+    if len(key_chunk) == 1:
+        return [_fault_info(exc)]
+
+    mid = len(key_chunk) // 2
+    results = []
+
+    for half in (key_chunk[:mid], key_chunk[mid:]):
+        try:
+            results.extend(await send(half))
+        except _RECOVERABLE as half_exc:
+            results.extend(await _async_recover_multicall(session, send,
+                                                          half, half_exc))
+
+    return results
+
+
+async def async_iter_bulk_load(asession, loadfn, keys, err=True,
+                               size=None, jobs=None):
+    """
+    Asynchronous counterpart to `kojismokydingo.iter_bulk_load`.
+    Invokes the given loadfn on each key in keys using chunking
+    multicalls, sent via the `AsyncSession`.
+
+    Yields (key, result) pairs in order.
+
+    The chunk size, fault handling, and recovery from failed
+    multicalls are as described for `kojismokydingo.iter_bulk_load`.
+
+    :param asession: the async session
+
+    :type asession: `AsyncSession`
+
+    :param loadfn: The loading function, to be invoked in a multicall
+      arrangement. Will be called once with each given key from keys.
+      Should be a method of ``asession.session``
+
+    :type loadfn: Callable[[object], object]
+
+    :param keys: The sequence of keys to be used to invoke loadfn.
+
+    :type keys: list[object]
+
+    :param err: Whether to raise any underlying fault returns as
+      exceptions. Default, True
+
+    :type err: bool, optional
+
+    :param size: How many calls to loadfn to chunk up for each
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param jobs: How many multicalls may be in flight at once. Default,
+      the number of connections of the async session
+
+    :type jobs: int, optional
+
+    :raises koji.GenericError: if err is True and an issue
+      occurrs while invoking the loadfn
+
+    :rtype: AsyncGenerator[tuple[object, object]]
+    """
+
+    session = asession.session
+    if jobs is None:
+        jobs = asession.connections
+
+    async def send(key_chunk):
+        _queue_calls(session, loadfn, key_chunk)
+        results, _elapsed, _nbytes = \
+            await asession.multicall(_capture_calls(session))
+        return results
+
+    async def dispatch(key_chunk, chunker, calls):
+        try:
+            results, elapsed, nbytes = await asession.multicall(calls)
+        except _RECOVERABLE as exc:
+            if chunker is not None:
+                chunker.failed(len(key_chunk))
+            return await _async_recover_multicall(session, send,
+                                                  key_chunk, exc)
+        if chunker is not None:
+            chunker.record(len(key_chunk), elapsed, nbytes)
+        return results
+
+    pending = deque()
+
+    async def complete():
+        key_chunk, task = pending.popleft()
+        return _iter_multicall_results(key_chunk, await task, err)
+
+    # calls are queued and then captured from the session without
+    # yielding to the event loop in between, so that concurrent bulk
+    # loads on the same session don't collect each other's calls
+    try:
+        for key_chunk, chunker in _iter_queued_chunks(session, loadfn,
+                                                      keys, size):
+            calls = _capture_calls(session)
+            task = asyncio.ensure_future(dispatch(key_chunk, chunker, calls))
+            pending.append((key_chunk, task))
+
+            if len(pending) > jobs:
+                for pair in await complete():
+                    yield pair
+
+        while pending:
+            for pair in await complete():
+                yield pair
+
+    finally:
+        for _key_chunk, task in pending:
+            task.cancel()
+
+
+async def async_hub_version(asession):
+    """
+    Asynchronous counterpart to `kojismokydingo.hub_version`, which
+    shares the same cached value on the wrapped session.
+
+    :param asession: the async session
+
+    :type asession: `AsyncSession`
+
+    :rtype: tuple[int]
+    """
+
+    session_vars = vars(asession.session)
+
+    hub_ver = session_vars.get("__hub_version", None)
+    if hub_ver is None:
+        try:
+            hub_ver = await asession.call("getKojiVersion")
+        except GenericError:
+            pass
+
+        hub_ver = _hub_version_tuple(hub_ver)
+        session_vars["__hub_version"] = hub_ver
+
+    return hub_ver
+
+
+async def async_bulk_load_builds(asession, nvrs, err=True, size=None,
+                                 results=None, jobs=None):
+    """
+    Asynchronous counterpart to `kojismokydingo.bulk_load_builds`.
+
+    :param asession: the async session
+
+    :type asession: `AsyncSession`
+
+    :param nvrs: Sequence of build NVRs or build IDs to load
+
+    :type nvrs: Iterator[str] or Iterator[int]
+
+    :param err: Raise an exception if an NVR fails to load. Default,
+      True.
+
+    :type err: bool, optional
+
+    :param size: Count of NVRs to load in a single multicall. Default,
+      adaptive
+
+    :type size: int, optional
+
+    :param results: mapping to store the results in. Default, produce
+      a new OrderedDict
+
+    :type results: Mapping, optional
+
+    :param jobs: Count of multicalls to have in flight at
+      once. Default, the number of connections of the async session
+
+    :type jobs: int, optional
+
+    :raises kojismokydingo.NoSuchBuild: if err is True and a build
+      could not be loaded
+
+    :rtype: Mapping
+    """
+
+    results = OrderedDict() if results is None else results
+    fn = asession.session.getBuild
+
+    async for key, info in async_iter_bulk_load(asession, fn, nvrs,
+                                                False, size, jobs):
+        if err and not info:
+            raise NoSuchBuild(key)
+        else:
+            results[key] = info
+
+    return results
+
+
+async def async_bulk_load_tasks(asession, task_ids, request=False,
+                                err=True, size=None, results=None,
+                                jobs=None):
+    """
+    Asynchronous counterpart to `kojismokydingo.bulk_load_tasks`.
+
+    :param asession: the async session
+
+    :type asession: `AsyncSession`
+
+    :param task_ids: Sequence of task IDs to load
+
+    :type task_ids: Iterator[int]
+
+    :param request: Whether to include the task request. Default,
+      False
+
+    :type request: bool, optional
+
+    :raises kojismokydingo.NoSuchTask: if err is True and a task
+      could not be loaded
+
+    :rtype: Mapping
+    """
+
+    results = OrderedDict() if results is None else results
+    fn = partial(asession.session.getTaskInfo, request=request)
+
+    async for key, info in async_iter_bulk_load(asession, fn, task_ids,
+                                                False, size, jobs):
+        if err and not info:
+            raise NoSuchTask(key)
+        else:
+            results[key] = info
+
+    return results
+
+
+async def async_bulk_load_tags(asession, tags, err=True, size=None,
+                               results=None, jobs=None):
+    """
+    Asynchronous counterpart to `kojismokydingo.bulk_load_tags`.
+
+    :param asession: the async session
+
+    :type asession: `AsyncSession`
+
+    :param tags: Sequence of tag names or IDs to load
+
+    :type tags: Iterator[str] or Iterator[int]
+
+    :raises kojismokydingo.NoSuchTag: if err is True and a tag could
+      not be loaded
+
+    :rtype: Mapping
+    """
+
+    results = OrderedDict() if results is None else results
+    session = asession.session
+
+    await async_hub_version(asession)
+    if version_check(session, (1, 23)):
+        fn = partial(session.getTag, blocked=True)
+    else:
+        fn = session.getTag
+
+    async for key, info in async_iter_bulk_load(asession, fn, tags,
+                                                False, size, jobs):
+        if err and not info:
+            raise NoSuchTag(key)
+        else:
+            results[key] = info
+
+    return results
+
+
+#
+# The end.
@@ -21,10 +21,14 @@ representing RPMs and build archives
 """
 
 
-from koji import PathInfo
+from functools import partial
+from koji import GenericError, PathInfo
 from os.path import join
 
-from . import as_buildinfo, as_taginfo, bulk_load_rpm_sigs
+from . import (
+    as_buildinfo, as_taginfo, bulk_load_rpm_sigs, cached_metadata,
+    iter_paged, )
+from .paging import DEFAULT_PAGE_SIZE
 
 
 __all__ = (
@@ -44,6 +48,8 @@ __all__ = (
     "gather_latest_win_archives",
 
     "gather_signed_rpms",
+
+    "iter_list_archives",
 )
 
 
@@ -60,6 +66,39 @@ def as_pathinfo(path):
         return PathInfo(path or "")
 
 
+def _archive_type_ids(session, names):
+    # the IDs of the archive types matching each of the given file
+    # extensions or filenames, in the same manner as the hub's
+    # getArchiveType, but from the full table of archive types so
+    # that it may be cached. Like the hub, this tries each suffix of
+    # the name from the longest to the shortest, and the first suffix
+    # matching any extensions decides the type. A suffix matching the
+    # extensions of more than one type is an error.
+
+    types = cached_metadata(session, "getArchiveTypes",
+                            session.getArchiveTypes)
+
+    by_ext = {}
+    for atype in types:
+        for ext in (atype.get("extensions") or "").split():
+            by_ext.setdefault(ext.lower(), []).append(atype["id"])
+
+    found = set()
+    for name in names:
+        parts = name.lower().split(".")
+        for index in range(len(parts)):
+            ext = ".".join(parts[index:])
+            matches = by_ext.get(ext)
+            if matches:
+                if len(matches) > 1:
+                    raise GenericError("multiple matches for file"
+                                       " extension: %s" % ext)
+                found.add(matches[0])
+                break
+
+    return found
+
+
 def filter_archives(session, archives, archive_types=(), arches=()):
     """
     Given a list of archives (or RPMs dressed up like archives),
@@ -86,11 +125,7 @@ def filter_archives(session, archives, archive_types=(), arches=()):
 
     # convert the list of string extensions from atypes into a set of
     # archive type IDs
-    session.multicall = True
-    for t in archive_types:
-        session.getArchiveType(t)
-    atypes = session.multiCall()
-    atypes = set(t[0]["id"] for t in atypes if t and t[0])
+    atypes = _archive_type_ids(session, archive_types)
 
     # RPM is a special type, which isn't considered an archive but
     # rather its own first-class type. However, we want to pretend
@@ -662,5 +697,29 @@ def gather_latest_archives(session, tagname, btype=None,
     return found
 
 
+def iter_list_archives(session, size=DEFAULT_PAGE_SIZE, **filters):
+    """
+    Yields pages of the archive infos matching the given filters, as
+    by ``session.listArchives(**filters)``, but loaded by ascending
+    archive ID a page at a time rather than in a single response.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param size: count of archives in each page. Default,
+      `kojismokydingo.paging.DEFAULT_PAGE_SIZE`
+
+    :type size: int, optional
+
+    :param filters: keyword arguments for ``listArchives``, eg.
+      ``type`` or ``buildrootID``
+
+    :rtype: Generator[list[dict], None, None]
+    """
+
+    return iter_paged(partial(session.listArchives, **filters), "id", size)
+
+
 #
 # The end.
@@ -0,0 +1,441 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Multicall batches
+
+Hub calls queued by separate pieces of code, to be sent together in
+the same multicalls.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from koji import BR_STATES, Fault, convertFault
+
+from .multicall import (
+    _completed_build_ids, _iter_parallel_multicall, _iter_serial_multicall, )
+
+
+__all__ = (
+    "MulticallBatch",
+    "gather_batched",
+)
+
+
+# the count of queued calls at which a MulticallBatch sends them
+DEFAULT_BATCH_THRESHOLD = 5000
+
+
+class _BatchFuture(Future):
+    # a future for a call queued in a MulticallBatch, which sends the
+    # batch if the result is wanted before it has been sent
+
+    def __init__(self, batch):
+        super().__init__()
+        self._batch = batch
+
+
+    def result(self, timeout=None):
+        if not self.done():
+            self._batch.flush()
+        return super().result(timeout)
+
+
+    def exception(self, timeout=None):
+        if not self.done():
+            self._batch.flush()
+        return super().exception(timeout)
+
+
+class _BatchCall():
+    # a hub call queued in a MulticallBatch
+
+    __slots__ = ("method", "args", "kwargs", "immutable", "future", )
+
+
+    def __init__(self, method, args, kwargs, immutable, future):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.immutable = immutable
+        self.future = future
+
+
+    def invoke(self, session):
+        return getattr(session, self.method)(*self.args, **self.kwargs)
+
+
+    def cache_args(self):
+        # the call arguments in the form used as a bulk cache key,
+        # matching those of the bulk loading functions
+        if not self.kwargs:
+            return list(self.args)
+        elif not self.args:
+            return self.kwargs
+        else:
+            return [*self.args, self.kwargs]
+
+
+class MulticallBatch():
+    """
+    Collects hub calls of any method, and sends them together in
+    chunked multicalls. Each queued call provides a
+    `concurrent.futures.Future` for its result, so that independent
+    lookups may be queued by separate pieces of code and then share
+    the same round-trips to the hub.
+
+    The queued calls are sent when `flush` is invoked, when the result
+    of any of their futures is asked for, when the count of queued
+    calls reaches the threshold, or when the batch is used as a
+    context manager and the context exits. A fault from an individual
+    call is raised from its future, and does not affect the others.
+
+    Calls are sent as by `kojismokydingo.iter_bulk_load`, and so
+    observe the session's chunking, streaming, retry, and parallel
+    settings. A MulticallBatch is not safe to share between threads.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param size: calls to send in each multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param threshold: count of queued calls which causes them to be
+      sent. Default, 5000
+
+    :type threshold: int, optional
+
+    :param jobs: how many multicalls may be in flight at once.
+      Default, as set via `kojismokydingo.set_bulk_jobs` for this
+      session, or 1
+
+    :type jobs: int, optional
+    """
+
+    def __init__(self, session, size=None, threshold=DEFAULT_BATCH_THRESHOLD,
+                 jobs=None):
+
+        self.session = session
+        self.size = size
+        self.threshold = threshold
+        self.jobs = jobs
+        self._pending = []
+
+
+    def __len__(self):
+        return len(self._pending)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, _exc_val, _exc_tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.cancel()
+        return False
+
+
+    def call(self, method, *args, **kwargs):
+        """
+        Queues a call to the named hub method
+
+        :param method: name of the hub method
+
+        :type method: str
+
+        :rtype: `concurrent.futures.Future`
+        """
+
+        return self.submit(method, args, kwargs)
+
+
+    def submit(self, method, args=(), kwargs=None, immutable=None):
+        """
+        Queues a call to the named hub method.
+
+        If the session has a bulk cache associated via
+        `kojismokydingo.set_bulk_cache`, then `immutable` determines
+        whether the result may be kept in the cache. A call which may
+        be cached is answered from the cache when possible rather than
+        sent.
+
+        :param method: name of the hub method
+
+        :type method: str
+
+        :param args: positional arguments for the call
+
+        :type args: tuple, optional
+
+        :param kwargs: keyword arguments for the call
+
+        :type kwargs: dict, optional
+
+        :param immutable: whether the result of the call may be cached,
+          or a predicate deciding so from the result. Default, the
+          result is not cached
+
+        :type immutable: bool or Callable[[object], bool], optional
+
+        :rtype: `concurrent.futures.Future`
+        """
+
+        future = _BatchFuture(self)
+        self._pending.append(_BatchCall(method, tuple(args), kwargs or {},
+                                        immutable, future))
+
+        if self.threshold and len(self._pending) >= self.threshold:
+            self.flush()
+
+        return future
+
+
+    def load_build_archives(self, build_ids, btype=None):
+        """
+        Queues a ``listArchives`` call for each build ID, caching the
+        results as `kojismokydingo.bulk_load_build_archives` does
+
+        :param build_ids: IDs of the builds
+
+        :type build_ids: list[int]
+
+        :param btype: only archives of this btype. Default, all
+
+        :type btype: str, optional
+
+        :rtype: dict[int, `concurrent.futures.Future`]
+        """
+
+        build_ids = tuple(build_ids)
+        complete = _completed_build_ids(self.session, build_ids)
+
+        return OrderedDict(
+            (bid, self.submit("listArchives",
+                              kwargs={"buildID": bid, "type": btype},
+                              immutable=(bid in complete)))
+            for bid in build_ids)
+
+
+    def load_build_rpms(self, build_ids):
+        """
+        Queues a ``listRPMs`` call for each build ID, caching the
+        results as `kojismokydingo.bulk_load_build_rpms` does
+
+        :param build_ids: IDs of the builds
+
+        :type build_ids: list[int]
+
+        :rtype: dict[int, `concurrent.futures.Future`]
+        """
+
+        build_ids = tuple(build_ids)
+        complete = _completed_build_ids(self.session, build_ids)
+
+        return OrderedDict(
+            (bid, self.submit("listRPMs", (bid, ),
+                              immutable=(bid in complete)))
+            for bid in build_ids)
+
+
+    def load_buildroots(self, broot_ids):
+        """
+        Queues a ``getBuildroot`` call for each buildroot ID, caching
+        the results as `kojismokydingo.bulk_load_buildroots` does
+
+        :param broot_ids: IDs of the buildroots
+
+        :type broot_ids: list[int]
+
+        :rtype: dict[int, `concurrent.futures.Future`]
+        """
+
+        expired = BR_STATES["EXPIRED"]
+        immutable = lambda info: info["state"] == expired
+
+        return OrderedDict(
+            (brid, self.submit("getBuildroot", (brid, ),
+                               immutable=immutable))
+            for brid in broot_ids)
+
+
+    def cancel(self):
+        """
+        Cancels the futures of all queued calls, and forgets them
+        """
+
+        pending = self._pending
+        self._pending = []
+
+        for call in pending:
+            call.future.cancel()
+
+
+    def flush(self):
+        """
+        Sends all of the queued calls, and sets the results of their
+        futures. Futures which were cancelled are skipped.
+
+        If sending fails entirely, the exception is set on the futures
+        which have no result yet, and is raised.
+        """
+
+        pending = [call for call in self._pending
+                   if not call.future.cancelled()]
+        self._pending = []
+
+        if not pending:
+            return
+
+        try:
+            self._send(pending)
+
+        except BaseException as exc:
+            for call in pending:
+                if not call.future.done():
+                    call.future.set_exception(exc)
+            raise
+
+
+    def _cached(self, cache, pending):
+        # sets the futures of the calls which can be answered from the
+        # cache, and returns those which must still be sent
+
+        hub = self.session.baseurl
+        by_method = {}
+        for call in pending:
+            if call.immutable:
+                by_method.setdefault(call.method, []).append(call)
+
+        answered = set()
+        for method, calls in by_method.items():
+            found = cache.get_many(hub, method,
+                                   [call.cache_args() for call in calls])
+            for index, result in found.items():
+                calls[index].future.set_result(result)
+                answered.add(id(calls[index]))
+
+        return [call for call in pending if id(call) not in answered]
+
+
+    def _send(self, pending):
+        session = self.session
+        cache = vars(session).get("__bulk_cache")
+
+        if cache is not None:
+            pending = self._cached(cache, pending)
+
+        jobs = self.jobs
+        if jobs is None:
+            jobs = vars(session).get("__bulk_jobs", 1)
+
+        invoke = lambda call: call.invoke(session)
+
+        if jobs > 1:
+            work = _iter_parallel_multicall(session, invoke, pending,
+                                            self.size, jobs)
+        else:
+            work = _iter_serial_multicall(session, invoke, pending,
+                                          self.size)
+
+        store = {}
+
+        try:
+            for call_chunk, results in work:
+                for call, result in zip(call_chunk, results):
+                    if result and "faultCode" in result:
+                        exc = convertFault(Fault(**result))
+                        call.future.set_exception(exc)
+                        continue
+
+                    value = result[0] if result else None
+                    call.future.set_result(value)
+
+                    if cache is None or value is None:
+                        continue
+
+                    immutable = call.immutable
+                    if callable(immutable):
+                        immutable = immutable(value)
+                    if immutable:
+                        store.setdefault(call.method, []).append(
+                            (call.cache_args(), value))
+        finally:
+            work.close()
+
+        for method, found in store.items():
+            cache.put_many(session.baseurl, method, found)
+
+
+def gather_batched(batch, gatherers):
+    """
+    Runs a number of gatherers which share a `MulticallBatch`, such
+    that their calls are sent together.
+
+    A gatherer is a generator which queues calls on the batch, and
+    then yields when it needs their results. Once every gatherer has
+    either yielded or finished, the batch is flushed and those which
+    yielded are resumed. This repeats until all of them have
+    finished, so that each round of calls shares the same multicalls
+    however many gatherers are involved.
+
+    Returns a list of the value returned by each gatherer.
+
+    :param batch: the batch which the gatherers queue calls on
+
+    :type batch: `MulticallBatch`
+
+    :param gatherers: generators queueing calls on the batch
+
+    :type gatherers: Iterable[Generator]
+
+    :rtype: list
+    """
+
+    active = list(enumerate(gatherers))
+    results = [None] * len(active)
+
+    try:
+        while active:
+            waiting = []
+            for index, gatherer in active:
+                try:
+                    next(gatherer)
+                except StopIteration as stop:
+                    results[index] = stop.value
+                else:
+                    waiting.append((index, gatherer))
+
+            batch.flush()
+            active = waiting
+
+    except BaseException:
+        batch.cancel()
+        for _index, gatherer in active:
+            gatherer.close()
+        raise
+
+    return results
+
+
+#
+# The end.
@@ -25,18 +25,18 @@ Functions for working with Koji builds
 from itertools import chain, repeat
 from koji import BUILD_STATES
 from collections import OrderedDict
+from functools import partial
 from operator import itemgetter
 
 from . import (
-    NoSuchBuild,
+    MulticallBatch, NoSuchBuild,
     as_buildinfo, as_taginfo,
-    bulk_load, bulk_load_build_archives, bulk_load_build_rpms,
-    bulk_load_builds, bulk_load_buildroots,
-    bulk_load_buildroot_archives, bulk_load_buildroot_rpms,
-    bulk_load_rpm_sigs, bulk_load_tasks, iter_bulk_load, )
+    bulk_load, bulk_load_builds, bulk_load_tasks,
+    cached_metadata, gather_batched, iter_bulk_load, iter_paged, )
 from .common import (
     chunkseq, merge_extend, rpm_evr_compare,
     unique, update_extend, )
+from .paging import DEFAULT_PAGE_SIZE
 
 
 __all__ = (
@@ -49,6 +49,9 @@ __all__ = (
     "BuildFilter",
     "BuildNEVRCompare",
 
+    "batch_decorate_builds_btypes",
+    "batch_decorate_builds_cg_list",
+    "batch_gather_rpm_sigkeys",
     "build_dedup",
     "build_id_sort",
     "build_nvr_sort",
@@ -73,6 +76,8 @@ __all__ = (
     "iter_bulk_tag_builds",
     "iter_bulk_untag_builds",
     "iter_latest_maven_builds",
+    "iter_list_builds",
+    "iter_list_tagged",
     "latest_maven_builds",
 )
 
@@ -728,6 +733,154 @@ def latest_maven_builds(session, tag, pkg_names=None, inherit=True):
     return dict(builds)
 
 
+def iter_list_builds(session, size=DEFAULT_PAGE_SIZE, **filters):
+    """
+    Yields pages of the build infos matching the given filters, as
+    by ``session.listBuilds(**filters)``, but loaded by ascending
+    build ID a page at a time rather than in a single response.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param size: count of builds in each page. Default,
+      `kojismokydingo.paging.DEFAULT_PAGE_SIZE`
+
+    :type size: int, optional
+
+    :param filters: keyword arguments for ``listBuilds``, eg.
+      ``packageID`` or ``state``
+
+    :rtype: Generator[list[dict], None, None]
+    """
+
+    return iter_paged(partial(session.listBuilds, **filters),
+                      "build_id", size)
+
+
+def iter_list_tagged(session, tag, inherit=False, latest=False,
+                     type=None, event=None, size=DEFAULT_PAGE_SIZE):
+    """
+    Yields pages of the build infos tagged into tag, as by
+    ``session.listTagged``, but loaded as they arrive rather than in a
+    single response.
+
+    The hub offers no paging of ``listTagged``, so the builds are
+    instead loaded one package at a time from the tag's package list,
+    via streamed multicalls. Every page is loaded as of the same
+    event, so the pages are consistent with each other even if the
+    tag changes meanwhile.
+
+    This costs the hub more than a single ``listTagged`` call, as it
+    works out the tag's inheritance again for each package, and the
+    builds arrive grouped by package rather than in the order of a
+    single call. It is intended for tags whose ``listTagged``
+    response is too large to hold at once.
+
+    A build may remain tagged after its package has been removed
+    from the tag's package list. The count of tagged builds is
+    checked once the packages have been loaded, and if any builds
+    were missed, the packages which were ever in the package lists
+    of the tag (and of its parents, if inheriting) are found in the
+    hub's history, and the builds of those no longer listed are
+    loaded one package at a time in the same way. The whole tag is
+    never loaded in a single call.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param tag: the tag to list the builds of
+
+    :type tag: int or str or dict
+
+    :param inherit: follow the tag's inheritance. Default, False
+
+    :type inherit: bool, optional
+
+    :param latest: only the latest build of each package. Default,
+      False
+
+    :type latest: bool, optional
+
+    :param type: only builds of this btype. Default, any btype
+
+    :type type: str, optional
+
+    :param event: list the builds as of this event ID. Default, the
+      most recent event
+
+    :type event: int, optional
+
+    :param size: the least count of builds in each page, except the
+      last. Default, `kojismokydingo.paging.DEFAULT_PAGE_SIZE`
+
+    :type size: int, optional
+
+    :raises kojismokydingo.NoSuchTag: if the tag does not exist
+
+    :rtype: Generator[list[dict], None, None]
+    """
+
+    taginfo = as_taginfo(session, tag)
+    tid = taginfo["id"]
+
+    if event is None:
+        event = session.getLastEvent()["id"]
+
+    pkgs = session.listPackages(tagID=tid, inherited=inherit, event=event)
+    pkg_names = unique(p["package_name"] for p in pkgs)
+
+    listTagged = partial(session.listTagged, tid, event=event,
+                         inherit=inherit, latest=latest, type=type)
+
+    fn = lambda p: listTagged(package=p)
+
+    page = []
+    found = 0
+
+    for _pkg, builds in iter_bulk_load(session, fn, pkg_names):
+        found += len(builds)
+        page.extend(builds)
+        if len(page) >= size:
+            yield page
+            page = []
+
+    total = session.count("listTagged", tid, event=event, inherit=inherit,
+                          latest=latest, type=type)
+
+    if total > found:
+        # some builds are of packages no longer in the package list,
+        # which the history of the package lists still names
+        tag_ids = [tid]
+        if inherit:
+            inh = session.getFullInheritance(tid, event=event)
+            tag_ids.extend(link["parent_id"] for link in inh)
+
+        fn = lambda t: session.queryHistory(tables=["tag_packages"],
+                                            tag=t)
+
+        listed = set(pkg_names)
+        removed = []
+        for _tid, hist in iter_bulk_load(session, fn, unique(tag_ids)):
+            for row in hist["tag_packages"]:
+                name = row["package.name"]
+                if name not in listed:
+                    listed.add(name)
+                    removed.append(name)
+
+        fn = lambda p: listTagged(package=p)
+
+        for _pkg, builds in iter_bulk_load(session, fn, removed):
+            page.extend(builds)
+            if len(page) >= size:
+                yield page
+                page = []
+
+    if page:
+        yield page
+
+
 def decorate_builds_maven(session, build_infos):
     """
     For any build info which does not have a maven_group_id and hasn't
@@ -779,15 +932,51 @@ def decorate_builds_btypes(session, build_infos, with_fields=True):
 
     build_infos = tuple(build_infos)
 
+    batch = MulticallBatch(session)
+    gather_batched(batch, [batch_decorate_builds_btypes(batch, build_infos,
+                                                        with_fields)])
+
+    return build_infos
+
+
+def batch_decorate_builds_btypes(batch, build_infos, with_fields=True):
+    """
+    Generator which decorates build infos as `decorate_builds_btypes`
+    does, queueing its calls on the given batch. For use with
+    `kojismokydingo.gather_batched`, so that the calls may be sent
+    together with those of other gatherers.
+
+    :param batch: the batch to queue calls on
+
+    :type batch: `kojismokydingo.MulticallBatch`
+
+    :param build_infos: build infos to decorate
+
+    :type build_infos: list[dict]
+
+    :param with_fields: also decorate btype-specific fields. Default,
+      True
+
+    :type with_fields: bool, optional
+
+    :rtype: Generator
+    """
+
+    session = batch.session
+
     wanted = {bld["id"]: bld for bld in build_infos if
               "archive_btype_names" not in bld}
 
     if not wanted:
-        return build_infos
+        return
 
-    btypes = {bt["name"]: bt["id"] for bt in session.listBTypes()}
+    btypes = cached_metadata(session, "listBTypes", session.listBTypes)
+    btypes = {bt["name"]: bt["id"] for bt in btypes}
 
-    for bid, bts in iter_bulk_load(session, session.getBuildType, wanted):
+    futures = {bid: batch.call("getBuildType", bid) for bid in wanted}
+    yield
+
+    for bid, bts in _future_results(futures).items():
         bld = wanted[bid]
 
         bld["archive_btype_names"] = btype_names = list(bts)
@@ -811,8 +1000,6 @@ def decorate_builds_btypes(session, build_infos, with_fields=True):
                 for key, val in data.items():
                     bld["_".join((btn, key))] = val
 
-    return build_infos
-
 
 def decorate_builds_cg_list(session, build_infos):
     """
@@ -852,16 +1039,45 @@ def decorate_builds_cg_list(session, build_infos):
 
     build_infos = tuple(build_infos)
 
+    batch = MulticallBatch(session)
+    gather_batched(batch, [batch_decorate_builds_cg_list(batch,
+                                                         build_infos)])
+
+    return build_infos
+
+
+def batch_decorate_builds_cg_list(batch, build_infos):
+    """
+    Generator which decorates build infos as `decorate_builds_cg_list`
+    does, queueing its calls on the given batch. For use with
+    `kojismokydingo.gather_batched`, so that the calls may be sent
+    together with those of other gatherers.
+
+    :param batch: the batch to queue calls on
+
+    :type batch: `kojismokydingo.MulticallBatch`
+
+    :param build_infos: build infos to decorate
+
+    :type build_infos: list[dict]
+
+    :rtype: Generator
+    """
+
     wanted = {bld["id"]: bld for bld in build_infos if
               "archive_cg_names" not in bld}
 
     if not wanted:
-        return build_infos
+        return
+
+    # the artifacts and rpms for all build IDs that need decorating
+    # share multicalls
+    archives = batch.load_build_archives(wanted)
+    rpms = batch.load_build_rpms(wanted)
+    yield
 
-    # multicall to fetch the artifacts and rpms for all build IDs that
-    # need decorating
-    archives = bulk_load_build_archives(session, wanted)
-    rpms = bulk_load_build_rpms(session, wanted)
+    archives = _future_results(archives)
+    rpms = _future_results(rpms)
 
     # gather all the buildroot IDs, based on both the archives and
     # RPMs of the build.
@@ -881,7 +1097,10 @@ def decorate_builds_cg_list(session, build_infos):
                 root_ids.add(broot_id)
 
     # multicall to fetch all the buildroots
-    buildroots = bulk_load_buildroots(session, root_ids)
+    buildroots = batch.load_buildroots(root_ids)
+    yield
+
+    buildroots = _future_results(buildroots)
 
     for build_id, archive_list in archives.items():
         bld = wanted[build_id]
@@ -941,8 +1160,6 @@ def decorate_builds_cg_list(session, build_infos):
         bld["archive_cg_ids"] = unique(cg_ids)
         bld["archive_cg_names"] = unique(cg_names)
 
-    return build_infos
-
 
 def filter_builds_by_tags(session, build_infos,
                           limit_tag_ids=(), lookaside_tag_ids=()):
@@ -1112,6 +1329,33 @@ def filter_imported_builds(build_infos, by_cg=(), negate=False):
                     yield build
 
 
+def _future_results(futures):
+    # converts a mapping of futures into an OrderedDict of their
+    # results
+
+    return OrderedDict((key, fut.result()) for key, fut in futures.items())
+
+
+def _batch_results(batch, futures):
+    # sends the batch, and converts a mapping of futures into an
+    # OrderedDict of their results
+
+    batch.flush()
+    return _future_results(futures)
+
+
+def _batch_build_artifacts(batch, build_ids):
+    # the archives and RPMs of each build ID, loaded together via the
+    # batch, as a dict of build ID to a combined list
+
+    build_ids = tuple(build_ids)
+    archives = batch.load_build_archives(build_ids)
+    rpms = batch.load_build_rpms(build_ids)
+
+    return merge_extend(_batch_results(batch, archives),
+                        _batch_results(batch, rpms))
+
+
 def gather_buildroots(session, build_ids):
     """
     For each build ID given, produce the list of buildroots used to
@@ -1124,9 +1368,10 @@ def gather_buildroots(session, build_ids):
     :rtype: dict[int, list[dict]]
     """
 
-    # multicall to fetch the artifacts for all build IDs
-    archives = merge_extend(bulk_load_build_archives(session, build_ids),
-                            bulk_load_build_rpms(session, build_ids))
+    batch = MulticallBatch(session)
+
+    # the archives and RPMs of all build IDs share multicalls
+    archives = _batch_build_artifacts(batch, build_ids)
 
     # gather all the buildroot IDs
     root_ids = set()
@@ -1138,7 +1383,7 @@ def gather_buildroots(session, build_ids):
                 root_ids.add(broot_id)
 
     # multicall to fetch all the buildroots
-    buildroots = bulk_load_buildroots(session, root_ids)
+    buildroots = _batch_results(batch, batch.load_buildroots(root_ids))
 
     results = {}
 
@@ -1159,12 +1404,44 @@ def gather_rpm_sigkeys(session, build_ids):
     discovered sigkeys.
     """
 
+    batch = MulticallBatch(session)
+    return gather_batched(batch, [batch_gather_rpm_sigkeys(batch,
+                                                           build_ids)])[0]
+
+
+def batch_gather_rpm_sigkeys(batch, build_ids):
+    """
+    Generator which collects the sigkeys of the rpms in each build as
+    `gather_rpm_sigkeys` does, queueing its calls on the given
+    batch. For use with `kojismokydingo.gather_batched`, so that the
+    calls may be sent together with those of other gatherers.
+
+    Returns a dict mapping the build IDs to a set of the discovered
+    sigkeys.
+
+    :param batch: the batch to queue calls on
+
+    :type batch: `kojismokydingo.MulticallBatch`
+
+    :param build_ids: IDs of the builds
+
+    :type build_ids: list[int]
+
+    :rtype: Generator
+    """
+
     # first load a mapping of build_id: [RPMS]
-    loaded = bulk_load_build_rpms(session, build_ids)
+    loaded = batch.load_build_rpms(build_ids)
+    yield
+
+    loaded = _future_results(loaded)
 
     # now load a mapping of rpm_id: [SIGS]
-    rpmids = (rpm["id"] for rpm in chain(*loaded.values()))
-    rpm_sigs = bulk_load_rpm_sigs(session, rpmids)
+    rpmids = unique(rpm["id"] for rpm in chain(*loaded.values()))
+    rpm_sigs = {rid: batch.call("queryRPMSigs", rid) for rid in rpmids}
+    yield
+
+    rpm_sigs = _future_results(rpm_sigs)
 
     results = {}
 
@@ -1226,9 +1503,10 @@ def gather_component_build_ids(session, build_ids, btypes=None):
     :rtype: dict[int, list[int]]
     """
 
-    # multicall to fetch the artifacts and RPMs for all build IDs
-    archives = merge_extend(bulk_load_build_archives(session, build_ids),
-                            bulk_load_build_rpms(session, build_ids))
+    batch = MulticallBatch(session)
+
+    # the archives and RPMs of all build IDs share multicalls
+    archives = _batch_build_artifacts(batch, build_ids)
 
     # gather all the buildroot IDs
     root_ids = set()
@@ -1245,15 +1523,22 @@ def gather_component_build_ids(session, build_ids, btypes=None):
         btypes = ("rpm", None)
 
     # dig up the component archives (pretending that RPMs are just
-    # another archive type as usual) and map them to the buildroot ID.
-    components = {}
-
+    # another archive type as usual) and map them to the buildroot
+    # ID. The lookups for every btype share multicalls.
+    queued = []
     for bt in btypes:
         if bt == "rpm":
-            more = bulk_load_buildroot_rpms(session, root_ids)
+            futs = {brid: batch.call("listRPMs", componentBuildrootID=brid)
+                    for brid in root_ids}
         else:
-            more = bulk_load_buildroot_archives(session, root_ids, btype=bt)
-        update_extend(components, more)
+            futs = {brid: batch.call("listArchives",
+                                     componentBuildrootID=brid, type=bt)
+                    for brid in root_ids}
+        queued.append(futs)
+
+    components = {}
+    for futs in queued:
+        update_extend(components, _batch_results(batch, futs))
 
     # now associate the components back with the original build IDs
     results = {}
@@ -0,0 +1,648 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Persistent caches of hub data
+
+A SQLite backed cache, which the bulk loading functions will consult
+when it has been associated with a session via `set_bulk_cache`.
+Only data which seldom changes once written to the hub is stored,
+such as completed builds, and these entries expire after a
+time-to-live.
+
+Alongside it, a cache of the hub metadata which rarely changes, such
+as the hub version and the tables of build and archive types. These
+entries expire after a time-to-live, and are consulted via
+`cached_metadata` once associated with a session via
+`set_metadata_cache`.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+from json import dumps, loads
+from os import makedirs
+from os.path import dirname, join
+from time import time
+
+from .common import chunkseq, find_config_dirs
+
+
+__all__ = (
+    "BulkCache",
+    "MetadataCache",
+
+    "cached_metadata",
+    "close_bulk_cache",
+    "close_metadata_cache",
+    "default_cache_file",
+    "set_bulk_cache",
+    "set_metadata_cache",
+)
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+DEFAULT_BULK_TTL = 60 * 60
+
+DEFAULT_METADATA_TTL = 60 * 60
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+  hub TEXT NOT NULL,
+  method TEXT NOT NULL,
+  args TEXT NOT NULL,
+  value TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  atime REAL NOT NULL,
+  mtime REAL NOT NULL,
+  PRIMARY KEY (hub, method, args));
+
+CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime);
+"""
+
+
+_METADATA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+  hub TEXT NOT NULL,
+  principal TEXT NOT NULL,
+  name TEXT NOT NULL,
+  value TEXT NOT NULL,
+  mtime REAL NOT NULL,
+  PRIMARY KEY (hub, principal, name));
+"""
+
+
+def default_cache_file():
+    """
+    The default location of the cache database, within the user
+    configuration directory from `find_config_dirs`
+
+    :rtype: str
+    """
+
+    _site_dir, user_dir = find_config_dirs()
+    return join(user_dir, "cache.sqlite")
+
+
+def _encode_args(args):
+    # a stable text form of the call args, or None if they cannot be
+    # represented
+    try:
+        return dumps(args, sort_keys=True, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return None
+
+
+class BulkCache():
+    """
+    Persistent cache of hub call results, keyed by the hub URL, the
+    method name, and the call arguments. Values are stored as JSON.
+
+    When the total size of the stored values grows past `max_bytes`,
+    the least recently used entries are evicted.
+
+    The bulk loading functions only store results which seldom
+    change, such as the info of a completed build. They can still
+    change, and this cache cannot observe that. A completed build may
+    be deleted, have its owner or ``extra`` edited via ``editBuild``,
+    or be moved to another volume via ``changeBuildVolume``. Instead
+    every entry expires `ttl` seconds after it was stored, whether or
+    not it has been read since, and is loaded again from the hub on
+    the next request for it. Until then, the stored result may be
+    stale.
+
+    :param filename: path to the SQLite database. Default, the result
+      of `default_cache_file`
+
+    :type filename: str, optional
+
+    :param max_bytes: size limit for the stored values. Default, 256MiB
+
+    :type max_bytes: int, optional
+
+    :param ttl: seconds for which a stored value is fresh. Default,
+      one hour
+
+    :type ttl: float, optional
+    """
+
+    def __init__(self, filename=None, max_bytes=DEFAULT_MAX_BYTES,
+                 ttl=DEFAULT_BULK_TTL):
+        if filename is None:
+            filename = default_cache_file()
+
+        if filename != ":memory:":
+            makedirs(dirname(filename) or ".", exist_ok=True)
+
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # sqlite3 is only imported once a cache is opened, as this
+        # module is loaded along with the rest of the data API
+        import sqlite3
+
+        self._conn = sqlite3.connect(filename)
+        self._conn.executescript(_SCHEMA)
+
+
+    def get_many(self, hub, method, argss):
+        """
+        Find the cached results for calls to method on the hub with
+        each of the given argument lists.
+
+        Returns a dict mapping the index of each argument list in
+        `argss` to its cached result. Calls without a fresh cached
+        result are omitted.
+
+        :param hub: the hub URL
+
+        :type hub: str
+
+        :param method: the hub method name
+
+        :type method: str
+
+        :param argss: argument lists
+
+        :type argss: list[list]
+
+        :rtype: dict[int, object]
+        """
+
+        wanted = {}
+        for index, args in enumerate(argss):
+            enc = _encode_args(args)
+            if enc is not None:
+                wanted.setdefault(enc, []).append(index)
+
+        found = {}
+        hit = []
+        stale = time() - self.ttl
+
+        for enc_chunk in chunkseq(list(wanted), 500):
+            marks = ",".join("?" * len(enc_chunk))
+            query = ("SELECT args, value FROM entries"
+                     " WHERE hub = ? AND method = ? AND mtime > ?"
+                     " AND args IN (%s)" % marks)
+
+            params = [hub, method, stale, *enc_chunk]
+            for enc, value in self._conn.execute(query, params):
+                value = loads(value)
+                hit.append(enc)
+                for index in wanted[enc]:
+                    found[index] = value
+
+        if hit:
+            now = time()
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE entries SET atime = ?"
+                    " WHERE hub = ? AND method = ? AND args = ?",
+                    ((now, hub, method, enc) for enc in hit))
+
+        return found
+
+
+    def put_many(self, hub, method, items):
+        """
+        Store results for calls to method on the hub.
+
+        :param hub: the hub URL
+
+        :type hub: str
+
+        :param method: the hub method name
+
+        :type method: str
+
+        :param items: pairs of argument lists and their results
+
+        :type items: list[tuple[list, object]]
+        """
+
+        now = time()
+        rows = []
+
+        for args, value in items:
+            enc = _encode_args(args)
+            if enc is None:
+                continue
+            value = dumps(value, separators=(",", ":"))
+            rows.append((hub, method, enc, value, len(value), now, now))
+
+        if not rows:
+            return
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries"
+                " (hub, method, args, value, size, atime, mtime)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+        if self.total_bytes() > self.max_bytes:
+            # leave some room so we aren't evicting on every put
+            self.prune(int(self.max_bytes * 0.9))
+
+
+    def total_bytes(self):
+        """
+        The total size of the stored values
+
+        :rtype: int
+        """
+
+        cur = self._conn.execute("SELECT COALESCE(SUM(size), 0)"
+                                 " FROM entries")
+        return cur.fetchone()[0]
+
+
+    def stats(self):
+        """
+        The count and total size of the entries for each hub and method
+
+        :rtype: list[tuple[str, str, int, int]]
+        """
+
+        cur = self._conn.execute("SELECT hub, method, COUNT(*), SUM(size)"
+                                 " FROM entries GROUP BY hub, method"
+                                 " ORDER BY hub, method")
+        return cur.fetchall()
+
+
+    def prune(self, max_bytes=None):
+        """
+        Evict the expired entries, then the least recently used
+        entries until the total size of the stored values is no more
+        than max_bytes.
+
+        :param max_bytes: size to prune down to. Default, the cache's
+          `max_bytes`
+
+        :type max_bytes: int, optional
+
+        :returns: count of entries evicted
+
+        :rtype: int
+        """
+
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+
+        with self._conn:
+            cur = self._conn.execute("DELETE FROM entries WHERE mtime <= ?",
+                                     (time() - self.ttl,))
+            expired = cur.rowcount
+
+        excess = self.total_bytes() - max_bytes
+        if excess <= 0:
+            return expired
+
+        doomed = []
+        cur = self._conn.execute("SELECT rowid, size FROM entries"
+                                 " ORDER BY atime")
+        for rowid, size in cur:
+            doomed.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        cur.close()
+
+        # the freed pages will be re-used by later entries, so we
+        # don't bother to VACUUM here
+        with self._conn:
+            self._conn.executemany("DELETE FROM entries WHERE rowid = ?",
+                                   doomed)
+
+        return expired + len(doomed)
+
+
+    def clear(self, hub=None):
+        """
+        Remove all entries, or only those for the given hub
+
+        :param hub: the hub URL. Default, all hubs
+
+        :type hub: str, optional
+        """
+
+        with self._conn:
+            if hub is None:
+                self._conn.execute("DELETE FROM entries")
+            else:
+                self._conn.execute("DELETE FROM entries WHERE hub = ?",
+                                   (hub,))
+        self._conn.execute("VACUUM")
+
+
+    def close(self):
+        """
+        Close the underlying database connection
+        """
+
+        self._conn.close()
+
+
+class MetadataCache():
+    """
+    Persistent cache of hub metadata, keyed by the hub URL, the
+    principal the metadata was loaded as, and a name for the
+    metadata. Values are stored as JSON, and expire once they are
+    older than `ttl` seconds.
+
+    :param filename: path to the SQLite database. Default, the result
+      of `default_cache_file`
+
+    :type filename: str, optional
+
+    :param ttl: seconds for which a stored value is fresh. Default,
+      one hour
+
+    :type ttl: float, optional
+    """
+
+    def __init__(self, filename=None, ttl=DEFAULT_METADATA_TTL):
+        if filename is None:
+            filename = default_cache_file()
+
+        if filename != ":memory:":
+            makedirs(dirname(filename) or ".", exist_ok=True)
+
+        self.filename = filename
+        self.ttl = ttl
+
+        import sqlite3
+
+        self._conn = sqlite3.connect(filename)
+        self._conn.executescript(_METADATA_SCHEMA)
+
+
+    def get(self, hub, principal, name, max_age=None):
+        """
+        The stored value, or None if there is no fresh value
+
+        :param hub: the hub URL
+
+        :type hub: str
+
+        :param principal: the principal the value was loaded as, or
+          an empty string if it is the same for everyone
+
+        :type principal: str
+
+        :param name: the name of the metadata
+
+        :type name: str
+
+        :param max_age: seconds for which a stored value is considered
+          fresh, if less than the cache's `ttl`. Default, the `ttl`
+
+        :type max_age: float, optional
+
+        :rtype: object
+        """
+
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+
+        cur = self._conn.execute("SELECT value FROM metadata"
+                                 " WHERE hub = ? AND principal = ?"
+                                 " AND name = ? AND mtime > ?",
+                                 (hub, principal, name, time() - ttl))
+        found = cur.fetchone()
+        return loads(found[0]) if found else None
+
+
+    def put(self, hub, principal, name, value):
+        """
+        Store a value, which will be fresh for the next `ttl` seconds
+
+        :param hub: the hub URL
+
+        :type hub: str
+
+        :param principal: the principal the value was loaded as, or
+          an empty string if it is the same for everyone
+
+        :type principal: str
+
+        :param name: the name of the metadata
+
+        :type name: str
+
+        :param value: JSON-serializable value to store
+
+        :type value: object
+        """
+
+        value = dumps(value, separators=(",", ":"))
+
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO metadata"
+                               " (hub, principal, name, value, mtime)"
+                               " VALUES (?, ?, ?, ?, ?)",
+                               (hub, principal, name, value, time()))
+
+
+    def stats(self):
+        """
+        The names and ages in seconds of the stored values for each
+        hub and principal
+
+        :rtype: list[tuple[str, str, str, float]]
+        """
+
+        now = time()
+        cur = self._conn.execute("SELECT hub, principal, name, mtime"
+                                 " FROM metadata"
+                                 " ORDER BY hub, principal, name")
+        return [(hub, principal, name, now - mtime)
+                for hub, principal, name, mtime in cur]
+
+
+    def clear(self, hub=None):
+        """
+        Remove all values, or only those for the given hub
+
+        :param hub: the hub URL. Default, all hubs
+
+        :type hub: str, optional
+        """
+
+        with self._conn:
+            if hub is None:
+                self._conn.execute("DELETE FROM metadata")
+            else:
+                self._conn.execute("DELETE FROM metadata WHERE hub = ?",
+                                   (hub,))
+
+
+    def close(self):
+        """
+        Close the underlying database connection
+        """
+
+        self._conn.close()
+
+
+def set_bulk_cache(session, cache):
+    """
+    Associates a persistent cache of hub data with the given session,
+    to be consulted and populated by the bulk loading functions. Any
+    previously associated cache is closed.
+
+    Only data which seldom changes is stored, such as completed
+    builds along with their archives and RPMs, and expired
+    buildroots. A completed build may still be deleted, edited, or
+    moved to another volume on the hub. Until its entry expires after
+    the cache's ``ttl``, the cache continues to provide the info as
+    it was when stored.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param cache: the cache, or None to stop using a cache
+
+    :type cache: `kojismokydingo.cache.BulkCache`, optional
+    """
+
+    close_bulk_cache(session)
+    if cache is not None:
+        vars(session)["__bulk_cache"] = cache
+
+
+def close_bulk_cache(session):
+    """
+    Closes the persistent cache associated with the given session, if
+    any.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+    """
+
+    cache = vars(session).pop("__bulk_cache", None)
+    if cache is not None:
+        cache.close()
+
+
+def set_metadata_cache(session, cache, principal=None, refresh=False):
+    """
+    Associates a persistent cache of rarely changing hub metadata with
+    the given session, to be consulted and populated by
+    `cached_metadata`. Any previously associated metadata cache is
+    closed.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param cache: the cache, or None to stop using a cache
+
+    :type cache: `kojismokydingo.cache.MetadataCache`, optional
+
+    :param principal: identifies who the session is authenticated as,
+      for metadata which differs between users such as permissions.
+      Default, no principal
+
+    :type principal: str, optional
+
+    :param refresh: ignore the stored values, while still storing
+      newly loaded values. Default, False
+
+    :type refresh: bool, optional
+    """
+
+    close_metadata_cache(session)
+    if cache is not None:
+        vars(session)["__metadata_cache"] = (cache, principal or "", refresh)
+
+
+def close_metadata_cache(session):
+    """
+    Closes the persistent metadata cache associated with the given
+    session, if any.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+    """
+
+    found = vars(session).pop("__metadata_cache", None)
+    if found is not None:
+        found[0].close()
+
+
+def cached_metadata(session, name, loadfn, personal=False, refresh=False,
+                    max_age=None):
+    """
+    Invokes loadfn to load some hub metadata, unless a fresh value is
+    stored under the given name in the metadata cache associated with
+    the session via `set_metadata_cache`. A newly loaded value is
+    stored in that cache. Without a cache, simply returns the result
+    of loadfn.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param name: the name to store the metadata under
+
+    :type name: str
+
+    :param loadfn: loads the metadata from the hub. Its result must be
+      JSON-serializable, and is only stored when it is not None
+
+    :type loadfn: Callable[[], object]
+
+    :param personal: whether the metadata differs between users, in
+      which case it is stored under the session's principal. Default,
+      False
+
+    :type personal: bool, optional
+
+    :param refresh: ignore any stored value. Default, False
+
+    :type refresh: bool, optional
+
+    :param max_age: ignore a stored value older than this many
+      seconds. Default, use any value the cache considers fresh
+
+    :type max_age: float, optional
+    """
+
+    found = vars(session).get("__metadata_cache")
+    if found is None:
+        return loadfn()
+
+    cache, principal, refresh_all = found
+    hub = session.baseurl
+    principal = principal if personal else ""
+
+    if not (refresh or refresh_all):
+        value = cache.get(hub, principal, name, max_age)
+        if value is not None:
+            return value
+
+    value = loadfn()
+    if value is not None:
+        cache.put(hub, principal, name, value)
+    return value
+
+
+#
+# The end.
@@ -0,0 +1,244 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Recorded hub sessions
+
+A `Cassette` records the calls a session makes to its hub along with
+the responses, and can later replay those responses to a session
+without connecting to the hub at all. Associate a cassette with a
+session via `kojismokydingo.set_cassette`.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+import gzip
+
+from collections import deque
+from json import dump, dumps, load, loads
+from koji import Fault, GenericError, convertFault, encode_args
+from threading import Lock
+
+from . import BadDingo
+
+
+__all__ = (
+    "Cassette",
+    "CassetteMiss",
+)
+
+
+CASSETTE_VERSION = 1
+
+
+class CassetteMiss(BadDingo):
+    """
+    Raised when replaying a call which was not recorded
+    """
+
+    complaint = "No recorded response for call"
+
+
+def _call_key(name, params):
+    # a stable text form of a call, as the hub would see it
+
+    return dumps([name, params], sort_keys=True, separators=(",", ":"),
+                 default=str)
+
+
+def _fault_item(exc):
+    # the multicall result form of a fault raised by a call
+
+    return {"faultCode": exc.faultCode, "faultString": str(exc)}
+
+
+class Cassette():
+    """
+    A recording of the calls made to a koji hub, and their results.
+
+    Each call and each multicall is recorded as it was sent, so the
+    recording keeps the chunking of the original session. When
+    replaying, each call within a multicall is answered on its own, so
+    a replaying session may chunk its calls differently. A call which
+    was made more than once is answered with its results in the order
+    they were recorded, with the last result repeating after that.
+
+    :param replay: whether the cassette answers calls from its
+      recording, rather than recording them. Default, False
+
+    :type replay: bool, optional
+
+    :param entries: the recorded calls and multicalls, as produced by
+      a prior recording
+
+    :type entries: list, optional
+    """
+
+    def __init__(self, replay=False, entries=None):
+        self.replay = replay
+        self.entries = []
+
+        self._answers = {}
+        self._lock = Lock()
+
+        for entry in (entries or ()):
+            self._add(entry)
+
+
+    @classmethod
+    def load(cls, filename, replay=True):
+        """
+        Load a cassette saved via `save`
+
+        :param filename: path to the gzip compressed cassette
+
+        :type filename: str
+
+        :param replay: whether the cassette will replay its recording.
+          Default, True
+
+        :type replay: bool, optional
+
+        :rtype: `Cassette`
+        """
+
+        with gzip.open(filename, "rt") as fin:
+            data = load(fin)
+
+        return cls(replay, data["entries"])
+
+
+    def save(self, filename):
+        """
+        Write the recording to a gzip compressed JSON file
+
+        :param filename: path to write the cassette to
+
+        :type filename: str
+        """
+
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "entries": self.entries}
+
+            with gzip.open(filename, "wt") as fout:
+                dump(data, fout, separators=(",", ":"), default=str)
+
+
+    def _add(self, entry):
+        self.entries.append(entry)
+
+        if entry[0] == "multicall":
+            _kind, calls, items = entry
+            pairs = ((call["methodName"], call["params"]) for call in calls)
+        else:
+            _kind, name, params, item = entry
+            pairs, items = ((name, params),), (item,)
+
+        for (name, params), item in zip(pairs, items):
+            key = _call_key(name, params)
+            answers = self._answers.get(key)
+            if answers is None:
+                answers = self._answers[key] = deque()
+            answers.append(item)
+
+
+    def _answer(self, name, params):
+        # the next recorded result for a call, in multicall result form
+
+        key = _call_key(name, params)
+
+        with self._lock:
+            answers = self._answers.get(key)
+            if not answers:
+                params = dumps(params, default=str)
+                raise CassetteMiss("%s %s" % (name, params))
+
+            if len(answers) > 1:
+                return answers.popleft()
+            else:
+                return answers[0]
+
+
+    def invoke(self, send, name, args, kwargs):
+        """
+        Invokes a hub method via the cassette. When recording, the
+        call is sent via the send function, and its result or fault
+        recorded. When replaying, the recorded result is returned or
+        fault raised instead.
+
+        :param send: function which sends the call to the hub
+
+        :type send: Callable[[], object]
+
+        :param name: the hub method name
+
+        :type name: str
+
+        :param args: positional arguments to the method
+
+        :type args: tuple
+
+        :param kwargs: keyword arguments to the method
+
+        :type kwargs: dict
+
+        :raises CassetteMiss: if replaying a call which was not
+          recorded
+        """
+
+        if name == "multiCall":
+            return self._invoke_multicall(send, args[0])
+
+        params = list(encode_args(*args, **(kwargs or {})))
+
+        if self.replay:
+            item = self._answer(name, params)
+            if isinstance(item, dict):
+                raise convertFault(Fault(**item))
+            return item[0]
+
+        try:
+            result = send()
+        except GenericError as exc:
+            if getattr(exc, "faultCode", None) is not None:
+                self._record(["call", name, params, _fault_item(exc)])
+            raise
+
+        self._record(["call", name, params, [result]])
+        return result
+
+
+    def _invoke_multicall(self, send, calls):
+        if self.replay:
+            return [self._answer(call["methodName"], call["params"])
+                    for call in calls]
+
+        results = send()
+        self._record(["multicall", calls, results])
+        return results
+
+
+    def _record(self, entry):
+        # the results may be modified by their callers, so we record a
+        # copy of them as they will be saved
+        entry = loads(dumps(entry, default=str))
+
+        with self._lock:
+            self._add(entry)
+
+
+#
+# The end.
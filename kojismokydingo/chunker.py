@@ -0,0 +1,194 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Adaptive chunking
+
+Sizes for the multicalls made by the bulk loading functions, adapted
+to the measured cost of the calls to each hub method.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+__all__ = (
+    "AdaptiveChunker",
+    "session_chunker",
+    "set_bulk_chunking",
+)
+
+
+class AdaptiveChunker():
+    """
+    Decides how many calls to place into each multicall for a single
+    hub method. After each multicall, the round-trip time and response
+    size are recorded via the `record` method, and the size of the
+    following chunks is grown or shrunk so that a multicall is
+    expected to use about half of the time and byte budgets.
+
+    Growth is limited to doubling per multicall, but a multicall which
+    exceeds either budget shrinks the size immediately.
+
+    Rather than create instances of this class directly, use the
+    `session_chunker` function to obtain the chunker which remembers
+    the learned sizes for a method across a session.
+
+    :param size: initial chunk size. Default, 100
+
+    :type size: int, optional
+
+    :param min_size: smallest chunk size. Default, 1
+
+    :type min_size: int, optional
+
+    :param max_size: largest chunk size. Default, 5000
+
+    :type max_size: int, optional
+
+    :param max_bytes: byte budget for a single multicall
+      response. Default, 8MiB
+
+    :type max_bytes: int, optional
+
+    :param max_time: time budget in seconds for a single multicall
+      round-trip. Default, 10.0
+
+    :type max_time: float, optional
+    """
+
+    def __init__(self, size=100, min_size=1, max_size=5000,
+                 max_bytes=(8 * 1024 * 1024), max_time=10.0):
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.max_time = max_time
+
+        self.size = max(min_size, min(max_size, size))
+
+        # smoothed per-call costs
+        self.call_time = None
+        self.call_bytes = None
+
+
+    def record(self, count, elapsed, nbytes=0):
+        """
+        Adjust the chunk size based on the measured cost of a multicall
+
+        :param count: number of calls in the multicall
+
+        :type count: int
+
+        :param elapsed: round-trip time in seconds
+
+        :type elapsed: float
+
+        :param nbytes: size of the response in bytes, or 0 if unknown
+
+        :type nbytes: int, optional
+        """
+
+        if count < 1:
+            return
+
+        call_time = elapsed / count
+        call_bytes = nbytes / count
+
+        over = elapsed > self.max_time or nbytes > self.max_bytes
+
+        if over or self.call_time is None:
+            # an over-budget multicall discards the averages, so we
+            # react to it in full
+            self.call_time = call_time
+            self.call_bytes = call_bytes
+        else:
+            self.call_time = (self.call_time + call_time) / 2
+            self.call_bytes = (self.call_bytes + call_bytes) / 2
+
+        target = self.max_size
+        if self.call_time > 0:
+            target = min(target, self.max_time / 2 / self.call_time)
+        if self.call_bytes > 0:
+            target = min(target, self.max_bytes / 2 / self.call_bytes)
+
+        if not over:
+            target = min(target, self.size * 2)
+
+        self.size = max(self.min_size, min(self.max_size, int(target)))
+
+
+    def failed(self, count):
+        """
+        Shrink the chunk size after a multicall of count calls failed as
+        a whole, and had to be split up.
+
+        :param count: number of calls in the failed multicall
+
+        :type count: int
+        """
+
+        self.size = max(self.min_size, min(self.size, count // 2))
+
+
+def set_bulk_chunking(session, **settings):
+    """
+    Sets the options used to create the `AdaptiveChunker` instances for
+    the given session, eg. ``max_bytes`` and ``max_time``. Any sizes
+    already learned for the session are forgotten.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param settings: keyword arguments for `AdaptiveChunker`
+    """
+
+    svars = vars(session)
+    svars["__bulk_chunking"] = settings
+    svars.pop("__chunkers", None)
+
+
+def session_chunker(session, method):
+    """
+    Obtain the `AdaptiveChunker` for calls to the named hub method on
+    the given session. The chunker is cached on the session, so sizes
+    learned from earlier bulk loads are re-used by later ones.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param method: name of the hub method
+
+    :type method: str
+
+    :rtype: `AdaptiveChunker`
+    """
+
+    svars = vars(session)
+    chunkers = svars.get("__chunkers")
+    if chunkers is None:
+        chunkers = svars["__chunkers"] = {}
+
+    chunker = chunkers.get(method)
+    if chunker is None:
+        settings = svars.get("__bulk_chunking") or {}
+        chunker = chunkers[method] = AdaptiveChunker(**settings)
+
+    return chunker
+
+
+#
+# The end.
@@ -35,10 +35,18 @@ from itertools import zip_longest
 from json import dump
 from koji import GenericError
 from koji_cli.lib import activate_session, ensure_connection
-from os import devnull
+from os import devnull, environ
 from os.path import basename
-
-from .. import BadDingo, NotPermitted
+from time import monotonic
+
+from .. import (
+    BadDingo, CallStats, IdentityMap, NotPermitted, Throttle,
+    cached_metadata, close_bulk_cache, close_metadata_cache,
+    close_session_pool, set_bulk_cache, set_bulk_chunking, set_bulk_jobs,
+    set_bulk_streaming, set_call_stats, set_cassette, set_identity_map,
+    set_metadata_cache, set_throttle, )
+from ..transport import (
+    HubTransport, TransferStats, session_transport, set_transport, )
 from ..common import load_plugin_config
 
 
@@ -54,8 +62,10 @@ __all__ = (
     "find_action",
     "remove_action",
     "int_or_str",
+    "iter_clean_lines",
     "open_output",
     "pretty_json",
+    "print_call_stats",
     "printerr",
     "read_clean_lines",
     "resplit",
@@ -64,6 +74,11 @@ __all__ = (
 )
 
 
+# a command is refused only once the permissions it was checked
+# against are no older than this many seconds
+PERMISSION_RECHECK_AGE = 5 * 60
+
+
 # these mimic the default format for jq output
 JSON_PRETTY_OPTIONS = {
     "indent": 2,
@@ -195,6 +210,17 @@ def open_output(filename="-", append=None):
         stream.close()
 
 
+def _iter_clean(lines, skip_comments):
+    # the lazy form of clean_lines
+
+    if skip_comments:
+        lines = (l.split('#', 1)[0].strip() for l in lines)
+    else:
+        lines = map(str.strip, lines)
+
+    return filter(None, lines)
+
+
 def clean_lines(lines, skip_comments=True):
     """
     Filters clean lines from a sequence.
@@ -217,12 +243,7 @@ def clean_lines(lines, skip_comments=True):
     :rtype: List[str]
     """
 
-    if skip_comments:
-        lines = (l.split('#', 1)[0].strip() for l in lines)
-    else:
-        lines = map(str.strip, lines)
-
-    return list(filter(None, lines))
+    return list(_iter_clean(lines, skip_comments))
 
 
 def read_clean_lines(filename="-", skip_comments=True):
@@ -263,6 +284,41 @@ def read_clean_lines(filename="-", skip_comments=True):
             return clean_lines(fin)
 
 
+def iter_clean_lines(filename="-", skip_comments=True):
+    """
+    Generator of clean lines from a named file, as by
+    `read_clean_lines`. If filename is ``-`` then read from
+    `sys.stdin` instead.
+
+    Unlike `read_clean_lines`, the lines are read only as they are
+    needed, so that a very large file or an ongoing stream need not
+    be collected all at once. The file (if not stdin) is closed once
+    the generator is exhausted or closed.
+
+    :param filename: File name to read lines from, or ``-`` to indicate
+      stdin. Default, read from `sys.stdin`
+
+    :type filename: str, optional
+
+    :param skip_comments: Skip over lines with leading # characters.
+      Default, True
+
+    :type skip_comments: bool, optional
+
+    :rtype: Generator[str]
+    """
+
+    if not filename:
+        return
+
+    elif filename == "-":
+        yield from _iter_clean(sys.stdin, skip_comments)
+
+    else:
+        with open(filename, "rt") as fin:
+            yield from _iter_clean(fin, skip_comments)
+
+
 printerr = partial(print, file=sys.stderr)
 
 
@@ -353,6 +409,88 @@ def tabulate(headings, data, key=None, sorting=0,
         print(fmt.format(*row), file=out)
 
 
+def print_call_stats(stats, out=None, transfer=None):
+    """
+    Prints tables summarizing the hub calls and phase timers recorded
+    in a `kojismokydingo.CallStats`, and optionally the bytes recorded
+    in a `kojismokydingo.transport.TransferStats`
+
+    :param stats: the recorded calls and phases
+
+    :type stats: `kojismokydingo.CallStats`
+
+    :param out: Stream to write output to. Default, `sys.stdout`
+
+    :type out: io.TextIOBase, optional
+
+    :param transfer: the recorded bytes sent and received
+
+    :type transfer: `kojismokydingo.transport.TransferStats`, optional
+
+    :rtype: None
+    """
+
+    if out is None:
+        out = sys.stdout
+
+    data = stats.as_dict()
+
+    rows = [(method, c["calls"], c["multicalls"], c["bytes"],
+             "%0.3f" % c["seconds"])
+            for method, c in data["methods"].items()]
+    tabulate(("Method", "Calls", "Multicalls", "Bytes", "Seconds"),
+             rows, quiet=False, out=out)
+
+    print(file=out)
+
+    rows = [(name, c["count"], "%0.3f" % c["seconds"])
+            for name, c in data["phases"].items()]
+    tabulate(("Phase", "Count", "Seconds"), rows, quiet=False, out=out)
+
+    if transfer is None:
+        return
+
+    print(file=out)
+
+    data = transfer.as_dict()
+    rows = []
+    for direction in ("sent", "received"):
+        raw = data[direction]
+        wire = data[direction + "_wire"]
+        ratio = "%0.2f" % (raw / wire) if wire else "-"
+        rows.append((direction, raw, wire, ratio))
+    tabulate(("Transfer", "Bytes", "Wire Bytes", "Ratio"), rows,
+             quiet=False, out=out)
+
+
+class _TimedWriter():
+    # proxies an output stream, accumulating the time spent writing
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.elapsed = 0.0
+
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+    def write(self, data):
+        start = monotonic()
+        try:
+            return self.stream.write(data)
+        finally:
+            self.elapsed += monotonic() - start
+
+
+    def flush(self):
+        start = monotonic()
+        try:
+            return self.stream.flush()
+        finally:
+            self.elapsed += monotonic() - start
+
+
 def space_normalize(txt):
     """
     Normalizes the whitespace in txt to single spaces.
@@ -416,6 +554,9 @@ class SmokyDingo(metaclass=ABCMeta):
 
       * the `SmokyDingo.activate` method authenticates with the hub
 
+      * the `SmokyDingo.configure_session` method applies any session
+        options, such as the number of concurrent multicall jobs
+
       * the `SmokyDingo.pre_handle` method verifies that any required
         permissions are present for the user
 
@@ -470,6 +611,9 @@ class SmokyDingo(metaclass=ABCMeta):
         # actually called
         self.goptions = None
         self.session = None
+        self.stats = None
+        self.transfer = None
+        self.cassette = None
 
 
     def get_plugin_config(self, key, default=None):
@@ -490,7 +634,9 @@ class SmokyDingo(metaclass=ABCMeta):
 
         invoke = " ".join((basename(sys.argv[0]), self.name))
         argp = ArgumentParser(prog=invoke, description=self.description)
-        return self.arguments(argp) or argp
+        argp = self.arguments(argp) or argp
+        argp = self.session_arguments(argp) or argp
+        return self.diagnostic_arguments(argp) or argp
 
 
     def arguments(self, parser):
@@ -502,6 +648,62 @@ class SmokyDingo(metaclass=ABCMeta):
         pass
 
 
+    def session_arguments(self, parser):
+        """
+        Adds the arguments controlling how the session communicates
+        with the hub, which are common to all commands.
+        """
+
+        grp = parser.add_argument_group("Session options")
+        addarg = grp.add_argument
+
+        addarg("--jobs", action="store", type=int, default=None,
+               metavar="JOBS",
+               help="Number of multicalls to keep in flight at once"
+               " when loading data in bulk. Default, 1")
+
+        addarg("--refresh", action="store_true", default=False,
+               help="Load hub metadata such as the hub version and"
+               " permissions afresh, rather than from the metadata cache")
+
+        return parser
+
+
+    def diagnostic_arguments(self, parser):
+        """
+        Adds the arguments for measuring where a command spends its
+        time, which are common to all commands.
+        """
+
+        grp = parser.add_argument_group("Diagnostic options")
+        addarg = grp.add_argument
+
+        addarg("--stats", action="store_true", default=False,
+               help="Print a summary of the hub calls made and the time"
+               " spent in each phase of the command to stderr")
+
+        addarg("--profile-out", action="store", default=None,
+               metavar="FILENAME",
+               help="Write a cProfile dump of the command to FILENAME,"
+               " and its hub call and phase metrics as JSON to"
+               " FILENAME.json")
+
+        tape = grp.add_mutually_exclusive_group()
+        addarg = tape.add_argument
+
+        addarg("--record", action="store", default=None,
+               metavar="FILENAME",
+               help="Record the hub calls made by the command and their"
+               " results to FILENAME")
+
+        addarg("--replay", action="store", default=None,
+               metavar="FILENAME",
+               help="Answer the hub calls made by the command from the"
+               " recording in FILENAME, without contacting the hub")
+
+        return parser
+
+
     def validate(self, parser, options):
         """
         Override to perform validation on options values. Return value is
@@ -519,10 +721,25 @@ class SmokyDingo(metaclass=ABCMeta):
 
         if self.permission and self.session:
             session = self.session
-            userinfo = session.getLoggedInUser()
-            userperms = session.getUserPerms(userinfo["id"]) or ()
 
-            if not (self.permission in userperms or "admin" in userperms):
+            loaded = []
+
+            def load_perms():
+                userinfo = session.getLoggedInUser()
+                loaded.append(True)
+                return session.getUserPerms(userinfo["id"]) or []
+
+            def permitted(max_age=None):
+                userperms = cached_metadata(session, "getUserPerms",
+                                            load_perms, personal=True,
+                                            max_age=max_age)
+                return self.permission in userperms or "admin" in userperms
+
+            # permissions from the metadata cache may predate a recent
+            # grant, so unless they were only just loaded, check again
+            # with those which are older than a few minutes reloaded
+            if not (permitted() or
+                    (not loaded and permitted(PERMISSION_RECHECK_AGE))):
                 msg = "Insufficient permissions for command %s" % self.name
                 raise NotPermitted(msg)
 
@@ -546,9 +763,191 @@ class SmokyDingo(metaclass=ABCMeta):
         """
 
         if self.session:
+            if self.use_cassette():
+                return None
+
             return activate_session(self.session, self.goptions)
 
 
+    def use_cassette(self):
+        """
+        Associates the cassette for the ``--record`` or ``--replay``
+        options with our session. Returns True if the hub calls are
+        being replayed, in which case the session must not contact
+        the hub.
+
+        :rtype: bool
+        """
+
+        cassette = self.cassette
+        if cassette is None:
+            return False
+
+        set_cassette(self.session, cassette)
+        return cassette.replay
+
+
+    def configure_session(self, options):
+        """
+        Apply the session options to our session. This is triggered
+        after activate, before pre_handle and handle
+        """
+
+        jobs = options.jobs
+        if jobs is None:
+            jobs = int(self.get_plugin_config("jobs", 1))
+
+        chunking = {}
+
+        max_bytes = self.get_plugin_config("multicall_bytes")
+        if max_bytes:
+            chunking["max_bytes"] = int(max_bytes)
+
+        max_time = self.get_plugin_config("multicall_time")
+        if max_time:
+            chunking["max_time"] = float(max_time)
+
+        stream = self.get_plugin_config("multicall_stream")
+
+        cache = self.get_plugin_config("cache", "")
+        cache = cache.lower() in ("1", "yes", "true", "on")
+
+        metadata = self.get_plugin_config("metadata_cache", "")
+        metadata = metadata.lower() in ("1", "yes", "true", "on")
+
+        transport = self.get_plugin_config("transport", "")
+        transport = transport.lower() in ("1", "yes", "true", "on")
+
+        # a recording must include the calls otherwise answered from
+        # the caches, and a replay must neither be answered from them
+        # nor store its results in them
+        cache = cache and self.cassette is None
+        metadata = metadata and self.cassette is None
+
+        if cache or metadata:
+            from ..cache import (
+                DEFAULT_BULK_TTL, DEFAULT_MAX_BYTES, DEFAULT_METADATA_TTL,
+                BulkCache, MetadataCache, )
+
+        if self.session:
+            set_bulk_jobs(self.session, jobs)
+            set_bulk_chunking(self.session, **chunking)
+
+            if stream:
+                set_bulk_streaming(self.session, stream.lower() in
+                                   ("1", "yes", "true", "on"))
+
+            if options.stats or options.profile_out:
+                set_call_stats(self.session, self.stats)
+
+            throttle = self.throttle()
+            if throttle is not None:
+                set_throttle(self.session, throttle)
+
+            if transport:
+                self.transfer = TransferStats()
+                set_transport(self.session, self.transport(jobs),
+                              self.transfer)
+
+            if cache:
+                cache_file = self.get_plugin_config("cache_file")
+                cache_size = self.get_plugin_config("cache_size")
+                cache_size = int(cache_size or DEFAULT_MAX_BYTES)
+                ttl = self.get_plugin_config("cache_ttl")
+                ttl = float(ttl or DEFAULT_BULK_TTL)
+                set_bulk_cache(self.session,
+                               BulkCache(cache_file, cache_size, ttl))
+
+            if metadata:
+                cache_file = self.get_plugin_config("cache_file")
+                ttl = self.get_plugin_config("metadata_ttl")
+                ttl = float(ttl or DEFAULT_METADATA_TTL)
+                set_metadata_cache(self.session,
+                                   MetadataCache(cache_file, ttl),
+                                   principal=self.principal(),
+                                   refresh=options.refresh)
+
+
+    def transport(self, jobs):
+        """
+        A `kojismokydingo.transport.HubTransport` for the session, as
+        configured by the ``transport_pool``, ``compress_requests``,
+        and ``compress_min`` plugin settings. The pool defaults to
+        enough connections for the concurrent multicalls.
+
+        :param jobs: the number of concurrent multicalls
+
+        :type jobs: int
+
+        :rtype: `kojismokydingo.transport.HubTransport`
+        """
+
+        pool_size = self.get_plugin_config("transport_pool")
+        pool_size = int(pool_size or max(10, jobs + 1))
+
+        compress = self.get_plugin_config("compress_requests", "")
+        compress = compress.lower() in ("1", "yes", "true", "on")
+
+        settings = {}
+        compress_min = self.get_plugin_config("compress_min")
+        if compress_min:
+            settings["compress_min"] = int(compress_min)
+
+        return HubTransport(pool_size, compress, **settings)
+
+
+    def throttle(self):
+        """
+        A `kojismokydingo.Throttle` for the session's calls to the hub,
+        as configured by the ``throttle_rate`` (calls per second),
+        ``throttle_burst``, ``throttle_concurrency``, and
+        ``throttle_latency`` plugin settings. None if neither a rate
+        nor a concurrency limit is configured.
+
+        :rtype: `kojismokydingo.Throttle`
+        """
+
+        rate = self.get_plugin_config("throttle_rate")
+        concurrency = self.get_plugin_config("throttle_concurrency")
+        if not (rate or concurrency):
+            return None
+
+        settings = {}
+        if rate:
+            settings["rate"] = float(rate)
+        if concurrency:
+            settings["concurrency"] = int(concurrency)
+
+        burst = self.get_plugin_config("throttle_burst")
+        if burst:
+            settings["burst"] = int(burst)
+
+        latency = self.get_plugin_config("throttle_latency")
+        if latency:
+            settings["latency_factor"] = float(latency)
+
+        return Throttle(**settings)
+
+
+    def principal(self):
+        """
+        Identifies who the session authenticates as, for keying the
+        permissions stored in the metadata cache. This is the
+        configured principal, user, or client certificate, or failing
+        those the Kerberos credentials cache in use.
+
+        :rtype: str
+        """
+
+        opts = dict(getattr(self.session, "opts", None) or ())
+        for key in ("principal", "user", "cert"):
+            found = getattr(self.goptions, key, None) or opts.get(key)
+            if found:
+                return "%s:%s" % (key, found)
+
+        return "ccache:%s" % environ.get("KRB5CCNAME", "")
+
+
     def deactivate(self):
         """
         Deactivate our session. This is triggered after handle has
@@ -559,11 +958,96 @@ class SmokyDingo(metaclass=ABCMeta):
         """
 
         if self.session:
+            close_session_pool(self.session)
+            close_bulk_cache(self.session)
+            close_metadata_cache(self.session)
+            set_identity_map(self.session, None)
+            set_call_stats(self.session, None)
+            set_cassette(self.session, None)
             try:
                 self.session.logout()
             except BaseException:
                 pass
 
+            transport = session_transport(self.session)
+            if transport is not None:
+                set_transport(self.session, None)
+                transport.close()
+
+
+    @contextmanager
+    def diagnostics(self, options):
+        """
+        Context manager which profiles the command, reports its
+        stats, and records or replays its hub calls, as requested via
+        the diagnostic options.
+        """
+
+        # the diagnostic tools are only imported when they're used, to
+        # keep the startup of every command quick
+        if options.replay or options.record:
+            from ..cassette import Cassette
+
+        if options.replay:
+            self.cassette = Cassette.load(options.replay)
+        elif options.record:
+            self.cassette = Cassette()
+
+        profiler = None
+        if options.profile_out:
+            from cProfile import Profile
+            profiler = Profile()
+            profiler.enable()
+
+        try:
+            yield self.stats
+
+        finally:
+            if options.record:
+                self.cassette.save(options.record)
+            self.cassette = None
+
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(options.profile_out)
+                data = self.stats.as_dict()
+                if self.transfer is not None:
+                    data["transfer"] = self.transfer.as_dict()
+                with open(options.profile_out + ".json", "wt") as fd:
+                    pretty_json(data, fd)
+
+            if options.stats:
+                print_call_stats(self.stats, sys.stderr, self.transfer)
+            self.transfer = None
+
+
+    @contextmanager
+    def handle_phase(self, options):
+        """
+        Context manager which records the handle phase of the
+        command. When diagnostics were requested, the time spent
+        writing to stdout is recorded separately as the output phase.
+        """
+
+        stats = self.stats
+
+        if not (options.stats or options.profile_out):
+            with stats.phase("handle"):
+                yield stats
+            return
+
+        out = sys.stdout = _TimedWriter(sys.stdout)
+        start = monotonic()
+
+        try:
+            yield stats
+
+        finally:
+            sys.stdout = out.stream
+            elapsed = monotonic() - start
+            stats.add_phase("handle", elapsed - out.elapsed)
+            stats.add_phase("output", out.elapsed)
+
 
     def __call__(self, goptions, session, args):
         """
@@ -573,16 +1057,25 @@ class SmokyDingo(metaclass=ABCMeta):
 
         self.goptions = goptions
         self.session = session
+        self.stats = stats = CallStats()
 
-        parser = self.parser()
-        options = parser.parse_args(args)
+        with stats.phase("parse"):
+            parser = self.parser()
+            options = parser.parse_args(args)
 
-        self.validate(parser, options)
+            self.validate(parser, options)
 
         try:
-            self.activate()
-            self.pre_handle(options)
-            return self.handle(options) or 0
+            with self.diagnostics(options):
+                with stats.phase("activate"):
+                    self.activate()
+                    self.configure_session(options)
+
+                with stats.phase("pre_handle"):
+                    self.pre_handle(options)
+
+                with self.handle_phase(options):
+                    return self.handle(options) or 0
 
         except KeyboardInterrupt:
             printerr()
@@ -634,7 +1127,17 @@ class AnonSmokyDingo(SmokyDingo):
     def activate(self):
         # rather than logging on, we only open a connection
         if self.session:
-            ensure_connection(self.session)
+            if not self.use_cassette():
+                ensure_connection(self.session)
+
+
+    def configure_session(self, options):
+        super().configure_session(options)
+
+        # we won't be modifying anything, so there's no harm in
+        # remembering what we've loaded for the life of the command
+        if self.session:
+            set_identity_map(self.session, IdentityMap())
 
 
     def pre_handle(self, options):
@@ -28,23 +28,27 @@ from operator import itemgetter
 
 from . import (
     AnonSmokyDingo, TagSmokyDingo,
-    int_or_str, pretty_json, open_output,
+    int_or_str, iter_clean_lines, pretty_json, open_output,
     printerr, read_clean_lines, resplit, )
-from .sift import BuildSifting, output_sifted
+from .sift import BuildSifting, output_sifted, output_sifted_stream
 from .. import (
     NoSuchUser,
-    as_buildinfo, as_taginfo,
-    bulk_load, bulk_load_builds, bulk_load_tags, iter_bulk_load,
-    version_check, )
+    as_buildinfo, as_taginfo, bulk_as_taginfo,
+    bulk_load, bulk_load_builds, bulk_load_tags, cached_metadata,
+    iter_bulk_load, version_check, )
 from ..builds import (
     BUILD_COMPLETE, BUILD_DELETED,
     BuildFilter,
     build_dedup, build_id_sort, build_nvr_sort,
     decorate_builds_btypes, decorate_builds_cg_list,
     gather_component_build_ids, gather_wrapped_builds,
-    iter_bulk_move_builds, iter_bulk_tag_builds, iter_bulk_untag_builds, )
+    iter_bulk_move_builds, iter_bulk_tag_builds, iter_bulk_untag_builds,
+    iter_list_tagged, )
+from ..lazy import lazy_build_group
+from ..records import BuildStore
+from ..sift import DEFAULT_WINDOW
 from ..tags import ensure_tag, gather_tag_ids
-from ..common import chunkseq, unique
+from ..common import chunkiter, chunkseq, unique
 
 
 __all__ = (
@@ -64,6 +68,7 @@ __all__ = (
     "cli_list_btypes",
     "cli_list_cgs",
     "cli_list_components",
+    "cli_stream_builds",
 )
 
 
@@ -726,19 +731,21 @@ def cli_list_components(session, nvr_list,
 
     nvr_list = unique(map(int_or_str, nvr_list))
 
+    # only the task ID of each build is needed after this, so only
+    # that is kept
+    loaded = {}
+
     if nvr_list:
         # load the initial set of builds, validating them
         found = bulk_load_builds(session, nvr_list, err=True)
-        loaded = {b["id"]: b for b in found.values()}
-
-    else:
-        loaded = {}
+        loaded.update((b["id"], b["task_id"]) for b in found.values())
 
-    for tag in tags:
-        # mix in any tagged builds
-        tag = as_taginfo(session, tag)
-        found = session.listTagged(tag["id"], inherit=inherit, latest=latest)
-        loaded.update((b["id"], b) for b in found)
+    for tag in bulk_as_taginfo(session, tags):
+        # mix in any tagged builds, a page at a time so that only
+        # their IDs are kept
+        for found in iter_list_tagged(session, tag["id"], inherit=inherit,
+                                      latest=latest):
+            loaded.update((b["id"], b["task_id"]) for b in found)
 
     # the build IDs of all the builds we've loaded, combined from the
     # initial nvr_list, plus the builds from tag
@@ -755,7 +762,7 @@ def cli_list_components(session, nvr_list,
     # we'll also want the underlying builds used to produce any
     # standalone wrapperRPM builds, as those are not recorded as
     # normal buildroot components
-    tids = [b["task_id"] for b in loaded.values() if b["task_id"]]
+    tids = [tid for tid in loaded.values() if tid]
     wrapped = gather_wrapped_builds(session, tids)
 
     builds = list(found.values())
@@ -855,11 +862,111 @@ class ListComponents(AnonSmokyDingo, BuildFiltering):
                                    outputs=outputs)
 
 
+def _tagged_pages(session, taginfo, inherit, latest, build_filter,
+                  stream=False):
+    # pages of the builds tagged into taginfo, for filter-builds. When
+    # streaming, these are loaded package by package via
+    # iter_list_tagged, otherwise each is a single listTagged call
+
+    tid = taginfo["id"]
+
+    def listTagged(**kwds):
+        if stream:
+            return iter_list_tagged(session, tid, inherit=inherit,
+                                    latest=latest, **kwds)
+        else:
+            return (session.listTagged(tid, inherit=inherit,
+                                       latest=latest, **kwds), )
+
+    # server-side optimization if we're doing filtering by btype
+    if build_filter and build_filter._btypes:
+        return chain.from_iterable(listTagged(type=btype)
+                                   for btype in build_filter._btypes)
+    else:
+        return listTagged()
+
+
+def _stream_builds(session, nvrs, tags, inherit, latest, build_filter,
+                   strict, compact, lazy, window):
+    # generator of the builds for filter-builds --stream. The NVRs
+    # are loaded a window at a time as they are read, and then the
+    # tagged builds a page at a time. Only the IDs of the builds are
+    # kept, so that each is produced once. That set of IDs is the one
+    # thing which grows with the count of builds, at under 100
+    # bytes per distinct build rather than the several KiB of each
+    # info, which are only kept for their window.
+
+    known_ids = set()
+    lazy = lazy_build_group(session) if lazy else None
+
+    def fresh(builds):
+        for binfo in builds:
+            if binfo and binfo["id"] not in known_ids:
+                known_ids.add(binfo["id"])
+                yield binfo
+
+    for chunk in chunkiter(nvrs, window):
+        # each window has its own store, which is discarded along
+        # with the window
+        store = BuildStore() if compact else None
+        loaded = bulk_load_builds(session, unique(map(int_or_str, chunk)),
+                                  err=strict, store=store)
+        yield from fresh(loaded.values())
+
+    for taginfo in bulk_as_taginfo(session, tags):
+        pages = _tagged_pages(session, taginfo, inherit, latest, build_filter,
+                              stream=True)
+
+        for tagged in pages:
+            if lazy is not None:
+                yield from fresh(lazy.extend(b for b in tagged
+                                             if b["id"] not in known_ids))
+
+            else:
+                tagged_ids = [b["id"] for b in tagged
+                              if b["id"] not in known_ids]
+                loaded = bulk_load_builds(session, tagged_ids,
+                                          store=BuildStore())
+                yield from fresh(loaded.values())
+
+
+def cli_stream_builds(session, nvrs,
+                      tags=(), inherit=False, latest=False,
+                      build_filter=None, build_sifter=None,
+                      outputs=None, strict=False, compact=False,
+                      lazy=False, window=DEFAULT_WINDOW):
+    """
+    Implements the ``koji filter-builds --stream`` command. The NVRs
+    are read, loaded, filtered, and output a window at a time, and
+    the results are written in the order that the builds arrived.
+
+    Each build is output only once, even if it is given again in a
+    later window or is also tagged. To do so the ID of every build
+    produced is remembered, so memory use still grows with the count
+    of distinct builds, though by an ID rather than a build info
+    apiece.
+    """
+
+    builds = _stream_builds(session, nvrs, tags, inherit, latest,
+                            build_filter, strict, compact, lazy, window)
+
+    if build_filter:
+        builds = chain.from_iterable(map(build_filter,
+                                         chunkiter(builds, window)))
+
+    if build_sifter:
+        results = build_sifter.iter_run(session, builds, window)
+    else:
+        results = ({"default": found} for found in chunkiter(builds, window))
+
+    output_sifted_stream(results, "nvr", outputs)
+
+
 def cli_filter_builds(session, nvr_list,
                       tags=(), inherit=False, latest=False,
                       build_filter=None, build_sifter=None,
                       sorting=None, outputs=None,
-                      strict=False):
+                      strict=False, compact=False, lazy=False):
 
     """
     Implements the ``koji filter-builds`` command
@@ -867,32 +974,40 @@ def cli_filter_builds(session, nvr_list,
 
     nvr_list = unique(map(int_or_str, nvr_list))
 
+    # all of the loaded builds share a single store
+    store = BuildStore() if compact else None
+
+    # if lazy, the tagged builds start from the fields listTagged
+    # provided, and load the rest only if a filter asks for them
+    lazy = lazy_build_group(session) if lazy else None
+
     if nvr_list:
-        loaded = bulk_load_builds(session, nvr_list, err=strict)
-        builds = filter(None, loaded.values())
+        loaded = bulk_load_builds(session, nvr_list, err=strict,
+                                  store=store)
+        builds = list(filter(None, loaded.values()))
     else:
-        builds = ()
-
-    for tag in tags:
-        taginfo = as_taginfo(session, tag)
-        listTagged = partial(session.listTagged, taginfo["id"],
-                             inherit=inherit, latest=latest)
-
-        # server-side optimization if we're doing filtering by btype
-        if build_filter and build_filter._btypes:
-            tagged = []
-            for btype in build_filter._btypes:
-                tagged.extend(listTagged(type=btype))
-        else:
-            tagged = listTagged()
+        builds = []
+
+    known_ids = set(b["id"] for b in builds)
+
+    for taginfo in bulk_as_taginfo(session, tags):
+        pages = _tagged_pages(session, taginfo, inherit, latest, build_filter)
+
+        for tagged in pages:
+            if lazy is not None:
+                for binfo in tagged:
+                    if binfo["id"] not in known_ids:
+                        known_ids.add(binfo["id"])
+                        builds.append(lazy.add(binfo))
+
+            else:
+                tagged_ids = set(b["id"] for b in tagged)
+                tagged_ids.difference_update(known_ids)
+                known_ids.update(tagged_ids)
 
-        if tagged:
-            builds = list(builds)
-            known_ids = set(b["id"] for b in builds)
-            tagged_ids = set(b["id"] for b in tagged)
-            loaded = bulk_load_builds(session, tagged_ids - known_ids)
-            if loaded:
-                builds.extend(loaded.values())
+                loaded = bulk_load_builds(session, tagged_ids, store=store)
+                if loaded:
+                    builds.extend(loaded.values())
 
     if build_filter:
         builds = build_filter(builds)
@@ -933,6 +1048,21 @@ class FilterBuilds(AnonSmokyDingo, BuildFiltering):
                help="Error if any of the NVRs do not resolve into a"
                " real build. Otherwise, bad NVRs are ignored.")
 
+        addarg("--compact", action="store_true", default=False,
+               help="Keep the loaded builds in a compact form, using"
+               " less memory when filtering very many builds")
+
+        addarg("--lazy", action="store_true", default=False,
+               help="Start from the fields of the tagged builds as"
+               " the tag listing provides them, loading the rest of"
+               " each build only if a filter needs them")
+
+        addarg("--stream", action="store_true", default=False,
+               help="Read, load, filter and output the builds in"
+               " windows of %i as they arrive, rather than all at"
+               " once. Output is in the order the builds arrive, and"
+               " cannot be sorted" % DEFAULT_WINDOW)
+
         group = parser.add_argument_group("Working from tagged builds")
         addarg = group.add_argument
 
@@ -965,6 +1095,14 @@ class FilterBuilds(AnonSmokyDingo, BuildFiltering):
         return parser
 
 
+    def validate(self, parser, options):
+        if options.stream and options.sorting:
+            parser.error("--stream cannot be combined with sorting")
+
+        if options.lazy and options.compact:
+            parser.error("--lazy cannot be combined with --compact")
+
+
     def handle(self, options):
         nvrs = list(options.nvr)
         tags = resplit(options.tags)
@@ -973,7 +1111,10 @@ class FilterBuilds(AnonSmokyDingo, BuildFiltering):
             if not options.nvr_file:
                 options.nvr_file = "-"
 
-        if options.nvr_file:
+        if options.stream:
+            nvrs = chain(nvrs, iter_clean_lines(options.nvr_file))
+
+        elif options.nvr_file:
             nvrs.extend(read_clean_lines(options.nvr_file))
 
         bf = self.get_filter(self.session, options)
@@ -981,6 +1122,18 @@ class FilterBuilds(AnonSmokyDingo, BuildFiltering):
         sorting = options.sorting
         outputs = self.get_outputs(options)
 
+        if options.stream:
+            return cli_stream_builds(self.session, nvrs,
+                                     tags=tags,
+                                     inherit=options.inherit,
+                                     latest=options.latest,
+                                     build_filter=bf,
+                                     build_sifter=bs,
+                                     outputs=outputs,
+                                     strict=options.strict,
+                                     compact=options.compact,
+                                     lazy=options.lazy)
+
         return cli_filter_builds(self.session, nvrs,
                                  tags=tags,
                                  inherit=options.inherit,
@@ -989,7 +1142,9 @@ class FilterBuilds(AnonSmokyDingo, BuildFiltering):
                                  build_sifter=bs,
                                  sorting=sorting,
                                  outputs=outputs,
-                                 strict=options.strict)
+                                 strict=options.strict,
+                                 compact=options.compact,
+                                 lazy=options.lazy)
 
 
 def cli_list_btypes(session, nvr=None, json=False, quiet=False):
@@ -997,7 +1152,8 @@ def cli_list_btypes(session, nvr=None, json=False, quiet=False):
     Implements ``koji list-btypes`` command
     """
 
-    btypes = {bt["id"]: bt for bt in session.listBTypes()}
+    btypes = cached_metadata(session, "listBTypes", session.listBTypes)
+    btypes = {bt["id"]: bt for bt in btypes}
 
     if nvr:
         build = as_buildinfo(session, nvr)
@@ -1064,7 +1220,8 @@ def cli_list_cgs(session, nvr=None, json=False, quiet=False):
     """
 
     cgs = {}
-    for name, cg in session.listCGs().items():
+    found = cached_metadata(session, "listCGs", session.listCGs)
+    for name, cg in found.items():
         cg["name"] = name
         cg.pop("users")
         cgs[cg["id"]] = cg
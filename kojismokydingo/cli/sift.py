@@ -23,10 +23,10 @@ Some CLI adapters for working with Sifty Dingo filtering
 import os
 
 from collections import defaultdict
+from contextlib import ExitStack
 from functools import partial
 from operator import itemgetter
 from os.path import basename
-from pkg_resources import iter_entry_points
 
 from . import open_output, printerr, resplit
 from ..common import escapable_replace
@@ -41,6 +41,7 @@ __all__ = (
     "TagSifting",
 
     "output_sifted",
+    "output_sifted_stream",
 )
 
 
@@ -78,6 +79,9 @@ def _entry_point_sieves(key, on_err=None):
     :rtype: list[type]
     """
 
+    # pkg_resources is costly to import, and only needed here
+    from pkg_resources import iter_entry_points
+
     points = sorted(iter_entry_points(key),
                     key=lambda e: (e.module_name, e.name))
 
@@ -134,6 +138,7 @@ class Sifting():
         the expected flags from that Sifter's results.
 
          * ``--output/-o FLAG:FILENAME[,...]``
+         * ``--prefetch``
          * ``--filter FILTER``
          * ``--filter-file FILTER_FILE``
         """
@@ -162,6 +167,10 @@ class Sifting():
                help="Disable loading of additional sieves from"
                " entry_points")
 
+        addarg("--prefetch", action="store_true", default=False,
+               help="Gather the data needed by all of the sieves in"
+               " shared multicalls before filtering")
+
         grp = grp.add_mutually_exclusive_group()
         addarg = grp.add_argument
 
@@ -267,7 +276,8 @@ class Sifting():
 
         params = self.get_params(options)
         sieves = self.get_sieves(options.entry_points)
-        return Sifter(sieves, filter_src, params=params)
+        return Sifter(sieves, filter_src, params=params,
+                      prefetch=options.prefetch)
 
 
 def _report_problem(msg, entry_point, exc):
@@ -301,19 +311,33 @@ class TagSifting(Sifting):
         return sieves
 
 
+def _flag_output(flag, dest):
+    # the filename and append mode for the output of a flag
+
+    if dest and "%" in dest:
+        safe_flag = flag.translate(str.maketrans("/\\ ", "___"))
+        dest = escapable_replace(dest, "%", safe_flag)
+
+    if dest and dest.startswith("@"):
+        return dest[1:], True
+    else:
+        return dest, False
+
+
 def output_sifted(results, key="id", outputs=None, sort=None):
     """
     Records the results of a sifter to output. As sifter results are
     dicts, the `key` parameter can be either a unary callable or an
     index value to be used to fetch a simplified, printable
-    representaiton from the dicts.
+    representaiton from the dicts. The dicts may also be views from a
+    `kojismokydingo.records.RecordStore`.
 
     `outputs` is a mapping of flag names to filenames using the rules
     of the :py:func:`open_output` function.
 
     :param results: results of invoking a Sifter on a set of data
 
-    :type results: dict[str, list[dict]]
+    :type results: dict[str, list[Mapping]]
 
     :param key: transformation to apply to the individual data
       elements prior to recording. Default, lookup the ``"id"`` index
@@ -351,15 +375,7 @@ def output_sifted(results, key="id", outputs=None, sort=None):
             dest = outputs[flag]
 
     for flag, dest in outputs.items():
-        if "%" in dest:
-            safe_flag = flag.translate(str.maketrans("/\\ ", "___"))
-            dest = escapable_replace(dest, "%", safe_flag)
-
-        if dest.startswith("@"):
-            dest = dest[1:]
-            append = True
-        else:
-            append = False
+        dest, append = _flag_output(flag, dest)
 
         flagged = results.get(flag, ())
         if sort:
@@ -370,5 +386,64 @@ def output_sifted(results, key="id", outputs=None, sort=None):
                 print(res, file=dout)
 
 
+def output_sifted_stream(results, key="id", outputs=None):
+    """
+    Records a sequence of sifter results to output, as from
+    `kojismokydingo.sift.Sifter.iter_run`. Each output is opened once,
+    and the results are written and flushed as each of them arrives.
+    Otherwise behaves as `output_sifted`, without sorting.
+
+    :param results: results of invoking a Sifter on successive
+      windows of data
+
+    :type results: Iterable[dict[str, list[Mapping]]]
+
+    :param key: transformation to apply to the individual data
+      elements prior to recording. Default, lookup the ``"id"`` index
+      from the element.
+
+    :type key: callable or str
+
+    :param outputs: mapping of flags to destination filenames. If
+      unspecified, the default flag will be written to stdout and the
+      rest will be discarded.
+
+    :type outputs: dict[str, str]
+    """
+
+    if not callable(key):
+        key = itemgetter(key)
+
+    if outputs is None:
+        outputs = {"default": "-"}
+
+    with ExitStack() as stack:
+        opened = {}
+
+        def open_flag(flag):
+            dest = _flag_output(flag, outputs[flag])
+            dout = opened.get(dest)
+            if dout is None:
+                dout = opened[dest] = stack.enter_context(open_output(*dest))
+            return dout
+
+        # every output gets written to, even if it has no results
+        flagged_outputs = {flag: open_flag(flag) for flag in outputs}
+
+        for found in results:
+            for flag, flagged in found.items():
+                dout = flagged_outputs.get(flag)
+                if dout is None:
+                    if not isinstance(outputs, defaultdict):
+                        continue
+                    dout = flagged_outputs[flag] = open_flag(flag)
+
+                for res in map(key, flagged):
+                    print(res, file=dout)
+
+            for dout in opened.values():
+                dout.flush()
+
+
 #
 # The end.
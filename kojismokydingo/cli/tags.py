@@ -32,7 +32,7 @@ from . import (
 from .sift import TagSifting, output_sifted
 from .. import (
     BadDingo, FeatureUnavailable, NoSuchTag,
-    bulk_load_tags, version_require, )
+    bulk_as_taginfo, bulk_load_tags, version_require, )
 from ..common import unique
 from ..tags import (
     collect_tag_extras, find_inheritance_parent, gather_affected_targets,
@@ -222,13 +222,7 @@ def cli_swap_inheritance(session, tagname, old_parent, new_parent,
     if original is None:
         raise NoSuchTag(tagname)
 
-    old_p = session.getTag(old_parent)
-    if old_p is None:
-        raise NoSuchTag(old_parent)
-
-    new_p = session.getTag(new_parent)
-    if new_p is None:
-        raise NoSuchTag(new_parent)
+    old_p, new_p = bulk_as_taginfo(session, (old_parent, new_parent))
 
     # deep copy of original inheritance
     swapped = [dict(i) for i in original]
@@ -34,7 +34,7 @@ from configparser import ConfigParser
 from datetime import datetime, timezone
 from fnmatch import fnmatchcase
 from glob import glob
-from itertools import filterfalse, zip_longest
+from itertools import filterfalse, islice, zip_longest
 from operator import itemgetter
 from os.path import expanduser, isdir, join
 
@@ -46,6 +46,7 @@ except ImportError:  # pragma: no cover
 
 
 __all__ = (
+    "chunkiter",
     "chunkseq",
     "fnmatches",
     "find_config_dirs",
@@ -62,6 +63,28 @@ __all__ = (
 )
 
 
+def chunkiter(iterable, chunksize):
+    """
+    Chop up an iterable into lists, each up to chunksize in length.
+    Unlike `chunkseq`, the iterable is consumed only as each chunk is
+    produced, so it need not fit in memory all at once.
+
+    :param iterable: values to chunk up
+    :type iterable: Iterable
+
+    :param chunksize: max length for chunks
+    :type chunksize: int
+
+    :rtype: Generator[list]
+    """
+
+    iterable = iter(iterable)
+    chunk = list(islice(iterable, chunksize))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterable, chunksize))
+
+
 def chunkseq(seq, chunksize):
     """
     Chop up a sequence into sub-sequences, each up to chunksize in
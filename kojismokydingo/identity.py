@@ -0,0 +1,322 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Identity maps
+
+A session-scoped record of the infos loaded from a koji hub, so that
+each is loaded only once.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+from concurrent.futures import Future
+from threading import Lock
+
+
+__all__ = (
+    "IdentityMap",
+    "set_identity_map",
+)
+
+
+class IdentityMap():
+    """
+    A session-scoped map of the builds, tags, users, targets, hosts,
+    channels, and packages which have been loaded from the hub. Each
+    loaded info dict is recorded under the key it was loaded with, and
+    also under its ID and name, so that loading a build by its NVR and
+    then again by its ID will find the same entry.
+
+    Keys which are being loaded by one thread are claimed, and other
+    threads wanting the same key will wait for that result rather than
+    invoke a second call to the hub.
+
+    Associate an instance with a session via `set_identity_map` for
+    it to be used by the ``as_*info`` and ``bulk_load_*`` functions.
+    As entries are never refreshed, this is best suited to short-lived
+    sessions which do not modify the entries they load.
+    """
+
+    # the fields of each kind of info dict which may be used to load
+    # that same info
+    ALIASES = {
+        "build": ("id", "nvr"),
+        "channel": ("id", "name"),
+        "host": ("id", "name"),
+        "package": ("id", "name"),
+        "tag": ("id", "name"),
+        "target": ("id", "name"),
+        "user": ("id", "name"),
+    }
+
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = {}
+        self._pending = {}
+
+
+    def get(self, kind, key):
+        """
+        The info dict of the given kind recorded under key, or None
+
+        :param kind: one of the kinds in `ALIASES`
+
+        :type kind: str
+
+        :param key: name or ID
+
+        :type key: str or int
+
+        :rtype: dict
+        """
+
+        return self._entries.get((kind, key))
+
+
+    def add(self, kind, info, key=None):
+        """
+        Record an info dict under its ID and name, and optionally the
+        key it was loaded with
+
+        :param kind: one of the kinds in `ALIASES`
+
+        :type kind: str
+
+        :param info: the info dict
+
+        :type info: dict
+
+        :param key: the key used to load the info
+
+        :type key: str or int, optional
+        """
+
+        with self._lock:
+            self._add(kind, info, key)
+
+
+    def _add(self, kind, info, key):
+        entries = self._entries
+        for field in self.ALIASES[kind]:
+            alias = info.get(field)
+            if alias is not None:
+                entries[(kind, alias)] = info
+        if key is not None:
+            entries[(kind, key)] = info
+
+
+    def claim(self, kind, keys):
+        """
+        Claim the loading of the given keys which are not yet recorded.
+
+        Returns a list of the keys which the caller is now responsible
+        for loading, and then either resolving via `resolve` or
+        abandoning via `fail`. Also returns a dict of the keys which
+        are already being loaded by another caller, mapped to a future
+        which will provide their info.
+
+        :param kind: one of the kinds in `ALIASES`
+
+        :type kind: str
+
+        :param keys: names or IDs
+
+        :type keys: list
+
+        :rtype: tuple[list, dict[object, concurrent.futures.Future]]
+        """
+
+        claimed = []
+        waiting = {}
+
+        with self._lock:
+            for key in keys:
+                ident = (kind, key)
+                if ident in self._entries:
+                    continue
+
+                fut = self._pending.get(ident)
+                if fut is None:
+                    self._pending[ident] = Future()
+                    claimed.append(key)
+                else:
+                    waiting[key] = fut
+
+        return claimed, waiting
+
+
+    def resolve(self, kind, key, info):
+        """
+        Provide the info for a claimed key. If info is None then the
+        key didn't match anything, and nothing is recorded.
+        """
+
+        with self._lock:
+            if info:
+                self._add(kind, info, key)
+            fut = self._pending.pop((kind, key), None)
+
+        if fut is not None:
+            fut.set_result(info)
+
+
+    def fail(self, kind, keys, exc):
+        """
+        Abandon the claimed keys which have not been resolved, passing
+        the given exception along to any waiters.
+        """
+
+        with self._lock:
+            futs = [self._pending.pop((kind, key), None) for key in keys]
+
+        for fut in futs:
+            if fut is not None:
+                fut.set_exception(exc)
+
+
+    def clear(self):
+        """
+        Forget all recorded entries
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+
+def set_identity_map(session, idmap):
+    """
+    Associates an `IdentityMap` with the given session, to be used by
+    the ``as_*info`` and ``bulk_load_*`` functions to avoid loading
+    the same build, tag, user, target, host, channel, or package more
+    than once.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param idmap: the identity map, or None to stop using one
+
+    :type idmap: `IdentityMap`, optional
+    """
+
+    if idmap is None:
+        vars(session).pop("__identity_map", None)
+    else:
+        vars(session)["__identity_map"] = idmap
+
+
+def _iter_identity_load(session, kind, keys, loader, record=None):
+    # yields (key, info) pairs in the order of keys. When the session
+    # has an identity map, keys already recorded are not loaded, each
+    # unique key is loaded only once, and keys being loaded elsewhere
+    # are waited on. loader is invoked with the list of keys which
+    # need to be loaded, and must return an iterable of (key, info)
+    # pairs in that same order. record, if given, is applied once to
+    # each info as it is obtained, before it is recorded in the
+    # identity map.
+
+    if record is None:
+        record = lambda info: info
+
+    idmap = vars(session).get("__identity_map")
+    if idmap is None:
+        for key, info in loader(keys):
+            yield key, record(info)
+        return
+
+    keys = tuple(keys)
+
+    # the count of each key yet to be yielded, so that an info is
+    # only kept until its key has been yielded for the last time
+    remaining = {}
+    for key in keys:
+        remaining[key] = remaining.get(key, 0) + 1
+
+    found = {}
+    wanted = []
+
+    for key in remaining:
+        info = idmap.get(kind, key)
+        if info is None:
+            wanted.append(key)
+        else:
+            found[key] = record(info)
+
+    claimed, waiting = idmap.claim(kind, wanted)
+    loading = set(claimed)
+    loaded = iter(loader(claimed))
+
+    try:
+        for key in keys:
+            # the loader provides the claimed keys in the same order
+            # as they appear in keys, so only those which arrive
+            # ahead of a key known or loaded elsewhere are buffered
+            while key in loading:
+                lkey, info = next(loaded)
+                if info is not None:
+                    info = record(info)
+                idmap.resolve(kind, lkey, info)
+                loading.discard(lkey)
+                found[lkey] = info
+
+                if not loading:
+                    # lets the loader finish up, as by storing the
+                    # last of its results in the bulk cache
+                    for _pair in loaded:
+                        pass
+
+            if key in found:
+                info = found[key]
+            elif key in waiting:
+                info = waiting.pop(key).result()
+                if info is not None:
+                    info = record(info)
+                found[key] = info
+            else:
+                info = None
+
+            if info is None:
+                # may have been recorded by another caller after we
+                # checked
+                info = idmap.get(kind, key)
+                if info is not None:
+                    info = found[key] = record(info)
+
+            remaining[key] -= 1
+            if not remaining[key]:
+                found.pop(key, None)
+
+            yield key, info
+
+    except BaseException as exc:
+        # including the generator being closed early
+        idmap.fail(kind, loading, exc)
+        raise
+
+
+def _identity_load(session, kind, key, loadfn):
+    # loads a single key via loadfn, using the session's identity map
+    # if it has one
+
+    loader = lambda keys: ((k, loadfn(k)) for k in keys)
+    for _key, info in _iter_identity_load(session, kind, (key,), loader):
+        return info
+
+
+#
+# The end.
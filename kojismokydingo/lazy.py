@@ -0,0 +1,379 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Lazy info objects
+
+Info mappings which start from whatever fields are already known,
+such as the partial build infos returned by ``listTagged``, and which
+load the rest from the hub only when it is first asked for.
+
+Each `LazyInfo` belongs to a `LazyGroup`. When a missing field is
+asked of any member, the fields provided by the same hub calls are
+loaded for every member of the group which doesn't have them yet, in
+a single bulk load. Members which have since been discarded are not
+loaded at all.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+from collections.abc import MutableMapping
+from weakref import WeakValueDictionary
+
+from . import bulk_load_builds, bulk_load_tags
+from .builds import decorate_builds_btypes, decorate_builds_cg_list
+
+
+__all__ = (
+    "LazyGroup",
+    "LazyInfo",
+    "lazy_build_group",
+    "lazy_builds",
+    "lazy_tag_group",
+    "lazy_tags",
+)
+
+
+# the keys set by decorate_builds_btypes, beyond which are keys for
+# the fields of any other btypes
+BTYPE_KEYS = frozenset((
+    "archive_btype_ids", "archive_btype_names",
+    "maven_group_id", "maven_artifact_id", "maven_version",
+    "platform",
+))
+
+# the keys set by decorate_builds_cg_list
+CG_KEYS = frozenset((
+    "archive_cg_ids", "archive_cg_names",
+))
+
+
+class LazyInfo(MutableMapping):
+    """
+    An info mapping which loads its missing fields on demand, via its
+    `LazyGroup`.
+
+    Asking for, or checking for, a missing key causes it to be loaded
+    along with the rest of the fields which come from the same hub
+    calls. Iterating over a LazyInfo, or converting it via `copy`,
+    covers only the fields which are known so far.
+
+    LazyInfo is not a subclass of dict, and serializing one as JSON
+    requires first converting it via `copy`.
+    """
+
+    __slots__ = ("_data", "_group", "_tried", "__weakref__", )
+
+
+    def __init__(self, group, data):
+        self._group = group
+        self._data = data
+        self._tried = set()
+
+
+    def _resolve(self, key):
+        provider = self._group.provider(key)
+        if provider is not None and provider not in self._tried:
+            self._group.load(provider)
+
+
+    def __getitem__(self, key):
+        data = self._data
+        if key not in data:
+            self._resolve(key)
+        return data[key]
+
+
+    def __contains__(self, key):
+        data = self._data
+        if key not in data:
+            self._resolve(key)
+        return key in data
+
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+
+    def __iter__(self):
+        return iter(tuple(self._data))
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+    def copy(self):
+        """
+        A new dict of the fields known so far
+
+        :rtype: dict
+        """
+
+        return dict(self._data)
+
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self._data)
+
+
+class LazyGroup():
+    """
+    A collection of `LazyInfo` which load their missing fields
+    together.
+
+    Fields are loaded by providers. A provider is a callable which is
+    invoked with the session and a list of LazyInfo, and which sets
+    the keys it is responsible for on each of them. The `fallback`
+    provider is responsible for any key which isn't claimed by one of
+    the other `providers`.
+
+    A provider is invoked at most once for each member of the group,
+    even if it leaves the key which was asked for unset.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param fallback: provider for unclaimed keys
+
+    :type fallback: Callable[[koji.ClientSession, list[LazyInfo]], None]
+
+    :param providers: pairs of keys and the provider which is
+      responsible for them
+
+    :type providers: list[tuple[set[str], Callable]], optional
+    """
+
+    def __init__(self, session, fallback, providers=()):
+        self.session = session
+        self.fallback = fallback
+
+        self._providers = {}
+        for keys, provider in providers:
+            for key in keys:
+                self._providers[key] = provider
+
+        # the members are kept weakly, so that those which are
+        # discarded are never loaded
+        self._members = WeakValueDictionary()
+
+
+    def __len__(self):
+        return len(self._members)
+
+
+    def add(self, info):
+        """
+        Adds a member to the group, starting from the fields of the
+        given info mapping. The mapping is copied.
+
+        :param info: the known fields
+
+        :type info: dict
+
+        :rtype: `LazyInfo`
+        """
+
+        found = LazyInfo(self, dict(info))
+        self._members[id(found)] = found
+        return found
+
+
+    def extend(self, infos):
+        """
+        Adds a member to the group for each of the given info mappings
+
+        :param infos: the known fields of each member
+
+        :type infos: Iterable[dict]
+
+        :rtype: list[LazyInfo]
+        """
+
+        return [self.add(info) for info in infos]
+
+
+    def provider(self, key):
+        """
+        The provider responsible for the given key
+
+        :param key: the key
+
+        :type key: str
+
+        :rtype: Callable
+        """
+
+        return self._providers.get(key, self.fallback)
+
+
+    def load(self, provider):
+        """
+        Invokes the provider on each member which it hasn't already
+        been invoked on. If the provider raises an exception, those
+        members may be tried again.
+
+        :param provider: one of the group's providers
+
+        :type provider: Callable
+        """
+
+        wanted = [info for info in tuple(self._members.values())
+                  if provider not in info._tried]
+
+        if not wanted:
+            return
+
+        for info in wanted:
+            info._tried.add(provider)
+
+        try:
+            provider(self.session, wanted)
+
+        except BaseException:
+            for info in wanted:
+                info._tried.discard(provider)
+            raise
+
+
+def _fill(info, loaded):
+    # sets the loaded fields which the info doesn't already have
+
+    if loaded:
+        data = info._data
+        for key, val in loaded.items():
+            data.setdefault(key, val)
+
+
+def _load_builds(session, infos):
+    # fills in the fields from getBuild, by ID or else by NVR
+
+    keys = [info._data.get("id") or info._data.get("nvr") for info in infos]
+    loaded = bulk_load_builds(session, filter(None, keys), err=False)
+
+    for key, info in zip(keys, infos):
+        _fill(info, loaded.get(key))
+
+
+def _load_tags(session, infos):
+    # fills in the fields from getTag, by ID or else by name
+
+    keys = [info._data.get("id") or info._data.get("name")
+            for info in infos]
+    loaded = bulk_load_tags(session, filter(None, keys), err=False)
+
+    for key, info in zip(keys, infos):
+        _fill(info, loaded.get(key))
+
+
+def _as_known(value, idkey, namekey):
+    # the known fields of a build or tag given as a dict, an ID, or a
+    # name
+
+    if isinstance(value, int):
+        return {idkey: value}
+    elif isinstance(value, str):
+        return {namekey: value}
+    else:
+        return value
+
+
+def lazy_build_group(session):
+    """
+    A `LazyGroup` for build infos. Missing fields are loaded via
+    `kojismokydingo.bulk_load_builds`. The keys added by
+    `kojismokydingo.builds.decorate_builds_btypes` and
+    `kojismokydingo.builds.decorate_builds_cg_list` are loaded via
+    those functions, and so are only loaded if they are asked for.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :rtype: `LazyGroup`
+    """
+
+    providers = (
+        (BTYPE_KEYS, decorate_builds_btypes),
+        (CG_KEYS, decorate_builds_cg_list),
+    )
+    return LazyGroup(session, _load_builds, providers)
+
+
+def lazy_builds(session, build_infos):
+    """
+    Lazy build infos, sharing a new `lazy_build_group`. Each build may
+    be given as an ID, an NVR, or a partial build info dict with at
+    least an ``id`` or an ``nvr`` key.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param build_infos: the known builds
+
+    :type build_infos: Iterable[int or str or dict]
+
+    :rtype: list[LazyInfo]
+    """
+
+    group = lazy_build_group(session)
+    return group.extend(_as_known(b, "id", "nvr") for b in build_infos)
+
+
+def lazy_tag_group(session):
+    """
+    A `LazyGroup` for tag infos. Missing fields are loaded via
+    `kojismokydingo.bulk_load_tags`.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :rtype: `LazyGroup`
+    """
+
+    return LazyGroup(session, _load_tags)
+
+
+def lazy_tags(session, tag_infos):
+    """
+    Lazy tag infos, sharing a new `lazy_tag_group`. Each tag may be
+    given as an ID, a name, or a partial tag info dict with at least
+    an ``id`` or a ``name`` key.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param tag_infos: the known tags
+
+    :type tag_infos: Iterable[int or str or dict]
+
+    :rtype: list[LazyInfo]
+    """
+
+    group = lazy_tag_group(session)
+    return group.extend(_as_known(t, "id", "name") for t in tag_infos)
+
+
+#
+# The end.
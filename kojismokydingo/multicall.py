@@ -0,0 +1,525 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Bulk multicalls
+
+The chunked multicalls underlying the bulk loading functions, along
+with their recovery from failures, the streaming of their responses,
+and their dispatch via a session pool.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+from collections import deque
+from koji import Fault, GenericError, convertFault
+from requests.exceptions import (
+    ChunkedEncodingError, HTTPError, Timeout,
+    ConnectionError as RequestsConnectionError, )
+from time import monotonic, sleep
+
+from .chunker import session_chunker
+from .pool import session_pool
+from .stats import _record_call, _response_bytes, _track_response_bytes
+from .throttle import _is_transient, _throttle_acquire
+from .transport import iter_multicall
+
+
+__all__ = (
+    "iter_bulk_load",
+    "set_bulk_retries",
+    "set_bulk_streaming",
+)
+
+
+def set_bulk_retries(session, retries=2, backoff=1.0):
+    """
+    Sets how the bulk loading functions for the given session recover
+    from a multicall which fails as a whole.
+
+    Transient failures, such as connection errors, timeouts, or a hub
+    which is offline, are retried up to `retries` times, sleeping
+    `backoff` seconds before the first retry and doubling that each
+    time after.
+
+    Any other failure is assumed to be caused by one or more of the
+    calls in the multicall. The multicall is split in half and each
+    half retried, until the calls which fail on their own are found.
+    Only those calls are then reported as faults.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param retries: how many times to retry a transient failure.
+      Default, 2
+
+    :type retries: int, optional
+
+    :param backoff: seconds to sleep before the first retry. Default,
+      1.0
+
+    :type backoff: float, optional
+    """
+
+    vars(session)["__bulk_retries"] = (retries, backoff)
+
+
+# failures of a whole multicall which we can try to recover from
+_RECOVERABLE = (
+    ChunkedEncodingError, GenericError, HTTPError,
+    RequestsConnectionError, Timeout, )
+
+
+def _fault_info(exc):
+    # a multicall fault result representing the given exception
+
+    code = getattr(exc, "faultCode", GenericError.faultCode)
+    return {"faultCode": code, "faultString": str(exc)}
+
+
+def _recover_multicall(session, send, key_chunk, exc):
+    # recovers from exc having been raised while sending the calls
+    # for key_chunk. send is a function which queues and sends the
+    # calls for a list of keys, returning the multicall results.
+
+    retries, backoff = vars(session).get("__bulk_retries", (2, 1.0))
+
+    attempt = 0
+    while _is_transient(exc):
+        if attempt >= retries:
+            raise exc
+
+        sleep(backoff * (2 ** attempt))
+        attempt += 1
+
+        try:
+            return send(key_chunk)
+        except _RECOVERABLE as retry_exc:
+            exc = retry_exc
+
+    # not transient, so something in this chunk upsets the hub
+    if len(key_chunk) == 1:
+        return [_fault_info(exc)]
+
+    mid = len(key_chunk) // 2
+    results = []
+
+    for half in (key_chunk[:mid], key_chunk[mid:]):
+        try:
+            results.extend(send(half))
+        except _RECOVERABLE as half_exc:
+            results.extend(_recover_multicall(session, send, half, half_exc))
+
+    return results
+
+
+def _queued_method(session):
+    # the name of the hub method most recently queued on a session in
+    # multicall mode, if it can be determined
+
+    calls = getattr(session, "_calls", None)
+    if isinstance(calls, list) and calls:
+        return calls[-1].get("methodName")
+    else:
+        return None
+
+
+def _iter_queued_chunks(session, loadfn, keys, size):
+    # puts the session into multicall mode and invokes loadfn on a
+    # chunk of keys, then yields (key_chunk, chunker). The caller must
+    # send or remove the queued calls before resuming. If size is
+    # None, chunker is the session's AdaptiveChunker for the method
+    # being invoked and decides the size of each chunk. Otherwise
+    # chunker is None and chunks have the given fixed size.
+
+    keys = iter(keys)
+    chunker = None
+
+    while True:
+        session.multicall = True
+        key_chunk = []
+
+        for key in keys:
+            loadfn(key)
+            key_chunk.append(key)
+
+            if size is None:
+                if chunker is None:
+                    chunker = session_chunker(session,
+                                              _queued_method(session))
+                limit = chunker.size
+            else:
+                limit = size
+
+            if len(key_chunk) >= limit:
+                break
+
+        if not key_chunk:
+            session.multicall = False
+            break
+
+        yield key_chunk, chunker
+
+
+def _queue_calls(session, loadfn, key_chunk):
+    # puts the session into multicall mode and invokes loadfn on each
+    # key in key_chunk
+
+    session.multicall = True
+    for key in key_chunk:
+        loadfn(key)
+
+
+def _capture_calls(session):
+    # removes and returns the calls queued on a session in multicall
+    # mode, without sending them
+
+    calls = session._calls
+    session._calls = []
+    session.multicall = False
+    return calls
+
+
+def _iter_parallel_multicall(session, loadfn, keys, size, jobs):
+    # yields (key_chunk, results) tuples in order, while keeping up
+    # to jobs + 1 chunks in flight in the session pool.
+
+    pool = session_pool(session, jobs)
+    pending = deque()
+
+    def send(key_chunk):
+        _queue_calls(session, loadfn, key_chunk)
+        fut = pool.submit(_capture_calls(session))
+        return fut.result()[0]
+
+    def complete():
+        key_chunk, chunker, fut = pending.popleft()
+        try:
+            results, elapsed, nbytes = fut.result()
+        except _RECOVERABLE as exc:
+            if chunker is not None:
+                chunker.failed(len(key_chunk))
+            results = _recover_multicall(session, send, key_chunk, exc)
+        else:
+            if chunker is not None:
+                chunker.record(len(key_chunk), elapsed, nbytes)
+        return key_chunk, results
+
+    try:
+        for key_chunk, chunker in _iter_queued_chunks(session, loadfn,
+                                                      keys, size):
+            calls = _capture_calls(session)
+            pending.append((key_chunk, chunker, pool.submit(calls)))
+
+            if len(pending) > jobs:
+                yield complete()
+
+        while pending:
+            yield complete()
+
+    finally:
+        for _key_chunk, _chunker, fut in pending:
+            fut.cancel()
+
+
+def set_bulk_streaming(session, enabled=True):
+    """
+    Sets whether the bulk loading functions for the given session
+    decode the response of each multicall as it arrives, yielding
+    each result as soon as it has been decoded rather than once the
+    whole response has been read. This bounds the memory used by a
+    large multicall to roughly that of its largest result.
+
+    Streaming is enabled by default for a
+    `kojismokydingo.ManagedClientSession`, and disabled for any other
+    session. It only applies when the multicalls are sent one at a
+    time, and never to a session which has a cassette.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param enabled: whether to stream multicall responses. Default,
+      True
+
+    :type enabled: bool, optional
+    """
+
+    vars(session)["__bulk_streaming"] = bool(enabled)
+
+
+def _streaming(session):
+    # whether the bulk multicalls of the session should be streamed. A
+    # cassette records and answers whole responses, so can't be used
+    # with streaming
+
+    svars = vars(session)
+    if "__cassette" in svars:
+        return False
+
+    return svars.get("__bulk_streaming", False)
+
+
+def _iter_streamed_multicall(session, send, key_chunk, chunker):
+    # sends the calls queued on the session for key_chunk, yielding
+    # their results as they are decoded. If the multicall fails part
+    # way through, the keys which have no result yet are recovered via
+    # send
+
+    svars = vars(session)
+    calls = _capture_calls(session)
+
+    # the streamed multicall doesn't pass through _callMethod, so it
+    # is throttled here. Its latency is the time until the first
+    # result is decoded, as the results are consumed as they are
+    # decoded.
+    throttle = svars.get("__throttle")
+    if throttle is not None:
+        _throttle_acquire(session, throttle, len(calls))
+    latency = None
+
+    def response_bytes(nbytes):
+        svars["__response_bytes"] = nbytes
+
+    svars["__response_bytes"] = 0
+    start = monotonic()
+    done = 0
+    failure = None
+
+    try:
+        for result in iter_multicall(session, calls, response_bytes):
+            if latency is None:
+                latency = monotonic() - start
+            done += 1
+            yield result
+
+    except _RECOVERABLE as exc:
+        failure = exc
+
+    finally:
+        elapsed = monotonic() - start
+        stats = svars.get("__call_stats")
+        if stats is not None:
+            _record_call(stats, "multiCall", (calls, ), elapsed,
+                         _response_bytes(session))
+        if throttle is not None:
+            throttle.release(len(calls), latency,
+                             failure is not None and _is_transient(failure))
+
+    if failure is None:
+        if chunker is not None:
+            chunker.record(len(key_chunk), elapsed, _response_bytes(session))
+    else:
+        if chunker is not None:
+            chunker.failed(len(key_chunk))
+        yield from _recover_multicall(session, send, key_chunk[done:],
+                                      failure)
+
+
+def _iter_serial_multicall(session, loadfn, keys, size):
+    # yields (key_chunk, results) tuples in order, one multicall at a
+    # time. If the session is streaming, results is a generator which
+    # must be exhausted before resuming.
+
+    _track_response_bytes(session)
+    streaming = _streaming(session)
+
+    def send(key_chunk):
+        _queue_calls(session, loadfn, key_chunk)
+        return session.multiCall()
+
+    for key_chunk, chunker in _iter_queued_chunks(session, loadfn,
+                                                  keys, size):
+        if streaming:
+            yield key_chunk, _iter_streamed_multicall(session, send,
+                                                      key_chunk, chunker)
+            continue
+
+        start = monotonic()
+        try:
+            results = session.multiCall()
+        except _RECOVERABLE as exc:
+            if chunker is not None:
+                chunker.failed(len(key_chunk))
+            results = _recover_multicall(session, send, key_chunk, exc)
+        else:
+            if chunker is not None:
+                chunker.record(len(key_chunk), monotonic() - start,
+                               _response_bytes(session))
+
+        yield key_chunk, results
+
+
+def iter_bulk_load(session, loadfn, keys, err=True, size=None, jobs=None):
+    """
+    Generic bulk loading generator. Invokes the given loadfn on each
+    key in keys using chunking multicalls limited to the specified
+    size.
+
+    Yields (key, result) pairs in order.
+
+    If err is True (default) then any faults will raise an exception.
+    If err is False, then a None will be substituted as the result for
+    the failing key.
+
+    If size is None (default) then the chunk size is adapted to the
+    measured round-trip time and response size of each multicall, via
+    the session's `kojismokydingo.AdaptiveChunker` for the hub method
+    that loadfn invokes.
+
+    If jobs is greater than 1, then up to that many multicalls will be
+    dispatched concurrently via a `kojismokydingo.SessionPool` of
+    cloned sessions, and the next chunk will be read ahead while
+    waiting on the results. The results are still yielded in the order
+    of keys. Otherwise, if the session is streaming as described in
+    `set_bulk_streaming`, then each result is yielded as soon as it
+    has been decoded from the multicall response.
+
+    A multicall which fails as a whole is retried or split up to find
+    the keys at fault, as described in `set_bulk_retries`. Only those
+    keys are then treated as faults.
+
+    :param session: The koji session
+
+    :type session: `koji.ClientSession`
+
+    :param loadfn: The loading function, to be invoked in a multicall
+      arrangement. Will be called once with each given key from keys
+
+    :type loadfn: Callable[[object], object]
+
+    :param keys: The sequence of keys to be used to invoke loadfn.
+
+    :type keys: list[object]
+
+    :param err: Whether to raise any underlying fault returns as
+      exceptions. Default, True
+
+    :type err: bool, optional
+
+    :param size: How many calls to loadfn to chunk up for each
+      multicall. Default, adaptive
+
+    :type size: int, optional
+
+    :param jobs: How many multicalls may be in flight at once. Default,
+      the value set via `kojismokydingo.set_bulk_jobs` for this
+      session, or 1
+
+    :type jobs: int, optional
+
+    :raises koji.GenericError: if err is True and an issue
+      occurrs while invoking the loadfn
+
+    :rtype: Generator[tuple[object, object]]
+    """
+
+    if jobs is None:
+        jobs = vars(session).get("__bulk_jobs", 1)
+
+    if jobs > 1:
+        work = _iter_parallel_multicall(session, loadfn, keys, size, jobs)
+    else:
+        work = _iter_serial_multicall(session, loadfn, keys, size)
+
+    try:
+        for key_chunk, results in work:
+            yield from _iter_multicall_results(key_chunk, results, err)
+    finally:
+        work.close()
+
+
+def _iter_multicall_results(key_chunk, results, err):
+    # yields (key, result) pairs from the results of a multicall. A
+    # fault result is raised if err is True, otherwise it becomes None
+
+    for key, info in zip(key_chunk, results):
+        if info:
+            if "faultCode" in info:
+                if err:
+                    raise convertFault(Fault(**info))
+                else:
+                    yield key, None
+            else:
+                yield key, info[0]
+        else:
+            yield key, None
+
+
+def _iter_cached_bulk_load(session, method, loadfn, keys, immutable,
+                           err, size, jobs, argsfn=None, aliases=None):
+
+    # like iter_bulk_load, but when the session has a bulk cache
+    # associated, keys with a cached result are not loaded from the
+    # hub. Loaded results are stored in the cache when
+    # immutable(key, result) is True. argsfn converts a key into the
+    # args to the hub method, and aliases gives further keys which
+    # would also have loaded a result.
+
+    cache = vars(session).get("__bulk_cache")
+    if cache is None:
+        yield from iter_bulk_load(session, loadfn, keys, err, size, jobs)
+        return
+
+    if argsfn is None:
+        argsfn = lambda key: [key]
+
+    hub = session.baseurl
+    keys = tuple(keys)
+
+    found = cache.get_many(hub, method, [argsfn(key) for key in keys])
+    missing = [key for index, key in enumerate(keys) if index not in found]
+    loaded = iter_bulk_load(session, loadfn, missing, err, size, jobs)
+
+    store = []
+
+    for index, key in enumerate(keys):
+        if index in found:
+            yield key, found[index]
+            continue
+
+        key, info = next(loaded)
+        yield key, info
+
+        if info is not None and immutable(key, info):
+            store.append((argsfn(key), info))
+            if aliases:
+                store.extend((argsfn(alias), info) for alias in aliases(info))
+
+        if len(store) >= 500:
+            cache.put_many(hub, method, store)
+            store = []
+
+    if store:
+        cache.put_many(hub, method, store)
+
+
+def _completed_build_ids(session, build_ids):
+    # the subset of build_ids which the session's bulk cache knows to
+    # be completed builds
+
+    cache = vars(session).get("__bulk_cache")
+    if cache is None:
+        return set()
+
+    found = cache.get_many(session.baseurl, "getBuild",
+                           [[bid] for bid in build_ids])
+    return set(build_ids[index] for index in found)
+
+
+#
+# The end.
@@ -0,0 +1,107 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Paged queries
+
+The results of hub queries, loaded a page at a time.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+__all__ = (
+    "iter_paged",
+)
+
+
+# the count of infos requested in each page by iter_paged
+DEFAULT_PAGE_SIZE = 1000
+
+
+def iter_paged(queryfn, order="id", size=DEFAULT_PAGE_SIZE):
+    """
+    Generic paging generator for hub query methods which accept a
+    ``queryOpts`` parameter, such as ``listBuilds`` or
+    ``listArchives``. Invokes `queryfn` once per page with a
+    ``queryOpts`` keyword argument giving the order, offset, and
+    limit, yielding each non-empty page as it arrives. Rather than a
+    single enormous response, the results are loaded and may be
+    processed a page at a time.
+
+    The order must be by a unique, increasing field such as the ID,
+    and the pages are keyed on it: each page holds only the rows
+    whose field is greater than the last row yielded. The hub
+    methods accept no such bound, so each page after the first is
+    requested from the offset of the last row yielded, and one row
+    longer. If that row is no longer at the offset because earlier
+    rows were deleted meanwhile, the offset is backed up a page and
+    requested again. Rows deleted while paging therefore shift no
+    rows past the pages, and rows created while paging appear in
+    the last page, so no row is skipped or repeated. A page may hold
+    fewer than `size` rows after backing up.
+
+    :param queryfn: The query function, eg. a `functools.partial` of
+      ``session.listBuilds`` with the wanted filters
+
+    :type queryfn: Callable[..., list[dict]]
+
+    :param order: the field to order the results by. Default, ``id``
+
+    :type order: str, optional
+
+    :param size: the count of results in each page. Default,
+      `DEFAULT_PAGE_SIZE`
+
+    :type size: int, optional
+
+    :rtype: Generator[list[dict], None, None]
+    """
+
+    last = None
+    offset = 0
+    limit = size
+
+    while True:
+        page = queryfn(queryOpts={"order": order, "offset": offset,
+                                  "limit": limit})
+
+        if last is None:
+            fresh = page
+
+        elif offset and page and page[0][order] > last:
+            # rows before the offset were deleted since the last
+            # page, so this page may have passed rows not yet seen
+            offset = max(0, offset - size)
+            continue
+
+        else:
+            fresh = [row for row in page if row[order] > last]
+
+        if fresh:
+            yield fresh
+            last = fresh[-1][order]
+
+        if len(page) < limit:
+            break
+
+        # the next page starts at the last row yielded, which anchors
+        # it and is dropped again
+        offset += len(page) - 1
+        limit = size + 1
+
+
+#
+# The end.
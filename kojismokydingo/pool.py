@@ -0,0 +1,252 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Session pools
+
+Sessions cloned from a parent session, for dispatching multicalls to
+a koji hub concurrently.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor
+from koji import ClientSession
+from queue import Queue
+from threading import Lock
+from time import monotonic
+
+from .stats import (
+    _response_bytes, _track_response_bytes, set_call_stats, set_cassette, )
+from .throttle import set_throttle
+from .transport import set_transport
+
+
+__all__ = (
+    "SessionPool",
+    "clone_session",
+    "close_session_pool",
+    "session_pool",
+    "set_bulk_jobs",
+)
+
+
+def clone_session(session):
+    """
+    Creates a new `koji.ClientSession` connected to the same hub as
+    the given session, with the same options. If the given session is
+    logged in, the clone will be associated with a new subsession of
+    it, and will therefore share its authentication. Otherwise the
+    clone will be anonymous.
+
+    The clone has its own connection and call sequence, and so may be
+    used concurrently with the original session. It shares any
+    `kojismokydingo.CallStats`, `kojismokydingo.Throttle`, cassette, or
+    transport associated with the original session.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :rtype: `koji.ClientSession`
+    """
+
+    sinfo = None
+    if session.logged_in:
+        sinfo = session.callMethod("subsession")
+
+    clone = ClientSession(session.baseurl, opts=session.opts, sinfo=sinfo)
+
+    svars = vars(session)
+    if "__transport" in svars:
+        set_transport(clone, *svars["__transport"])
+    if "__cassette" in svars:
+        set_cassette(clone, svars["__cassette"])
+    if "__call_stats" in svars:
+        set_call_stats(clone, svars["__call_stats"])
+    if "__throttle" in svars:
+        set_throttle(clone, svars["__throttle"])
+
+    return clone
+
+
+class SessionPool():
+    """
+    A bounded pool of sessions cloned from a single parent session,
+    paired with a thread pool for dispatching multicalls to them
+    concurrently. Clones are created lazily as they are needed, and
+    never more than `jobs` of them.
+
+    Rather than create instances of this class directly, use the
+    `session_pool` function to obtain the pool associated with a
+    session.
+
+    :param session: the parent koji session
+
+    :type session: `koji.ClientSession`
+
+    :param jobs: maximum number of concurrent multicalls
+
+    :type jobs: int
+    """
+
+    def __init__(self, session, jobs):
+        self.session = session
+        self.jobs = jobs
+
+        self._clones = []
+        self._idle = Queue()
+        self._executor = ThreadPoolExecutor(max_workers=jobs)
+
+        # count of submitted multicalls which haven't finished
+        self._pending = 0
+        self._lock = Lock()
+
+
+    def _multicall(self, calls):
+        clone = self._idle.get()
+        try:
+            start = monotonic()
+            results = clone._callMethod("multiCall", (calls,), {})
+            elapsed = monotonic() - start
+            return results, elapsed, _response_bytes(clone)
+        finally:
+            self._idle.put(clone)
+            with self._lock:
+                self._pending -= 1
+
+
+    def submit(self, calls):
+        """
+        Submits a list of call dicts (as accumulated by a session in
+        multicall mode) to be invoked as a single multicall on one of
+        the pooled sessions.
+
+        The future's result is a tuple of the multicall results, the
+        round-trip time in seconds, and the size of the response in
+        bytes.
+
+        :param calls: list of call dicts with methodName and params
+          keys
+
+        :type calls: list[dict]
+
+        :rtype: `concurrent.futures.Future`
+        """
+
+        # clones are created here rather than in the workers, because
+        # the parent session may only be used from the calling
+        # thread. The idle queue can't tell us whether one is needed,
+        # as the workers may not have taken any clones from it yet, so
+        # there is a clone for each multicall in flight, up to jobs
+        with self._lock:
+            self._pending += 1
+            wanted = self._pending > len(self._clones)
+
+        if wanted and len(self._clones) < self.jobs:
+            clone = clone_session(self.session)
+            _track_response_bytes(clone)
+            self._clones.append(clone)
+            self._idle.put(clone)
+
+        return self._executor.submit(self._multicall, calls)
+
+
+    def close(self):
+        """
+        Shuts down the thread pool, and logs out any cloned
+        sessions. Subsessions are ended via the parent session.
+        """
+
+        self._executor.shutdown(wait=True)
+
+        for clone in self._clones:
+            if clone.logged_in:
+                try:
+                    clone.logout()
+                except Exception:
+                    pass
+            if clone.rsession:
+                clone.rsession.close()
+
+        self._clones = []
+
+
+def session_pool(session, jobs):
+    """
+    Obtain a `SessionPool` associated with the given session, able to
+    dispatch up to `jobs` multicalls concurrently. The pool is cached
+    on the session and re-used, unless the requested number of jobs
+    differs, in which case the old pool is closed and a new one
+    created.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param jobs: maximum number of concurrent multicalls
+
+    :type jobs: int
+
+    :rtype: `SessionPool`
+    """
+
+    pool = vars(session).get("__session_pool")
+    if pool is not None:
+        if pool.jobs == jobs:
+            return pool
+        pool.close()
+
+    pool = vars(session)["__session_pool"] = SessionPool(session, jobs)
+    return pool
+
+
+def close_session_pool(session):
+    """
+    Closes the `SessionPool` associated with the given session, if
+    any.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+    """
+
+    pool = vars(session).pop("__session_pool", None)
+    if pool is not None:
+        pool.close()
+
+
+def set_bulk_jobs(session, jobs):
+    """
+    Sets the default number of concurrent multicalls that the bulk
+    loading functions will use for the given session when not
+    otherwise specified.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param jobs: maximum number of concurrent multicalls. None or 1
+      disables concurrency.
+
+    :type jobs: int, optional
+    """
+
+    vars(session)["__bulk_jobs"] = jobs or 1
+
+
+#
+# The end.
@@ -37,14 +37,19 @@ from collections import OrderedDict
 from functools import partial
 from operator import itemgetter
 
-from .. import BadDingo
+from .. import BadDingo, MulticallBatch, gather_batched, stats_phase
+from ..common import chunkiter
 from .parse import (
     Glob, ItemPath, Matcher, Number, Regex, Symbol, SymbolGroup,
     convert_token, parse_exprs, )
 
 
 __all__ = (
+    "COST_ITEM",
+    "COST_LOCAL",
+    "COST_SET",
     "DEFAULT_SIEVES",
+    "DEFAULT_WINDOW",
 
     "Flagged",
     "Flagger",
@@ -75,6 +80,25 @@ __all__ = (
 )
 
 
+# The cost classes of sieves, from the cheapest to the most
+# expensive. When planning the evaluation of a logic sieve, its cheaper
+# sub-expressions are run first.
+
+# checks only the fields of each info dict
+COST_LOCAL = 0
+
+# makes a fixed number of hub calls, regardless of the count of info
+# dicts
+COST_SET = 1
+
+# makes hub calls for each info dict
+COST_ITEM = 2
+
+
+# count of info dicts sifted together by `Sifter.iter_run`
+DEFAULT_WINDOW = 1000
+
+
 class SifterError(BadDingo):
     # Indicates an problem during the compilation of a Sifter, either
     # due to a syntactic problem or in the initialization of a Sieve
@@ -298,7 +322,8 @@ def gather_args(values):
 
 class Sifter():
 
-    def __init__(self, sieves, source, key="id", params=None):
+    def __init__(self, sieves, source, key="id", params=None,
+                 store=None, plan=True, prefetch=False):
         """
         A flagging data filter, compiled from an s-expression syntax.
 
@@ -327,6 +352,30 @@ class Sifter():
         :param params: Map of text substitutions for quoted strings
 
         :type params: dict[str, str], optional
+
+        :param store: Factory for a record store. When given, each run
+          copies the info dicts into a new store, and sieves and
+          results are given views of the stored records in place of
+          the dicts. Info dicts which are already views are kept
+          as-is. Default, use the info dicts directly
+
+        :type store: type[kojismokydingo.records.RecordStore], optional
+
+        :param plan: Reorder the sub-expressions of the logic sieves
+          so that cheap and selective predicates are evaluated before
+          expensive ones. The results and flags are the same either
+          way. Default, True
+
+        :type plan: bool, optional
+
+        :param prefetch: Before evaluating any sieve, gather the hub
+          data which the sieves will need for their candidate info
+          dicts, with the calls of every sieve sharing the same
+          multicalls. Cheap sieves are evaluated first where they
+          narrow the candidates of an ``(and ...)``. Default, each
+          sieve loads its own data as it is reached
+
+        :type prefetch: bool, optional
         """
 
         if not callable(key):
@@ -334,13 +383,24 @@ class Sifter():
         self.key = key
 
         self.params = params or {}
+        self.store = store
+        self.prefetch = prefetch
 
         # {flagname: set(data_id)}
         self._flags = {}
 
-        # {(cachename, data_id): {}}
+        # {(cachename, key): {}}
         self._cache = {}
 
+        # {(cachename, data_id): {}}
+        self._info_cache = {}
+
+        # {signature: Sieve} of the sieves compiled so far, and the
+        # list of those which have been shared by more than one
+        # expression
+        self._signatures = {}
+        self._shared = []
+
         if not isinstance(sieves, dict):
             # convert a list of sieves into a dict mapping the sieve
             # names and their aliases to the classes
@@ -356,6 +416,10 @@ class Sifter():
         exprs = self._compile(source) if source else []
         self._exprs = ensure_all_sieve(exprs)
 
+        if plan:
+            for expr in self._exprs:
+                expr.plan()
+
 
     def sieve_exprs(self):
         """
@@ -373,6 +437,16 @@ class Sifter():
         return [self._convert(p) for p in parse_exprs(source)]
 
 
+    def _records(self, info_dicts):
+        """
+        The info dicts, as views from a new store if this Sifter was
+        given a store factory
+        """
+
+        store = self.store
+        return info_dicts if store is None else store().records(info_dicts)
+
+
     def _convert_sieve_aliases(self, sym, args):
         """
         When there is no sieve with a matchin name for sym, we check if it
@@ -405,6 +479,39 @@ class Sifter():
             return sym, args
 
 
+    def _share(self, sieve):
+        """
+        Finds the sieve with the same signature which was compiled
+        earlier, and if there is one, shares it in place of the given
+        sieve. A shared sieve remembers its result for each info dict
+        over the course of a run, so that its work is done only once.
+
+        :rtype: Sieve
+        """
+
+        sig = sieve.signature()
+        if sig is None:
+            return sieve
+
+        found = self._signatures.setdefault(sig, sieve)
+        if found is not sieve:
+            self._memoize(found)
+
+        return found
+
+
+    def _memoize(self, sieve):
+        """
+        Has the given sieve remember its result for each info dict
+        over the course of a run, as a shared sieve does. The sieve
+        must be pure and cacheable.
+        """
+
+        if sieve.memo is None:
+            sieve.memo = {}
+            self._shared.append(sieve)
+
+
     def _convert(self, parsed):
         """
         Takes the simple parse tree and turns it into a series of nested
@@ -450,6 +557,8 @@ class Sifter():
                 msg = "Error creating Sieve %s: %s" % (name, te)
                 raise SifterError(msg)
 
+            result = self._share(result)
+
         elif isinstance(parsed, Symbol):
             if parsed.startswith("$") and parsed[1:] in self.params:
                 # this is a parameter reference, and should be
@@ -482,14 +591,24 @@ class Sifter():
         """
 
         self._flags.clear()
+        self._clear_shared()
 
         key = self.key
-        data = OrderedDict((key(b), b) for b in info_dicts if b)
+        data = OrderedDict((key(b), b) for b in self._records(info_dicts)
+                           if b)
         work = tuple(data.values())
 
+        if self.prefetch and work:
+            with stats_phase(session, "sieve prefetch"):
+                self._prefetch(session, work)
+
         for expr in self._exprs:
             autoflag = not isinstance(expr, Flagger)
-            for binfo in expr(session, work):
+
+            with stats_phase(session, "sieve %s" % expr.name):
+                matched = expr(session, work)
+
+            for binfo in matched:
                 if autoflag:
                     self.set_flag("default", binfo)
 
@@ -500,6 +619,83 @@ class Sifter():
         return results
 
 
+    def iter_run(self, session, info_dicts, window=DEFAULT_WINDOW):
+        """
+        Generator which runs the contained sieves over windows of the
+        given info_dicts, yielding the results of each window as they
+        are found, in the same form as `run` provides them.
+
+        The info_dicts are only read as each window is needed, so an
+        iterable of unbounded length may be sifted in bounded memory.
+        The caches kept by sieves, such as of the latest builds of a
+        tag, are kept from one window to the next, but those of each
+        info dict are discarded along with its window. Flags are also
+        set per window, and info dicts are only deduplicated within
+        their window.
+
+        :param info_dicts: the info dicts to sift
+
+        :type info_dicts: Iterable[dict]
+
+        :param window: the count of info dicts in each window. Default,
+          `DEFAULT_WINDOW`
+
+        :type window: int, optional
+
+        :rtype: Generator[dict[str,list[dict]]]
+        """
+
+        for work in chunkiter(filter(None, info_dicts), window):
+            try:
+                yield self.run(session, work)
+            finally:
+                self._flags.clear()
+                self._info_cache.clear()
+                self._clear_shared()
+
+
+    def _prefetch(self, session, info_dicts):
+        """
+        Gathers the data needed by each sieve for its candidate info
+        dicts, sharing a single `kojismokydingo.MulticallBatch`
+        """
+
+        found = OrderedDict()
+        for expr in self._exprs:
+            expr.candidates(session, info_dicts, found)
+
+        batch = MulticallBatch(session)
+        gatherers = []
+        for sieve, wanted in found.items():
+            gatherer = sieve.gather(session, tuple(wanted.values()), batch)
+            if gatherer is not None:
+                gatherers.append(gatherer)
+
+        gather_batched(batch, gatherers)
+
+
+    async def async_run(self, session, info_dicts):
+        """
+        Coroutine which invokes `run` in a worker thread of the event
+        loop's default executor, and provides its results.
+
+        The sieves are still evaluated synchronously, and the session
+        is used from the worker thread. It therefore must not be a
+        session which is in use elsewhere, such as the session wrapped
+        by a `kojismokydingo.aio.AsyncSession`. A session from
+        `kojismokydingo.clone_session` is suitable.
+
+        :rtype: dict[str,list[dict]]
+        """
+
+        # asyncio is costly to import, and only needed here
+        import asyncio
+
+        work = tuple(info_dicts)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.run, session, work)
+
+
     def __call__(self, session, info_dicts):
         """
         Invokes run if there are any elements in info_dicts sequence. If
@@ -509,17 +705,24 @@ class Sifter():
         invoked on any of the sieves.
         """
 
-        work = tuple(info_dicts)
+        work = tuple(self._records(info_dicts))
         return self.run(session, work) if work else {}
 
 
+    def _clear_shared(self):
+        for sieve in self._shared:
+            sieve.memo.clear()
+
+
     def reset(self):
         """
         Clears flags and data caches
         """
 
         self._cache.clear()
+        self._info_cache.clear()
         self._flags.clear()
+        self._clear_shared()
 
 
     def is_flagged(self, flagname, data):
@@ -566,10 +769,82 @@ class Sifter():
         """
         Cache associated with a particular info dict.
 
-        This data is cleared when the `reset` method is invoked
+        This data is cleared when the `reset` method is invoked, or
+        when `iter_run` is done with the window holding the info dict
         """
 
-        return self.get_cache(cachename, self.key(data))
+        cachekey = (cachename, self.key(data))
+        cch = self._info_cache.get(cachekey)
+        if cch is None:
+            cch = self._info_cache[cachekey] = OrderedDict()
+        return cch
+
+
+def _all_of(predicates):
+    # a predicate which passes info dicts that pass all of the given
+    # predicates. The common small cases avoid the loop.
+
+    count = len(predicates)
+
+    if count == 1:
+        return predicates[0]
+
+    elif count == 2:
+        first, second = predicates
+        return lambda info: first(info) and second(info)
+
+    elif count == 3:
+        first, second, third = predicates
+        return lambda info: first(info) and second(info) and third(info)
+
+    def fused(info):
+        for pred in predicates:
+            if not pred(info):
+                return False
+        return True
+
+    return fused
+
+
+def _any_of(predicates):
+    # a predicate which passes info dicts that pass any of the given
+    # predicates. The common small cases avoid the loop.
+
+    count = len(predicates)
+
+    if count == 1:
+        return predicates[0]
+
+    elif count == 2:
+        first, second = predicates
+        return lambda info: first(info) or second(info)
+
+    elif count == 3:
+        first, second, third = predicates
+        return lambda info: first(info) or second(info) or third(info)
+
+    def fused(info):
+        for pred in predicates:
+            if pred(info):
+                return True
+        return False
+
+    return fused
+
+
+def _fused_filter(pred, session, info_dicts):
+    # a step of a logic sieve which applies a fused predicate
+    return tuple(filter(pred, info_dicts))
+
+
+def _signature(value):
+    # a hashable key for a sieve or one of its arguments, which is
+    # equal for equal values
+
+    if isinstance(value, Sieve):
+        return value.signature()
+    else:
+        return (type(value), repr(value))
 
 
 class Sieve(metaclass=ABCMeta):
@@ -607,6 +882,23 @@ class Sieve(metaclass=ABCMeta):
 
     aliases = ()
 
+    # hints for the planner. The cost class of running this sieve, the
+    # expected fraction of info dicts which it matches, and whether it
+    # is free of side effects, such as the setting of flags. Sieves
+    # which aren't pure are never reordered.
+    cost = COST_ITEM
+    selectivity = 0.5
+    pure = True
+
+    # whether this sieve gives the same result for an info dict each
+    # time it is checked during a run. Sieves which are pure and
+    # cacheable may be shared between the expressions which use them.
+    cacheable = True
+
+    # the results by info dict key for the current run, if this sieve
+    # is shared
+    memo = None
+
 
     def __init__(self, sifter, *tokens, **options):
         self.sifter = sifter
@@ -617,7 +909,23 @@ class Sieve(metaclass=ABCMeta):
 
     def __call__(self, session, info_dicts):
         work = tuple(info_dicts)
-        return tuple(self.run(session, work)) if work else work
+        memo = self.memo
+
+        if not work or memo is None:
+            return tuple(self.run(session, work)) if work else work
+
+        # only run on the info dicts which haven't been seen by this
+        # sieve during the current run
+        key = self.key
+        needed = [b for b in work if key(b) not in memo]
+
+        if needed:
+            found = set(map(key, self.run(session, needed)))
+            for b in needed:
+                bid = key(b)
+                memo[bid] = bid in found
+
+        return tuple(b for b in work if memo[key(b)])
 
 
     def __repr__(self):
@@ -633,6 +941,107 @@ class Sieve(metaclass=ABCMeta):
             return "".join(("(", self.name, ")"))
 
 
+    def signature(self):
+        """
+        A hashable key which is equal for sieves that will always give
+        the same results, or None if this sieve mustn't be shared. The
+        `Sifter` compiles the sieves with equal signatures into a
+        single shared sieve.
+
+        The default signature is made from the class, the tokens, and
+        the options. Sieves which keep other arguments must override
+        this to include them.
+
+        :rtype: tuple or None
+        """
+
+        if not (self.pure and self.cacheable):
+            return None
+
+        found = [_signature(tok) for tok in self.tokens]
+        found.extend((key, _signature(val))
+                     for key, val in sorted(self.options.items()))
+
+        if None in found:
+            return None
+        return (type(self), tuple(found))
+
+
+    def predicate(self, session):
+        """
+        A function which is given an info dict and returns True if this
+        sieve would pass it, or None if this sieve must be run over
+        the whole sequence of info dicts. Logic sieves fuse the
+        predicates of their sub-expressions into a single pass over
+        the info dicts.
+
+        The default is the `check` method, for pure sieves with a cost
+        of `COST_LOCAL` that override neither `prep` nor `run`.
+
+        :rtype: Callable[[dict], bool] or None
+        """
+
+        cls = type(self)
+        if self.cost == COST_LOCAL and self.pure and \
+           cls.prep is Sieve.prep and cls.run is Sieve.run:
+            return partial(self.check, session)
+        else:
+            return None
+
+
+    def gather(self, session, info_dicts, batch):
+        """
+        Override to gather the hub data which `prep` would load for the
+        given info dicts, by queueing calls on the batch.
+
+        Returns a generator as used by `kojismokydingo.gather_batched`,
+        which yields whenever it needs the results of the calls it has
+        queued so far, or None if there is nothing to gather. The
+        prep method should then find the data already present. This
+        allows the `Sifter` to load the data for all of its sieves in
+        shared multicalls before running any of them.
+
+        :type info_dicts: list[dict]
+
+        :type batch: `kojismokydingo.MulticallBatch`
+
+        :rtype: Generator or None
+        """
+
+        return None
+
+
+    def candidates(self, session, info_dicts, found):
+        """
+        Records the info dicts which this sieve, and any sieves within
+        it, may be given during a run. Used by the `Sifter` to decide
+        what to `gather` before running any sieves.
+
+        :type info_dicts: list[dict]
+
+        :param found: the candidate info dicts by key for each sieve
+
+        :type found: dict[Sieve, dict]
+        """
+
+        if type(self).gather is not Sieve.gather:
+            key = self.key
+            wanted = found.get(self)
+            if wanted is None:
+                wanted = found[self] = OrderedDict()
+            wanted.update((key(b), b) for b in info_dicts)
+
+
+    def plan(self):
+        """
+        Override to decide the order in which any sub-expressions will
+        be evaluated. Invoked once by the `Sifter` after compiling the
+        sieve, if planning is enabled.
+        """
+
+        pass
+
+
     def check(self, session, info):
         """
         Override to return True if the predicate matches the given
@@ -739,6 +1148,26 @@ class IntStrSieve(Sieve):
 
 
 class Logic(Sieve, metaclass=ABCMeta):
+    """
+    Base class for sieves which combine the results of their
+    sub-expressions.
+
+    The sub-expressions are evaluated in the order given by the
+    `planned` attribute, which is initially the same as the order of
+    the `tokens`. The `plan` method reorders them by their cost class
+    and then by the `plan_key` of the subclass, except that no
+    sub-expression is moved past one which isn't pure.
+
+    Each sub-expression is only given the info dicts which are still
+    undecided after those evaluated before it. For ``and`` that is
+    the info dicts which every earlier sub-expression matched, and
+    for ``or`` and ``not`` it is those which none of them matched. So
+    the info dicts given to a sieve's `prep` and `check` depend upon
+    the planned order, and may be only a subset of those given to the
+    logic sieve. A pure sieve matches the same info dicts however
+    few it is given, so the combined results are the same whatever
+    the order, and keep the order of the input.
+    """
 
     check = None
 
@@ -746,6 +1175,144 @@ class Logic(Sieve, metaclass=ABCMeta):
     def __init__(self, sifter, *exprs):
         exprs = ensure_all_sieve(exprs)
         super().__init__(sifter, *exprs)
+        self.planned = self.tokens
+
+
+    @property
+    def cost(self):
+        return max((expr.cost for expr in self.tokens), default=COST_LOCAL)
+
+
+    @property
+    def pure(self):
+        return all(expr.pure for expr in self.tokens)
+
+
+    @property
+    def cacheable(self):
+        return all(expr.cacheable for expr in self.tokens)
+
+
+    def merges(self, expr):
+        """
+        True if the sub-expressions of expr may be merged into those
+        of this sieve without changing its results. Used to normalize
+        the `signature`
+
+        :rtype: bool
+        """
+
+        return type(expr) is type(self)
+
+
+    def fuse(self, predicates):
+        """
+        A single predicate combining the predicates of the
+        sub-expressions, as this sieve would
+
+        :rtype: Callable[[dict], bool]
+        """
+
+        return _any_of(predicates)
+
+
+    def predicate(self, session):
+        if not self.pure:
+            return None
+
+        found = [expr.predicate(session) for expr in self.planned]
+        if None in found:
+            return None
+        return self.fuse(found)
+
+
+    def steps(self, session):
+        """
+        The planned sub-expressions, with each run of those which have a
+        `predicate` fused into a single step. Each step is called
+        with the session and the info dicts, as a sieve would be.
+
+        :rtype: list[Callable]
+        """
+
+        steps = []
+        pending = []
+
+        for expr in self.planned:
+            pred = expr.predicate(session)
+            if pred is not None:
+                pending.append(pred)
+                continue
+
+            if pending:
+                steps.append(partial(_fused_filter, self.fuse(pending)))
+                pending = []
+            steps.append(expr)
+
+        if pending:
+            steps.append(partial(_fused_filter, self.fuse(pending)))
+
+        return steps
+
+
+    def candidates(self, session, info_dicts, found):
+        for expr in self.planned:
+            expr.candidates(session, info_dicts, found)
+
+
+    def _members(self):
+        found = set()
+        for expr in self.tokens:
+            if self.merges(expr):
+                found.update(expr._members())
+            else:
+                found.add(expr.signature())
+        return found
+
+
+    def signature(self):
+        # the order of the sub-expressions doesn't alter the results,
+        # so neither does it alter the signature
+
+        if not (self.pure and self.cacheable):
+            return None
+
+        found = self._members()
+        if None in found:
+            return None
+        return (type(self), frozenset(found))
+
+
+    def plan_key(self, expr):
+        """
+        The sort key for a sub-expression within its cost class, from
+        the sub-expression to evaluate first to the last
+
+        :rtype: float
+        """
+
+        return 0
+
+
+    def plan(self):
+        planned = []
+        pending = []
+
+        def key(expr):
+            return (expr.cost, self.plan_key(expr))
+
+        for expr in self.tokens:
+            expr.plan()
+
+            if expr.pure:
+                pending.append(expr)
+            else:
+                planned.extend(sorted(pending, key=key))
+                planned.append(expr)
+                pending = []
+
+        planned.extend(sorted(pending, key=key))
+        self.planned = tuple(planned)
 
 
 class LogicAnd(Logic):
@@ -758,13 +1325,49 @@ class LogicAnd(Logic):
     name = "and"
 
 
+    @property
+    def selectivity(self):
+        found = 1.0
+        for expr in self.tokens:
+            found *= expr.selectivity
+        return found
+
+
+    def plan_key(self, expr):
+        # the sub-expressions which discard the most go first
+        return expr.selectivity
+
+
+    def fuse(self, predicates):
+        return _all_of(predicates)
+
+
+    def candidates(self, session, info_dicts, found):
+        work = info_dicts
+
+        for expr in self.planned:
+            if not work:
+                break
+
+            if expr.cost < COST_ITEM and expr.pure and expr.cacheable:
+                # cheap enough to evaluate now, so that the later
+                # sub-expressions only gather for the info dicts
+                # which remain. Unless it is only local, its results
+                # are remembered so the run doesn't repeat its work
+                if expr.cost > COST_LOCAL:
+                    self.sifter._memoize(expr)
+                work = expr(session, work)
+            else:
+                expr.candidates(session, work, found)
+
+
     def run(self, session, info_dicts):
         work = info_dicts
 
-        for expr in self.tokens:
+        for step in self.steps(session):
             if not work:
                 break
-            work = expr(session, work)
+            work = step(session, work)
 
         return work
 
@@ -779,20 +1382,41 @@ class LogicOr(Logic):
     name = "or"
 
 
+    @property
+    def selectivity(self):
+        missed = 1.0
+        for expr in self.tokens:
+            missed *= 1.0 - expr.selectivity
+        return 1.0 - missed
+
+
+    def plan_key(self, expr):
+        # the sub-expressions which match the most go first, leaving
+        # less work for the rest
+        return -expr.selectivity
+
+
     def run(self, session, info_dicts):
+        fused = self.predicate(session)
+        if fused is not None:
+            return filter(fused, info_dicts)
+
         work = OrderedDict((self.key(b), b) for b in info_dicts)
-        results = OrderedDict()
+        ordered = tuple(work.items())
+        matched = set()
 
-        for expr in self.tokens:
+        for step in self.steps(session):
             if not work:
                 break
 
-            for b in expr(session, work.values()):
+            for b in step(session, work.values()):
                 bid = self.key(b)
                 del work[bid]
-                results[bid] = b
+                matched.add(bid)
 
-        return results.values()
+        # the results keep the order of the input, regardless of which
+        # sub-expression matched them
+        return [b for bid, b in ordered if bid in matched]
 
 
 class LogicNot(Logic):
@@ -806,14 +1430,42 @@ class LogicNot(Logic):
     aliases = ("!", )
 
 
+    def merges(self, expr):
+        # (not (or A B)) is the same as (not A B)
+        return type(expr) is LogicOr
+
+
+    def predicate(self, session):
+        found = super().predicate(session)
+        return found and (lambda info: not found(info))
+
+
+    @property
+    def selectivity(self):
+        missed = 1.0
+        for expr in self.tokens:
+            missed *= 1.0 - expr.selectivity
+        return missed
+
+
+    def plan_key(self, expr):
+        # the sub-expressions which match the most go first, leaving
+        # less work for the rest
+        return -expr.selectivity
+
+
     def run(self, session, info_dicts):
+        fused = self.predicate(session)
+        if fused is not None:
+            return filter(fused, info_dicts)
+
         work = OrderedDict((self.key(b), b) for b in info_dicts)
 
-        for expr in self.tokens:
+        for step in self.steps(session):
             if not work:
                 break
 
-            for b in expr(session, work.values()):
+            for b in step(session, work.values()):
                 del work[self.key(b)]
 
         return work.values()
@@ -828,6 +1480,7 @@ class Flagger(LogicAnd):
     """
 
     name = "flag"
+    pure = False
 
 
     def __init__(self, sifter, flag, *exprs):
@@ -885,6 +1538,11 @@ class Flagged(VariadicSieve):
     name = "flagged"
     aliases = ("?", )
 
+    cost = COST_LOCAL
+
+    # the flags are set as the run progresses
+    cacheable = False
+
 
     def __init__(self, sifter, name):
         super().__init__(sifter, ensure_symbol(name))
@@ -910,11 +1568,21 @@ class ItemSieve(VariadicSieve, metaclass=ABCMeta):
     given field key exists and is not None.
     """
 
+    cost = COST_LOCAL
+
+
     @abstractproperty
     def field(self):
         pass
 
 
+    @property
+    def selectivity(self):
+        # most info dicts have a value for any given field, but few
+        # will match a particular pattern
+        return 0.9 if self.token is None else 0.2
+
+
     def __init__(self, sifter, pattern=None):
         if pattern is not None:
             pattern = ensure_matcher(pattern)
@@ -929,6 +1597,19 @@ class ItemSieve(VariadicSieve, metaclass=ABCMeta):
                     (self.token == info[self.field]))
 
 
+    def predicate(self, session):
+        if type(self).check is not ItemSieve.check:
+            return super().predicate(session)
+
+        field = self.field
+        token = self.token
+
+        if token is None:
+            return lambda info: info.get(field) is not None
+        else:
+            return lambda info: field in info and token == info[field]
+
+
     def __repr__(self):
         if self.token is None:
             return "".join(("(", self.name, ")"))
@@ -946,6 +1627,8 @@ class ItemPathSieve(Sieve):
 
     name = "item"
 
+    cost = COST_LOCAL
+
 
     def __init__(self, sifter, path, *values):
         if not isinstance(path, ItemPath):
@@ -957,6 +1640,11 @@ class ItemPathSieve(Sieve):
         self.path = path
 
 
+    def signature(self):
+        found = super().signature()
+        return found and found + (_signature(self.path), )
+
+
     def check(self, _session, data):
         work = self.path.get(data)
 
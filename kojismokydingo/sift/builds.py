@@ -28,19 +28,22 @@ from koji import BUILD_STATES
 from operator import itemgetter
 
 from . import (
-    DEFAULT_SIEVES,
+    COST_ITEM, COST_LOCAL, COST_SET, DEFAULT_SIEVES,
     IntStrSieve, ItemSieve, MatcherSieve, Number, Sieve,
     Sifter, SifterError, VariadicSieve,
     ensure_int_or_str, ensure_str, ensure_symbol, )
 from .common import ensure_comparison, CacheMixin
 from .. import (
+    MulticallBatch,
     as_taginfo, bulk_load_builds, bulk_load_tags, bulk_load_users,
-    iter_bulk_load, )
+    gather_batched, )
 from ..builds import (
     BuildNEVRCompare,
-    build_dedup, decorate_builds_btypes, decorate_builds_cg_list,
-    decorate_builds_maven, gather_rpm_sigkeys, gavgetter, )
+    batch_decorate_builds_btypes, batch_decorate_builds_cg_list,
+    batch_gather_rpm_sigkeys, build_dedup, decorate_builds_maven,
+    gavgetter, )
 from ..common import rpm_evr_compare, unique
+from ..records import BuildStore
 from ..tags import gather_tag_ids
 
 
@@ -153,6 +156,8 @@ class StateSieve(Sieve):
 
     name = "state"
 
+    cost = COST_LOCAL
+
 
     def __init__(self, sifter, name, *names):
         super().__init__(sifter, name, *names)
@@ -190,6 +195,9 @@ class OwnerSieve(IntStrSieve):
 
     name = "owner"
 
+    cost = COST_SET
+    selectivity = 0.2
+
 
     def __init__(self, sifter, user, *users):
         super().__init__(sifter, user, *users)
@@ -215,6 +223,9 @@ class ImportedSieve(Sieve):
 
     name = "imported"
 
+    cost = COST_LOCAL
+    selectivity = 0.2
+
 
     def check(self, session, binfo):
         return not binfo.get("task_id")
@@ -232,6 +243,9 @@ class EVRCompare(Sieve):
     * ``<=``
     """
 
+    cost = COST_LOCAL
+
+
     def __init__(self, sifter, version):
         version = ensure_str(version)
         super().__init__(sifter, version)
@@ -390,6 +404,44 @@ class EVRCompareLE(EVRCompare):
     name = "<="
 
 
+def _prep_gathered(sieve, session, binfos):
+    # runs the sieve's gather by itself, for whichever of the binfos
+    # weren't covered by a prefetch
+
+    batch = MulticallBatch(session)
+    gatherer = sieve.gather(session, binfos, batch)
+    if gatherer is not None:
+        gather_batched(batch, [gatherer])
+
+
+def _gather_tags(sieve, binfos, batch):
+    # queues listTags for the builds whose tags aren't in the shared
+    # "tagged" caches, and which no other gatherer has already queued
+
+    needed = {}
+    for binfo in binfos:
+        cache = sieve.sifter.get_info_cache("tagged", binfo)
+        if "tag_names" not in cache and "tags_pending" not in cache:
+            cache["tags_pending"] = True
+            bid = binfo["id"]
+            needed[bid] = (cache, batch.call("listTags", build=bid))
+
+    if not needed:
+        return
+
+    try:
+        yield
+
+        for cache, fut in needed.values():
+            tags = fut.result()
+            cache["tag_names"] = [t["name"] for t in tags]
+            cache["tag_ids"] = [t["id"] for t in tags]
+
+    finally:
+        for cache, _fut in needed.values():
+            cache.pop("tags_pending", None)
+
+
 class TaggedSieve(MatcherSieve):
     """
     usage: (tagged [TAG...])
@@ -403,20 +455,15 @@ class TaggedSieve(MatcherSieve):
 
     name = "tagged"
 
+    cost = COST_ITEM
 
-    def prep(self, session, binfos):
 
-        needed = {}
-        for binfo in binfos:
-            cache = self.get_info_cache(binfo)
-            if "tag_names" not in cache:
-                needed[binfo["id"]] = cache
+    def gather(self, session, binfos, batch):
+        return _gather_tags(self, binfos, batch)
 
-        fn = lambda i: session.listTags(build=i)
-        for bid, tags in iter_bulk_load(session, fn, needed):
-            cache = needed[bid]
-            cache["tag_names"] = [t["name"] for t in tags]
-            cache["tag_ids"] = [t["id"] for t in tags]
+
+    def prep(self, session, binfos):
+        _prep_gathered(self, session, binfos)
 
 
     def check(self, session, binfo):
@@ -450,6 +497,8 @@ class InheritedSieve(IntStrSieve):
 
     name = "inherited"
 
+    cost = COST_ITEM
+
 
     def __init__(self, sifter, tagname, *tagnames):
         super().__init__(sifter, tagname, *tagnames)
@@ -461,22 +510,15 @@ class InheritedSieve(IntStrSieve):
         return self.sifter.get_info_cache("tagged", binfo)
 
 
+    def gather(self, session, binfos, batch):
+        return _gather_tags(self, binfos, batch)
+
+
     def prep(self, session, binfos):
         if self.tag_ids is None:
             self.tag_ids = gather_tag_ids(session, deep=self.tokens)
 
-        needed = {}
-        for binfo in binfos:
-            cache = self.get_info_cache(binfo)
-            if "tag_names" not in cache:
-                needed[binfo["id"]] = cache
-
-        if needed:
-            fn = lambda i: session.listTags(build=i)
-            for bid, tags in iter_bulk_load(session, fn, needed):
-                cache = needed[bid]
-                cache["tag_names"] = [t["name"] for t in tags]
-                cache["tag_ids"] = [t["id"] for t in tags]
+        _prep_gathered(self, session, binfos)
 
 
     def check(self, session, binfo):
@@ -492,6 +534,9 @@ class InheritedSieve(IntStrSieve):
 
 class PkgListSieve(IntStrSieve, CacheMixin):
 
+    cost = COST_SET
+
+
     def __init__(self, sifter, tagname, *tagnames):
         super().__init__(sifter, tagname, *tagnames)
         self.tag_ids = None
@@ -585,13 +630,19 @@ class TypeSieve(MatcherSieve):
 
     name = "type"
 
+    cost = COST_ITEM
+
 
     def __init__(self, sifter, btype, *btypes):
         super().__init__(sifter, btype, *btypes)
 
 
+    def gather(self, session, binfos, batch):
+        return batch_decorate_builds_btypes(batch, binfos)
+
+
     def prep(self, session, binfos):
-        decorate_builds_btypes(session, binfos)
+        _prep_gathered(self, session, binfos)
 
 
     def check(self, session, binfo):
@@ -615,9 +666,16 @@ class CGImportedSieve(MatcherSieve):
 
     name = "cg-imported"
 
+    cost = COST_ITEM
+    selectivity = 0.1
+
+
+    def gather(self, session, binfos, batch):
+        return batch_decorate_builds_cg_list(batch, binfos)
+
 
     def prep(self, session, binfos):
-        decorate_builds_cg_list(session, binfos)
+        _prep_gathered(self, session, binfos)
 
 
     def check(self, session, binfo):
@@ -645,6 +703,9 @@ class LatestSieve(IntStrSieve, CacheMixin):
 
     name = "latest"
 
+    cost = COST_SET
+    selectivity = 0.2
+
 
     def __init__(self, sifter, tagname, *tagnames):
         super().__init__(sifter, tagname, *tagnames)
@@ -683,6 +744,9 @@ class LatestMavenSieve(IntStrSieve, CacheMixin):
 
     name = "latest-maven"
 
+    cost = COST_ITEM
+    selectivity = 0.2
+
 
     def __init__(self, sifter, tagname, *tagnames):
         super().__init__(sifter, tagname, *tagnames)
@@ -730,8 +794,10 @@ class SignedSieve(MatcherSieve):
 
     name = "signed"
 
+    cost = COST_ITEM
 
-    def prep(self, session, binfos):
+
+    def gather(self, session, binfos, batch):
         needed = {}
         for binfo in binfos:
             cache = self.get_info_cache(binfo)
@@ -741,13 +807,19 @@ class SignedSieve(MatcherSieve):
         if not needed:
             return
 
-        for bid, sigs in gather_rpm_sigkeys(session, needed).items():
+        sigkeys = yield from batch_gather_rpm_sigkeys(batch, needed)
+
+        for bid, sigs in sigkeys.items():
             # we need to drop the unsigned key, which is an empty
             # string
             cache = needed[bid]
             cache["rpmsigs"] = list(filter(None, sigs)) or None
 
 
+    def prep(self, session, binfos):
+        _prep_gathered(self, session, binfos)
+
+
     def check(self, session, binfo):
         want_keys = self.tokens
         build_keys = self.get_info_cache(binfo).get("rpmsigs")
@@ -783,6 +855,9 @@ class CompareLatestSieve(CacheMixin):
     `comparison_key` method.
     """
 
+    cost = COST_SET
+
+
     def __init__(self, sifter, comparison, tag):
         op = ensure_comparison(comparison)
         tag = ensure_int_or_str(tag)
@@ -936,7 +1011,7 @@ def build_info_sieves():
     return sieves
 
 
-def build_info_sifter(source, params=None):
+def build_info_sifter(source, params=None, compact=False, prefetch=False):
     """
     Create a Sifter from the source using the default build-info
     Sieves.
@@ -944,10 +1019,20 @@ def build_info_sifter(source, params=None):
     :param source: sieve expressions source
     :type source: stream or str
 
+    :param compact: keep the build infos being sifted in a
+      `kojismokydingo.records.BuildStore`
+    :type compact: bool, optional
+
+    :param prefetch: gather the data for all of the sieves in shared
+      multicalls before running them
+    :type prefetch: bool, optional
+
     :rtype: Sifter
     """
 
-    return Sifter(build_info_sieves(), source, "id", params)
+    store = BuildStore if compact else None
+    return Sifter(build_info_sieves(), source, "id", params, store,
+                  prefetch=prefetch)
 
 
 def sift_builds(session, src_str, build_infos, params=None):
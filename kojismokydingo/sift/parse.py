@@ -26,6 +26,7 @@ import re
 
 from abc import ABCMeta
 from codecs import decode
+from collections.abc import Mapping
 from fnmatch import translate
 from functools import partial
 from io import StringIO
@@ -290,7 +291,7 @@ class ItemMatch(Item):
     """
 
     def get(self, d):
-        if isinstance(d, dict):
+        if isinstance(d, Mapping):
             data = d.items()
         else:
             data = enumerate(d)
@@ -311,7 +312,7 @@ class AllItems(Item):
 
 
     def get(self, d):
-        if isinstance(d, dict):
+        if isinstance(d, Mapping):
             return d.values()
         else:
             return iter(d)
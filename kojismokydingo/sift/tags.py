@@ -27,7 +27,7 @@ from abc import abstractmethod
 from operator import itemgetter
 
 from . import (
-    DEFAULT_SIEVES,
+    COST_LOCAL, DEFAULT_SIEVES,
     IntStrSieve, ItemSieve, MatcherSieve, Sieve, Sifter,
     SymbolSieve, VariadicSieve,
     ensure_int_or_str, ensure_str, ensure_symbol, )
@@ -94,6 +94,8 @@ class ArchSieve(MatcherSieve):
 
     name = "arch"
 
+    cost = COST_LOCAL
+
 
     def prep(self, session, taginfos):
         for tag in taginfos:
@@ -133,12 +135,19 @@ class ExactArchSieve(SymbolSieve):
 
     name = "exact-arch"
 
+    cost = COST_LOCAL
+
 
     def get_info_cache(self, tinfo):
         # let's use the same caches that the ArchSieve uses
         return self.sifter.get_info_cache("arch", tinfo)
 
 
+    # and fill them the same way, rather than relying on an arch
+    # sieve having been run first
+    prep = ArchSieve.prep
+
+
     def check(self, session, taginfo):
         wanted = self.tokens
 
@@ -167,6 +176,9 @@ class LockedSieve(Sieve):
 
     name = "locked"
 
+    cost = COST_LOCAL
+    selectivity = 0.2
+
 
     def __init__(self, sifter):
         super().__init__(sifter)
@@ -189,6 +201,8 @@ class PermissionSieve(MatcherSieve):
 
     name = "permission"
 
+    cost = COST_LOCAL
+
 
     def check(self, session, taginfo):
         return (taginfo["perm"] in self.tokens or
@@ -731,6 +745,11 @@ class GroupPkgSieve(SymbolSieve, CacheMixin):
         self.require_all = bool(require_all)
 
 
+    def signature(self):
+        found = super().signature()
+        return found and found + (self.group, )
+
+
     def prep(self, session, taginfos):
 
         needed = {}
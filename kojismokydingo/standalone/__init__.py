@@ -26,10 +26,13 @@ into a stand-alone console_script entry point.
 import sys
 
 from argparse import ArgumentParser
+from contextlib import ExitStack
 from koji import GenericError
 from os.path import basename
 
-from .. import AnonClientSession, BadDingo, ProfileClientSession
+from .. import (
+    AnonClientSession, BadDingo, CallStats, IdentityMap,
+    ProfileClientSession, set_cassette, set_identity_map, )
 from ..cli import AnonSmokyDingo, SmokyDingo, printerr
 
 
@@ -57,7 +60,9 @@ class LonelyDingo(SmokyDingo):
         invoke = basename(sys.argv[0])
         argp = ArgumentParser(prog=invoke, description=self.description)
         argp = self.profile_arguments(argp) or argp
-        return self.arguments(argp) or argp
+        argp = self.arguments(argp) or argp
+        argp = self.session_arguments(argp) or argp
+        return self.diagnostic_arguments(argp) or argp
 
 
     def profile_arguments(self, parser):
@@ -75,16 +80,28 @@ class LonelyDingo(SmokyDingo):
 
 
     def __call__(self, args=None):
-        parser = self.parser()
-        options = parser.parse_args(args)
+        self.stats = stats = CallStats()
 
-        self.validate(parser, options)
+        with stats.phase("parse"):
+            parser = self.parser()
+            options = parser.parse_args(args)
+
+            self.validate(parser, options)
 
         try:
-            with self.create_session(options.profile) as session:
-                self.session = session
-                self.pre_handle(options)
-                return self.handle(options) or 0
+            with self.diagnostics(options), ExitStack() as managed:
+                with stats.phase("activate"):
+                    session = self.create_session(options.profile)
+                    if self.cassette is not None:
+                        set_cassette(session, self.cassette)
+                    self.session = managed.enter_context(session)
+                    self.configure_session(options)
+
+                with stats.phase("pre_handle"):
+                    self.pre_handle(options)
+
+                with self.handle_phase(options):
+                    return self.handle(options) or 0
 
         except KeyboardInterrupt:
             printerr()
@@ -120,5 +137,13 @@ class AnonLonelyDingo(LonelyDingo):
         return AnonClientSession(options)
 
 
+    def configure_session(self, options):
+        super().configure_session(options)
+
+        # we won't be modifying anything, so there's no harm in
+        # remembering what we've loaded for the life of the command
+        set_identity_map(self.session, IdentityMap())
+
+
 #
 # The end.
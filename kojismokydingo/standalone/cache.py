@@ -0,0 +1,182 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Standalone cache command
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:licence: GPL v3
+"""
+
+
+from itertools import chain
+from koji import BUILD_STATES
+
+from . import AnonLonelyDingo
+from .. import (
+    bulk_load_build_archives, bulk_load_build_rpms,
+    bulk_load_buildroots, bulk_load_builds, set_bulk_cache, )
+from ..cache import BulkCache, DEFAULT_MAX_BYTES
+from ..cli import read_clean_lines, tabulate
+
+
+__all__ = (
+    "LonelyCache",
+    "cli_cache_prune",
+    "cli_cache_show",
+    "cli_cache_warm",
+    "ksd_cache",
+)
+
+
+def cli_cache_show(cache, quiet=None):
+    """
+    Implements the ``ksd-cache show`` command
+
+    :param cache: the persistent cache
+
+    :type cache: `kojismokydingo.cache.BulkCache`
+
+    :param quiet: whether to omit the headings. Default, only print
+      headings if stdout is a TTY
+
+    :type quiet: bool, optional
+    """
+
+    stats = cache.stats()
+    tabulate(("Hub", "Method", "Entries", "Bytes"), stats, quiet=quiet)
+
+    if not quiet:
+        entries = sum(stat[2] for stat in stats)
+        print("Total: %i entries, %i of %i bytes in %s" %
+              (entries, cache.total_bytes(), cache.max_bytes,
+               cache.filename))
+
+
+def cli_cache_prune(cache, max_bytes=None):
+    """
+    Implements the ``ksd-cache prune`` command
+
+    :param cache: the persistent cache
+
+    :type cache: `kojismokydingo.cache.BulkCache`
+
+    :param max_bytes: size to prune down to. Default, the cache's
+      size limit
+
+    :type max_bytes: int, optional
+    """
+
+    evicted = cache.prune(max_bytes)
+    print("Evicted %i entries" % evicted)
+
+
+def cli_cache_warm(session, nvrs):
+    """
+    Implements the ``ksd-cache warm`` command
+
+    Loads the given builds, and the archives, RPMs, and buildroots of
+    those which are completed, so that they will be stored in the
+    persistent cache associated with the session.
+
+    :param session: an active koji session, with a persistent cache
+      associated via `kojismokydingo.set_bulk_cache`
+
+    :type session: `koji.ClientSession`
+
+    :param nvrs: builds to load
+
+    :type nvrs: list[str]
+    """
+
+    complete = BUILD_STATES["COMPLETE"]
+
+    builds = bulk_load_builds(session, nvrs, err=False)
+    build_ids = [b["id"] for b in builds.values()
+                 if b and b["state"] == complete]
+
+    archives = bulk_load_build_archives(session, build_ids)
+    rpms = bulk_load_build_rpms(session, build_ids)
+
+    found = chain(chain(*archives.values()), chain(*rpms.values()))
+    broot_ids = set(f["buildroot_id"] for f in found if f["buildroot_id"])
+    broots = bulk_load_buildroots(session, sorted(broot_ids))
+
+    print("Loaded %i builds, %i completed, with %i buildroots" %
+          (len(builds), len(build_ids), len(broots)))
+
+
+class LonelyCache(AnonLonelyDingo):
+
+    description = "Manage the persistent cache of hub data"
+
+
+    def arguments(self, parser):
+        addarg = parser.add_argument
+
+        addarg("action", choices=("show", "prune", "warm"),
+               help="Show the cache statistics, prune the cache down to"
+               " size, or warm the cache by loading builds")
+
+        addarg("nvrs", nargs="*", metavar="NVR",
+               help="Builds to load, for the warm action")
+
+        addarg("-f", "--file", action="store", default=None,
+               dest="nvr_file", metavar="NVR_FILE",
+               help="Read list of builds from file, one NVR per line."
+               " Specify - to read from stdin.")
+
+        addarg("--cache-file", action="store", default=None,
+               metavar="FILENAME",
+               help="Cache database to use. Default, cache.sqlite in"
+               " the user configuration directory")
+
+        addarg("--max-size", action="store", type=int,
+               default=DEFAULT_MAX_BYTES, metavar="BYTES",
+               help="Size limit for the cache. Default, %(default)s")
+
+        addarg("--quiet", "-q", action="store_true", default=None,
+               help="Omit headings from show")
+
+        return parser
+
+
+    def configure_session(self, options):
+        super().configure_session(options)
+
+        self.cache = BulkCache(options.cache_file, options.max_size)
+        set_bulk_cache(self.session, self.cache)
+
+
+    def handle(self, options):
+        action = options.action
+
+        if action == "show":
+            return cli_cache_show(self.cache, options.quiet)
+
+        elif action == "prune":
+            return cli_cache_prune(self.cache, options.max_size)
+
+        else:
+            nvrs = list(options.nvrs)
+            if options.nvr_file:
+                nvrs.extend(read_clean_lines(options.nvr_file))
+            return cli_cache_warm(self.session, nvrs)
+
+
+ksd_cache = LonelyCache.main
+
+
+#
+# The end.
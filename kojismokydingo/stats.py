@@ -0,0 +1,356 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Call statistics
+
+Counters of the calls a session makes to a koji hub, and the hook on
+the session's calls through which they are recorded, answered by a
+cassette, or limited by a throttle.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from threading import Lock
+from time import monotonic
+
+
+__all__ = (
+    "CallStats",
+    "call_stats",
+    "set_call_stats",
+    "set_cassette",
+    "stats_phase",
+)
+
+
+def _track_response_bytes(session):
+    # wraps the session's response reader so that the size of the
+    # most recent response body is recorded in the session's
+    # __response_bytes var. This is the size once decoded, as the
+    # Content-Length is that of the compressed body if the hub
+    # compressed it, and is absent if the response was chunked
+
+    svars = vars(session)
+    if "__response_bytes" in svars:
+        return
+
+    svars["__response_bytes"] = 0
+    orig_read = session._read_xmlrpc_response
+
+    def read_response(response):
+        read = response.iter_content
+
+        def iter_content(*args, **kwds):
+            for chunk in read(*args, **kwds):
+                svars["__response_bytes"] += len(chunk)
+                yield chunk
+
+        svars["__response_bytes"] = 0
+        response.iter_content = iter_content
+        return orig_read(response)
+
+    session._read_xmlrpc_response = read_response
+
+
+def _response_bytes(session):
+    return vars(session).get("__response_bytes") or 0
+
+
+class CallStats():
+    """
+    Counters of the calls made to a koji hub, and timers for named
+    phases of work.
+
+    For each hub method, records the count of calls, the count of
+    multicalls those calls were sent in, the total size of the
+    responses in bytes, and the total latency in seconds. Calls made
+    concurrently each contribute their full latency, so the total
+    latency may exceed the elapsed time.
+
+    For each phase, records the number of times it was entered and the
+    total elapsed seconds. Phases may be nested within each other.
+
+    Associate an instance with a session via `set_call_stats` to have
+    the session's calls recorded.
+    """
+
+    def __init__(self):
+        self.methods = OrderedDict()
+        self.phases = OrderedDict()
+        self._lock = Lock()
+
+
+    def record(self, method, calls, multicalls, nbytes, elapsed):
+        """
+        Record calls to a hub method
+
+        :param method: the hub method name
+
+        :type method: str
+
+        :param calls: count of calls
+
+        :type calls: int
+
+        :param multicalls: count of multicalls the calls were sent in,
+          or 0 if they were sent directly
+
+        :type multicalls: int
+
+        :param nbytes: size of the response in bytes
+
+        :type nbytes: int
+
+        :param elapsed: round-trip time in seconds
+
+        :type elapsed: float
+        """
+
+        with self._lock:
+            counts = self.methods.get(method)
+            if counts is None:
+                counts = self.methods[method] = [0, 0, 0, 0.0]
+            counts[0] += calls
+            counts[1] += multicalls
+            counts[2] += nbytes
+            counts[3] += elapsed
+
+
+    def add_phase(self, name, elapsed):
+        """
+        Record time spent in the named phase
+
+        :param name: the phase name
+
+        :type name: str
+
+        :param elapsed: seconds spent in the phase
+
+        :type elapsed: float
+        """
+
+        with self._lock:
+            counts = self.phases.get(name)
+            if counts is None:
+                counts = self.phases[name] = [0, 0.0]
+            counts[0] += 1
+            counts[1] += elapsed
+
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager which records the time spent within it as the
+        named phase
+
+        :param name: the phase name
+
+        :type name: str
+        """
+
+        start = monotonic()
+        try:
+            yield self
+        finally:
+            self.add_phase(name, monotonic() - start)
+
+
+    def as_dict(self):
+        """
+        The recorded counters and timers as a JSON-compatible dict
+
+        :rtype: dict
+        """
+
+        with self._lock:
+            methods = OrderedDict()
+            for method, counts in self.methods.items():
+                methods[method] = OrderedDict(zip(
+                    ("calls", "multicalls", "bytes", "seconds"), counts))
+
+            phases = OrderedDict()
+            for name, counts in self.phases.items():
+                phases[name] = OrderedDict(zip(("count", "seconds"),
+                                               counts))
+
+        return {"methods": methods, "phases": phases}
+
+
+def _track_calls(session):
+    # wraps the session's _callMethod so that each call is recorded
+    # in the session's CallStats, sent via the session's Cassette, and
+    # limited by the session's Throttle, if it has them
+
+    svars = vars(session)
+    if "_callMethod" in svars:
+        return
+
+    _track_response_bytes(session)
+    orig_call = session._callMethod
+
+    def call_method(name, *args, **kwargs):
+        if session.multicall:
+            # calls made in multicall mode are only being queued
+            return orig_call(name, *args, **kwargs)
+
+        call_args = args[0] if args else kwargs.get("args", ())
+        call_kwargs = args[1] if len(args) > 1 else kwargs.get("kwargs")
+
+        send = partial(orig_call, name, *args, **kwargs)
+
+        cassette = svars.get("__cassette")
+        if cassette is not None:
+            send = partial(cassette.invoke, send, name,
+                           call_args, call_kwargs)
+
+        stats = svars.get("__call_stats")
+        if stats is not None:
+            send = partial(_recorded_send, session, stats, send,
+                           name, call_args)
+
+        throttle = svars.get("__throttle")
+        if throttle is not None and not _replaying(session):
+            calls = len(call_args[0]) if name == "multiCall" else 1
+            send = partial(throttle.invoke, send, calls, stats)
+
+        return send()
+
+    svars["_callMethod"] = call_method
+
+
+def _recorded_send(session, stats, send, name, args):
+    # invokes send, recording the call in stats
+
+    svars = vars(session)
+    svars["__response_bytes"] = 0
+    start = monotonic()
+    try:
+        return send()
+    finally:
+        _record_call(stats, name, args,
+                     monotonic() - start, _response_bytes(session))
+
+
+def _record_call(stats, name, args, elapsed, nbytes):
+    # records a call in stats. A multicall is recorded under the name
+    # of the method it invokes, if it invokes only one.
+
+    if name == "multiCall" and args:
+        calls = args[0]
+        names = set(call.get("methodName") for call in calls)
+        method = names.pop() if len(names) == 1 else name
+        stats.record(method, len(calls), 1, nbytes, elapsed)
+    else:
+        stats.record(name, 1, 0, nbytes, elapsed)
+
+
+def set_call_stats(session, stats):
+    """
+    Associates a `CallStats` with the given session, which will then
+    record each call the session makes to the hub, including those
+    made by the bulk loading functions on its behalf.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param stats: the call stats, or None to stop recording
+
+    :type stats: `CallStats`, optional
+    """
+
+    if stats is None:
+        vars(session).pop("__call_stats", None)
+    else:
+        _track_calls(session)
+        vars(session)["__call_stats"] = stats
+
+
+def set_cassette(session, cassette):
+    """
+    Associates a `kojismokydingo.cassette.Cassette` with the given
+    session. Each call the session makes to the hub will then be
+    recorded by the cassette, or if the cassette is replaying, will
+    be answered by the cassette without contacting the hub.
+
+    :param session: a koji session
+
+    :type session: `koji.ClientSession`
+
+    :param cassette: the cassette, or None to stop using one
+
+    :type cassette: `kojismokydingo.cassette.Cassette`, optional
+    """
+
+    if cassette is None:
+        vars(session).pop("__cassette", None)
+    else:
+        _track_calls(session)
+        vars(session)["__cassette"] = cassette
+
+
+def _replaying(session):
+    # whether the session's calls are answered by a replaying cassette
+
+    cassette = vars(session).get("__cassette")
+    return cassette is not None and cassette.replay
+
+
+def call_stats(session):
+    """
+    The `CallStats` associated with the given session via
+    `set_call_stats`, or None
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :rtype: `CallStats`
+    """
+
+    return vars(session).get("__call_stats")
+
+
+@contextmanager
+def stats_phase(session, name):
+    """
+    Context manager which records the time spent within it as the
+    named phase of the `CallStats` associated with the given session.
+    Does nothing if the session is None or has no stats.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param name: the phase name
+
+    :type name: str
+    """
+
+    stats = call_stats(session) if session is not None else None
+    if stats is None:
+        yield None
+    else:
+        with stats.phase(name):
+            yield stats
+
+
+#
+# The end.
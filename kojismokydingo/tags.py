@@ -27,7 +27,7 @@ from itertools import chain
 from . import (
     NoSuchTag,
     as_taginfo, as_targetinfo,
-    bulk_load, bulk_load_tags, )
+    bulk_as_taginfo, bulk_load, bulk_load_tags, )
 from .common import unique
 
 
@@ -138,7 +138,7 @@ def gather_affected_targets(session, tagnames):
     :rtype: list[dict]
     """
 
-    tags = [as_taginfo(session, t) for t in set(tagnames)]
+    tags = bulk_as_taginfo(session, unique(tagnames))
 
     session.multicall = True
     for tag in tags:
@@ -0,0 +1,347 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Throttling
+
+Limits on the rate and concurrency of the calls a session makes to a
+koji hub.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+from koji import ServerOffline
+from requests.exceptions import (
+    ChunkedEncodingError, HTTPError, Timeout,
+    ConnectionError as RequestsConnectionError, )
+from threading import Condition
+from time import monotonic
+
+from .stats import _track_calls
+
+
+__all__ = (
+    "Throttle",
+    "set_throttle",
+)
+
+
+class Throttle():
+    """
+    Limits the rate and concurrency of the calls a session makes to a
+    koji hub, so that large bulk operations don't overwhelm a shared
+    hub and its database.
+
+    The rate is limited by a token bucket holding up to `burst` calls,
+    which refills at `rate` calls per second. A multicall takes a
+    token for each of the calls it carries, and a multicall larger
+    than the bucket waits for the bucket to be full and then leaves it
+    in debt. Separately, no more than `concurrency` calls or
+    multicalls may be in flight at once.
+
+    Both limits are scaled by an adaptive factor. The factor is halved
+    whenever a call fails in a way that suggests the hub is overloaded,
+    or when the latency per call rises to `latency_factor` times the
+    lowest that has been seen for calls of a similar size. It recovers
+    gradually as calls succeed at a normal latency.
+
+    Associate an instance with a session via `set_throttle`. The
+    sessions cloned from it share the same throttle.
+
+    :param rate: calls per second, or None for no rate limit
+
+    :type rate: float, optional
+
+    :param burst: size of the token bucket. Default, one second's
+      worth of calls
+
+    :type burst: int, optional
+
+    :param concurrency: calls in flight at once, or None for no limit
+
+    :type concurrency: int, optional
+
+    :param latency_factor: ratio of latency to the lowest seen which
+      triggers a back-off. Default, 3.0
+
+    :type latency_factor: float, optional
+
+    :param min_factor: the lowest the limits may be scaled down
+      to. Default, 0.05
+
+    :type min_factor: float, optional
+    """
+
+    # seconds before another back-off may follow the last
+    COOLDOWN = 1.0
+
+    # recovery of the factor after each normal call
+    RECOVERY = 0.05
+
+
+    def __init__(self, rate=None, burst=None, concurrency=None,
+                 latency_factor=3.0, min_factor=0.05):
+
+        self.rate = rate
+        self.burst = max(1, int(burst or rate or 1))
+        self.concurrency = concurrency
+        self.latency_factor = latency_factor
+        self.min_factor = min_factor
+
+        self.factor = 1.0
+        self.active = 0
+
+        self.waited = 0.0
+        self.backoffs = 0
+
+        self._tokens = float(self.burst)
+        self._stamp = monotonic()
+        self._last_backoff = None
+
+        # smoothed and lowest latency per call, keyed by the magnitude
+        # of the call count
+        self._latency = {}
+        self._baseline = {}
+
+        self._cond = Condition()
+
+
+    def _delay(self, calls):
+        # seconds to wait before the calls may be sent, 0 if they may
+        # be sent now, or None to wait for a call to be released
+
+        if self.concurrency:
+            limit = max(1, int(self.concurrency * self.factor))
+            if self.active >= limit:
+                return None
+
+        if self.rate:
+            now = monotonic()
+            rate = self.rate * self.factor
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._stamp) * rate)
+            self._stamp = now
+
+            needed = min(calls, self.burst)
+            if self._tokens < needed:
+                return (needed - self._tokens) / rate
+
+        return 0
+
+
+    def acquire(self, calls=1):
+        """
+        Wait until the given count of calls may be sent. Every acquire
+        must be followed by a `release` once the calls complete.
+
+        :param calls: count of calls being sent, eg. the size of a
+          multicall
+
+        :type calls: int, optional
+
+        :returns: seconds spent waiting
+
+        :rtype: float
+        """
+
+        waited = 0.0
+
+        with self._cond:
+            delay = self._delay(calls)
+            if delay != 0:
+                start = monotonic()
+                while delay != 0:
+                    self._cond.wait(delay)
+                    delay = self._delay(calls)
+                waited = monotonic() - start
+                self.waited += waited
+
+            self.active += 1
+            if self.rate:
+                self._tokens -= calls
+
+        return waited
+
+
+    def release(self, calls=1, latency=None, overloaded=False):
+        """
+        Record the completion of calls sent after an `acquire`, and
+        adapt the limits to how the hub responded.
+
+        :param calls: count of calls which were sent
+
+        :type calls: int, optional
+
+        :param latency: round-trip time in seconds, or None if unknown
+
+        :type latency: float, optional
+
+        :param overloaded: whether the calls failed in a way that
+          indicates the hub is overloaded
+
+        :type overloaded: bool, optional
+        """
+
+        with self._cond:
+            self.active -= 1
+
+            slow = False
+            if latency is not None and calls > 0:
+                slow = self._slow(calls, latency / calls)
+
+            if overloaded or slow:
+                now = monotonic()
+                last = self._last_backoff
+                if last is None or now - last >= self.COOLDOWN:
+                    self._last_backoff = now
+                    self.factor = max(self.min_factor, self.factor / 2)
+                    self.backoffs += 1
+            else:
+                self.factor = min(1.0, self.factor + self.RECOVERY)
+
+            self._cond.notify_all()
+
+
+    def invoke(self, send, calls=1, stats=None):
+        """
+        Invokes send within the limits of the throttle, between an
+        `acquire` and a `release`, and returns its result. A failure
+        which indicates the hub is overloaded causes a back-off.
+
+        :param send: sends the calls to the hub
+
+        :type send: Callable[[], object]
+
+        :param calls: count of calls being sent, eg. the size of a
+          multicall
+
+        :type calls: int, optional
+
+        :param stats: records the time spent waiting as its
+          ``throttle`` phase. Default, not recorded
+
+        :type stats: `kojismokydingo.CallStats`, optional
+        """
+
+        waited = self.acquire(calls)
+        if waited and stats is not None:
+            stats.add_phase("throttle", waited)
+
+        start = monotonic()
+        overloaded = False
+        try:
+            return send()
+        except Exception as exc:
+            overloaded = _is_transient(exc)
+            raise
+        finally:
+            self.release(calls, monotonic() - start, overloaded)
+
+
+    def _slow(self, calls, per_call):
+        # records the latency per call, and decides whether it has
+        # risen too far above the lowest seen for calls of this size
+
+        key = calls.bit_length()
+
+        smoothed = self._latency.get(key)
+        if smoothed is None:
+            smoothed = per_call
+        else:
+            smoothed = (smoothed * 3 + per_call) / 4
+        self._latency[key] = smoothed
+
+        # the baseline creeps upwards, so that a hub which has become
+        # permanently slower is eventually accepted as normal
+        baseline = self._baseline.get(key)
+        if baseline is None or per_call < baseline:
+            baseline = per_call
+        else:
+            baseline *= 1.01
+        self._baseline[key] = baseline
+
+        return smoothed > baseline * self.latency_factor
+
+
+    def as_dict(self):
+        """
+        The throttle's settings and counters as a JSON-compatible dict
+
+        :rtype: dict
+        """
+
+        with self._cond:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "concurrency": self.concurrency,
+                "factor": self.factor,
+                "waited": self.waited,
+                "backoffs": self.backoffs,
+            }
+
+
+def set_throttle(session, throttle):
+    """
+    Associates a `Throttle` with the given session, which will then
+    limit each call the session makes to the hub, including the
+    multicalls made by the bulk loading functions on its behalf and
+    by the sessions cloned from it. Calls answered by a replaying
+    cassette are not limited.
+
+    Time spent waiting on the throttle is recorded as the ``throttle``
+    phase of the session's `kojismokydingo.CallStats`, if it has them.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param throttle: the throttle, or None to stop limiting calls
+
+    :type throttle: `Throttle`, optional
+    """
+
+    if throttle is None:
+        vars(session).pop("__throttle", None)
+    else:
+        _track_calls(session)
+        vars(session)["__throttle"] = throttle
+
+
+def _throttle_acquire(session, throttle, calls):
+    # waits on the throttle, recording the time spent waiting in the
+    # session's stats
+
+    waited = throttle.acquire(calls)
+    if waited:
+        stats = vars(session).get("__call_stats")
+        if stats is not None:
+            stats.add_phase("throttle", waited)
+
+
+def _is_transient(exc):
+    # whether a multicall failure is likely to go away if retried
+
+    if isinstance(exc, HTTPError):
+        response = exc.response
+        return response is None or response.status_code >= 500
+
+    return isinstance(exc, (ChunkedEncodingError, RequestsConnectionError,
+                            ServerOffline, Timeout))
+
+
+#
+# The end.
@@ -0,0 +1,527 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Koji Smoky Dingo - Hub transport
+
+Sends multicalls to a koji hub and decodes their responses
+incrementally, so that each result may be used and discarded as soon
+as it arrives rather than once the whole response has been read.
+
+Also a tuned transport for koji sessions, which keeps a shared pool
+of keep-alive connections, may compress request bodies, and counts
+the bytes sent and received both on the wire and once decompressed.
+
+:author: Christopher O'Brien <obriencj@gmail.com>
+:license: GPL v3
+"""
+
+
+import warnings
+
+from gzip import compress
+from koji import Fault, convertFault
+from requests.adapters import HTTPAdapter
+from socket import SOL_SOCKET, SO_KEEPALIVE
+from threading import Lock
+from urllib3 import PoolManager
+from urllib3.connection import HTTPConnection
+from xmlrpc.client import ExpatParser, ResponseError, Unmarshaller
+
+
+__all__ = (
+    "HubTransport",
+    "StreamingUnmarshaller",
+    "TransferStats",
+    "iter_multicall",
+    "iter_response_results",
+    "session_transport",
+    "set_transport",
+    "transfer_stats",
+)
+
+
+# size of each read from the response body
+READ_SIZE = 8192
+
+# request bodies smaller than this aren't worth compressing
+DEFAULT_COMPRESS_MIN = 1024
+
+# favors speed, as XML compresses well regardless
+COMPRESS_LEVEL = 5
+
+
+class StreamingUnmarshaller(Unmarshaller):
+    """
+    An XML-RPC unmarshaller which allows the items of an array result
+    to be taken away as soon as each has been decoded, rather than
+    only once the whole response has been decoded.
+
+    Feed it via an `xmlrpc.client.ExpatParser`, and call `take`
+    between feedings.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._outer = None
+
+
+    def start(self, tag, attrs):
+        if self._outer is None and tag in ("array", "struct"):
+            self._outer = tag
+        return super().start(tag, attrs)
+
+
+    def take(self):
+        """
+        Removes and returns the items of the outermost array which
+        have been completely decoded so far. Returns an empty list if
+        there are none, or if the response isn't an array.
+
+        :rtype: list
+        """
+
+        marks = self._marks
+        if self._outer != "array" or not marks:
+            return []
+
+        stack = self._stack
+        start = marks[0]
+        end = marks[1] if len(marks) > 1 else len(stack)
+
+        found = stack[start:end]
+        if found:
+            del stack[start:end]
+
+            # items within an array or struct still being decoded
+            # have moved down the stack
+            count = len(found)
+            for index in range(1, len(marks)):
+                marks[index] -= count
+
+        return found
+
+
+def iter_response_results(chunks):
+    """
+    Decodes an XML-RPC response from an iterable of byte strings,
+    yielding the items of its array result as each is decoded. Each
+    item is released once yielded, so only the most recent chunk and
+    the item currently being decoded are kept in memory.
+
+    :param chunks: the response body, in pieces
+
+    :type chunks: Iterable[bytes]
+
+    :raises koji.GenericError: if the response is a fault
+
+    :raises xml.parsers.expat.ExpatError: if the response is
+      truncated or malformed
+
+    :raises xmlrpc.client.ResponseError: if the result isn't an array
+
+    :rtype: Generator[object]
+    """
+
+    target = StreamingUnmarshaller()
+    parser = ExpatParser(target)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from target.take()
+
+    parser.close()
+
+    try:
+        result = target.close()
+    except Fault as fault:
+        raise convertFault(fault)
+
+    if len(result) != 1 or not isinstance(result[0], list):
+        raise ResponseError("expected an array result")
+
+    yield from result[0]
+
+
+def _call_options(session, headers, request):
+    # the keyword arguments for posting a request on behalf of the
+    # session, matching those of koji.ClientSession._sendOneCall
+
+    opts = session.opts
+    callopts = {
+        "headers": dict(headers),
+        "data": request,
+        "stream": True,
+    }
+
+    verify = opts.get("serverca")
+    if verify:
+        callopts["verify"] = verify
+    elif opts.get("no_ssl_verify"):
+        callopts["verify"] = False
+
+    for key in ("cert", "auth", "timeout"):
+        value = opts.get(key)
+        if value:
+            callopts[key] = value
+
+    return callopts
+
+
+def iter_multicall(session, calls, response_bytes=None):
+    """
+    Sends a list of call dicts (as accumulated by a session in
+    multicall mode) as a single multicall, yielding each of its
+    results as soon as it has been decoded. The results are in the
+    same form as those returned by ``session.multiCall``.
+
+    Unlike ``session.multiCall``, the call is not retried when it
+    fails, and an expired session is not renewed.
+
+    The response remains open until the generator is exhausted or
+    closed.
+
+    :param session: an active koji session
+
+    :type session: `koji.ClientSession`
+
+    :param calls: list of call dicts with methodName and params keys
+
+    :type calls: list[dict]
+
+    :param response_bytes: invoked with the size in bytes of the
+      decoded response body, once it has been read or the response
+      is closed
+
+    :type response_bytes: Callable[[int], None], optional
+
+    :raises koji.GenericError: if the hub returns a fault for the
+      multicall as a whole
+
+    :rtype: Generator[object]
+    """
+
+    handler, headers, request = session._prepCall("multiCall", (calls, ))
+    callopts = _call_options(session, headers, request)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        response = session.rsession.post(handler, **callopts)
+
+    # the Content-Length is that of the compressed body if the hub
+    # compressed it, and is absent if the response was chunked, so
+    # the decoded body is counted instead
+    size = 0
+
+    def iter_content():
+        nonlocal size
+        for chunk in response.iter_content(READ_SIZE):
+            size += len(chunk)
+            yield chunk
+
+    try:
+        response.raise_for_status()
+        yield from iter_response_results(iter_content())
+
+    finally:
+        response.close()
+        if response_bytes is not None:
+            response_bytes(size)
+
+
+class TransferStats():
+    """
+    Counters of the bytes sent to and received from a koji hub, both
+    as they were on the wire and as they were before compression or
+    after decompression.
+
+    Obtain the counters for a session with a transport via
+    `transfer_stats`.
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.sent_wire = 0
+        self.received = 0
+        self.received_wire = 0
+        self._lock = Lock()
+
+
+    def record_sent(self, raw, wire):
+        """
+        Record a request body
+
+        :param raw: size of the body before compression
+
+        :type raw: int
+
+        :param wire: size of the body as sent
+
+        :type wire: int
+        """
+
+        with self._lock:
+            self.sent += raw
+            self.sent_wire += wire
+
+
+    def record_received(self, raw, wire):
+        """
+        Record a response body
+
+        :param raw: size of the body after decompression
+
+        :type raw: int
+
+        :param wire: size of the body as received
+
+        :type wire: int
+        """
+
+        with self._lock:
+            self.received += raw
+            self.received_wire += wire
+
+
+    def as_dict(self):
+        """
+        The counters as a JSON-compatible dict
+
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {"sent": self.sent, "sent_wire": self.sent_wire,
+                    "received": self.received,
+                    "received_wire": self.received_wire}
+
+
+class HubTransport():
+    """
+    Connection handling which may be shared by any number of koji
+    sessions via `set_transport`.
+
+    The sessions sharing a transport also share its pool of keep-alive
+    connections, so a connection opened for one multicall is reused by
+    the next, whether it comes from the same session, a clone of it
+    from a `kojismokydingo.SessionPool`, or another session to the
+    same hub. Responses are always requested with gzip or deflate
+    compression, which the hub may or may not honor.
+
+    :param pool_size: connections to keep open to each hub. This
+      should be at least the number of concurrent multicalls. Default,
+      10
+
+    :type pool_size: int, optional
+
+    :param compress_requests: gzip compress request bodies of at least
+      `compress_min` bytes. The hub must be configured to accept them,
+      as with the ``DEFLATE`` input filter of Apache's mod_deflate.
+      Default, False
+
+    :type compress_requests: bool, optional
+
+    :param compress_min: the smallest request body to compress.
+      Default, 1024
+
+    :type compress_min: int, optional
+
+    :param keepalive: enable TCP keep-alive probes on the connections,
+      so that idle pooled connections aren't dropped by firewalls
+      between us and the hub. Default, True
+
+    :type keepalive: bool, optional
+    """
+
+    def __init__(self, pool_size=10, compress_requests=False,
+                 compress_min=DEFAULT_COMPRESS_MIN, keepalive=True):
+
+        self.pool_size = pool_size
+        self.compress_requests = compress_requests
+        self.compress_min = compress_min
+
+        socket_options = list(HTTPConnection.default_socket_options)
+        if keepalive:
+            socket_options.append((SOL_SOCKET, SO_KEEPALIVE, 1))
+
+        self.pool = PoolManager(maxsize=pool_size,
+                                socket_options=socket_options)
+
+
+    def close(self):
+        """
+        Close all of the pooled connections. The transport may still be
+        used afterwards, opening new connections as needed.
+        """
+
+        self.pool.clear()
+
+
+class _HubAdapter(HTTPAdapter):
+    # a requests adapter which sends via the pool of a HubTransport,
+    # compressing requests and counting bytes on behalf of a single
+    # session
+
+    def __init__(self, transport, stats):
+        self.transport = transport
+        self.stats = stats
+        super().__init__(pool_maxsize=transport.pool_size)
+
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        # the pool belongs to the transport
+        self.poolmanager = self.transport.pool
+
+
+    def close(self):
+        # the transport's pool outlives this adapter, and the sessions
+        # it was mounted in
+        for proxy in self.proxy_manager.values():
+            proxy.clear()
+
+
+    def send(self, request, **kwargs):
+        transport = self.transport
+        headers = request.headers
+
+        body = request.body or b""
+        if isinstance(body, str):
+            body = request.body = body.encode("utf-8")
+
+        size = len(body)
+        if transport.compress_requests and \
+           size >= transport.compress_min and \
+           "Content-Encoding" not in headers:
+
+            body = request.body = compress(body, COMPRESS_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+            headers["Content-Length"] = str(len(body))
+
+        headers["Accept-Encoding"] = "gzip, deflate"
+
+        self.stats.record_sent(size, len(body))
+        return super().send(request, **kwargs)
+
+
+    def build_response(self, req, resp):
+        response = super().build_response(req, resp)
+
+        stats = self.stats
+        read = response.iter_content
+
+        def iter_content(chunk_size=1, decode_unicode=False):
+            size = 0
+            try:
+                for chunk in read(chunk_size, decode_unicode):
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                stats.record_received(size, resp.tell())
+
+        response.iter_content = iter_content
+        return response
+
+
+def _mount_transport(session):
+    # mounts an adapter for the session's transport in its current
+    # requests session
+
+    found = vars(session).get("__transport")
+    if found is not None and session.rsession is not None:
+        adapter = _HubAdapter(*found)
+        session.rsession.mount("http://", adapter)
+        session.rsession.mount("https://", adapter)
+
+
+def set_transport(session, transport, stats=None):
+    """
+    Associates a `HubTransport` with the given session, which will
+    then send its calls over the transport's connections.
+
+    :param session: a koji session
+
+    :type session: `koji.ClientSession`
+
+    :param transport: the transport, or None to stop using one
+
+    :type transport: `HubTransport`, optional
+
+    :param stats: counters to record the session's transfers in, as
+      when sharing them with the session's clones. Default, new
+      counters
+
+    :type stats: `TransferStats`, optional
+    """
+
+    svars = vars(session)
+
+    if transport is None:
+        if svars.pop("__transport", None) is not None:
+            svars.pop("new_session", None)
+            session.new_session()
+        return
+
+    if stats is None:
+        stats = TransferStats()
+    svars["__transport"] = (transport, stats)
+
+    if "new_session" not in svars:
+        # koji replaces the requests session after a connection error
+        # or logout, and the replacement needs the adapter too
+        orig_new_session = session.new_session
+
+        def new_session():
+            orig_new_session()
+            _mount_transport(session)
+
+        svars["new_session"] = new_session
+
+    _mount_transport(session)
+
+
+def session_transport(session):
+    """
+    The `HubTransport` associated with the given session via
+    `set_transport`, or None
+
+    :param session: a koji session
+
+    :type session: `koji.ClientSession`
+
+    :rtype: `HubTransport`
+    """
+
+    found = vars(session).get("__transport")
+    return None if found is None else found[0]
+
+
+def transfer_stats(session):
+    """
+    The `TransferStats` of the given session, if it is associated with
+    a transport via `set_transport`, otherwise None
+
+    :param session: a koji session
+
+    :type session: `koji.ClientSession`
+
+    :rtype: `TransferStats`
+    """
+
+    found = vars(session).get("__transport")
+    return None if found is None else found[1]
+
+
+#
+# The end.
@@ -24,7 +24,9 @@ from koji import ParameterError, USERTYPES, USER_STATUS
 from operator import itemgetter
 from time import asctime, localtime
 
-from . import NoSuchContentGenerator, NoSuchPermission, as_userinfo
+from . import (
+    NoSuchContentGenerator, NoSuchPermission, as_userinfo,
+    cached_metadata, )
 
 
 __all__ = (
@@ -109,7 +111,8 @@ def collect_cg_access(session, user):
     username = userinfo["name"]
 
     found = []
-    for cgname, val in session.listCGs().items():
+    cgs = cached_metadata(session, "listCGs", session.listCGs)
+    for cgname, val in cgs.items():
         if username in val.get("users", ()):
             val["name"] = cgname
             found.append(val)
@@ -128,7 +131,7 @@ def collect_cgs(session, name=None):
       content generator matches
     """
 
-    cgs = session.listCGs()
+    cgs = cached_metadata(session, "listCGs", session.listCGs)
 
     if name:
         # filter the cgs dict down to just the named one
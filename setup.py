@@ -75,6 +75,7 @@ COMMANDS = {
 
 
 STANDALONE = {
+    "ksd-cache": "kojismokydingo.standalone.cache:ksd_cache",
     "ksd-filter-builds": "kojismokydingo.standalone.builds:ksd_filter_builds",
     "ksd-filter-tags": "kojismokydingo.standalone.tags:ksd_filter_tags",
 }
@@ -15,15 +15,30 @@
 import koji
 
 from collections import OrderedDict
+from threading import Event, Thread
 from mock import MagicMock, PropertyMock, patch
+from requests.exceptions import ConnectionError as RequestsConnectionError
 from unittest import TestCase
 
 from kojismokydingo import (
-    BadDingo, FeatureUnavailable,
-    NoSuchBuild, NoSuchTag, NoSuchTarget, NoSuchUser,
+    AdaptiveChunker, BadDingo, CallStats, FeatureUnavailable, IdentityMap,
+    MulticallBatch, NoSuchArchive, NoSuchBuild, NoSuchChannel, NoSuchPackage, NoSuchRPM,
+    NoSuchTag, NoSuchTarget, NoSuchUser, Throttle,
     as_buildinfo, as_taginfo, as_targetinfo, as_userinfo,
-    bulk_load, iter_bulk_load,
+    bulk_as_archiveinfo, bulk_as_buildinfo, bulk_as_hostinfo,
+    bulk_as_rpminfo, bulk_as_taginfo, bulk_as_targetinfo,
+    bulk_as_userinfo, bulk_load, bulk_load_archives, bulk_load_builds,
+    bulk_load_channels, bulk_load_hosts, bulk_load_packages,
+    bulk_load_rpms, bulk_load_targets, close_session_pool, gather_batched,
+    iter_bulk_load, session_pool,
+    session_chunker, set_bulk_chunking, set_bulk_jobs, set_bulk_retries,
+    set_call_stats, set_identity_map, set_throttle, stats_phase,
     version_check, version_require, )
+from kojismokydingo import _iter_identity_load
+from kojismokydingo.builds import (
+    decorate_builds_cg_list, gather_component_build_ids, )
+
+from benchmarks.fakehub import PER_BUILD, SyntheticData, fake_hub
 
 
 class TestIterBulkLoad(TestCase):
@@ -79,6 +94,649 @@ class TestIterBulkLoad(TestCase):
                 self.assertEqual(call['params'], (i + offset,))
 
 
+class TestAdaptiveChunker(TestCase):
+
+    def test_grow(self):
+        chunker = AdaptiveChunker(size=10, max_size=100, max_time=10.0)
+
+        # cheap calls double the size each time, up to max_size
+        chunker.record(10, 0.01)
+        self.assertEqual(chunker.size, 20)
+        chunker.record(20, 0.02)
+        self.assertEqual(chunker.size, 40)
+        chunker.record(40, 0.04)
+        chunker.record(80, 0.08)
+        self.assertEqual(chunker.size, 100)
+
+
+    def test_time_budget(self):
+        chunker = AdaptiveChunker(size=100, max_time=10.0)
+
+        # 0.5s per call means 10 calls fills half the budget. The
+        # multicall was over budget, so we shrink immediately
+        chunker.record(100, 50.0)
+        self.assertEqual(chunker.size, 10)
+
+        # within budget again, but still slow
+        chunker.record(10, 5.0)
+        self.assertEqual(chunker.size, 10)
+
+
+    def test_byte_budget(self):
+        chunker = AdaptiveChunker(size=100, max_bytes=1000)
+
+        chunker.record(100, 0.1, 10000)
+        self.assertEqual(chunker.size, 5)
+
+        # a huge single result still gets loaded
+        chunker.record(5, 0.1, 100000)
+        self.assertEqual(chunker.size, 1)
+
+
+    def test_session_chunker(self):
+        session = koji.ClientSession('FAKE_URL')
+
+        c1 = session_chunker(session, "getBuild")
+        c2 = session_chunker(session, "listTagged")
+        self.assertIsNot(c1, c2)
+        self.assertIs(c1, session_chunker(session, "getBuild"))
+
+        set_bulk_chunking(session, size=5, max_time=2.0)
+        c3 = session_chunker(session, "getBuild")
+        self.assertIsNot(c1, c3)
+        self.assertEqual(c3.size, 5)
+        self.assertEqual(c3.max_time, 2.0)
+
+
+    @patch('koji.ClientSession._sendCall')
+    @patch('koji.ClientSession._prepCall')
+    def test_adaptive_bulk_load(self, prep, send):
+        prep.side_effect = lambda *args: (None, None, args)
+        send.side_effect = lambda h, hd, req: [[100 + c["params"][0]]
+                                               for c in req[1][0]]
+
+        session = koji.ClientSession('FAKE_URL')
+        set_bulk_chunking(session, size=2)
+
+        x = iter_bulk_load(session, session.ImpossibleDream, range(0, 30))
+        self.assertEqual(list(x), list(zip(range(0, 30), range(100, 130))))
+
+        # the chunks grew as 2, 4, 8, 16
+        sizes = [len(c[0][1][0]) for c in prep.call_args_list]
+        self.assertEqual(sizes, [2, 4, 8, 16])
+
+        # and the learned size is remembered for the method
+        self.assertEqual(session_chunker(session, "ImpossibleDream").size, 32)
+
+
+class TestParallelBulkLoad(TestCase):
+
+    def setUp(self):
+        self.prep = patch('koji.ClientSession._prepCall').start()
+        self.prep.side_effect = lambda *args: (None, None, args)
+        self.send = patch('koji.ClientSession._sendCall').start()
+        self.send.side_effect = self.do_send
+        self.session = koji.ClientSession('FAKE_URL')
+
+
+    def tearDown(self):
+        close_session_pool(self.session)
+        patch.stopall()
+
+
+    def do_send(self, handler, headers, request):
+        # pretends to be a hub which answers each call to
+        # ImpossibleDream with 100 + its argument, except for the
+        # argument 13, which is a fault
+
+        name, args, _kwargs = request
+        self.assertEqual(name, "multiCall")
+
+        results = []
+        for call in args[0]:
+            val = call["params"][0]
+            if val == 13:
+                results.append({"faultCode": koji.GenericError.faultCode,
+                                "faultString": "unlucky"})
+            else:
+                results.append([100 + val])
+        return results
+
+
+    def test_parallel_order(self):
+        x = iter_bulk_load(self.session, self.session.ImpossibleDream,
+                           range(0, 12), True, size=2, jobs=3)
+        x = list(x)
+
+        self.assertEqual(x, list(zip(range(0, 12), range(100, 112))))
+        self.assertEqual(self.send.call_count, 6)
+
+        # the parent session never sent a multicall itself
+        self.assertFalse(self.session.multicall)
+        self.assertEqual(self.session._calls, [])
+
+
+    def test_parallel_err(self):
+        x = iter_bulk_load(self.session, self.session.ImpossibleDream,
+                           range(0, 25), False, size=5, jobs=3)
+        x = dict(x)
+
+        self.assertEqual(len(x), 25)
+        self.assertEqual(x[12], 112)
+        self.assertEqual(x[13], None)
+        self.assertEqual(x[14], 114)
+
+        x = iter_bulk_load(self.session, self.session.ImpossibleDream,
+                           range(0, 25), True, size=5, jobs=3)
+        self.assertRaises(koji.GenericError, list, x)
+
+
+    def test_pool_clones(self):
+        # multicalls submitted back to back each get their own clone,
+        # even before any worker has taken one from the pool
+        pool = session_pool(self.session, 3)
+        executor = pool._executor
+
+        deferred = []
+        pool._executor = MagicMock()
+        pool._executor.submit.side_effect = \
+            lambda *args: deferred.append(args)
+
+        calls = [{"methodName": "ImpossibleDream", "params": [n]}
+                 for n in range(0, 4)]
+        for n in range(0, 4):
+            pool.submit(calls[n:n + 1])
+
+        self.assertEqual(len(pool._clones), 3)
+
+        pool._executor = executor
+        futures = [executor.submit(*args) for args in deferred]
+        found = [fut.result()[0] for fut in futures]
+        self.assertEqual(found, [[[100]], [[101]], [[102]], [[103]]])
+
+
+    def test_set_bulk_jobs(self):
+        set_bulk_jobs(self.session, 4)
+
+        x = bulk_load(self.session, self.session.ImpossibleDream,
+                      range(0, 10), size=1)
+
+        self.assertEqual(list(x.values()), list(range(100, 110)))
+
+        pool = vars(self.session)["__session_pool"]
+        self.assertEqual(pool.jobs, 4)
+        self.assertTrue(len(pool._clones) <= 4)
+
+        close_session_pool(self.session)
+        self.assertNotIn("__session_pool", vars(self.session))
+
+
+class TestBulkLoadRecovery(TestCase):
+
+    def setUp(self):
+        self.prep = patch('koji.ClientSession._prepCall').start()
+        self.prep.side_effect = lambda *args: (None, None, args)
+        self.send = patch('koji.ClientSession._sendCall').start()
+        self.send.side_effect = self.do_send
+        self.sleep = patch('kojismokydingo.multicall.sleep').start()
+        self.session = koji.ClientSession('FAKE_URL')
+
+        # number of times to fail with a transient error before
+        # answering
+        self.offline = 0
+
+
+    def tearDown(self):
+        close_session_pool(self.session)
+        patch.stopall()
+
+
+    def do_send(self, handler, headers, request):
+        # pretends to be a hub which cannot answer any multicall
+        # containing a call to ImpossibleDream with 13 as the argument
+
+        if self.offline:
+            self.offline -= 1
+            raise RequestsConnectionError("hub went away")
+
+        name, args, _kwargs = request
+        vals = [call["params"][0] for call in args[0]]
+        if 13 in vals:
+            raise koji.GenericError("unlucky")
+
+        return [[100 + val] for val in vals]
+
+
+    def test_bisect(self):
+        x = iter_bulk_load(self.session, self.session.ImpossibleDream,
+                           range(0, 16), False, size=16)
+        x = dict(x)
+
+        expected = dict(zip(range(0, 16), range(100, 116)))
+        expected[13] = None
+        self.assertEqual(x, expected)
+
+        # one failure, then each level of the bisection sends two
+        # halves, only one of which can fail
+        self.assertEqual(self.send.call_count, 1 + 2 * 4)
+        self.sleep.assert_not_called()
+
+        x = iter_bulk_load(self.session, self.session.ImpossibleDream,
+                           range(0, 16), True, size=16)
+        x = iter(x)
+
+        # the keys before the bad one are loaded fine
+        for i in range(0, 13):
+            self.assertEqual(next(x), (i, 100 + i))
+        self.assertRaises(koji.GenericError, next, x)
+
+
+    def test_bisect_parallel(self):
+        x = iter_bulk_load(self.session, self.session.ImpossibleDream,
+                           range(0, 40), False, size=8, jobs=3)
+        x = dict(x)
+
+        expected = dict(zip(range(0, 40), range(100, 140)))
+        expected[13] = None
+        self.assertEqual(x, expected)
+
+
+    def test_transient(self):
+        set_bulk_retries(self.session, retries=2, backoff=0.5)
+        self.offline = 2
+
+        x = iter_bulk_load(self.session, self.session.ImpossibleDream,
+                           range(0, 10), True, size=10)
+        self.assertEqual(list(x), list(zip(range(0, 10), range(100, 110))))
+
+        self.assertEqual(self.send.call_count, 3)
+        self.assertEqual([c[0][0] for c in self.sleep.call_args_list],
+                         [0.5, 1.0])
+
+        # more failures than retries gives up
+        self.offline = 3
+
+        x = iter_bulk_load(self.session, self.session.ImpossibleDream,
+                           range(0, 10), True, size=10)
+        self.assertRaises(RequestsConnectionError, list, x)
+
+
+class TestIdentityMap(TestCase):
+
+    def setUp(self):
+        self.prep = patch('koji.ClientSession._prepCall').start()
+        self.prep.side_effect = lambda *args: (None, None, args)
+        self.send = patch('koji.ClientSession._sendCall').start()
+        self.send.side_effect = self.do_send
+
+        self.session = koji.ClientSession('FAKE_URL')
+        self.idmap = IdentityMap()
+        set_identity_map(self.session, self.idmap)
+
+        self.builds = {
+            1: {"id": 1, "nvr": "one-1-1"},
+            2: {"id": 2, "nvr": "two-1-1"},
+        }
+        for info in list(self.builds.values()):
+            self.builds[info["nvr"]] = info
+
+        # the keys requested of the hub
+        self.requested = []
+
+
+    def tearDown(self):
+        patch.stopall()
+
+
+    def do_send(self, handler, headers, request):
+        name, args, _kwargs = request
+
+        if name == "multiCall":
+            calls = [call["params"][0] for call in args[0]]
+            self.requested.extend(calls)
+            return [[self.builds.get(key)] for key in calls]
+
+        else:
+            self.requested.append(args[0])
+            return self.builds.get(args[0])
+
+
+    def test_bulk_load_builds(self):
+        keys = [1, "one-1-1", 1, 3, 2, 1]
+        loaded = bulk_load_builds(self.session, keys, err=False)
+
+        self.assertEqual(list(loaded), [1, "one-1-1", 3, 2])
+        self.assertIs(loaded[1], loaded["one-1-1"])
+        self.assertEqual(loaded[3], None)
+
+        # each unique key was only requested once
+        self.assertEqual(self.requested, [1, "one-1-1", 3, 2])
+
+        # and everything found is remembered by ID and NVR, but the
+        # missing build isn't remembered
+        self.requested = []
+        loaded = bulk_load_builds(self.session, ["two-1-1", 3, 1],
+                                  err=False)
+        self.assertEqual(self.requested, [3])
+
+        self.requested = []
+        self.assertEqual(as_buildinfo(self.session, 2), self.builds[2])
+        self.assertEqual(as_buildinfo(self.session, "two-1-1"),
+                         self.builds[2])
+        self.assertEqual(self.requested, [])
+
+        self.assertRaises(NoSuchBuild, as_buildinfo, self.session, 3)
+        self.assertEqual(self.requested, [3])
+
+
+    def test_single_flight(self):
+        # pretend that some other caller is already loading build 1
+        claimed, waiting = self.idmap.claim("build", [1])
+        self.assertEqual(claimed, [1])
+        self.assertEqual(waiting, {})
+
+        found = []
+        waiter = Thread(target=lambda: found.append(
+            as_buildinfo(self.session, 1)))
+        waiter.start()
+
+        # the other caller also can't claim it again
+        claimed, waiting = self.idmap.claim("build", [1, 2])
+        self.assertEqual(claimed, [2])
+        self.assertEqual(list(waiting), [1])
+
+        self.idmap.resolve("build", 1, self.builds[1])
+        self.idmap.resolve("build", 2, self.builds[2])
+
+        waiter.join()
+
+        # the waiter got the result of our load, without a call to
+        # the hub
+        self.assertEqual(found, [self.builds[1]])
+        self.assertEqual(self.requested, [])
+
+        self.assertEqual(waiting[1].result(), self.builds[1])
+
+        # and the NVR alias is now known too
+        self.assertIs(as_buildinfo(self.session, "one-1-1"), found[0])
+        self.assertEqual(self.requested, [])
+
+
+    def test_fail(self):
+        claimed, _waiting = self.idmap.claim("build", [1])
+        _claimed, waiting = self.idmap.claim("build", [1])
+
+        self.idmap.fail("build", claimed, koji.GenericError("oops"))
+        self.assertRaises(koji.GenericError, waiting[1].result)
+
+        # a loader blowing up abandons its claims, so they can be
+        # loaded again later
+        self.send.side_effect = ValueError("kaboom")
+        self.assertRaises(ValueError, bulk_load_builds, self.session, [1])
+
+        self.send.side_effect = self.do_send
+        loaded = bulk_load_builds(self.session, [1])
+        self.assertEqual(loaded[1], self.builds[1])
+
+
+    def test_streaming(self):
+        produced = []
+        recorded = []
+
+        def loader(keys):
+            for key in keys:
+                produced.append(key)
+                yield key, self.builds.get(key)
+
+        def record(info):
+            recorded.append(info)
+            return info
+
+        found = _iter_identity_load(self.session, "build", [1, 3, 2, 1],
+                                    loader, record)
+
+        # each result is provided as soon as it has been loaded
+        self.assertEqual(next(found), (1, self.builds[1]))
+        self.assertEqual(produced, [1])
+        self.assertEqual(next(found), (3, None))
+        self.assertEqual(produced, [1, 3])
+
+        # closing early abandons the remaining claims
+        found.close()
+        self.assertEqual(self.idmap.claim("build", [2]), ([2], {}))
+        self.idmap.resolve("build", 2, self.builds[2])
+
+        found = list(_iter_identity_load(self.session, "build",
+                                         [1, 3, 2, 1], loader, record))
+        self.assertEqual(found, [(1, self.builds[1]), (3, None),
+                                 (2, self.builds[2]), (1, self.builds[1])])
+        self.assertEqual(produced, [1, 3, 3])
+
+        # a missing info is never recorded
+        self.assertNotIn(None, recorded)
+
+
+class TestCallStats(TestCase):
+
+    def setUp(self):
+        self.prep = patch('koji.ClientSession._prepCall').start()
+        self.prep.side_effect = lambda *args: (None, None, args)
+        self.send = patch('koji.ClientSession._sendCall').start()
+        self.send.side_effect = self.do_send
+
+        self.session = koji.ClientSession('FAKE_URL')
+        self.stats = CallStats()
+        set_call_stats(self.session, self.stats)
+
+
+    def tearDown(self):
+        close_session_pool(self.session)
+        patch.stopall()
+
+
+    def do_send(self, handler, headers, request):
+        name, args, _kwargs = request
+        if name == "multiCall":
+            return [[call["params"][0]] for call in args[0]]
+        else:
+            return args[0]
+
+
+    def test_direct_calls(self):
+        self.assertEqual(self.session.getBuild(5), 5)
+        self.assertEqual(self.session.getBuild(6), 6)
+        self.assertEqual(self.session.getTag(1), 1)
+
+        methods = self.stats.as_dict()["methods"]
+        self.assertEqual(list(methods), ["getBuild", "getTag"])
+        self.assertEqual(methods["getBuild"]["calls"], 2)
+        self.assertEqual(methods["getBuild"]["multicalls"], 0)
+
+        # once removed, calls are no longer recorded
+        set_call_stats(self.session, None)
+        self.session.getTag(2)
+        self.assertEqual(self.stats.methods["getTag"][0], 1)
+
+
+    def test_bulk_load(self):
+        loaded = bulk_load(self.session, self.session.getBuild,
+                           range(0, 10), size=4)
+        self.assertEqual(len(loaded), 10)
+
+        loaded = bulk_load(self.session, self.session.getTag,
+                           range(0, 10), size=5, jobs=2)
+        self.assertEqual(len(loaded), 10)
+
+        methods = self.stats.as_dict()["methods"]
+        self.assertEqual(methods["getBuild"]["calls"], 10)
+        self.assertEqual(methods["getBuild"]["multicalls"], 3)
+
+        # the pooled clones record into the same stats
+        self.assertEqual(methods["getTag"]["calls"], 10)
+        self.assertEqual(methods["getTag"]["multicalls"], 2)
+
+
+    def test_phases(self):
+        with stats_phase(self.session, "outer"):
+            with stats_phase(self.session, "inner"):
+                pass
+            with stats_phase(self.session, "inner"):
+                pass
+
+        # no stats, so nothing to record
+        with stats_phase(None, "nothing") as stats:
+            self.assertIsNone(stats)
+
+        phases = self.stats.as_dict()["phases"]
+        self.assertEqual(list(phases), ["inner", "outer"])
+        self.assertEqual(phases["inner"]["count"], 2)
+        self.assertGreaterEqual(phases["outer"]["seconds"],
+                                phases["inner"]["seconds"])
+
+
+class TestThrottle(TestCase):
+
+    def test_rate(self):
+        throttle = Throttle(rate=50, burst=5)
+
+        # the full bucket is available immediately
+        for _index in range(5):
+            self.assertEqual(throttle.acquire(), 0)
+            throttle.release()
+
+        # then calls wait for tokens at the rate
+        self.assertGreater(throttle.acquire(2), 0.02)
+        throttle.release(2)
+
+        # a multicall larger than the bucket waits for a full bucket,
+        # and leaves the bucket in debt
+        self.assertGreater(throttle.acquire(20), 0.05)
+        throttle.release(20)
+        self.assertGreater(throttle.acquire(), 0.3)
+        throttle.release()
+
+        self.assertGreater(throttle.as_dict()["waited"], 0.4)
+
+
+    def test_concurrency(self):
+        throttle = Throttle(concurrency=1)
+        throttle.acquire()
+
+        entered = Event()
+
+        def other():
+            throttle.acquire()
+            entered.set()
+            throttle.release()
+
+        thread = Thread(target=other)
+        thread.start()
+
+        self.assertFalse(entered.wait(0.1))
+        throttle.release()
+        self.assertTrue(entered.wait(5))
+        thread.join()
+
+        self.assertEqual(throttle.active, 0)
+
+
+    def test_backoff(self):
+        throttle = Throttle(rate=100, concurrency=8)
+
+        throttle.acquire()
+        throttle.release(overloaded=True)
+        self.assertEqual(throttle.factor, 0.5)
+
+        # no further back-off until the cooldown passes
+        throttle.acquire()
+        throttle.release(overloaded=True)
+        self.assertEqual(throttle.factor, 0.5)
+        self.assertEqual(throttle.backoffs, 1)
+
+        # and recovery is gradual
+        throttle.acquire()
+        throttle.release(latency=0.01)
+        self.assertAlmostEqual(throttle.factor, 0.55)
+
+        # rising latency also causes a back-off, but only relative
+        # to calls of a similar size
+        throttle = Throttle(concurrency=8)
+        throttle.COOLDOWN = 0
+        for _index in range(5):
+            throttle.acquire()
+            throttle.release(1, 0.01)
+        throttle.acquire(100)
+        throttle.release(100, 5.0)
+        self.assertEqual(throttle.factor, 1.0)
+
+        for _index in range(10):
+            throttle.acquire()
+            throttle.release(1, 0.1)
+        self.assertLess(throttle.factor, 0.1)
+        self.assertGreaterEqual(throttle.factor, throttle.min_factor)
+
+
+class TestSessionThrottle(TestCase):
+
+    def setUp(self):
+        self.prep = patch('koji.ClientSession._prepCall').start()
+        self.prep.side_effect = lambda *args: (None, None, args)
+        self.send = patch('koji.ClientSession._sendCall').start()
+        self.send.side_effect = self.do_send
+
+        self.session = koji.ClientSession('FAKE_URL')
+        self.throttle = Throttle(rate=100, burst=10, concurrency=2)
+        set_throttle(self.session, self.throttle)
+
+        self.sent = []
+
+
+    def tearDown(self):
+        close_session_pool(self.session)
+        patch.stopall()
+
+
+    def do_send(self, handler, headers, request):
+        name, args, _kwargs = request
+        if name == "multiCall":
+            self.sent.append(len(args[0]))
+            return [[call["params"][0]] for call in args[0]]
+        elif name == "getTag":
+            raise koji.ServerOffline("overloaded")
+        else:
+            self.sent.append(1)
+            return args[0]
+
+
+    def test_calls(self):
+        stats = CallStats()
+        set_call_stats(self.session, stats)
+
+        self.assertEqual(self.session.getBuild(5), 5)
+
+        # the pooled clones share the throttle
+        loaded = bulk_load(self.session, self.session.getBuild,
+                           range(0, 30), size=10, jobs=2)
+        self.assertEqual(len(loaded), 30)
+        self.assertEqual(sorted(self.sent), [1, 10, 10, 10])
+
+        # the multicalls took a token per call, and had to wait
+        self.assertEqual(self.throttle.active, 0)
+        self.assertGreater(stats.as_dict()["phases"]["throttle"]["count"],
+                           0)
+
+        self.assertRaises(koji.ServerOffline, self.session.getTag, 1)
+        self.assertEqual(self.throttle.backoffs, 1)
+        self.assertEqual(self.throttle.active, 0)
+
+        # once removed, calls are no longer limited
+        set_throttle(self.session, None)
+        waited = self.throttle.waited
+        for index in range(20):
+            self.session.getBuild(index)
+        self.assertEqual(self.throttle.waited, waited)
+
+
 class TestBulkLoad(TestCase):
 
 
@@ -584,11 +1242,300 @@ class TestAsUserinfo(TestCase):
         self.assertEqual(send.call_count, 0)
 
 
+class TestBulkLoaders(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=200, tags=10, depth=5)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.session = koji.ClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def requests(self):
+        found = self.server.hub.requests
+        self.server.hub.requests = 0
+        return found
+
+
+    def test_bulk_load_named(self):
+        sess = self.session
+
+        targets = bulk_load_targets(sess, ["target1", 2])
+        self.assertEqual(targets["target1"]["dest_tag_name"], "tag0001")
+        self.assertEqual(targets[2]["name"], "target2")
+        self.assertRaises(NoSuchTarget, bulk_load_targets, sess, [99])
+
+        hosts = bulk_load_hosts(sess, ["host1", 2, "nope"], err=False)
+        self.assertEqual(hosts[2]["name"], "host2")
+        self.assertIsNone(hosts["nope"])
+
+        channels = bulk_load_channels(sess, ["createrepo", 1])
+        self.assertEqual(channels[1]["name"], "default")
+        self.assertRaises(NoSuchChannel, bulk_load_channels, sess, ["x"])
+
+        packages = bulk_load_packages(sess, ["pkg00003", 4])
+        self.assertEqual(packages[4]["name"], "pkg00004")
+        self.assertRaises(NoSuchPackage, bulk_load_packages, sess, [999])
+
+        # each of the loads was a single multicall
+        self.assertEqual(self.requests(), 7)
+
+
+    def test_bulk_load_archives_rpms(self):
+        sess = self.session
+
+        aid = 10 * PER_BUILD + 1
+        filename = self.data.archive(aid)["filename"]
+
+        archives = bulk_load_archives(sess, [10 * PER_BUILD, filename])
+        self.assertEqual(archives[filename]["id"], aid)
+        self.assertEqual(archives[10 * PER_BUILD]["build_id"], 10)
+        self.assertRaises(NoSuchArchive, bulk_load_archives,
+                          sess, ["missing.jar"])
+
+        rpm = self.data.rpm(11 * PER_BUILD + 1)
+        nvra = "%s.%s" % (rpm["nvr"], rpm["arch"])
+
+        rpms = bulk_load_rpms(sess, [nvra, 11 * PER_BUILD])
+        self.assertEqual(rpms[nvra], rpm)
+        self.assertEqual(rpms[11 * PER_BUILD]["arch"], "src")
+        self.assertRaises(NoSuchRPM, bulk_load_rpms, sess, [1])
+
+        self.assertEqual(self.requests(), 4)
+
+
+    def test_bulk_as_info(self):
+        sess = self.session
+        data = self.data
+
+        build = data.build(5)
+        found = bulk_as_buildinfo(sess, [1, build, data.build(2)["nvr"], 1])
+        self.assertEqual([b["id"] for b in found], [1, 5, 2, 1])
+        self.assertIs(found[1], build)
+
+        # only the two unique keys were loaded, in one multicall
+        self.assertEqual(self.server.hub.calls["getBuild"], 2)
+        self.assertEqual(self.requests(), 1)
+
+        self.assertRaises(NoSuchBuild, bulk_as_buildinfo, sess, [1, 999])
+        found = bulk_as_buildinfo(sess, [999, 1, None], err=False)
+        self.assertEqual(found[0], None)
+        self.assertEqual(found[1]["id"], 1)
+        self.assertEqual(found[2], None)
+        self.requests()
+
+        # dicts alone need no calls at all
+        self.assertEqual(bulk_as_buildinfo(sess, [build]), [build])
+        self.assertEqual(self.requests(), 0)
+
+        tags = bulk_as_taginfo(sess, ["tag0002", 3])
+        self.assertEqual([t["id"] for t in tags], [2, 3])
+
+        targets = bulk_as_targetinfo(sess, [{"id": 7}, "target1"])
+        self.assertEqual([t["id"] for t in targets], [7, 1])
+
+        hosts = bulk_as_hostinfo(sess, [1, "host3"])
+        self.assertEqual([h["id"] for h in hosts], [1, 3])
+
+        users = bulk_as_userinfo(sess, ["user1", 2, 3])
+        self.assertEqual([u["name"] for u in users],
+                         ["user1", "user2", "user3"])
+
+        archives = bulk_as_archiveinfo(sess, [10 * PER_BUILD])
+        self.assertEqual(archives[0]["build_id"], 10)
+
+        rpms = bulk_as_rpminfo(sess, [11 * PER_BUILD])
+        self.assertEqual(rpms[0]["build_id"], 11)
+
+
+    def test_bulk_as_info_identity(self):
+        sess = self.session
+        set_identity_map(sess, IdentityMap())
+
+        bulk_as_taginfo(sess, [1, 2])
+        self.server.hub.calls.clear()
+
+        tags = bulk_as_taginfo(sess, ["tag0001", 2, 3])
+        self.assertEqual([t["id"] for t in tags], [1, 2, 3])
+
+        # only tag 3 was unknown to the identity map
+        self.assertEqual(self.server.hub.calls,
+                         {"multiCall": 1, "getTag": 1})
+
+
+class TestMulticallBatch(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=200, tags=10, depth=5)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.session = koji.ClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def requests(self):
+        found = self.server.hub.requests
+        self.server.hub.requests = 0
+        return found
+
+
+    def test_mixed_calls(self):
+        batch = MulticallBatch(self.session)
+
+        build = batch.call("getBuild", 5)
+        tag = batch.call("getTag", "tag0002")
+        rpms = batch.submit("listRPMs", kwargs={"buildID": 5})
+        missing = batch.call("getBuild", 999, strict=True)
+
+        self.assertEqual(len(batch), 4)
+        self.assertFalse(build.done())
+        self.assertEqual(self.requests(), 0)
+
+        batch.flush()
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(self.requests(), 1)
+
+        self.assertEqual(build.result()["id"], 5)
+        self.assertEqual(tag.result()["id"], 2)
+        self.assertEqual(rpms.result(), self.data.rpms_of(5))
+        self.assertRaises(koji.GenericError, missing.result)
+
+        # an empty batch sends nothing
+        batch.flush()
+        self.assertEqual(self.requests(), 0)
+
+
+    def test_on_demand(self):
+        batch = MulticallBatch(self.session)
+        first = batch.call("getBuild", 1)
+        second = batch.call("getBuild", 2)
+
+        # asking for any result sends all of the queued calls
+        self.assertEqual(first.result()["id"], 1)
+        self.assertTrue(second.done())
+        self.assertEqual(self.requests(), 1)
+
+
+    def test_threshold(self):
+        batch = MulticallBatch(self.session, size=2, threshold=5)
+        futs = [batch.call("getBuild", bid) for bid in range(1, 8)]
+
+        # the first five were sent in multicalls of two
+        self.assertTrue(futs[4].done())
+        self.assertFalse(futs[5].done())
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(self.requests(), 3)
+
+        self.assertEqual([f.result()["id"] for f in futs],
+                         list(range(1, 8)))
+
+
+    def test_context(self):
+        with MulticallBatch(self.session) as batch:
+            fut = batch.call("getBuild", 1)
+        self.assertTrue(fut.done())
+
+        try:
+            with MulticallBatch(self.session) as batch:
+                fut = batch.call("getBuild", 1)
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertTrue(fut.cancelled())
+        self.assertEqual(self.requests(), 1)
+
+
+    def test_shared_rounds(self):
+        sess = self.session
+        build_ids = list(range(1, 21))
+
+        components = gather_component_build_ids(sess, build_ids)
+        self.assertEqual(len(components), 20)
+
+        # archives and RPMs together, then the component RPMs and
+        # archives together
+        self.assertEqual(self.server.hub.calls["multiCall"], 2)
+        self.server.hub.calls.clear()
+
+        builds = [self.data.build(bid) for bid in build_ids]
+        decorate_builds_cg_list(sess, builds)
+        self.assertIn("archive_cg_names", builds[0])
+
+        # archives and RPMs together, then the buildroots
+        self.assertEqual(self.server.hub.calls["multiCall"], 2)
+
+
+    def test_gather_batched(self):
+        batch = MulticallBatch(self.session)
+
+        def builds(bids):
+            futs = [batch.call("getBuild", bid) for bid in bids]
+            yield
+            return [f.result()["id"] for f in futs]
+
+        def tags(names):
+            futs = [batch.call("getTag", name) for name in names]
+            yield
+            ids = [f.result()["id"] for f in futs]
+            futs = [batch.call("getTag", tid + 1) for tid in ids]
+            yield
+            return [f.result()["name"] for f in futs]
+
+        def nothing():
+            return "empty"
+            yield
+
+        found = gather_batched(batch, [builds([1, 2]),
+                                       tags(["tag0001", "tag0002"]),
+                                       nothing()])
+
+        self.assertEqual(found, [[1, 2], ["tag0002", "tag0003"], "empty"])
+
+        # the first round of both gatherers shared a request
+        self.assertEqual(self.requests(), 2)
+
+
+    def test_gather_batched_failure(self):
+        batch = MulticallBatch(self.session)
+        closed = []
+
+        def failing():
+            batch.call("getBuild", 1)
+            yield
+            raise ValueError()
+
+        def waiting():
+            try:
+                fut = batch.call("getBuild", 2)
+                yield
+                batch.call("getBuild", 3)
+                yield
+                return fut.result()
+            finally:
+                closed.append(True)
+
+        self.assertRaises(ValueError, gather_batched, batch,
+                          [waiting(), failing()])
+        self.assertEqual(closed, [True])
+        self.assertEqual(len(batch), 0)
+
+
 class TestBadDingo(TestCase):
 
     def test_bad_dingo(self):
         bads = [BadDingo, FeatureUnavailable,
-                NoSuchBuild, NoSuchTag, NoSuchTarget, NoSuchUser,]
+                NoSuchArchive, NoSuchBuild, NoSuchChannel, NoSuchPackage,
+                NoSuchRPM, NoSuchTag, NoSuchTarget, NoSuchUser, ]
 
         for cls in bads:
             inst = cls("test")
@@ -0,0 +1,342 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+import koji
+
+from gzip import compress
+from mock import patch
+from requests.exceptions import HTTPError
+from unittest import TestCase
+from xmlrpc.client import Fault, dumps, loads
+
+from kojismokydingo import NoSuchBuild, NoSuchTask, set_bulk_retries
+from kojismokydingo.aio import (
+    AsyncSession, async_bulk_load_builds, async_bulk_load_tags,
+    async_bulk_load_tasks, async_hub_version, async_iter_bulk_load, )
+from kojismokydingo.sift import DEFAULT_SIEVES, Sifter
+
+
+class FakeHub():
+    """
+    Just enough of an HTTP/1.1 XML-RPC server to answer the calls
+    made by an AsyncSession
+    """
+
+    def __init__(self, chunked=False):
+        self.chunked = chunked
+        self.calls = []
+        self.requests = 0
+        self.fail_next = 0
+        self.delay = 0
+        self.server = None
+        self.handlers = set()
+
+        self.builds = {i: {"id": i, "nvr": "b-%i-1" % i}
+                       for i in range(1, 21)}
+
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle,
+                                                 "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return "http://127.0.0.1:%i/kojihub" % port
+
+
+    async def stop(self):
+        self.server.close()
+        for task in self.handlers:
+            task.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+
+    def invoke(self, name, params):
+        self.calls.append((name, params))
+
+        if name == "getKojiVersion":
+            return "1.30.1"
+
+        elif name == "getBuild":
+            return self.builds.get(params[0])
+
+        elif name == "getTag":
+            opts = params[1] if len(params) > 1 else {}
+            return {"id": params[0], "name": "tag-%i" % params[0],
+                    "blocked": opts.get("blocked", False)}
+
+        elif name == "getTaskInfo":
+            if params[0] == 99:
+                raise Fault(1000, "bad task")
+            return {"id": params[0]}
+
+        raise Fault(1000, "no method %s" % name)
+
+
+    def respond(self, body):
+        (args, name) = loads(body, use_builtin_types=True)
+        self.requests += 1
+
+        if self.fail_next:
+            self.fail_next -= 1
+            return b"HTTP/1.1 503 Unavailable\r\nContent-Length: 0\r\n\r\n"
+
+        if name == "multiCall":
+            results = []
+            for call in args[0]:
+                params = list(call["params"])
+                if params and isinstance(params[-1], dict) \
+                   and params[-1].get("__starstar"):
+                    kw = params.pop()
+                    kw.pop("__starstar")
+                    params.append(kw)
+                try:
+                    results.append([self.invoke(call["methodName"],
+                                                params)])
+                except Fault as fault:
+                    results.append({"faultCode": fault.faultCode,
+                                    "faultString": fault.faultString})
+            payload = dumps((results,), methodresponse=True,
+                            allow_none=True)
+        else:
+            try:
+                payload = dumps((self.invoke(name, list(args)),),
+                                methodresponse=True, allow_none=True)
+            except Fault as fault:
+                payload = dumps(fault, methodresponse=True)
+
+        payload = payload.encode("utf-8")
+
+        if self.chunked:
+            payload = compress(payload)
+            mid = len(payload) // 2
+            parts = (payload[:mid], payload[mid:])
+            body = b"".join(b"%x\r\n%s\r\n" % (len(p), p) for p in parts)
+            return (b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n"
+                    b"Content-Encoding: gzip\r\n\r\n" + body + b"0\r\n\r\n")
+        else:
+            return (b"HTTP/1.1 200 OK\r\nContent-Length: %i\r\n\r\n"
+                    % len(payload)) + payload
+
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+
+                body = await reader.readexactly(length)
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                writer.write(self.respond(body))
+                await writer.drain()
+        finally:
+            self.handlers.discard(task)
+            writer.close()
+
+
+class AsyncTestCase(TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.hub = FakeHub()
+        self.url = self.run_async(self.hub.start())
+        self.session = koji.ClientSession(self.url)
+        self.asession = AsyncSession(self.session, connections=2)
+
+
+    def tearDown(self):
+        self.asession.close()
+        self.run_async(self.hub.stop())
+        self.loop.close()
+
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+
+class TestAsyncSession(AsyncTestCase):
+
+    def test_call(self):
+        asession = self.asession
+
+        self.assertEqual(self.run_async(asession.call("getBuild", 1)),
+                         self.hub.builds[1])
+        self.assertEqual(self.run_async(async_hub_version(asession)),
+                         (1, 30, 1))
+
+        with self.assertRaises(koji.GenericError):
+            self.run_async(asession.call("getTaskInfo", 99))
+
+        # the connection was kept alive and re-used
+        self.assertEqual(len(asession._slots), 1)
+        self.assertEqual(self.hub.requests, 3)
+
+
+    def test_cancelled(self):
+        asession = self.asession
+
+        async def cancel_then_call():
+            self.hub.delay = 0.2
+            task = asyncio.ensure_future(asession.call("getBuild", 1))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            # the response to the cancelled call is never read as the
+            # response to the next
+            self.hub.delay = 0
+            return await asession.call("getBuild", 2)
+
+        result = self.run_async(cancel_then_call())
+        self.assertEqual(result, self.hub.builds[2])
+        self.assertEqual(len(asession._slots), 1)
+
+
+    def test_clone_in_executor(self):
+        asession = self.asession
+        made = []
+
+        def clone(session):
+            made.append(session)
+            return koji.ClientSession(self.url)
+
+        async def calls():
+            return await asyncio.gather(asession.call("getBuild", 1),
+                                        asession.call("getBuild", 2),
+                                        asession.call("getBuild", 3))
+
+        loop = self.loop
+        with patch.object(loop, "run_in_executor",
+                          wraps=loop.run_in_executor) as executor, \
+             patch("kojismokydingo.aio.clone_session", clone):
+            found = self.run_async(calls())
+
+        self.assertEqual(found, [self.hub.builds[i] for i in (1, 2, 3)])
+
+        # no more clones than connections, each made in the executor
+        self.assertEqual(len(made), 2)
+        self.assertEqual(executor.call_count, 2)
+
+
+    def test_chunked_gzip(self):
+        self.hub.chunked = True
+        result = self.run_async(self.asession.call("getBuild", 2))
+        self.assertEqual(result, self.hub.builds[2])
+
+
+class TestAsyncBulkLoad(AsyncTestCase):
+
+    def test_iter_bulk_load(self):
+        asession = self.asession
+
+        async def collect():
+            loaded = async_iter_bulk_load(asession, self.session.getBuild,
+                                          range(1, 22), size=3)
+            return [pair async for pair in loaded]
+
+        loaded = self.run_async(collect())
+        self.assertEqual([key for key, _info in loaded], list(range(1, 22)))
+        self.assertEqual(loaded[0][1], self.hub.builds[1])
+        self.assertEqual(loaded[-1][1], None)
+        self.assertEqual(self.hub.requests, 7)
+        self.assertFalse(self.session.multicall)
+
+
+    def test_bulk_load_builds(self):
+        asession = self.asession
+
+        loaded = self.run_async(async_bulk_load_builds(asession, [3, 1, 2]))
+        self.assertEqual(list(loaded), [3, 1, 2])
+        self.assertEqual(loaded[3], self.hub.builds[3])
+
+        with self.assertRaises(NoSuchBuild):
+            self.run_async(async_bulk_load_builds(asession, [1, 50]))
+
+
+    def test_concurrent_loads(self):
+        asession = self.asession
+
+        async def both():
+            return await asyncio.gather(
+                async_bulk_load_builds(asession, range(1, 11), size=2),
+                async_bulk_load_tags(asession, range(1, 11), size=2))
+
+        builds, tags = self.run_async(both())
+        self.assertEqual(list(builds), list(range(1, 11)))
+        self.assertEqual(tags[4]["name"], "tag-4")
+        self.assertTrue(tags[4]["blocked"])
+
+        # neither load collected the other's calls
+        for name, params in self.hub.calls:
+            if name == "getTag":
+                self.assertEqual(params[1], {"blocked": True})
+
+
+    def test_bulk_load_tasks(self):
+        asession = self.asession
+
+        loaded = self.run_async(async_bulk_load_tasks(asession, [1, 99],
+                                                      err=False))
+        self.assertEqual(loaded, {1: {"id": 1}, 99: None})
+
+        with self.assertRaises(NoSuchTask):
+            self.run_async(async_bulk_load_tasks(asession, [1, 99]))
+
+
+    @patch('kojismokydingo.aio.asyncio.sleep')
+    def test_retry(self, sleep):
+        async def nap(delay):
+            pass
+        sleep.side_effect = nap
+
+        set_bulk_retries(self.session, retries=1, backoff=0.5)
+        self.hub.fail_next = 1
+
+        loaded = self.run_async(async_bulk_load_builds(self.asession,
+                                                       [1, 2]))
+        self.assertEqual(loaded[2], self.hub.builds[2])
+        sleep.assert_called_once_with(0.5)
+
+        self.hub.fail_next = 2
+        with self.assertRaises(HTTPError):
+            self.run_async(async_bulk_load_builds(self.asession, [1, 2],
+                                                      size=2))
+
+
+class TestAsyncSifter(AsyncTestCase):
+
+    def test_async_run(self):
+        sifter = Sifter(DEFAULT_SIEVES, "(item name foo-a)")
+        infos = [{"id": 1, "name": "foo-a"}, {"id": 2, "name": "bar"}]
+
+        results = self.run_async(sifter.async_run(self.session, infos))
+        self.assertEqual(results, {"default": [infos[0]]})
+
+
+#
+# The end.
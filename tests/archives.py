@@ -12,13 +12,16 @@
 # along with this library; if not, see <http://www.gnu.org/licenses/>.
 
 
-from koji import PathInfo
+from koji import ClientSession, PathInfo
 from mock import MagicMock
 from unittest import TestCase
 
 from kojismokydingo.archives import (
     as_pathinfo,
-    gather_build_archives, gather_build_maven_archives, gather_build_rpms, )
+    gather_build_archives, gather_build_maven_archives, gather_build_rpms,
+    iter_list_archives, )
+
+from benchmarks.fakehub import SyntheticData, fake_hub
 
 
 ARCHIVE_BUILD = {
@@ -239,5 +242,27 @@ class TestPathInfo(TestCase):
         self.assertTrue(pi is as_pathinfo(pi))
 
 
+
+class TestListArchives(TestCase):
+
+    def test_paged(self):
+        with fake_hub(SyntheticData(builds=100)) as server:
+            session = ClientSession(server.url)
+
+            expected = session.listArchives(type="maven")
+            server.hub.calls.clear()
+
+            pages = list(iter_list_archives(session, size=7, type="maven"))
+            found = [a for page in pages for a in page]
+
+            self.assertEqual(found, sorted(expected,
+                                           key=lambda a: a["id"]))
+            self.assertTrue(all(len(page) == 7 for page in pages[:-1]))
+            self.assertEqual(server.hub.calls["listArchives"],
+                             len(expected) // 7 + 1)
+
+            session.logout()
+
+
 #
 # The end.
@@ -0,0 +1,218 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+import koji
+
+from unittest import TestCase
+
+import benchmarks
+
+from benchmarks.__main__ import (
+    compare_timings, iter_benchmarks, time_benchmark, )
+from benchmarks.fakehub import PER_BUILD, SyntheticData, fake_hub
+from kojismokydingo import (
+    bulk_load_build_archives, bulk_load_build_rpms, bulk_load_buildroots,
+    bulk_load_builds, bulk_load_tags, bulk_load_users, )
+from kojismokydingo.archives import (
+    gather_latest_archives, gather_latest_maven_archives,
+    gather_latest_win_archives, )
+from kojismokydingo.builds import bulk_move_builds
+from kojismokydingo.sift import Sifter
+from kojismokydingo.sift.builds import build_info_sieves
+
+
+class TestBenchmarks(TestCase):
+
+    def test_suites(self):
+        # every benchmark still runs, at a tiny size
+
+        found = list(iter_benchmarks(benchmarks))
+        self.assertTrue(found)
+
+        for name, cls, mname, _param in found:
+            elapsed = time_benchmark(cls, mname, 50, 1, min_time=0)
+            self.assertGreater(elapsed, 0, name)
+
+
+    def test_synthetic_builds(self):
+        builds = benchmarks.synthetic_builds(100, seed=3)
+        self.assertEqual(len(builds), 100)
+        self.assertIs(benchmarks.synthetic_builds(100, seed=3), builds)
+        self.assertEqual(len(set(b["id"] for b in builds)), 100)
+
+
+    def test_compare(self):
+        baseline = {"a": 1.0, "b": 1.0, "c": 1.0}
+        timings = {"a": 1.1, "b": 1.5, "c": 0.5, "d": 2.0}
+
+        rows, regressed = compare_timings(baseline, timings, 0.25)
+        self.assertEqual(regressed, 1)
+        self.assertEqual([row[-1] for row in rows],
+                         ["ok", "REGRESSED", "improved", "new"])
+
+
+
+class TestSyntheticData(TestCase):
+
+    def test_seeded(self):
+        one = SyntheticData(seed=5)
+        two = SyntheticData(seed=5)
+        other = SyntheticData(seed=6)
+
+        self.assertEqual(one.build(123), two.build(123))
+        self.assertEqual(one.rpm_sigs(123 * PER_BUILD),
+                         two.rpm_sigs(123 * PER_BUILD))
+
+        owners = [one.build(i)["owner_id"] for i in range(1, 50)]
+        others = [other.build(i)["owner_id"] for i in range(1, 50)]
+        self.assertNotEqual(owners, others)
+
+
+    def test_lookups(self):
+        data = SyntheticData(builds=1000, tags=20, depth=4)
+
+        build = data.build(321)
+        self.assertEqual(data.build(build["nvr"]), build)
+        self.assertIsNone(data.build(1001))
+        self.assertIsNone(data.build("pkg00001-9.9-1.fake"))
+
+        self.assertEqual(data.tag("tag0007")["id"], 7)
+        self.assertEqual(data.tag_parents(7), [6])
+        self.assertEqual(data.tag_parents(9), [5])
+        self.assertEqual(data.tag_parents(12), [11, 5])
+
+        self.assertEqual([link[1] for link, _depth in data.inheritance(12)],
+                         [11, 10, 9, 5])
+        self.assertEqual(data.tag_children(5), [6, 9, 12])
+
+
+class TestFakeHub(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(seed=1, builds=500, tags=20, depth=4)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.session = koji.ClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def test_bulk_loaders(self):
+        session = self.session
+        data = self.data
+
+        nvrs = [data.build(i)["nvr"] for i in range(1, 101)]
+        builds = bulk_load_builds(session, nvrs, size=30)
+        self.assertEqual(list(builds), nvrs)
+        self.assertEqual(builds[nvrs[4]], data.build(5))
+
+        # the multicalls were chunked
+        self.assertEqual(self.server.hub.calls["getBuild"], 100)
+        self.assertEqual(self.server.hub.requests, 4)
+
+        tags = bulk_load_tags(session, ["tag0001", 2, 3])
+        self.assertEqual(tags[2]["name"], "tag0002")
+
+        users = bulk_load_users(session, ["user1", 2])
+        self.assertEqual(users[2]["name"], "user2")
+
+        archives = bulk_load_build_archives(session, [10, 11, 15])
+        self.assertEqual(len(archives[10]), 2)
+        self.assertEqual(archives[11], [])
+        self.assertEqual(archives[15][0]["btype"], "image")
+
+        rpms = bulk_load_build_rpms(session, [10, 11])
+        self.assertEqual(len(rpms[11]), 3)
+
+        broots = bulk_load_buildroots(session, [20, 21])
+        self.assertEqual(broots[20]["cg_name"], "fake-cg")
+
+
+    def test_tagged(self):
+        session = self.session
+
+        direct = session.listTagged("tag0004")
+        inherited = session.listTagged("tag0004", inherit=True)
+        self.assertTrue(set(b["id"] for b in direct) <
+                        set(b["id"] for b in inherited))
+
+        latest = session.listTagged("tag0004", inherit=True, latest=True)
+        names = [b["name"] for b in latest]
+        self.assertEqual(len(names), len(set(names)))
+
+        inher = session.getFullInheritance("tag0004")
+        self.assertEqual([i["parent_id"] for i in inher], [3, 2, 1])
+
+        children = session.getFullInheritance(1, reverse=True)
+        self.assertEqual(children[0]["child_id"], 2)
+
+
+    def test_move_and_sift(self):
+        session = self.session
+        data = self.data
+
+        # builds 21 and 22 are tagged into tag0001
+        builds = bulk_load_builds(session, [21, 22, 23])
+        self.assertIn(21, data.tagged_ids(1))
+        self.assertNotIn(21, data.tagged_ids(4))
+
+        bulk_move_builds(session, "tag0001", "tag0004",
+                         list(builds.values()))
+        self.assertNotIn(21, data.tagged_ids(1))
+        self.assertIn(21, data.tagged_ids(4))
+
+        sifter = Sifter(build_info_sieves(),
+                        "(flag moved (tagged tag0004))"
+                        "(flag imported (cg-imported))")
+        results = sifter(session, bulk_load_builds(session, range(15, 25))
+                         .values())
+
+        moved = sorted(b["id"] for b in results["moved"])
+        self.assertEqual(moved, [21, 22, 23])
+
+        imported = [b["id"] for b in results["imported"]]
+        self.assertEqual(imported, [20])
+
+
+    def test_archives(self):
+        session = self.session
+
+        types = session.getArchiveTypes()
+        self.assertEqual([t["id"] for t in types], list(range(1, 7)))
+        self.assertEqual(session.getArchiveType("a-1-0.jar")["id"], 1)
+        self.assertEqual(session.getArchiveType(type_id=6)["name"], "exe")
+        self.assertIsNone(session.getArchiveType(type_name="zip"))
+
+        archives, builds = session.listTaggedArchives("tag0004",
+                                                      inherit=True)
+        self.assertTrue(archives)
+        bids = set(b["id"] for b in builds)
+        self.assertTrue(all(a["build_id"] in bids for a in archives))
+
+        for btype, gather in (("maven", gather_latest_maven_archives),
+                              ("win", gather_latest_win_archives)):
+            found = gather(session, "tag0004")
+            self.assertTrue(found, btype)
+            self.assertTrue(all(a["btype"] == btype for a in found))
+            self.assertTrue(all(a["filepath"] for a in found))
+
+        found = gather_latest_archives(session, "tag0004")
+        self.assertEqual(set(a["type_name"] for a in found),
+                         {"rpm", "jar", "pom", "qcow2", "tar", "dll", "exe"})
+
+#
+# The end.
@@ -12,16 +12,22 @@
 # along with this library; if not, see <http://www.gnu.org/licenses/>.
 
 
+import koji
+
 from itertools import repeat
 from mock import MagicMock
+from operator import itemgetter
 from unittest import TestCase
 
 from kojismokydingo.builds import (
-    build_dedup, build_id_sort, build_nvr_sort,
+    BUILD_COMPLETE, build_dedup, build_id_sort, build_nvr_sort,
     bulk_move_builds, bulk_move_nvrs,
     bulk_tag_builds, bulk_tag_nvrs,
     bulk_untag_builds, bulk_untag_nvrs,
-    filter_builds_by_state, filter_imported_builds, )
+    filter_builds_by_state, filter_imported_builds,
+    iter_list_builds, iter_list_tagged, )
+
+from benchmarks.fakehub import SyntheticData, fake_hub
 
 
 # A CG-imported build
@@ -502,5 +508,132 @@ class BulkTagging(TestCase):
         self.assertEqual(sess.multiCall.call_count, 2)
 
 
+
+class TestPagedListing(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=300, tags=10)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.session = koji.ClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def test_list_tagged(self):
+        sess = self.session
+
+        for inherit in (False, True):
+            for latest in (False, True):
+                expected = sess.listTagged(7, inherit=inherit, latest=latest)
+                self.server.hub.calls.clear()
+
+                pages = list(iter_list_tagged(sess, "tag0007", size=10,
+                                              inherit=inherit,
+                                              latest=latest))
+                found = [b for page in pages for b in page]
+
+                self.assertEqual(sorted(found, key=itemgetter("id")),
+                                 sorted(expected, key=itemgetter("id")))
+
+                for page in pages[:-1]:
+                    self.assertGreaterEqual(len(page), 10)
+
+                # one listTagged per package, as of a single event,
+                # with no need for a pass over the whole tag
+                calls = self.server.hub.calls
+                self.assertEqual(calls["getLastEvent"], 1)
+                self.assertEqual(calls["listPackages"], 1)
+                self.assertEqual(calls["count"], 1)
+                self.assertNotIn("queryHistory", calls)
+                self.assertLess(calls["multiCall"], calls["listTagged"])
+
+        found = list(iter_list_tagged(sess, 7, type="maven"))
+        expected = sess.listTagged(7, type="maven")
+        self.assertEqual(len(found), 1)
+        self.assertEqual(sorted(b["id"] for b in found[0]),
+                         sorted(b["id"] for b in expected))
+
+
+    def test_list_tagged_unlisted(self):
+        sess = self.session
+
+        expected = sess.listTagged(7, inherit=True)
+        names = sorted(set(b["package_name"] for b in expected))
+        unlisted = names[:2]
+
+        # packages which are still tagged but no longer listed
+        self.server.hub.unlisted.update(int(n[3:]) for n in unlisted)
+
+        self.server.hub.calls.clear()
+
+        pages = list(iter_list_tagged(sess, 7, size=10, inherit=True))
+        found = [b for page in pages for b in page]
+
+        self.assertEqual(sorted(b["id"] for b in found),
+                         sorted(b["id"] for b in expected))
+
+        # the unlisted packages are found in the history of the
+        # package lists, rather than by listing the whole tag
+        calls = self.server.hub.calls
+        self.assertGreater(calls["queryHistory"], 0)
+        self.assertEqual(calls["listTagged"], len(names))
+
+        # the builds of the unlisted packages come last
+        last = set(b["package_name"] for b in pages[-1])
+        self.assertTrue(last.issuperset(unlisted))
+
+
+    def test_list_builds(self):
+        sess = self.session
+
+        expected = sess.listBuilds(state=BUILD_COMPLETE)
+        self.server.hub.calls.clear()
+
+        pages = list(iter_list_builds(sess, size=50, state=BUILD_COMPLETE))
+        self.assertEqual([b for page in pages for b in page], expected)
+        self.assertEqual([len(page) for page in pages[:-1]],
+                         [50] * (len(pages) - 1))
+        self.assertEqual(self.server.hub.calls["listBuilds"],
+                         len(expected) // 50 + 1)
+
+        found = list(iter_list_builds(sess, packageID=5))
+        self.assertEqual(len(found), 1)
+        self.assertEqual([b["id"] for b in found[0]],
+                         [b["id"] for b in sess.listBuilds(packageID=5)])
+
+
+    def test_list_builds_changing(self):
+        rows = [{"build_id": bid} for bid in range(1, 101)]
+
+        def listBuilds(queryOpts=None):
+            self.assertEqual(queryOpts["order"], "build_id")
+            start = queryOpts["offset"]
+            return [dict(row) for row in
+                    rows[start:start + queryOpts["limit"]]]
+
+        sess = MagicMock()
+        sess.listBuilds.side_effect = listBuilds
+
+        found = []
+        for page in iter_list_builds(sess, size=20):
+            found.extend(b["build_id"] for b in page)
+
+            # builds already loaded are deleted, including the last
+            # one, shifting the offsets of the later builds, and a
+            # new build is created
+            for bid in {page[0]["build_id"], page[-1]["build_id"]}:
+                rows.remove({"build_id": bid})
+            rows.append({"build_id": rows[-1]["build_id"] + 1})
+
+        # nothing skipped or repeated despite the deletions, and the
+        # created builds are included
+        self.assertEqual(found, list(range(1, found[-1] + 1)))
+        self.assertGreater(found[-1], 100)
+
+
 #
 # The end.
@@ -0,0 +1,404 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+import koji
+
+from mock import patch
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from kojismokydingo import (
+    MulticallBatch, NotPermitted, bulk_load_build_rpms, bulk_load_builds,
+    cached_metadata, close_bulk_cache, close_metadata_cache, hub_version,
+    set_bulk_cache, set_metadata_cache, )
+from kojismokydingo.archives import _archive_type_ids
+from kojismokydingo.cache import BulkCache, MetadataCache
+from kojismokydingo.cli import TagSmokyDingo
+
+
+class TestBulkCache(TestCase):
+
+    def setUp(self):
+        self.cache = BulkCache(":memory:", max_bytes=1000)
+
+
+    def tearDown(self):
+        self.cache.close()
+
+
+    def test_get_put(self):
+        cache = self.cache
+
+        self.assertEqual(cache.get_many("hub", "getBuild", [[1], [2]]), {})
+
+        cache.put_many("hub", "getBuild", [([1], {"id": 1}),
+                                           (["a-1-1"], {"id": 1})])
+
+        found = cache.get_many("hub", "getBuild", [[2], ["a-1-1"], [1]])
+        self.assertEqual(found, {1: {"id": 1}, 2: {"id": 1}})
+
+        # different hub or method is a different key
+        self.assertEqual(cache.get_many("other", "getBuild", [[1]]), {})
+        self.assertEqual(cache.get_many("hub", "getTag", [[1]]), {})
+
+        # dict args are keyed regardless of their order
+        cache.put_many("hub", "listRPMs", [({"a": 1, "b": 2}, [])])
+        found = cache.get_many("hub", "listRPMs", [{"b": 2, "a": 1}])
+        self.assertEqual(found, {0: []})
+
+        stats = cache.stats()
+        self.assertEqual([s[:3] for s in stats],
+                         [("hub", "getBuild", 2), ("hub", "listRPMs", 1)])
+
+        cache.clear("other")
+        self.assertEqual(len(cache.stats()), 2)
+        cache.clear()
+        self.assertEqual(cache.stats(), [])
+
+
+    @patch('kojismokydingo.cache.time')
+    def test_eviction(self, time):
+        # a clock that always moves forward
+        time.side_effect = iter(range(0, 100))
+
+        cache = self.cache
+        value = "x" * 98
+
+        # each entry is 100 bytes of JSON
+        for i in range(0, 9):
+            cache.put_many("hub", "getBuild", [([i], value)])
+        self.assertEqual(cache.total_bytes(), 900)
+
+        # going past the limit evicts the oldest down to 90%
+        cache.get_many("hub", "getBuild", [[0]])
+        cache.put_many("hub", "getBuild", [([9], value), ([10], value)])
+        self.assertEqual(cache.total_bytes(), 900)
+
+        found = cache.get_many("hub", "getBuild", [[i] for i in range(11)])
+        self.assertEqual(sorted(found), [0, 3, 4, 5, 6, 7, 8, 9, 10])
+
+        self.assertEqual(cache.prune(500), 4)
+        self.assertEqual(cache.total_bytes(), 500)
+
+
+    @patch('kojismokydingo.cache.time')
+    def test_expiry(self, time):
+        time.return_value = 0
+
+        cache = BulkCache(":memory:", ttl=10)
+        cache.put_many("hub", "getBuild", [([1], {"id": 1})])
+
+        # reading an entry doesn't refresh it
+        time.return_value = 9
+        self.assertEqual(cache.get_many("hub", "getBuild", [[1]]),
+                         {0: {"id": 1}})
+        cache.put_many("hub", "getBuild", [([2], {"id": 2})])
+
+        time.return_value = 10
+        self.assertEqual(cache.get_many("hub", "getBuild", [[1], [2]]),
+                         {1: {"id": 2}})
+
+        # expired entries are pruned regardless of the size limit
+        self.assertEqual(cache.prune(), 1)
+        self.assertEqual([s[:3] for s in cache.stats()],
+                         [("hub", "getBuild", 1)])
+
+        cache.close()
+
+
+class TestCachedBulkLoad(TestCase):
+
+    def setUp(self):
+        self.prep = patch('koji.ClientSession._prepCall').start()
+        self.prep.side_effect = lambda *args: (None, None, args)
+        self.send = patch('koji.ClientSession._sendCall').start()
+        self.send.side_effect = self.do_send
+
+        self.session = koji.ClientSession('FAKE_URL')
+        self.cache = BulkCache(":memory:")
+        set_bulk_cache(self.session, self.cache)
+
+        complete = koji.BUILD_STATES["COMPLETE"]
+        building = koji.BUILD_STATES["BUILDING"]
+
+        self.builds = {
+            1: {"id": 1, "nvr": "one-1-1", "state": complete},
+            2: {"id": 2, "nvr": "two-1-1", "state": building},
+        }
+        for info in list(self.builds.values()):
+            self.builds[info["nvr"]] = info
+
+        # the keys requested of the hub
+        self.requested = []
+
+
+    def tearDown(self):
+        close_bulk_cache(self.session)
+        patch.stopall()
+
+
+    def do_send(self, handler, headers, request):
+        results = []
+        for call in request[1][0]:
+            key = call["params"][0]
+            self.requested.append((call["methodName"], key))
+
+            if call["methodName"] == "getBuild":
+                results.append([self.builds.get(key)])
+            else:
+                results.append([[{"id": key * 10, "build_id": key}]])
+
+        return results
+
+
+    def test_bulk_load_builds(self):
+        loaded = bulk_load_builds(self.session, ["one-1-1", "two-1-1"])
+        self.assertEqual(list(loaded), ["one-1-1", "two-1-1"])
+        self.assertEqual(self.requested, [("getBuild", "one-1-1"),
+                                          ("getBuild", "two-1-1")])
+
+        # the completed build was stored under both its NVR and ID,
+        # but the building one wasn't stored at all
+        self.requested = []
+        loaded = bulk_load_builds(self.session, [1, 2, "one-1-1"])
+        self.assertEqual(list(loaded), [1, 2, "one-1-1"])
+        self.assertEqual(loaded[1], self.builds[1])
+        self.assertEqual(loaded["one-1-1"], self.builds[1])
+        self.assertEqual(self.requested, [("getBuild", 2)])
+
+
+    def test_bulk_load_build_rpms(self):
+        bulk_load_builds(self.session, [1, 2])
+
+        self.requested = []
+        loaded = bulk_load_build_rpms(self.session, [1, 2])
+        self.assertEqual(loaded[1], [{"id": 10, "build_id": 1}])
+        self.assertEqual(self.requested, [("listRPMs", 1),
+                                          ("listRPMs", 2)])
+
+        # only the RPMs of the completed build were stored
+        self.requested = []
+        loaded = bulk_load_build_rpms(self.session, [1, 2])
+        self.assertEqual(loaded[1], [{"id": 10, "build_id": 1}])
+        self.assertEqual(self.requested, [("listRPMs", 2)])
+
+
+    def test_batch(self):
+        bulk_load_builds(self.session, [1, 2])
+
+        batch = MulticallBatch(self.session)
+        self.requested = []
+        batch.load_build_rpms([1, 2])
+        batch.flush()
+        self.assertEqual(self.requested, [("listRPMs", 1),
+                                          ("listRPMs", 2)])
+
+        # the batch shares the cache with the bulk loaders
+        self.requested = []
+        found = batch.load_build_rpms([1, 2])
+        loaded = bulk_load_build_rpms(self.session, [1])
+        self.assertEqual(found[1].result(), loaded[1])
+        self.assertEqual(self.requested, [("listRPMs", 2)])
+
+
+class TestMetadataCache(TestCase):
+
+    def setUp(self):
+        self.cache = MetadataCache(":memory:", ttl=60)
+
+
+    def tearDown(self):
+        self.cache.close()
+
+
+    @patch('kojismokydingo.cache.time')
+    def test_get_put(self, time):
+        time.return_value = 1000
+        cache = self.cache
+
+        self.assertIsNone(cache.get("hub", "", "listBTypes"))
+
+        cache.put("hub", "", "listBTypes", [{"id": 1, "name": "rpm"}])
+        cache.put("hub", "user:me", "getUserPerms", ["admin"])
+
+        self.assertEqual(cache.get("hub", "", "listBTypes"),
+                         [{"id": 1, "name": "rpm"}])
+        self.assertEqual(cache.get("hub", "user:me", "getUserPerms"),
+                         ["admin"])
+
+        # different hub or principal is a different key
+        self.assertIsNone(cache.get("other", "", "listBTypes"))
+        self.assertIsNone(cache.get("hub", "user:you", "getUserPerms"))
+
+        # values expire after the ttl
+        time.return_value = 1059
+        self.assertIsNotNone(cache.get("hub", "", "listBTypes"))
+        time.return_value = 1061
+        self.assertIsNone(cache.get("hub", "", "listBTypes"))
+
+        self.assertEqual([s[:3] for s in cache.stats()],
+                         [("hub", "", "listBTypes"),
+                          ("hub", "user:me", "getUserPerms")])
+
+        cache.clear("other")
+        self.assertEqual(len(cache.stats()), 2)
+        cache.clear()
+        self.assertEqual(cache.stats(), [])
+
+
+class TestCachedMetadata(TestCase):
+
+    def setUp(self):
+        self.prep = patch('koji.ClientSession._prepCall').start()
+        self.prep.side_effect = lambda *args: (None, None, args)
+        self.send = patch('koji.ClientSession._sendCall').start()
+        self.send.side_effect = self.do_send
+
+        self.tmpdir = TemporaryDirectory()
+        self.filename = join(self.tmpdir.name, "cache.sqlite")
+        self.sessions = []
+        self.requested = []
+
+
+    def tearDown(self):
+        for session in self.sessions:
+            close_metadata_cache(session)
+        self.tmpdir.cleanup()
+        patch.stopall()
+
+
+    def do_send(self, handler, headers, request):
+        name = request[0]
+        self.requested.append(name)
+
+        if name == "getKojiVersion":
+            return "1.34.1"
+        elif name == "getArchiveTypes":
+            return [{"id": 1, "name": "tar", "extensions": "tar tar.gz"},
+                    {"id": 2, "name": "zip", "extensions": "zip"},
+                    {"id": 3, "name": "jar", "extensions": "jar"},
+                    {"id": 4, "name": "maybe", "extensions": "gz"},
+                    {"id": 5, "name": "also", "extensions": "gz"}]
+        elif name == "getUserPerms":
+            return ["repo"]
+        elif name == "getLoggedInUser":
+            return {"id": 1, "name": "me"}
+
+        raise koji.GenericError("no such method %s" % name)
+
+
+    def session(self, principal=None, refresh=False):
+        # each session has its own connection to the same database,
+        # as separate invocations would
+        session = koji.ClientSession('FAKE_URL')
+        set_metadata_cache(session, MetadataCache(self.filename),
+                           principal, refresh)
+        self.sessions.append(session)
+        return session
+
+
+    def test_hub_version(self):
+        self.assertEqual(hub_version(self.session()), (1, 34, 1))
+        self.assertEqual(hub_version(self.session()), (1, 34, 1))
+        self.assertEqual(self.requested, ["getKojiVersion"])
+
+        # refresh loads it again
+        self.assertEqual(hub_version(self.session(refresh=True)),
+                         (1, 34, 1))
+        self.assertEqual(self.requested, ["getKojiVersion"] * 2)
+
+        # without a cache, it's simply loaded
+        session = koji.ClientSession('FAKE_URL')
+        self.assertEqual(hub_version(session), (1, 34, 1))
+        self.assertEqual(len(self.requested), 3)
+
+
+    def test_personal(self):
+        mine = self.session("user:me")
+        yours = self.session("user:you")
+
+        perms = cached_metadata(mine, "getUserPerms", mine.getUserPerms,
+                                personal=True)
+        self.assertEqual(perms, ["repo"])
+        cached_metadata(mine, "getUserPerms", mine.getUserPerms,
+                        personal=True)
+        self.assertEqual(self.requested, ["getUserPerms"])
+
+        cached_metadata(yours, "getUserPerms", yours.getUserPerms,
+                        personal=True)
+        self.assertEqual(self.requested, ["getUserPerms"] * 2)
+
+        cached_metadata(mine, "getUserPerms", mine.getUserPerms,
+                        personal=True, refresh=True)
+        self.assertEqual(self.requested, ["getUserPerms"] * 3)
+
+        close_metadata_cache(mine)
+        self.assertNotIn("__metadata_cache", vars(mine))
+
+
+    @patch('kojismokydingo.cache.time')
+    def test_permission_check(self, time):
+        time.return_value = 0
+
+        class TagThing(TagSmokyDingo):
+            def handle(self, options):
+                pass
+
+        cmd = TagThing()
+        cmd.session = self.session("user:me")
+
+        # freshly loaded permissions aren't loaded again to refuse
+        with self.assertRaises(NotPermitted):
+            cmd.pre_handle(None)
+        self.assertEqual(self.requested,
+                         ["getLoggedInUser", "getUserPerms"])
+
+        # nor are recently cached ones
+        time.return_value = 60
+        with self.assertRaises(NotPermitted):
+            cmd.pre_handle(None)
+        self.assertEqual(len(self.requested), 2)
+
+        # but older cached ones are, in case of a recent grant
+        time.return_value = 600
+        with self.assertRaises(NotPermitted):
+            cmd.pre_handle(None)
+        self.assertEqual(self.requested,
+                         ["getLoggedInUser", "getUserPerms"] * 2)
+
+
+    def test_archive_type_ids(self):
+        session = self.session()
+
+        found = _archive_type_ids(session, ["zip", "tar.gz", "JAR",
+                                            "foo.tar", "nope"])
+        self.assertEqual(found, {1, 2, 3})
+
+        # the longest suffix matching an extension decides, so this
+        # is a tar.gz rather than an ambiguous gz
+        found = _archive_type_ids(session, ["foo.tar.gz"])
+        self.assertEqual(found, {1})
+
+        # and as with the hub, an ambiguous extension is an error
+        self.assertRaises(koji.GenericError, _archive_type_ids,
+                          session, ["gz"])
+        self.assertRaises(koji.GenericError, _archive_type_ids,
+                          session, ["foo.gz"])
+
+        self.assertEqual(self.requested, ["getArchiveTypes"])
+
+
+#
+# The end.
@@ -0,0 +1,135 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+import koji
+
+from mock import patch
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from kojismokydingo import (
+    NoSuchBuild, bulk_load_builds, close_session_pool, set_cassette, )
+from kojismokydingo.cassette import Cassette, CassetteMiss
+
+
+class TestCassette(TestCase):
+
+    def setUp(self):
+        self.prep = patch('koji.ClientSession._prepCall').start()
+        self.prep.side_effect = lambda *args: (None, None, args)
+        self.send = patch('koji.ClientSession._sendCall').start()
+        self.send.side_effect = self.do_send
+
+        self.session = koji.ClientSession('FAKE_URL')
+        self.tmpdir = TemporaryDirectory()
+
+
+    def tearDown(self):
+        close_session_pool(self.session)
+        self.tmpdir.cleanup()
+        patch.stopall()
+
+
+    def do_send(self, handler, headers, request):
+        name, args, _kwargs = request
+
+        if name == "multiCall":
+            results = []
+            for call in args[0]:
+                bid = call["params"][0]
+                if bid < 100:
+                    results.append([{"id": bid, "nvr": "b-%i-1" % bid}])
+                else:
+                    results.append([None])
+            return results
+
+        elif name == "getLastEvent":
+            return {"id": 500}
+
+        raise koji.GenericError("no such method %s" % name)
+
+
+    def record(self):
+        cassette = Cassette()
+        set_cassette(self.session, cassette)
+
+        builds = bulk_load_builds(self.session, range(1, 11), size=3)
+        event = self.session.getLastEvent()
+        self.assertRaises(koji.GenericError, self.session.getNope, 1)
+
+        # callers may modify what they loaded, which shouldn't change
+        # what was recorded
+        builds[1]["nvr"] = "changed"
+
+        filename = join(self.tmpdir.name, "test.cassette")
+        cassette.save(filename)
+        set_cassette(self.session, None)
+
+        return filename, builds, event
+
+
+    def test_record(self):
+        filename, _builds, _event = self.record()
+
+        cassette = Cassette.load(filename, replay=False)
+        kinds = [entry[0] for entry in cassette.entries]
+        self.assertEqual(kinds, ["multicall"] * 4 + ["call"] * 2)
+
+        # chunk boundaries are kept
+        self.assertEqual([len(entry[1]) for entry in cassette.entries[:4]],
+                         [3, 3, 3, 1])
+
+
+    def test_replay(self):
+        filename, builds, event = self.record()
+        sent = self.send.call_count
+
+        session = koji.ClientSession('FAKE_URL')
+        set_cassette(session, Cassette.load(filename))
+
+        # a different chunking still replays
+        replayed = bulk_load_builds(session, range(1, 11), size=4,
+                                    jobs=2)
+        self.assertEqual(list(replayed), list(range(1, 11)))
+        self.assertEqual(replayed[1]["nvr"], "b-1-1")
+        self.assertEqual(replayed[5], builds[5])
+
+        self.assertEqual(session.getLastEvent(), event)
+        self.assertRaises(koji.GenericError, session.getNope, 1)
+
+        # things which were never recorded
+        self.assertRaises(CassetteMiss, session.getNope, 2)
+        self.assertRaises(CassetteMiss, bulk_load_builds, session, [200])
+
+        # and the hub was never contacted
+        self.assertEqual(self.send.call_count, sent)
+        close_session_pool(session)
+
+
+    def test_replay_missing(self):
+        cassette = Cassette()
+        set_cassette(self.session, cassette)
+        bulk_load_builds(self.session, [1, 200], err=False)
+
+        cassette.replay = True
+        sent = self.send.call_count
+
+        self.assertRaises(NoSuchBuild, bulk_load_builds,
+                          self.session, [1, 200])
+        self.assertEqual(self.send.call_count, sent)
+
+
+#
+# The end.
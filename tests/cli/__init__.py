@@ -12,13 +12,26 @@
 # along with this library; if not, see <http://www.gnu.org/licenses/>.
 
 
+import koji
+
 from io import StringIO
+from mock import patch
+from os.path import join
 from pkg_resources import EntryPoint
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
+from kojismokydingo import bulk_load_builds
+from kojismokydingo.cache import BulkCache
 from kojismokydingo.cli import (
-    SmokyDingo, clean_lines, int_or_str,
+    AnonSmokyDingo, SmokyDingo, clean_lines, int_or_str, iter_clean_lines,
     resplit, space_normalize, tabulate)
+from kojismokydingo.cli.builds import (
+    cli_filter_builds, cli_list_components, cli_stream_builds, )
+from kojismokydingo.cli.sift import output_sifted_stream
+from kojismokydingo.sift.builds import build_info_sifter
+
+from benchmarks.fakehub import SyntheticData, fake_hub
 
 
 ENTRY_POINTS = {
@@ -166,6 +179,25 @@ class TestUtils(TestCase):
         self.assertEqual(clean_lines(expect_2, False), expect_2)
 
 
+    def test_iter_clean_lines(self):
+        with TemporaryDirectory() as tmpdir:
+            filename = join(tmpdir, "lines")
+            with open(filename, "wt") as out:
+                out.write("one  \n# skip me\n\n  two # yup\n")
+
+            lines = iter_clean_lines(filename)
+            self.assertEqual(next(lines), "one")
+            self.assertEqual(list(lines), ["two"])
+
+            self.assertEqual(list(iter_clean_lines(filename, False)),
+                             ["one", "# skip me", "two # yup"])
+
+        self.assertEqual(list(iter_clean_lines(None)), [])
+
+        with patch("sys.stdin", StringIO("three\n#four\n")):
+            self.assertEqual(list(iter_clean_lines("-")), ["three"])
+
+
     def test_space_normalize(self):
         data = """
         This is a
@@ -256,5 +288,245 @@ class TestTabulate(TestCase):
         self.assertEqual(expected, result)
 
 
+class ShowBuild(AnonSmokyDingo):
+
+    description = "Show the NVR of a build"
+
+
+    def arguments(self, parser):
+        parser.add_argument("build", type=int)
+        return parser
+
+
+    def handle(self, options):
+        found = bulk_load_builds(self.session, [options.build])
+        print(found[options.build]["nvr"])
+
+
+class TestCassetteOptions(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=10)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+
+
+    def tearDown(self):
+        self.served.__exit__(None, None, None)
+
+
+    def invoke(self, url, *args, config=None):
+        session = koji.ClientSession(url)
+        cmd = ShowBuild("show-build")
+        cmd.config = config or {}
+
+        with patch("sys.stdout", new_callable=StringIO) as out:
+            result = cmd(GOptions(), session, args)
+
+        self.assertEqual(result, 0)
+        return out.getvalue().strip()
+
+
+    def test_anon_record_replay(self):
+        nvr = self.data.build(3)["nvr"]
+
+        with TemporaryDirectory() as tmpdir:
+            filename = join(tmpdir, "show.cassette")
+
+            found = self.invoke(self.server.url, "3", "--record", filename)
+            self.assertEqual(found, nvr)
+            self.assertEqual(self.server.hub.calls["getBuild"], 1)
+
+            # the replay answers the calls without contacting the hub,
+            # which is no longer running
+            self.served.__exit__(None, None, None)
+            self.served = fake_hub(self.data)
+            self.served.__enter__()
+
+            found = self.invoke(self.server.url, "3", "--replay", filename)
+            self.assertEqual(found, nvr)
+
+
+    def test_bulk_cache(self):
+        nvr = self.data.build(3)["nvr"]
+        calls = self.server.hub.calls
+
+        with TemporaryDirectory() as tmpdir:
+            filename = join(tmpdir, "show.cassette")
+            cache_file = join(tmpdir, "cache.sqlite")
+            config = {"cache": "true", "cache_file": cache_file}
+
+            def entries():
+                cache = BulkCache(cache_file)
+                try:
+                    return sum(stat[2] for stat in cache.stats())
+                finally:
+                    cache.close()
+
+            found = self.invoke(self.server.url, "3", config=config)
+            self.assertEqual(found, nvr)
+            self.assertEqual(calls["getBuild"], 1)
+            self.assertTrue(entries())
+
+            # the recording isn't answered from the cache, so that it
+            # includes the call
+            found = self.invoke(self.server.url, "3", "--record", filename,
+                                config=config)
+            self.assertEqual(found, nvr)
+            self.assertEqual(calls["getBuild"], 2)
+
+            # nor are replayed results stored in the cache
+            cache = BulkCache(cache_file)
+            cache.clear()
+            cache.close()
+
+            found = self.invoke(self.server.url, "3", "--replay", filename,
+                                config=config)
+            self.assertEqual(found, nvr)
+            self.assertEqual(calls["getBuild"], 2)
+            self.assertEqual(entries(), 0)
+
+
+class TestStreamOutput(TestCase):
+
+    def test_output_sifted_stream(self):
+        results = [
+            {"default": [{"id": 1}, {"id": 2}], "odd": [{"id": 1}]},
+            {"default": [{"id": 3}], "odd": [{"id": 3}],
+             "other": [{"id": 3}]},
+        ]
+
+        with TemporaryDirectory() as tmpdir:
+            odd = join(tmpdir, "odd")
+            empty = join(tmpdir, "empty")
+            outputs = {"default": "-", "odd": odd, "none": empty}
+
+            with patch("sys.stdout", new_callable=StringIO) as out:
+                output_sifted_stream(iter(results), "id", outputs)
+
+            self.assertEqual(out.getvalue(), "1\n2\n3\n")
+
+            with open(odd, "rt") as fin:
+                self.assertEqual(fin.read(), "1\n3\n")
+
+            # every output is written, even if it had no results
+            with open(empty, "rt") as fin:
+                self.assertEqual(fin.read(), "")
+
+
+class TestStreamBuilds(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=60, packages=20)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.session = koji.ClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def filter_builds(self, filterfn, nvrs, **kwds):
+        src = "(flag rpms (type rpm)) (name pkg00001 pkg00002)"
+        outputs = {"default": "-", "rpms": "-"}
+
+        with patch("sys.stdout", new_callable=StringIO) as out:
+            filterfn(self.session, nvrs,
+                     build_sifter=build_info_sifter(src),
+                     outputs=outputs, **kwds)
+
+        return out.getvalue().split()
+
+
+    def test_stream(self):
+        nvrs = [self.data.build(bid)["nvr"] for bid in range(1, 61)]
+        nvrs.extend(nvrs[:10])
+
+        expected = self.filter_builds(cli_filter_builds, nvrs)
+        self.assertTrue(expected)
+
+        for compact in (False, True):
+            found = self.filter_builds(cli_stream_builds, iter(nvrs),
+                                       compact=compact, window=7)
+
+            # the same builds, though each window's flags are output
+            # together rather than each flag in turn
+            self.assertEqual(sorted(found), sorted(expected))
+
+
+    def test_stream_tag(self):
+        calls = self.server.hub.calls
+
+        expected = self.filter_builds(cli_filter_builds, (),
+                                      tags=["tag0004"], inherit=True)
+        self.assertTrue(expected)
+
+        # without streaming, the tag is listed in a single call
+        self.assertEqual(calls["listTagged"], 1)
+        self.assertNotIn("listPackages", calls)
+
+        for compact in (False, True):
+            calls.clear()
+            found = self.filter_builds(cli_stream_builds, (),
+                                       tags=["tag0004"], inherit=True,
+                                       compact=compact, window=7)
+            self.assertEqual(sorted(found), sorted(expected))
+
+            # while streaming, it is listed package by package
+            self.assertEqual(calls["listPackages"], 1)
+            self.assertGreater(calls["listTagged"], 1)
+
+
+    def test_lazy(self):
+        calls = self.server.hub.calls
+        nvrs = [self.data.build(bid)["nvr"] for bid in (1, 2, 3)]
+
+        # by default the tagged builds are loaded in full, as before
+        expected = self.filter_builds(cli_filter_builds, nvrs,
+                                      tags=["tag0004"], inherit=True)
+        self.assertTrue(expected)
+        self.assertGreater(calls["getBuild"], len(nvrs))
+
+        # lazily, they're used as listed, with the same builds output
+        calls.clear()
+        found = self.filter_builds(cli_filter_builds, nvrs,
+                                   tags=["tag0004"], inherit=True,
+                                   lazy=True)
+        self.assertEqual(sorted(found), sorted(expected))
+        self.assertEqual(calls["getBuild"], len(nvrs))
+
+        calls.clear()
+        found = self.filter_builds(cli_stream_builds, iter(nvrs),
+                                   tags=["tag0004"], inherit=True,
+                                   lazy=True, window=7)
+        self.assertEqual(sorted(found), sorted(expected))
+        self.assertEqual(calls["getBuild"], len(nvrs))
+
+
+    def test_list_components_tag(self):
+        calls = self.server.hub.calls
+        tagged = self.session.listTagged("tag0004", inherit=True)
+        nvrs = [b["nvr"] for b in tagged]
+
+        def list_components(nvrs, **kwds):
+            with patch("sys.stdout", new_callable=StringIO) as out:
+                cli_list_components(self.session, nvrs, **kwds)
+            return out.getvalue().split()
+
+        expected = list_components(nvrs)
+        self.assertTrue(expected)
+
+        # the tagged builds are loaded a package at a time rather than
+        # in a single listTagged call, with the same components found
+        calls.clear()
+        found = list_components([], tags=["tag0004"], inherit=True)
+        self.assertEqual(found, expected)
+        self.assertEqual(calls["listPackages"], 1)
+        self.assertEqual(calls["listTagged"],
+                         len(set(b["package_name"] for b in tagged)))
+
+
 #
 # The end.
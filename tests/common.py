@@ -21,7 +21,7 @@ from pkg_resources import resource_filename
 from unittest import TestCase
 
 from kojismokydingo.common import (
-    chunkseq, escapable_replace, fnmatches,
+    chunkiter, chunkseq, escapable_replace, fnmatches,
     find_config_dirs, find_config_files, get_plugin_config,
     globfilter, load_full_config, load_plugin_config, merge_extend,
     parse_datetime, rpm_evr_compare, unique, update_extend,
@@ -267,6 +267,19 @@ class TestChunkseq(TestCase):
         self.assertEqual(result, expect)
 
 
+    def test_chunkiter(self):
+        data = iter(range(0, 12))
+        chunks = chunkiter(data, 5)
+
+        self.assertEqual(next(chunks), list(range(0, 5)))
+
+        # only the first chunk has been consumed
+        self.assertEqual(next(data), 5)
+
+        self.assertEqual(list(chunks), [list(range(6, 11)), [11]])
+        self.assertEqual(list(chunkiter((), 5)), [])
+
+
 class TestGlob(TestCase):
 
     def test_fnmatches(self):
@@ -0,0 +1,118 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+
+from subprocess import DEVNULL, PIPE, run
+from unittest import TestCase
+
+
+# the modules making up the data API
+CORE_MODULES = (
+    "kojismokydingo",
+    "kojismokydingo.archives",
+    "kojismokydingo.builds",
+    "kojismokydingo.lazy",
+    "kojismokydingo.records",
+    "kojismokydingo.sift",
+    "kojismokydingo.sift.builds",
+    "kojismokydingo.sift.tags",
+    "kojismokydingo.tags",
+)
+
+# modules which the data API must not import
+CLI_ONLY = (
+    "argparse",
+    "koji_cli",
+    "koji_cli.lib",
+)
+
+# modules which are only imported when they're used
+DEFERRED = (
+    "asyncio",
+    "cProfile",
+    "pkg_resources",
+    "sqlite3",
+)
+
+
+def importtime(*modules):
+    """
+    Imports the given modules in a fresh interpreter with ``-X
+    importtime``, and returns a dict of the self and cumulative
+    microseconds spent importing each module that was loaded, and the
+    depth at which it was imported.
+    """
+
+    code = "import " + ", ".join(modules)
+    proc = run([sys.executable, "-X", "importtime", "-c", code],
+               stdout=DEVNULL, stderr=PIPE, check=True)
+
+    found = {}
+    for line in proc.stderr.decode("utf-8").splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        own, cumulative, name = line[12:].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        try:
+            found[name.strip()] = (int(own), int(cumulative), depth)
+        except ValueError:
+            # the header line
+            pass
+
+    return found
+
+
+class TestImportTime(TestCase):
+
+    def test_core(self):
+        found = importtime(*CORE_MODULES)
+
+        for name in CORE_MODULES:
+            self.assertIn(name, found)
+
+        for name in CLI_ONLY + DEFERRED:
+            self.assertNotIn(name, found)
+
+
+    def test_cli(self):
+        found = importtime("kojismokydingo.cli.builds",
+                           "kojismokydingo.cli.tags")
+
+        self.assertIn("koji_cli.lib", found)
+
+        for name in DEFERRED:
+            self.assertNotIn(name, found)
+
+
+    def test_overhead(self):
+        # the time we add on top of importing koji itself, taking the
+        # best of a few runs to smooth out the noise. This is a loose
+        # bound, as it must also hold when the modules are compiled
+        # fresh rather than loaded from cached bytecode.
+
+        overheads = []
+        for _index in range(3):
+            found = importtime(*CORE_MODULES)
+            koji = found["koji"][1]
+            ours = sum(found[name][1] for name in CORE_MODULES
+                       if found[name][2] == 0)
+            overheads.append((ours - koji) / koji)
+
+        self.assertLess(min(overheads), 1.0)
+
+
+#
+# The end.
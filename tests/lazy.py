@@ -0,0 +1,213 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+import gc
+import koji
+
+from unittest import TestCase
+
+from kojismokydingo import as_buildinfo
+from kojismokydingo.builds import decorate_builds_btypes
+from kojismokydingo.lazy import (
+    LazyGroup, LazyInfo, lazy_build_group, lazy_builds, lazy_tags, )
+from kojismokydingo.sift.builds import build_info_sifter
+
+from benchmarks.fakehub import SyntheticData, fake_hub
+
+
+class TestLazyGroup(TestCase):
+
+    def test_providers(self):
+        loaded = []
+
+        def fallback(session, infos):
+            loaded.append(("fallback", len(infos)))
+            for info in infos:
+                info["full"] = info["id"] * 10
+
+        def extra(session, infos):
+            loaded.append(("extra", len(infos)))
+            for info in infos:
+                if info["id"] % 2:
+                    info["odd"] = True
+
+        group = LazyGroup(None, fallback, [({"odd"}, extra)])
+        first, second, third = group.extend({"id": i} for i in (1, 2, 3))
+        self.assertIsInstance(first, LazyInfo)
+        self.assertEqual(len(group), 3)
+
+        # known fields need no loading
+        self.assertEqual(second["id"], 2)
+        self.assertEqual(first.copy(), {"id": 1})
+        self.assertEqual(loaded, [])
+
+        # every member is loaded by the first access of any
+        self.assertEqual(second["full"], 20)
+        self.assertEqual(third.copy(), {"id": 3, "full": 30})
+        self.assertEqual(loaded, [("fallback", 3)])
+
+        # a provider is only invoked once, even when it leaves the
+        # key unset
+        self.assertNotIn("odd", second)
+        self.assertTrue(third["odd"])
+        self.assertRaises(KeyError, lambda: second["odd"])
+        self.assertIsNone(second.get("odd"))
+        self.assertEqual(loaded, [("fallback", 3), ("extra", 3)])
+
+        # as is the fallback for any other key
+        self.assertNotIn("nope", first)
+        self.assertEqual(loaded, [("fallback", 3), ("extra", 3)])
+
+        # later members are loaded by themselves
+        fourth = group.add({"id": 4})
+        self.assertEqual(fourth["full"], 40)
+        self.assertEqual(loaded[-1], ("fallback", 1))
+
+        first["set"] = 1
+        del first["full"]
+        self.assertEqual(first, {"id": 1, "odd": True, "set": 1})
+        self.assertEqual(list(first), ["id", "odd", "set"])
+
+
+    def test_discarded(self):
+        loaded = []
+
+        def fallback(session, infos):
+            loaded.extend(info["id"] for info in infos)
+
+        group = LazyGroup(None, fallback)
+        infos = group.extend({"id": i} for i in range(10))
+
+        del infos[2:8]
+        gc.collect()
+        self.assertEqual(len(group), 4)
+
+        infos[0].get("full")
+        self.assertEqual(loaded, [0, 1, 8, 9])
+
+
+    def test_failure(self):
+        attempts = []
+
+        def fallback(session, infos):
+            attempts.append(len(infos))
+            if len(attempts) == 1:
+                raise ValueError("nope")
+            for info in infos:
+                info["full"] = True
+
+        group = LazyGroup(None, fallback)
+        info = group.add({"id": 1})
+
+        self.assertRaises(ValueError, lambda: info["full"])
+        self.assertTrue(info["full"])
+        self.assertEqual(attempts, [1, 1])
+
+
+class TestLazyBuilds(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=60, tags=5)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.session = koji.ClientSession(self.server.url)
+
+        self.tagged = self.session.listTagged(1)
+        self.server.hub.calls.clear()
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def calls(self):
+        found = dict(self.server.hub.calls)
+        self.server.hub.calls.clear()
+        return found
+
+
+    def test_fields(self):
+        builds = lazy_builds(self.session, [b["id"] for b in self.tagged])
+
+        self.assertEqual(builds[3]["nvr"], self.tagged[3]["nvr"])
+        self.assertEqual(self.calls(), {"multiCall": 1,
+                                        "getBuild": len(self.tagged)})
+
+        builds = lazy_builds(self.session, [5, self.data.build(6)["nvr"]])
+        self.assertEqual(builds[1]["id"], 6)
+        self.assertEqual(builds[0]["nvr"], self.data.build(5)["nvr"])
+        self.assertEqual(self.calls(), {"multiCall": 1, "getBuild": 2})
+
+        # as_buildinfo accepts them without loading anything
+        build = lazy_builds(self.session, [self.tagged[0]])[0]
+        self.assertIs(as_buildinfo(self.session, build), build)
+        self.assertEqual(self.calls(), {})
+
+
+    def test_decorations(self):
+        builds = lazy_builds(self.session, self.tagged)
+
+        # the fields from listTagged need no loading, and the
+        # decorations are only loaded when asked for
+        for build in builds:
+            self.assertEqual(build["tag_name"], "tag0001")
+        self.assertEqual(self.calls(), {})
+
+        self.assertIn("rpm", builds[0]["archive_btype_names"])
+        calls = self.calls()
+        self.assertEqual(calls["getBuildType"], len(builds))
+        self.assertNotIn("getBuild", calls)
+
+        # the decorate functions see the decorations as present
+        decorate_builds_btypes(self.session, builds)
+        self.assertEqual(self.calls(), {})
+
+        builds[1]["archive_cg_names"]
+        calls = self.calls()
+        self.assertEqual(calls["getBuildroot"], len(builds))
+        self.assertNotIn("getBuildType", calls)
+
+
+    def test_sift(self):
+        plain = [dict(b) for b in self.tagged]
+        expected = build_info_sifter("(type rpm)")(self.session, plain)
+        self.calls()
+
+        group = lazy_build_group(self.session)
+        builds = group.extend(self.tagged)
+        found = build_info_sifter("(type rpm)")(self.session, builds)
+
+        self.assertEqual([b["id"] for b in found["default"]],
+                         [b["id"] for b in expected["default"]])
+        calls = self.calls()
+        self.assertEqual(calls["getBuildType"], len(builds))
+        self.assertNotIn("getBuild", calls)
+
+
+    def test_tags(self):
+        tags = lazy_tags(self.session, [1, "tag0002", {"id": 3}])
+        self.assertEqual(tags[2]["id"], 3)
+        self.assertEqual(self.calls(), {})
+
+        self.assertEqual(tags[0]["name"], "tag0001")
+        self.assertEqual(tags[1]["id"], 2)
+        self.assertEqual(tags[2]["name"], "tag0003")
+        calls = self.calls()
+        self.assertEqual(calls["multiCall"], 1)
+        self.assertEqual(calls["getTag"], 3)
+
+
+#
+# The end.
@@ -0,0 +1,225 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+from json import dumps
+from mock import patch
+from unittest import TestCase
+
+from kojismokydingo import (
+    IdentityMap, ManagedClientSession, as_buildinfo, bulk_as_buildinfo,
+    bulk_load_builds, set_bulk_cache, set_identity_map, )
+from kojismokydingo.cache import BulkCache
+from kojismokydingo.records import (
+    BuildStore, RecordStore, RecordView, TagStore, )
+
+from benchmarks.fakehub import SyntheticData, fake_hub
+
+
+BUILD = {
+    "id": 7, "build_id": 7,
+    "name": "pkg", "version": "1.0", "release": "1.el9",
+    "nvr": "pkg-1.0-1.el9", "epoch": None,
+    "state": 1, "draft": False,
+    "owner_id": 2**70, "owner_name": "bob",
+    "creation_ts": 1600000000.5, "completion_ts": None,
+    "start_ts": float("inf"),
+    "extra": {"typeinfo": {"maven": {"group_id": "com.example"}}},
+}
+
+
+class TestRecordStore(TestCase):
+
+    def test_round_trip(self):
+        store = BuildStore()
+        view = store.append(BUILD)
+
+        self.assertIsInstance(view, RecordView)
+        self.assertEqual(len(store), 1)
+
+        self.assertEqual(view, BUILD)
+        self.assertEqual(BUILD, view)
+        self.assertEqual(view.copy(), BUILD)
+        self.assertEqual(list(view), list(BUILD))
+        self.assertEqual(len(view), len(BUILD))
+
+        # values keep their types, even where the column expects
+        # something else
+        for key, value in BUILD.items():
+            self.assertIs(type(view[key]), type(value), key)
+
+        self.assertIs(view["extra"], BUILD["extra"])
+        self.assertEqual(dumps(view.copy()), dumps(BUILD))
+
+
+    def test_missing(self):
+        store = BuildStore()
+        first = store.append({"id": 1, "name": "a"})
+        second = store.append({"id": 2, "nvr": "b-1-1", "task_id": 9})
+
+        self.assertNotIn("nvr", first)
+        self.assertNotIn("task_id", first)
+        self.assertRaises(KeyError, lambda: first["nvr"])
+        self.assertIsNone(first.get("task_id"))
+        self.assertEqual(first.get("task_id", 5), 5)
+        self.assertEqual(first, {"id": 1, "name": "a"})
+
+        self.assertNotIn("name", second)
+        self.assertEqual(second, {"id": 2, "nvr": "b-1-1", "task_id": 9})
+
+        self.assertNotIn("unheard_of", second)
+        self.assertIsNone(second.get("unheard_of"))
+
+
+    def test_mutation(self):
+        store = BuildStore()
+        first, second = store.records([{"id": 1}, {"id": 2}])
+
+        # new keys, as added by the decorate_builds functions
+        first["archive_btype_ids"] = [1, 2]
+        first["state"] = 2
+        second["state"] = None
+
+        self.assertEqual(first, {"id": 1, "state": 2,
+                                 "archive_btype_ids": [1, 2]})
+        self.assertEqual(second, {"id": 2, "state": None})
+
+        del first["state"]
+        self.assertNotIn("state", first)
+        self.assertIsNone(second["state"])
+
+        def delete():
+            del first["state"]
+
+        self.assertRaises(KeyError, delete)
+
+        first.update(name="a", creation_ts=1.5)
+        self.assertEqual(first["creation_ts"], 1.5)
+        self.assertEqual(first.setdefault("name", "b"), "a")
+
+
+    def test_interned(self):
+        store = BuildStore()
+        owners = ("alice", "bob", "carol")
+
+        views = list(store.records({"id": i, "owner_name": owners[i % 3],
+                                    "draft": (i % 2 == 0)}
+                                   for i in range(30)))
+
+        column = store._columns["owner_name"]
+        self.assertEqual(len(column.values), 4)
+        self.assertEqual([v["owner_name"] for v in views[:3]],
+                         ["alice", "bob", "carol"])
+
+        # True and 1 are equal, but remain distinct
+        views[0]["draft"] = 1
+        self.assertIs(views[0]["draft"], 1)
+        self.assertIs(views[2]["draft"], True)
+
+        # unhashable values are permitted
+        views[1]["owner_name"] = ["dave"]
+        self.assertEqual(views[1]["owner_name"], ["dave"])
+
+
+    def test_record(self):
+        store = BuildStore()
+        view = store.record(BUILD)
+        self.assertIs(store.record(view), view)
+        self.assertIs(RecordStore().record(view), view)
+        self.assertIsNone(store.record(None))
+
+        found = list(store.records([None, BUILD, view]))
+        self.assertIsNone(found[0])
+        self.assertEqual(found[1], BUILD)
+        self.assertIs(found[2], view)
+        self.assertEqual(len(store), 2)
+
+        self.assertEqual(list(store), [BUILD, BUILD])
+        self.assertEqual(store.view(0), view)
+        self.assertRaises(IndexError, store.view, 2)
+
+
+    def test_dynamic_columns(self):
+        store = RecordStore()
+        view = store.append({"id": 1, "ratio": 0.5, "name": "x"})
+        self.assertEqual(view, {"id": 1, "ratio": 0.5, "name": "x"})
+
+        store.append({"id": "one", "ratio": "half"})
+        self.assertEqual(store.view(1), {"id": "one", "ratio": "half"})
+
+        view = TagStore().append({"id": 1, "name": "tag", "locked": False,
+                                  "arches": "x86_64", "perm": None})
+        self.assertIs(view["locked"], False)
+        self.assertIsNone(view["perm"])
+
+
+class TestCompactLoad(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=50)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.session = ManagedClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def test_bulk_load_builds(self):
+        expected = bulk_load_builds(self.session, range(1, 21))
+
+        store = BuildStore()
+        found = bulk_load_builds(self.session, range(1, 21), store=store)
+
+        self.assertEqual(found, expected)
+        self.assertEqual(len(store), 20)
+        for info in found.values():
+            self.assertIsInstance(info, RecordView)
+
+        # views are accepted in place of info dicts
+        self.assertIs(as_buildinfo(self.session, found[1]), found[1])
+        self.assertEqual(bulk_as_buildinfo(self.session, found.values()),
+                         list(found.values()))
+
+
+    def test_identity_map(self):
+        set_identity_map(self.session, IdentityMap())
+
+        store = BuildStore()
+        first = bulk_load_builds(self.session, [1, 2], store=store)
+        second = bulk_load_builds(self.session, [2, 3], store=store)
+
+        # the identity map records the views
+        self.assertIs(second[2], first[2])
+        self.assertEqual(len(store), 3)
+
+
+    def test_record_once(self):
+        set_identity_map(self.session, IdentityMap())
+        set_bulk_cache(self.session, BulkCache(":memory:"))
+
+        store = BuildStore()
+        with patch.object(store, "record", wraps=store.record) as record:
+            bulk_load_builds(self.session, [1, 2, 1], store=store)
+            self.assertEqual(record.call_count, 2)
+
+            bulk_load_builds(self.session, [2, 3], store=store)
+            self.assertEqual(record.call_count, 4)
+
+        self.assertEqual(len(store), 3)
+
+
+#
+# The end.
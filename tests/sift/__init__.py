@@ -29,6 +29,7 @@ from kojismokydingo.sift.parse import (
     Null, Number, ParserError, Regex, Symbol, SymbolGroup,
     convert_token,
 )
+from kojismokydingo.records import RecordStore, RecordView
 
 
 class ExIntStrSieve(IntStrSieve):
@@ -83,6 +84,9 @@ class Poke(Sieve):
 
     aliases = ["incr", ]
 
+    # the results depend upon how many times it has been invoked
+    cacheable = False
+
 
     def __init__(self, sifter, *, count=-1):
         super(Poke, self).__init__(sifter, count=count)
@@ -97,6 +101,19 @@ class Poke(Sieve):
         return (self._max < 0) or (seen <= self._max)
 
 
+class Peek(Sieve):
+    # for testing shared sieves. Counts each time it checks a data
+    # item, and matches them all.
+
+    name = "peek"
+
+
+    def check(self, _session, data):
+        cache = self.get_info_cache(data)
+        cache["count"] = cache.get("count", 0) + 1
+        return True
+
+
 TACOS = {
     "id": 1,
     "type": "food",
@@ -140,7 +157,8 @@ DATA = [
 class SifterTest(TestCase):
 
     def compile_sifter(self, src, **params):
-        sieves = [NameSieve, TypeSieve, BrandSieve, CategorySieve, Poke]
+        sieves = [NameSieve, TypeSieve, BrandSieve, CategorySieve, Poke,
+                  Peek]
         sieves.extend(DEFAULT_SIEVES)
 
         return Sifter(sieves, src, params=params)
@@ -876,6 +894,30 @@ class SifterTest(TestCase):
         self.assertEqual(repr(poke), "(poke count: Number(-3))")
 
 
+    def test_store(self):
+        # sifting views from a store finds the same results as
+        # sifting the dicts
+
+        sources = (
+            "(item name Pizza Tacos)",
+            "([] 3)",
+            "(keywords[] spicy)",
+            "(flag hot (keywords[] spicy)) (not (flagged hot))",
+        )
+
+        for src in sources:
+            expected = self.compile_sifter(src)(None, DATA)
+
+            sifter = self.compile_sifter(src)
+            sifter.store = RecordStore
+            found = sifter(None, DATA)
+
+            self.assertEqual(found, expected, src)
+            for flagged in found.values():
+                for data in flagged:
+                    self.assertIsInstance(data, RecordView)
+
+
     def test_cache(self):
 
         src = """
@@ -940,6 +982,230 @@ class SifterTest(TestCase):
         self.assertEqual(che["count"], 4)
 
 
+    def test_iter_run(self):
+        src = """
+        (flag drinks (type drink))
+        (poke count: 0)
+        """
+
+        sifter = self.compile_sifter(src)
+        sifter.get_cache("kept", 1)["value"] = True
+
+        found = sifter.iter_run(None, iter(DATA + [None] + DATA), window=3)
+
+        # the input is only read as each window is needed
+        self.assertEqual(next(found), {"drinks": [BEER],
+                                       "default": [TACOS, PIZZA, BEER]})
+
+        self.assertEqual(list(found), [
+            {"drinks": [DRAINO], "default": [DRAINO, TACOS, PIZZA]},
+            {"drinks": [BEER, DRAINO], "default": [BEER, DRAINO]},
+        ])
+
+        # the info caches are discarded along with each window, so
+        # the second occurrence of each was poked afresh, but the
+        # other caches are kept
+        self.assertEqual(sifter.get_info_cache("poke", TACOS), {})
+        self.assertEqual(sifter.get_cache("kept", 1), {"value": True})
+
+
+    def test_plan(self):
+
+        def pokes(src, plan):
+            sieves = [NameSieve, TypeSieve, BrandSieve, CategorySieve, Poke]
+            sieves.extend(DEFAULT_SIEVES)
+
+            sifter = Sifter(sieves, src, plan=plan)
+            res = sifter(None, DATA)
+
+            poked = [sifter.get_info_cache("poke", data).get("count", 0)
+                     for data in DATA]
+            return res, poked
+
+        # the cheap item sieve runs first, so only the matching items
+        # are poked
+        src = """
+        (and (poke) (name Tacos Beer))
+        """
+        res, poked = pokes(src, True)
+        self.assertEqual(res["default"], [TACOS, BEER])
+        self.assertEqual(poked, [1, 0, 1, 0])
+
+        res, poked = pokes(src, False)
+        self.assertEqual(res["default"], [TACOS, BEER])
+        self.assertEqual(poked, [1, 1, 1, 1])
+
+        # the planned order is separate from the tokens
+        sifter = self.compile_sifter(src)
+        sieve = sifter.sieve_exprs()[0]
+        self.assertEqual(repr(sieve), "(and (poke count: -1) (or"
+                         " (name Symbol('Tacos')) (name Symbol('Beer'))))")
+        self.assertEqual(sieve.planned, sieve.tokens[::-1])
+
+        # the results of an or keep their input order, regardless of
+        # which sub-expression is evaluated first
+        src = """
+        (or (poke count: -1) (name Beer))
+        """
+        res, poked = pokes(src, True)
+        self.assertEqual(res["default"], DATA)
+        self.assertEqual(poked, [1, 1, 0, 1])
+
+        # nothing is moved past a flag
+        src = """
+        (and (poke) (flag seen (type food drink)) (name Beer))
+        """
+        res, poked = pokes(src, True)
+        self.assertEqual(res["default"], [BEER])
+        self.assertEqual(res["seen"], DATA)
+        self.assertEqual(poked, [1, 1, 1, 1])
+
+        # though the sub-expressions of the flag are themselves planned
+        src = """
+        (and (flag tasty (poke) (type food)) (name Tacos))
+        """
+        res, poked = pokes(src, True)
+        self.assertEqual(res["default"], [TACOS])
+        self.assertEqual(res["tasty"], [TACOS, PIZZA])
+        self.assertEqual(poked, [1, 1, 0, 0])
+
+
+    def test_shared(self):
+
+        src = """
+        (flag first (type food) (peek))
+        (flag second (name Tacos Beer) (peek))
+        (flag third (peek) (type food))
+        """
+        sifter = self.compile_sifter(src)
+        first, second, third = sifter.sieve_exprs()
+
+        # identical sub-expressions are compiled into one sieve
+        self.assertIs(first.tokens[0], third.tokens[1])
+        self.assertIs(first.tokens[1], second.tokens[1])
+        self.assertIsNot(first, third)
+
+        res = sifter(None, DATA)
+        self.assertEqual(res["first"], [TACOS, PIZZA])
+        self.assertEqual(res["second"], [TACOS, BEER])
+        self.assertEqual(res["third"], [TACOS, PIZZA])
+
+        # and each data item is only checked once per run by the
+        # shared sieve
+        peeked = [sifter.get_info_cache("peek", data)["count"]
+                  for data in (TACOS, PIZZA, BEER)]
+        self.assertEqual(peeked, [1, 1, 1])
+
+        res = sifter(None, DATA)
+        self.assertEqual(res["third"], [TACOS, PIZZA])
+        peeked = [sifter.get_info_cache("peek", data)["count"]
+                  for data in (TACOS, PIZZA, BEER)]
+        self.assertEqual(peeked, [2, 2, 2])
+
+        # the forms of not, and the orders of the sub-expressions,
+        # are normalized
+        src = """
+        (not (name Tacos) (type drink))
+        (!type drink food)
+        (not-type food drink)
+        (! (or (type food) (type drink)))
+        (not (or (type drink) (name Tacos)))
+        (and (peek) (name Tacos))
+        (and (name Tacos) (and (peek)))
+        (or (type food) (peek))
+        """
+        sifter = self.compile_sifter(src)
+        exprs = sifter.sieve_exprs()
+
+        self.assertIsNot(exprs[0], exprs[1])
+        self.assertIs(exprs[1], exprs[2])
+        self.assertIs(exprs[1], exprs[3])
+        self.assertIs(exprs[0], exprs[4])
+        self.assertIs(exprs[5], exprs[6])
+        self.assertIsNot(exprs[5], exprs[7])
+
+        res = sifter(None, DATA)
+        self.assertEqual(res["default"], [PIZZA, TACOS, BEER, DRAINO])
+
+        # neither flags nor their checks are shared
+        src = """
+        (flag tasty (type food))
+        (flag tasty (type food))
+        (flag both (tasty?) (type food))
+        (flag both (tasty?) (type food))
+        (flag counted (poke) (poke count: 0))
+        """
+        sifter = self.compile_sifter(src)
+        exprs = sifter.sieve_exprs()
+
+        self.assertIsNot(exprs[0], exprs[1])
+        self.assertIs(exprs[0].tokens[0], exprs[1].tokens[0])
+        self.assertIsNot(exprs[2].tokens[0], exprs[3].tokens[0])
+        self.assertIs(exprs[2].tokens[1], exprs[0].tokens[0])
+        self.assertIsNone(exprs[4].tokens[0].signature())
+
+        res = sifter(None, DATA)
+        self.assertEqual(res["tasty"], [TACOS, PIZZA])
+        self.assertEqual(res["both"], [TACOS, PIZZA])
+        self.assertFalse("counted" in res)
+
+
+    def test_fused(self):
+
+        def check(src, expected):
+            sifter = self.compile_sifter(src)
+            sieve = sifter.sieve_exprs()[0]
+
+            pred = sieve.predicate(None)
+            self.assertIsNotNone(pred)
+            self.assertEqual(list(filter(pred, DATA)), expected)
+
+            res = sifter(None, DATA)
+            self.assertEqual(res.get("default", []), expected)
+
+        check("(name Tacos Beer)", [TACOS, BEER])
+        check("(and (type food) (not (name Tacos)))", [PIZZA])
+        check("(or (name Draino) (and (type food) (category 1)))",
+              [TACOS, PIZZA, DRAINO])
+        check("(not (.keywords[] yummy) (brand))", [])
+        check("(!type drink)", [TACOS, PIZZA])
+        check("(and (name Tacos Pizza Beer Draino) (type food drink)"
+              " (category 1) (not (brand)))", [TACOS, PIZZA, BEER])
+
+        # the local sub-expressions are fused into a single step,
+        # while the others are run as before
+        src = """
+        (and (poke) (type food) (name Tacos))
+        (or (type drink) (poke count: 0) (name Tacos) (brand null))
+        """
+        sifter = self.compile_sifter(src)
+        first, second = sifter.sieve_exprs()
+
+        self.assertIsNone(first.predicate(None))
+        steps = first.steps(None)
+        self.assertEqual(len(steps), 2)
+        self.assertIs(steps[1], first.tokens[0])
+
+        res = sifter(None, DATA)
+        self.assertEqual(res["default"], DATA)
+        self.assertEqual(sifter.get_info_cache("poke", TACOS)["count"], 1)
+        self.assertNotIn("count", sifter.get_info_cache("poke", PIZZA))
+        self.assertNotIn("count", sifter.get_info_cache("poke", BEER))
+
+        # flags aren't fused, nor is anything moved past them
+        src = """
+        (and (type food) (flag tasty (name Tacos)) (tasty?))
+        """
+        sifter = self.compile_sifter(src)
+        sieve = sifter.sieve_exprs()[0]
+        self.assertIsNone(sieve.predicate(None))
+        self.assertEqual(len(sieve.steps(None)), 3)
+
+        res = sifter(None, DATA)
+        self.assertEqual(res["default"], [TACOS])
+        self.assertEqual(res["tasty"], [TACOS])
+
+
     def test_symbol_param(self):
 
         src = """
@@ -12,9 +12,13 @@
 # along with this library; if not, see <http://www.gnu.org/licenses/>.
 
 
-from mock import MagicMock
+import koji
+
+from mock import MagicMock, patch
 from unittest import TestCase
 
+from kojismokydingo import bulk_load_builds
+
 from kojismokydingo.builds import build_id_sort
 from kojismokydingo.sift import Sifter, SifterError
 from kojismokydingo.sift.builds import (
@@ -22,9 +26,9 @@ from kojismokydingo.sift.builds import (
     EVRCompareEQ, EVRCompareNE,
     EVRCompareLT, EVRCompareLE,
     EVRCompareGT, EVRCompareGE,
-    ImportedSieve, TaggedSieve, InheritedSieve,
+    ImportedSieve, OwnerSieve, TaggedSieve, InheritedSieve,
     StateSieve, TypeSieve,
-    build_info_sifter, sift_builds, sift_nvrs, )
+    build_info_sieves, build_info_sifter, sift_builds, sift_nvrs, )
 
 from ..builds import (
     BUILD_SAMPLE_1, BUILD_SAMPLE_1_1,
@@ -36,6 +40,7 @@ from ..tags import (
     TAG_2, TAG_2_CANDIDATE, TAG_2_RELEASED,
     TAGS, inheritance,
 )
+from benchmarks.fakehub import SyntheticData, fake_hub
 
 
 BUILD_SAMPLES = list(BUILD_SAMPLES)
@@ -627,5 +632,125 @@ class SiftNVRsTest(TestCase):
         self.assertEqual(mc.call_count, 1)
 
 
+
+class PlannedSiftTest(TestCase):
+
+    def setUp(self):
+        self.served = fake_hub(SyntheticData(builds=60, packages=20))
+        self.server = self.served.__enter__()
+        self.session = koji.ClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def sift(self, src, plan):
+        builds = bulk_load_builds(self.session, range(1, 61)).values()
+        self.server.hub.calls.clear()
+
+        sifter = Sifter(build_info_sieves(), src, plan=plan)
+        found = sifter(self.session, builds)
+        return found, dict(self.server.hub.calls)
+
+
+    def test_plan(self):
+        src = """
+        (and (cg-imported) (name pkg00001 pkg00002))
+        """
+
+        planned, planned_calls = self.sift(src, True)
+        unplanned, unplanned_calls = self.sift(src, False)
+
+        self.assertEqual(planned, unplanned)
+
+        # only the six builds of the two packages were decorated
+        self.assertEqual(planned_calls["listArchives"], 6)
+        self.assertEqual(unplanned_calls["listArchives"], 60)
+
+
+class PrefetchSiftTest(TestCase):
+
+    def setUp(self):
+        self.served = fake_hub(SyntheticData(builds=60, packages=20))
+        self.server = self.served.__enter__()
+        self.session = koji.ClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def sift(self, src, prefetch):
+        builds = bulk_load_builds(self.session, range(1, 61)).values()
+        self.server.hub.calls.clear()
+
+        sifter = build_info_sifter(src, prefetch=prefetch)
+        found = sifter(self.session, builds)
+
+        # the prefetched builds may have been decorated by sieves
+        # which they never reached, so only the IDs are compared
+        found = {flag: [b["id"] for b in bs] for flag, bs in found.items()}
+        return found, dict(self.server.hub.calls)
+
+
+    def test_prefetch(self):
+        src = """
+        (or (tagged) (signed) (type rpm))
+        (flag named (inherited tag0001) (cg-imported))
+        """
+
+        fetched, fetched_calls = self.sift(src, True)
+        plain, plain_calls = self.sift(src, False)
+
+        self.assertEqual(fetched, plain)
+
+        # the calls of every sieve share the same multicalls, and
+        # the tags were only loaded once for tagged and inherited
+        self.assertLess(fetched_calls["multiCall"],
+                        plain_calls["multiCall"])
+        self.assertEqual(fetched_calls["listTags"], 60)
+        self.assertEqual(plain_calls["listTags"], 60)
+
+
+    def test_narrowed(self):
+        src = """
+        (and (type rpm) (name pkg00001 pkg00002) (signed))
+        """
+
+        fetched, fetched_calls = self.sift(src, True)
+        plain, plain_calls = self.sift(src, False)
+
+        self.assertEqual(fetched, plain)
+
+        # only the six builds of the two packages were gathered for
+        self.assertEqual(fetched_calls["getBuildType"], 6)
+        self.assertEqual(fetched_calls["listRPMs"], 6)
+
+
+    def test_narrowed_once(self):
+        src = """
+        (and (owner user1) (signed))
+        """
+
+        runs = []
+        orig_run = OwnerSieve.run
+
+        def run(sieve, session, info_dicts):
+            runs.append(len(info_dicts))
+            return orig_run(sieve, session, info_dicts)
+
+        with patch.object(OwnerSieve, "run", run):
+            fetched, _calls = self.sift(src, True)
+            self.assertEqual(len(runs), 1)
+
+            plain, _calls = self.sift(src, False)
+            self.assertEqual(len(runs), 2)
+
+        self.assertEqual(fetched, plain)
+
+
 #
 # The end.
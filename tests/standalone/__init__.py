@@ -17,6 +17,7 @@ from unittest import TestCase
 
 
 ENTRY_POINTS = {
+    "ksd-cache": "kojismokydingo.standalone.cache:ksd_cache",
     "ksd-filter-builds": "kojismokydingo.standalone.builds:ksd_filter_builds",
     "ksd-filter-tags": "kojismokydingo.standalone.tags:ksd_filter_tags",
 }
@@ -0,0 +1,306 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this library; if not, see <http://www.gnu.org/licenses/>.
+
+
+import koji
+
+from mock import patch
+from requests.exceptions import ChunkedEncodingError
+from unittest import TestCase
+from xml.parsers.expat import ExpatError
+from xmlrpc.client import ResponseError, dumps
+
+from kojismokydingo import (
+    CallStats, ManagedClientSession, Throttle, bulk_load_builds,
+    clone_session, iter_bulk_load, set_bulk_streaming, set_call_stats,
+    set_throttle, )
+from kojismokydingo.transport import (
+    HubTransport, iter_multicall, iter_response_results,
+    session_transport, set_transport, transfer_stats, )
+
+from benchmarks.fakehub import SyntheticData, fake_hub
+
+
+def _response(result):
+    return dumps((result, ), methodresponse=True,
+                 allow_none=True).encode("utf-8")
+
+
+def _pieces(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class TestIterResponseResults(TestCase):
+
+    def test_chunking(self):
+        results = [[{"id": i, "nvr": "b-%i-1" % i,
+                     "extra": {"nested": [1, [2, {"x": None}]]},
+                     "name": "ünicode"}]
+                   for i in range(10)]
+        results.append({"faultCode": 1000, "faultString": "nope"})
+        body = _response(results)
+
+        for size in (1, 7, 64, len(body)):
+            found = list(iter_response_results(_pieces(body, size)))
+            self.assertEqual(found, results, size)
+
+
+    def test_incremental(self):
+        # results are yielded before the rest of the response is fed
+        results = [[{"id": i, "pad": "x" * 100}] for i in range(20)]
+        pieces = _pieces(_response(results), 100)
+
+        fed = []
+
+        def feed():
+            for piece in pieces:
+                fed.append(piece)
+                yield piece
+
+        found = iter_response_results(feed())
+        self.assertEqual(next(found), results[0])
+        self.assertLess(len(fed), len(pieces) // 4)
+
+        self.assertEqual(list(found), results[1:])
+        self.assertEqual(len(fed), len(pieces))
+
+
+    def test_fault(self):
+        body = dumps(koji.Fault(1000, "boom"), methodresponse=True)
+        found = iter_response_results([body.encode("utf-8")])
+        self.assertRaises(koji.GenericError, list, found)
+
+
+    def test_bad_response(self):
+        # a result which isn't an array
+        found = iter_response_results([_response({"a": 1})])
+        self.assertRaises(ResponseError, list, found)
+
+        # a truncated response
+        body = _response([[1], [2]])
+        found = iter_response_results([body[:-30]])
+        self.assertRaises(ExpatError, list, found)
+
+
+class TestStreamedBulkLoad(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=200)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.session = ManagedClientSession(self.server.url)
+
+
+    def tearDown(self):
+        self.session.logout()
+        self.served.__exit__(None, None, None)
+
+
+    def test_iter_multicall(self):
+        sess = self.session
+        sess.multicall = True
+        for bid in (1, 2, 999999):
+            sess.getBuild(bid, strict=True)
+        calls = sess._calls
+        sess._calls = []
+        sess.multicall = False
+
+        sizes = []
+        found = list(iter_multicall(sess, calls, sizes.append))
+        self.assertEqual(len(found), 3)
+        self.assertEqual(found[0][0]["id"], 1)
+        self.assertEqual(found[1][0]["id"], 2)
+        self.assertIn("faultCode", found[2])
+        self.assertGreater(sizes[0], 0)
+
+
+    def test_bulk_load(self):
+        stats = CallStats()
+        set_call_stats(self.session, stats)
+
+        streamed = bulk_load_builds(self.session, range(1, 101), size=30)
+
+        plain = koji.ClientSession(self.server.url)
+        expected = bulk_load_builds(plain, range(1, 101), size=30)
+        plain.logout()
+
+        self.assertEqual(streamed, expected)
+
+        found = stats.as_dict()["methods"]["getBuild"]
+        self.assertEqual(found["calls"], 100)
+        self.assertEqual(found["multicalls"], 4)
+        self.assertGreater(found["bytes"], 0)
+
+
+    def test_throttle(self):
+        # streamed multicalls bypass _callMethod, but are still limited
+        throttle = Throttle(rate=200, burst=20, concurrency=1)
+        set_throttle(self.session, throttle)
+
+        with patch("kojismokydingo.multicall.iter_multicall",
+                   wraps=iter_multicall) as streamer:
+            found = bulk_load_builds(self.session, range(1, 61), size=20)
+            self.assertEqual(streamer.call_count, 3)
+
+        self.assertEqual(len(found), 60)
+        self.assertEqual(throttle.active, 0)
+        self.assertGreater(throttle.waited, 0.1)
+
+
+    def test_disabled(self):
+        set_bulk_streaming(self.session, False)
+
+        with patch("kojismokydingo.multicall.iter_multicall") as streamer:
+            found = bulk_load_builds(self.session, [1, 2])
+            self.assertFalse(streamer.called)
+
+        self.assertEqual(list(found), [1, 2])
+
+
+    def test_broken_stream(self):
+        # a response which breaks off part way through is recovered
+        # by sending the calls which had no result yet
+
+        real = iter_multicall
+        sent = []
+
+        def breaking(session, calls, response_bytes=None):
+            sent.append(len(calls))
+            found = real(session, calls, response_bytes)
+            if len(sent) == 1:
+                for _index in range(3):
+                    yield next(found)
+                found.close()
+                raise ChunkedEncodingError("connection went away")
+            yield from found
+
+        with patch("kojismokydingo.multicall.iter_multicall", new=breaking):
+            found = list(iter_bulk_load(self.session, self.session.getBuild,
+                                        range(1, 11), size=10))
+
+        self.assertEqual([key for key, _info in found], list(range(1, 11)))
+        self.assertEqual([info["id"] for _key, info in found],
+                         list(range(1, 11)))
+
+        # the retry was an ordinary multicall of the remaining keys
+        self.assertEqual(sent, [10])
+        self.assertEqual(self.server.hub.calls["getBuild"], 17)
+
+
+class TestHubTransport(TestCase):
+
+    def setUp(self):
+        self.data = SyntheticData(builds=200)
+        self.served = fake_hub(self.data)
+        self.server = self.served.__enter__()
+        self.transport = HubTransport(compress_requests=True,
+                                      compress_min=500)
+
+
+    def tearDown(self):
+        self.transport.close()
+        self.served.__exit__(None, None, None)
+
+
+    def test_compression(self):
+        session = ManagedClientSession(self.server.url,
+                                       transport=self.transport)
+
+        loaded = bulk_load_builds(session, range(1, 101), size=50)
+        self.assertEqual([b["id"] for b in loaded.values()],
+                         list(range(1, 101)))
+
+        # the fake hub compresses responses and accepts compressed
+        # requests, just as a suitably configured hub would
+        stats = transfer_stats(session).as_dict()
+        self.assertGreater(stats["sent_wire"], 0)
+        self.assertLess(stats["sent_wire"], stats["sent"])
+        self.assertGreater(stats["received_wire"], 0)
+        self.assertLess(stats["received_wire"], stats["received"])
+
+        # small requests are sent as they are
+        before = transfer_stats(session).as_dict()
+        session.getLoggedInUser()
+        after = transfer_stats(session).as_dict()
+        self.assertEqual(after["sent"] - before["sent"],
+                         after["sent_wire"] - before["sent_wire"])
+
+        session.logout()
+
+
+    def test_response_bytes(self):
+        # the sizes recorded for the multicalls, which guide their
+        # chunking, are those of the decoded responses rather than
+        # of the compressed ones
+
+        for streaming in (True, False):
+            session = ManagedClientSession(self.server.url,
+                                           transport=self.transport)
+            set_bulk_streaming(session, streaming)
+            calls = CallStats()
+            set_call_stats(session, calls)
+
+            before = transfer_stats(session).as_dict()
+            bulk_load_builds(session, range(1, 101), size=50)
+            after = transfer_stats(session).as_dict()
+
+            received = after["received"] - before["received"]
+            wire = after["received_wire"] - before["received_wire"]
+            self.assertLess(wire, received)
+
+            found = calls.as_dict()["methods"]["getBuild"]
+            self.assertEqual(found["bytes"], received)
+
+            session.logout()
+
+
+    def test_shared_pool(self):
+        # sessions sharing a transport share its connections, across
+        # multicalls, clones, and sessions. The fake hub keeps
+        # connections alive.
+
+        first = ManagedClientSession(self.server.url,
+                                     transport=self.transport)
+        bulk_load_builds(first, range(1, 51), size=10)
+
+        clone = clone_session(first)
+        self.assertIs(session_transport(clone), self.transport)
+        self.assertIs(transfer_stats(clone), transfer_stats(first))
+        clone.getLoggedInUser()
+
+        second = ManagedClientSession(self.server.url,
+                                      transport=self.transport)
+        bulk_load_builds(second, range(51, 101), size=10)
+
+        pools = self.transport.pool.pools
+        self.assertEqual(len(pools), 1)
+        pool = pools[pools.keys().pop()]
+        self.assertEqual(pool.num_connections, 1)
+
+        # replacing the requests session keeps the transport
+        second.new_session()
+        second.getLoggedInUser()
+        self.assertEqual(pool.num_connections, 1)
+
+        # and it may be removed again
+        set_transport(second, None)
+        self.assertIsNone(session_transport(second))
+        second.getLoggedInUser()
+        self.assertEqual(pool.num_connections, 1)
+
+        for session in (first, clone, second):
+            session.logout()
+
+
+#
+# The end.